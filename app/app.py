@@ -13,6 +13,9 @@ from functools import wraps
 from flask_mail import Mail, Message
 from jinja2 import ChoiceLoader, FileSystemLoader
 from extensions import db, mail
+from static_assets import init_static_assets, register_static_assets_cli
+from search_index import register_search_index_cli, install_search_tracking
+from query_profiler import init_query_profiler
 from sqlalchemy import desc
 from datetime import timedelta, datetime
 from modules.calculator import calculator_bp
@@ -25,6 +28,10 @@ from modules.baselinker import baselinker_bp
 from modules.preview3d_ar import preview3d_ar_bp
 from modules.logging import AppLogger, get_logger, logging_bp, get_structured_logger
 from modules.reports import reports_bp
+from modules.reports.parse_cache import register_parser_cli
+from modules.reports.map_stats import register_map_stats_cli, install_change_tracking
+from modules.calculator.pricing import register_pricing_cli, invalidate_pricing_cache
+from modules.calculator.repricing import register_repricing_cli, start_repricing_job
 from modules.dashboard import dashboard_bp
 from modules.dashboard.models import ChangelogEntry, ChangelogItem, UserSession
 from modules.production import production_bp
@@ -36,7 +43,14 @@ from modules.sales import sales_bp
 from modules.sales.models import SalesApplication
 from modules.users import users_bp
 from modules.help import help_bp
+from modules.help.services import register_help_search_cli
+from modules.production.services.baselinker_queue import register_baselinker_queue_cli
+from modules.production.services.queue_projection import register_queue_projection_cli, install_queue_tracking
+from modules.production.services.item_facets import register_item_facets_cli, install_facet_tracking
 from modules.issues import issues_bp
+from modules.issues.models import ensure_ticket_counter_columns
+from modules.jobs import jobs_bp
+from modules.scheduler import register_scheduler_cli
 
 from flask_login import login_user, logout_user  # DODANE importy
 from sqlalchemy.exc import ResourceClosedError, OperationalError
@@ -118,6 +132,18 @@ def register_cli_commands(app):
         create_admin()
         click.echo("[setup-db] Gotowe.")
 
+    register_static_assets_cli(app)
+    register_parser_cli(app)
+    register_pricing_cli(app)
+    register_repricing_cli(app)
+    register_map_stats_cli(app)
+    register_help_search_cli(app)
+    register_baselinker_queue_cli(app)
+    register_queue_projection_cli(app)
+    register_item_facets_cli(app)
+    register_search_index_cli(app)
+    register_scheduler_cli(app)
+
 # Funkcje do generowania i weryfikacji tokena resetującego hasło
 def generate_reset_token(email, secret_key, salt='password-reset-salt'):
     serializer = URLSafeTimedSerializer(secret_key)
@@ -214,6 +240,10 @@ def create_app():
     # Inicjalizacja Flask-Mail oraz bazy danych itp.
     from extensions import init_extensions
     init_extensions(app)
+    install_change_tracking()
+    install_queue_tracking()
+    install_facet_tracking()
+    install_search_tracking()
     register_cli_commands(app)
 
     if hasattr(app, 'login_manager'):
@@ -226,6 +256,8 @@ def create_app():
             print("[DB_SETUP] RUN_DB_SETUP włączone - tworzę schemat bazy i konto admina", file=sys.stderr)
             db.create_all()
             create_admin()
+        # Kolumny liczników ticketów (dodawane do istniejącej tabeli)
+        ensure_ticket_counter_columns()
         # Odkrywanie dostępnych modułów i ich metadanych
         app.config['MODULE_METADATA'] = discover_module_metadata(app)
 
@@ -247,11 +279,19 @@ def create_app():
         app.register_blueprint(users_bp)
         app.register_blueprint(help_bp)
         app.register_blueprint(issues_bp)
+        app.register_blueprint(jobs_bp)
 
         print("✅ Wszystkie blueprinty zarejestrowane", file=sys.stderr)
 
     register_blueprints_lazy(app)
 
+    # Manifest static z flask build-assets (przed pozostałymi before_request,
+    # żeby hashowane zasoby nie uruchamiały trackingu sesji)
+    init_static_assets(app)
+
+    # Liczba zapytań SQL / czas DB per request + wykrywanie N+1 i budżety
+    init_query_profiler(app)
+
     @app.before_request
     def extend_session():
         session.permanent = True
@@ -684,6 +724,7 @@ def create_app():
             # Po zaktualizowaniu wszystkich rekordów
             try:
                 db.session.commit()
+                invalidate_pricing_cache()
                 prices_logger.info("Pomyślnie zakończono aktualizację cennika", 
                                 operation='database_commit',
                                 total_records_processed=len(all_prices),
@@ -694,6 +735,14 @@ def create_app():
                 
                 if updated_records > 0:
                     flash(f"Pomyślnie zaktualizowano cennik. Zmieniono {updated_records} rekordów.", "success")
+                    # Raport wpływu zmian na otwarte wyceny (bez zapisu)
+                    try:
+                        job = start_repricing_job(current_app._get_current_object(),
+                                                  user_id=current_user.id, reason='price_list_update')
+                        flash(f"Trwa analiza wpływu zmian na otwarte wyceny - raport: "
+                              f"{url_for('calculator.api_repricing_status', job_id=job.id)}", "info")
+                    except Exception as e:
+                        prices_logger.warning("Nie udało się uruchomić przeliczenia wycen", error_message=str(e))
                 else:
                     flash("Cennik sprawdzony - brak zmian do zapisania.", "info")
                     
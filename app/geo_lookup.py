@@ -0,0 +1,187 @@
+# geo_lookup.py
+"""
+Kod pocztowy / nazwa -> województwo
+===================================
+
+Jedno źródło mapowania dla modułów clients (GUS lookup), reports (auto-fill
+województwa przy imporcie, normalizacja) i mapy statystyk:
+
+- tablica 100 pozycji indeksowana 2 pierwszymi cyframi kodu pocztowego
+  plus tablica 1000 pozycji dla prefiksów 3-cyfrowych, które leżą
+  w innym województwie niż reszta swojej dwójki (np. 26-2xx Końskie),
+- tabela normalizacji nazw wpisywanych ręcznie (wielkość liter, polskie
+  znaki, spacja/myślnik, przedrostek "woj."),
+- wersje zbiorcze (regions_from_postcodes, normalize_regions,
+  resolve_regions) - każda unikalna wartość liczona raz, potem O(1) na wiersz.
+
+Województwa identyfikowane są kluczem - małe litery z polskimi znakami
+('dolnośląskie'); display_name() daje formę do zapisu w bazie
+('Dolnośląskie'), region_slug() identyfikator bez znaków diakrytycznych
+używany przez mapę SVG ('dolnoslaskie').
+"""
+
+import re
+import unicodedata
+from functools import lru_cache
+from typing import Dict, Iterable, List, Optional
+
+# (klucz, nazwa wyświetlana, slug mapy, zakresy 2-cyfrowych prefiksów kodu)
+_VOIVODESHIP_TABLE = (
+    ('dolnośląskie', 'Dolnośląskie', 'dolnoslaskie', [(50, 59)]),
+    ('kujawsko-pomorskie', 'Kujawsko-Pomorskie', 'kujawsko-pomorskie', [(85, 89)]),
+    ('lubelskie', 'Lubelskie', 'lubelskie', [(20, 24)]),
+    ('lubuskie', 'Lubuskie', 'lubuskie', [(65, 69)]),
+    ('łódzkie', 'Łódzkie', 'lodzkie', [(90, 99)]),
+    ('małopolskie', 'Małopolskie', 'malopolskie', [(30, 34)]),
+    ('mazowieckie', 'Mazowieckie', 'mazowieckie', [(0, 9), (26, 26)]),
+    ('opolskie', 'Opolskie', 'opolskie', [(45, 49)]),
+    ('podkarpackie', 'Podkarpackie', 'podkarpackie', [(35, 39)]),
+    ('podlaskie', 'Podlaskie', 'podlaskie', [(15, 19)]),
+    ('pomorskie', 'Pomorskie', 'pomorskie', [(80, 84)]),
+    ('śląskie', 'Śląskie', 'slaskie', [(40, 44)]),
+    ('świętokrzyskie', 'Świętokrzyskie', 'swietokrzyskie', [(25, 25), (27, 29)]),
+    ('warmińsko-mazurskie', 'Warmińsko-Mazurskie', 'warminsko-mazurskie', [(10, 14)]),
+    ('wielkopolskie', 'Wielkopolskie', 'wielkopolskie', [(60, 64)]),
+    ('zachodniopomorskie', 'Zachodniopomorskie', 'zachodniopomorskie', [(70, 79)]),
+)
+
+# Prefiksy 3-cyfrowe w innym województwie niż ich dwójka
+_PREFIX3_OVERRIDES = {
+    260: 'świętokrzyskie',  # 26-0xx okolice Kielc
+    261: 'świętokrzyskie',
+    262: 'świętokrzyskie',  # 26-2xx Końskie
+    263: 'łódzkie',         # 26-3xx Opoczno
+    963: 'mazowieckie',     # 96-3xx Żyrardów
+    965: 'mazowieckie',     # 96-5xx Sochaczew
+    896: 'pomorskie',       # 89-6xx Chojnice
+}
+
+VOIVODESHIPS: List[str] = [row[0] for row in _VOIVODESHIP_TABLE]
+_DISPLAY_NAMES: Dict[str, str] = {row[0]: row[1] for row in _VOIVODESHIP_TABLE}
+_SLUGS: Dict[str, str] = {row[0]: row[2] for row in _VOIVODESHIP_TABLE}
+
+
+def _build_prefix_tables():
+    prefix2: List[Optional[str]] = [None] * 100
+    for key, _display, _slug, ranges in _VOIVODESHIP_TABLE:
+        for start, end in ranges:
+            for prefix in range(start, end + 1):
+                prefix2[prefix] = key
+
+    prefix3: List[Optional[str]] = [None] * 1000
+    for prefix, key in _PREFIX3_OVERRIDES.items():
+        prefix3[prefix] = key
+    return prefix2, prefix3
+
+
+_PREFIX2, _PREFIX3 = _build_prefix_tables()
+
+_NON_DIGITS = re.compile(r'\D')
+_SEPARATORS = re.compile(r'[\s_\-]+')
+_REGION_PREFIX = re.compile(r'^(wojew[oó]dztwo|woj\.?)\s*')
+
+
+def _fold(text: str) -> str:
+    """Małe litery, bez polskich znaków, separatory -> '-'"""
+    text = text.strip().lower().replace('ł', 'l')
+    text = unicodedata.normalize('NFKD', text)
+    text = ''.join(ch for ch in text if not unicodedata.combining(ch))
+    text = _REGION_PREFIX.sub('', text)
+    return _SEPARATORS.sub('-', text).strip('-')
+
+
+def _build_name_table() -> Dict[str, str]:
+    table = {}
+    for key, display, slug, _ranges in _VOIVODESHIP_TABLE:
+        for variant in (key, display, slug):
+            table[_fold(variant)] = key
+        # "kujawskopomorskie" - nazwy dwuczłonowe wpisane bez separatora
+        table[_fold(key).replace('-', '')] = key
+    return table
+
+
+_NAME_TABLE = _build_name_table()
+
+
+def display_name(region: Optional[str]) -> Optional[str]:
+    """'dolnośląskie' -> 'Dolnośląskie'"""
+    return _DISPLAY_NAMES.get(region) if region else None
+
+
+def region_slug(region: Optional[str]) -> Optional[str]:
+    """'dolnośląskie' -> 'dolnoslaskie' (identyfikator mapy)"""
+    return _SLUGS.get(region) if region else None
+
+
+def region_from_postcode(postcode) -> Optional[str]:
+    """
+    Województwo (klucz) dla polskiego kodu pocztowego 'XX-XXX' / 'XXXXX'
+
+    Returns:
+        Optional[str]: klucz województwa lub None
+    """
+    if not postcode:
+        return None
+
+    code = str(postcode).strip()
+    if len(code) >= 2 and code[0].isdigit() and code[1].isdigit():
+        # Szybka ścieżka dla 'XX-XXX' / 'XXXXX'
+        digits = code[:2] + (code[3:4] if code[2:3] in ('-', ' ') else code[2:3])
+        if not digits.isdigit():
+            digits = digits[:2]
+    else:
+        digits = _NON_DIGITS.sub('', code)[:3]
+        if len(digits) < 2:
+            return None
+
+    if len(digits) == 3:
+        override = _PREFIX3[int(digits)]
+        if override:
+            return override
+    return _PREFIX2[int(digits[:2])]
+
+
+@lru_cache(maxsize=4096)
+def normalize_region(name) -> Optional[str]:
+    """
+    Nazwa województwa w dowolnej formie -> klucz
+
+    'Dolnoslaskie', ' woj. ŚLĄSKIE', 'kujawsko pomorskie' -> klucz; nieznane -> None
+    """
+    if not name or not isinstance(name, str):
+        return None
+    return _NAME_TABLE.get(_fold(name))
+
+
+def regions_from_postcodes(postcodes: Iterable) -> List[Optional[str]]:
+    """Wersja zbiorcza region_from_postcode - każdy unikalny kod liczony raz"""
+    memo: Dict[object, Optional[str]] = {}
+    result = []
+    for postcode in postcodes:
+        region = memo.get(postcode, memo)
+        if region is memo:
+            region = memo[postcode] = region_from_postcode(postcode)
+        result.append(region)
+    return result
+
+
+def normalize_regions(names: Iterable) -> List[Optional[str]]:
+    """Wersja zbiorcza normalize_region"""
+    return [normalize_region(name) for name in names]
+
+
+def resolve_region(state, postcode) -> Optional[str]:
+    """Województwo z nazwy, a gdy jej brak lub jest nieznana - z kodu pocztowego"""
+    return normalize_region(state) or region_from_postcode(postcode)
+
+
+def resolve_regions(states: Iterable, postcodes: Iterable) -> List[Optional[str]]:
+    """Wersja zbiorcza resolve_region (pary stan/kod z tych samych wierszy)"""
+    memo: Dict[tuple, Optional[str]] = {}
+    result = []
+    for pair in zip(states, postcodes):
+        region = memo.get(pair, memo)
+        if region is memo:
+            region = memo[pair] = resolve_region(*pair)
+        result.append(region)
+    return result
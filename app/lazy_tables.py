@@ -0,0 +1,203 @@
+# lazy_tables.py
+"""
+Tabele tworzone przy pierwszym użyciu
+=====================================
+
+Projekt nie ma systemu migracji, więc tabele dodawane obok istniejących
+modeli (projekcje, liczniki, dzienniki, kolejki) są zakładane przez kod,
+który z nich korzysta - CREATE TABLE z checkfirst raz na proces.
+
+    _TABLES = LazyTables(BackgroundJob, BackgroundJobEvent)
+
+    def list_jobs():
+        _TABLES.ensure()
+        ...
+
+Tabele pochodne (projekcje, liczniki liczone z innych tabel) muszą być
+zbudowane z istniejących danych, zanim śledzenie zmian zacznie dopisywać
+do nich różnice - DerivedTables trzyma znacznik budowy w tabeli
+derived_table_builds, a budowę wykonuje jeden proces (lease warunkowym
+UPDATE, jak w schedulerze):
+
+    _TABLES = DerivedTables('production_queue', ProductionQueueItem, build=rebuild_projection)
+
+    _TABLES.ensure_built()   # odczyt lub zapis - raz na proces
+    _TABLES.rebuild()        # flask rebuild-... - pełna przebudowa
+"""
+
+import os
+import socket
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, List
+
+from sqlalchemy import insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+
+# Lease budowy - po tym czasie przejmuje ją inny proces (poprzedni zginął)
+LEASE_SECONDS = 600
+# Jak długo proces czeka na budowę trwającą w innym procesie
+WAIT_SECONDS = 120
+POLL_SECONDS = 0.5
+
+# Wszystkie zestawy tabel procesu (reset() w testach - każdy test ma nową bazę)
+_REGISTRY: List['LazyTables'] = []
+
+
+class LazyTables:
+    """
+    Zestaw tabel zakładanych przy pierwszym ensure() w procesie
+
+    Args:
+        models: Klasy modeli (lub obiekty Table) w kolejności tworzenia
+    """
+
+    def __init__(self, *models):
+        self.tables = tuple(getattr(model, '__table__', model) for model in models)
+        self._checked = False
+        self._lock = threading.Lock()
+        _REGISTRY.append(self)
+
+    def ensure(self):
+        """Tworzy brakujące tabele (raz na proces, kolejne wywołania bez zapytań)"""
+        if self._checked:
+            return
+        with self._lock:
+            if not self._checked:
+                for table in self.tables:
+                    table.create(bind=db.engine, checkfirst=True)
+                self._checked = True
+
+    def reset(self):
+        """Ponowne sprawdzenie tabel przy następnym ensure()"""
+        self._checked = False
+
+
+def reset_all():
+    """Reset wszystkich zestawów tabel procesu (testy, zmiana bazy)"""
+    for tables in _REGISTRY:
+        tables.reset()
+
+
+class DerivedTableBuild(db.Model):
+    """Znacznik budowy tabel pochodnych (built_at NULL - jeszcze niezbudowane)"""
+    __tablename__ = 'derived_table_builds'
+
+    name = db.Column(db.String(64), primary_key=True)
+    built_at = db.Column(db.DateTime, nullable=True)
+    lease_owner = db.Column(db.String(100), nullable=True)
+    lease_expires_at = db.Column(db.DateTime, nullable=True)
+
+
+_BUILDS = LazyTables(DerivedTableBuild)
+
+
+class DerivedTables(LazyTables):
+    """
+    Tabele pochodne budowane z danych źródłowych raz (znacznik w bazie)
+
+    Args:
+        name: Nazwa znacznika w derived_table_builds
+        models: Klasy modeli tabel pochodnych
+        build: build(conn) - pełna budowa w transakcji `conn` (wynik zwraca rebuild())
+    """
+
+    def __init__(self, name: str, *models, build: Callable[[Any], Any]):
+        super().__init__(*models)
+        self.name = name
+        self.build = build
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+        self._built = False
+
+    def ensure_built(self):
+        """
+        Buduje tabele, jeśli znacznik nie jest ustawiony (raz na proces)
+
+        Budowę trwającą w innym procesie przeczekuje (do WAIT_SECONDS) -
+        zapis różnic przed jej końcem zostałby nadpisany.
+        """
+        if self._built:
+            return
+        self.ensure()
+        deadline = time.monotonic() + WAIT_SECONDS
+        while not self._built:
+            if self._is_built():
+                self._built = True
+                return
+            if self._build_with_lease(force=False)[0]:
+                return
+            if time.monotonic() > deadline:
+                print(f"[LazyTables] {self.name}: budowa w innym procesie trwa ponad "
+                      f"{WAIT_SECONDS} s - kontynuuję bez czekania", file=sys.stderr)
+                return
+            time.sleep(POLL_SECONDS)
+
+    def rebuild(self) -> Any:
+        """Pełna przebudowa niezależnie od znacznika (czeka na budowę w innym procesie)"""
+        self.ensure()
+        deadline = time.monotonic() + WAIT_SECONDS
+        while True:
+            taken, result = self._build_with_lease(force=True)
+            if taken:
+                return result
+            if time.monotonic() > deadline:
+                raise RuntimeError(f"Tabele {self.name} przebudowuje inny proces")
+            time.sleep(POLL_SECONDS)
+
+    def reset(self):
+        super().reset()
+        self._built = False
+
+    def _is_built(self) -> bool:
+        _BUILDS.ensure()
+        builds = DerivedTableBuild.__table__
+        with db.engine.connect() as conn:
+            return conn.execute(
+                select(builds.c.built_at).where(builds.c.name == self.name, builds.c.built_at.isnot(None))
+            ).first() is not None
+
+    def _build_with_lease(self, force: bool):
+        """(czy ten proces budował, wynik build) - lease zajęty przez inny proces -> (False, None)"""
+        _BUILDS.ensure()
+        builds = DerivedTableBuild.__table__
+        try:
+            with db.engine.begin() as conn:
+                if conn.execute(select(builds.c.name).where(builds.c.name == self.name)).first() is None:
+                    conn.execute(insert(builds).values(name=self.name))
+        except IntegrityError:
+            pass  # Znacznik dodał równolegle inny proces
+
+        now = datetime.utcnow()
+        condition = [
+            builds.c.name == self.name,
+            or_(builds.c.lease_owner.is_(None), builds.c.lease_expires_at.is_(None),
+                builds.c.lease_expires_at <= now),
+        ]
+        if not force:
+            condition.append(builds.c.built_at.is_(None))
+        with db.engine.begin() as conn:
+            taken = conn.execute(update(builds).where(*condition).values(
+                lease_owner=self.owner,
+                lease_expires_at=now + timedelta(seconds=LEASE_SECONDS)
+            )).rowcount
+        if not taken:
+            return False, None
+
+        try:
+            with db.engine.begin() as conn:
+                result = self.build(conn)
+                conn.execute(update(builds).where(builds.c.name == self.name).values(
+                    built_at=datetime.utcnow(), lease_owner=None, lease_expires_at=None
+                ))
+        except Exception:
+            with db.engine.begin() as conn:
+                conn.execute(update(builds)
+                             .where(builds.c.name == self.name, builds.c.lease_owner == self.owner)
+                             .values(lease_owner=None, lease_expires_at=None))
+            raise
+        self._built = True
+        return True, result
@@ -99,4 +99,133 @@ class BaselinkerConfig(db.Model):
         if include_permissions:
             data['allowed_roles'] = self.allowed_roles
             
-        return data
\ No newline at end of file
+        return data
+
+class BaselinkerOrderMirror(db.Model):
+    """
+    Lokalna kopia zamówienia Baselinker (read-model dla widoków wycen/zamówień)
+
+    Odświeżana przez synchronizacje (production, reports) oraz na żądanie;
+    synced_at / documents_synced_at określają świeżość danych.
+    """
+    __tablename__ = 'baselinker_order_mirror'
+
+    baselinker_order_id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    order_status_id = db.Column(db.Integer, index=True)
+    order_source = db.Column(db.String(50))
+    order_source_id = db.Column(db.Integer)
+    order_page = db.Column(db.String(500))
+
+    currency = db.Column(db.String(10))
+    payment_method = db.Column(db.String(100))
+    payment_done = db.Column(db.Numeric(12, 2))
+
+    delivery_method = db.Column(db.String(255))
+    delivery_price = db.Column(db.Numeric(12, 2))
+    delivery_fullname = db.Column(db.String(255))
+    delivery_company = db.Column(db.String(255))
+    delivery_address = db.Column(db.String(255))
+    delivery_postcode = db.Column(db.String(20))
+    delivery_city = db.Column(db.String(100))
+    email = db.Column(db.String(255))
+    phone = db.Column(db.String(50))
+
+    user_comments = db.Column(db.Text)
+    admin_comments = db.Column(db.Text)
+    extra_field_1 = db.Column(db.String(255))
+    extra_field_2 = db.Column(db.String(255))
+    custom_extra_fields = db.Column(db.JSON)
+
+    date_add = db.Column(db.DateTime)
+    date_confirmed = db.Column(db.DateTime)
+    date_in_status = db.Column(db.DateTime)
+
+    synced_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
+    documents_synced_at = db.Column(db.DateTime)
+
+    def to_dict(self):
+        return {
+            'order_id': self.baselinker_order_id,
+            'order_status_id': self.order_status_id,
+            'order_source': self.order_source,
+            'order_source_id': self.order_source_id,
+            'order_page': self.order_page,
+            'currency': self.currency,
+            'payment_method': self.payment_method,
+            'payment_done': float(self.payment_done) if self.payment_done is not None else 0,
+            'delivery_method': self.delivery_method,
+            'delivery_price': float(self.delivery_price) if self.delivery_price is not None else 0,
+            'delivery_fullname': self.delivery_fullname,
+            'delivery_company': self.delivery_company,
+            'delivery_address': self.delivery_address,
+            'delivery_postcode': self.delivery_postcode,
+            'delivery_city': self.delivery_city,
+            'email': self.email,
+            'phone': self.phone,
+            'user_comments': self.user_comments,
+            'admin_comments': self.admin_comments,
+            'extra_field_1': self.extra_field_1,
+            'extra_field_2': self.extra_field_2,
+            'custom_extra_fields': self.custom_extra_fields or {},
+            'date_add': self.date_add.isoformat() if self.date_add else None,
+            'date_confirmed': self.date_confirmed.isoformat() if self.date_confirmed else None,
+            'date_in_status': self.date_in_status.isoformat() if self.date_in_status else None,
+            'synced_at': self.synced_at.isoformat() if self.synced_at else None,
+            'documents_synced_at': self.documents_synced_at.isoformat() if self.documents_synced_at else None
+        }
+
+
+class BaselinkerOrderMirrorProduct(db.Model):
+    """Pozycja zamówienia w lokalnej kopii (zastępowana w całości przy odświeżeniu)"""
+    __tablename__ = 'baselinker_order_mirror_products'
+
+    id = db.Column(db.Integer, primary_key=True)
+    baselinker_order_id = db.Column(db.BigInteger, nullable=False, index=True)
+    order_product_id = db.Column(db.BigInteger)
+    product_id = db.Column(db.String(50))
+    name = db.Column(db.String(500))
+    sku = db.Column(db.String(100))
+    ean = db.Column(db.String(50))
+    attributes = db.Column(db.String(500))
+    quantity = db.Column(db.Integer)
+    price_brutto = db.Column(db.Numeric(12, 2))
+    tax_rate = db.Column(db.Numeric(5, 2))
+    weight = db.Column(db.Numeric(10, 3))
+
+    def to_dict(self):
+        return {
+            'order_product_id': self.order_product_id,
+            'product_id': self.product_id,
+            'name': self.name,
+            'sku': self.sku,
+            'ean': self.ean,
+            'attributes': self.attributes,
+            'quantity': self.quantity,
+            'price_brutto': float(self.price_brutto) if self.price_brutto is not None else 0,
+            'tax_rate': float(self.tax_rate) if self.tax_rate is not None else None,
+            'weight': float(self.weight) if self.weight is not None else None
+        }
+
+
+class BaselinkerOrderMirrorDocument(db.Model):
+    """Dokument sprzedaży zamówienia (getInvoices) - bez pliku PDF (cache pliku w Quote)"""
+    __tablename__ = 'baselinker_order_mirror_documents'
+
+    id = db.Column(db.Integer, primary_key=True)
+    baselinker_order_id = db.Column(db.BigInteger, nullable=False, index=True)
+    invoice_id = db.Column(db.BigInteger, nullable=False)
+    document_type = db.Column(db.String(30))
+    number = db.Column(db.String(100))
+    date_add = db.Column(db.DateTime)
+    total_price_brutto = db.Column(db.Numeric(12, 2))
+    currency = db.Column(db.String(10))
+
+    def to_dict(self):
+        return {
+            'invoice_id': self.invoice_id,
+            'type': self.document_type,
+            'number': self.number,
+            'date_add': self.date_add.isoformat() if self.date_add else None,
+            'total_price_brutto': float(self.total_price_brutto) if self.total_price_brutto is not None else None,
+            'currency': self.currency
+        }
@@ -0,0 +1,383 @@
+# app/modules/baselinker/order_mirror.py
+"""
+Lokalna kopia zamówień Baselinker
+=================================
+
+Widoki wycen i zamówień (status zamówienia, dokumenty sprzedaży) czytają
+zamówienie z tabel baselinker_order_mirror* zamiast wołać getOrders/getInvoices
+przy każdym otwarciu panelu. API Baselinker jest odpytywane tylko, gdy kopia
+jest starsza niż BASELINKER_MIRROR_MAX_AGE (sekundy, domyślnie 15 min) albo
+użytkownik wymusi odświeżenie.
+
+Kopia jest zasilana przez:
+- synchronizacje, które i tak pobierają zamówienia (production CRON, reports),
+  przez mirror_orders() - błędy zapisu kopii nie przerywają synchronizacji,
+- odświeżenie na żądanie: get_order_snapshot(..., force_refresh=True).
+
+Zapisy idą osobnym połączeniem (engine.begin()), niezależnie od transakcji
+sesji wywołującego.
+"""
+
+import sys
+from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from typing import Any, Dict, List, Optional
+
+from flask import current_app
+from sqlalchemy import bindparam, delete, insert, select, update
+
+from extensions import db
+from lazy_tables import LazyTables
+from modules.logging import get_structured_logger
+from .models import (
+    BaselinkerConfig,
+    BaselinkerOrderMirror,
+    BaselinkerOrderMirrorDocument,
+    BaselinkerOrderMirrorProduct,
+)
+
+logger = get_structured_logger('baselinker.order_mirror')
+
+DEFAULT_MIRROR_MAX_AGE_SECONDS = 15 * 60
+
+# Nazwy statusów używane w widokach (fallback: BaselinkerConfig, potem "Status <id>")
+DEFAULT_STATUS_NAMES = {
+    105112: 'Nowe - nieopłacone',
+    155824: 'Nowe - opłacone',
+    138619: 'W produkcji - surowe',
+    148832: 'W produkcji - olejowanie',
+    148831: 'W produkcji - bejcowanie',
+    148830: 'W produkcji - lakierowanie',
+    138620: 'Produkcja zakończona',
+    138623: 'Zamówienie spakowane',
+    105113: 'Paczka zgłoszona do wysyłki',
+    105114: 'Wysłane - kurier',
+    149763: 'Wysłane - transport WoodPower',
+    149777: 'Czeka na odbiór osobisty',
+    138624: 'Dostarczona - kurier',
+    149778: 'Dostarczona - transport WoodPower',
+    149779: 'Odebrane',
+    138625: 'Zamówienie anulowane'
+}
+
+_MIRROR_TABLES = (BaselinkerOrderMirror, BaselinkerOrderMirrorProduct, BaselinkerOrderMirrorDocument)
+_TABLES = LazyTables(*_MIRROR_TABLES)
+
+
+def get_mirror_max_age() -> int:
+    try:
+        return int(current_app.config.get('BASELINKER_MIRROR_MAX_AGE', DEFAULT_MIRROR_MAX_AGE_SECONDS))
+    except (RuntimeError, TypeError, ValueError):
+        return DEFAULT_MIRROR_MAX_AGE_SECONDS
+
+
+# ============================================================================
+# NORMALIZACJA DANYCH Z API
+# ============================================================================
+
+def _to_int(value) -> Optional[int]:
+    try:
+        return int(value) if value not in (None, '') else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_decimal(value) -> Optional[Decimal]:
+    if value in (None, ''):
+        return None
+    try:
+        return Decimal(str(value))
+    except (InvalidOperation, ValueError):
+        return None
+
+
+def _to_datetime(timestamp) -> Optional[datetime]:
+    """Unix timestamp z API -> datetime lokalny (jak w module reports)"""
+    value = _to_int(timestamp)
+    if not value:
+        return None
+    return datetime.fromtimestamp(value)
+
+
+def _text(value, max_length: int) -> Optional[str]:
+    if value is None:
+        return None
+    return str(value).strip()[:max_length]
+
+
+def _order_row(order: Dict[str, Any]) -> Dict[str, Any]:
+    row = {
+        'baselinker_order_id': int(order['order_id']),
+        'order_status_id': _to_int(order.get('order_status_id')),
+        'order_source': _text(order.get('order_source'), 50),
+        'order_source_id': _to_int(order.get('order_source_id')),
+        'order_page': _text(order.get('order_page'), 500),
+        'currency': _text(order.get('currency'), 10),
+        'payment_method': _text(order.get('payment_method'), 100),
+        'payment_done': _to_decimal(order.get('payment_done')),
+        'delivery_method': _text(order.get('delivery_method'), 255),
+        'delivery_price': _to_decimal(order.get('delivery_price')),
+        'delivery_fullname': _text(order.get('delivery_fullname'), 255),
+        'delivery_company': _text(order.get('delivery_company'), 255),
+        'delivery_address': _text(order.get('delivery_address'), 255),
+        'delivery_postcode': _text(order.get('delivery_postcode'), 20),
+        'delivery_city': _text(order.get('delivery_city'), 100),
+        'email': _text(order.get('email'), 255),
+        'phone': _text(order.get('phone'), 50),
+        'user_comments': order.get('user_comments'),
+        'admin_comments': order.get('admin_comments'),
+        'extra_field_1': _text(order.get('extra_field_1'), 255),
+        'extra_field_2': _text(order.get('extra_field_2'), 255),
+        'date_add': _to_datetime(order.get('date_add')),
+        'date_confirmed': _to_datetime(order.get('date_confirmed')),
+        'date_in_status': _to_datetime(order.get('date_in_status')),
+    }
+    # getOrders bez include_custom_extra_fields nie zwraca klucza - zapisane pola zostają
+    # (NULL w kopii = pola nieznane, pusta lista z API = brak pól)
+    if 'custom_extra_fields' in order:
+        custom_fields = order['custom_extra_fields']
+        row['custom_extra_fields'] = custom_fields if isinstance(custom_fields, dict) else {}
+    return row
+
+
+def _product_rows(order_id: int, products: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return [{
+        'baselinker_order_id': order_id,
+        'order_product_id': _to_int(product.get('order_product_id')),
+        'product_id': _text(product.get('product_id'), 50),
+        'name': _text(product.get('name'), 500),
+        'sku': _text(product.get('sku'), 100),
+        'ean': _text(product.get('ean'), 50),
+        'attributes': _text(product.get('attributes'), 500),
+        'quantity': _to_int(product.get('quantity')),
+        'price_brutto': _to_decimal(product.get('price_brutto')),
+        'tax_rate': _to_decimal(product.get('tax_rate')),
+        'weight': _to_decimal(product.get('weight')),
+    } for product in products or [] if isinstance(product, dict)]
+
+
+def _document_rows(order_id: int, invoices: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    rows = []
+    for invoice in invoices or []:
+        invoice_id = _to_int(invoice.get('invoice_id'))
+        if invoice_id is None:
+            continue
+        rows.append({
+            'baselinker_order_id': order_id,
+            'invoice_id': invoice_id,
+            'document_type': _text(invoice.get('type'), 30),
+            'number': _text(invoice.get('invoice_number') or invoice.get('number'), 100),
+            'date_add': _to_datetime(invoice.get('date_add')),
+            'total_price_brutto': _to_decimal(invoice.get('total_price_brutto')),
+            'currency': _text(invoice.get('currency'), 10),
+        })
+    return rows
+
+
+# ============================================================================
+# ZAPIS KOPII
+# ============================================================================
+
+def mirror_orders(orders: List[Dict[str, Any]], include_products: bool = True) -> int:
+    """
+    Zapisuje/aktualizuje zamówienia z odpowiedzi getOrders
+
+    Args:
+        include_products: False, gdy produkty w słownikach zostały już
+            zmienione przez wywołującego (np. przeliczone ceny w reports)
+
+    Returns:
+        Liczba zapisanych zamówień (0 przy błędzie - błąd jest tylko logowany)
+    """
+    rows_by_id = {}
+    products_by_id = {}
+    for order in orders or []:
+        if not isinstance(order, dict) or _to_int(order.get('order_id')) is None:
+            continue
+        row = _order_row(order)
+        rows_by_id[row['baselinker_order_id']] = row
+        if include_products and 'products' in order:
+            products_by_id[row['baselinker_order_id']] = _product_rows(row['baselinker_order_id'],
+                                                                       order.get('products'))
+    if not rows_by_id:
+        return 0
+
+    try:
+        _TABLES.ensure()
+        table = BaselinkerOrderMirror.__table__
+        products_table = BaselinkerOrderMirrorProduct.__table__
+        now = datetime.utcnow()
+        order_ids = list(rows_by_id)
+
+        with db.engine.begin() as conn:
+            existing = set(conn.execute(
+                select(table.c.baselinker_order_id).where(table.c.baselinker_order_id.in_(order_ids))
+            ).scalars())
+
+            inserts = [dict({'custom_extra_fields': None}, **row, synced_at=now)
+                       for order_id, row in rows_by_id.items() if order_id not in existing]
+            if inserts:
+                conn.execute(insert(table), inserts)
+
+            # Jedno UPDATE na zestaw kolumn (zamówienia z custom_extra_fields i bez)
+            updates_by_columns = {}
+            for order_id, row in rows_by_id.items():
+                if order_id in existing:
+                    columns = tuple(key for key in row if key != 'baselinker_order_id')
+                    updates_by_columns.setdefault(columns, []).append(
+                        dict({f'v_{key}': value for key, value in row.items()}, v_synced_at=now)
+                    )
+            for columns, updates in updates_by_columns.items():
+                conn.execute(
+                    update(table)
+                    .where(table.c.baselinker_order_id == bindparam('v_baselinker_order_id'))
+                    .values({column: bindparam(f'v_{column}') for column in columns + ('synced_at',)}),
+                    updates
+                )
+
+            if products_by_id:
+                conn.execute(delete(products_table)
+                             .where(products_table.c.baselinker_order_id.in_(list(products_by_id))))
+                product_rows = [row for rows in products_by_id.values() for row in rows]
+                if product_rows:
+                    conn.execute(insert(products_table), product_rows)
+
+        return len(rows_by_id)
+
+    except Exception as e:
+        logger.error("Błąd zapisu kopii zamówień Baselinker", orders_count=len(rows_by_id), error=str(e))
+        print(f"[OrderMirror] Błąd zapisu kopii zamówień: {e}", file=sys.stderr)
+        return 0
+
+
+def mirror_documents(order_id: int, invoices: List[Dict[str, Any]]):
+    """Zastępuje listę dokumentów zamówienia (odpowiedź getInvoices)"""
+    _TABLES.ensure()
+    documents_table = BaselinkerOrderMirrorDocument.__table__
+    table = BaselinkerOrderMirror.__table__
+    rows = _document_rows(int(order_id), invoices)
+
+    with db.engine.begin() as conn:
+        conn.execute(delete(documents_table).where(documents_table.c.baselinker_order_id == int(order_id)))
+        if rows:
+            conn.execute(insert(documents_table), rows)
+        conn.execute(update(table).where(table.c.baselinker_order_id == int(order_id))
+                     .values(documents_synced_at=datetime.utcnow()))
+
+
+# ============================================================================
+# ODCZYT
+# ============================================================================
+
+def resolve_status_name(status_id: Optional[int], config_names: Optional[Dict[int, str]] = None) -> str:
+    if status_id in DEFAULT_STATUS_NAMES:
+        return DEFAULT_STATUS_NAMES[status_id]
+    if config_names is None and status_id is not None:
+        config = BaselinkerConfig.query.filter_by(config_type='order_status', baselinker_id=status_id).first()
+        config_names = {status_id: config.name} if config else {}
+    if config_names and status_id in config_names:
+        return config_names[status_id]
+    return f'Status {status_id}'
+
+
+def _is_fresh(synced_at: Optional[datetime], max_age_seconds: int) -> bool:
+    return bool(synced_at) and datetime.utcnow() - synced_at <= timedelta(seconds=max_age_seconds)
+
+
+def _load_order(order_id: int) -> Optional[BaselinkerOrderMirror]:
+    return (BaselinkerOrderMirror.query
+            .filter_by(baselinker_order_id=int(order_id))
+            .execution_options(populate_existing=True)
+            .first())
+
+
+def _serialize(order: BaselinkerOrderMirror, include_documents: bool) -> Dict[str, Any]:
+    data = order.to_dict()
+    data['status_name'] = resolve_status_name(order.order_status_id)
+    data['products'] = [product.to_dict() for product in
+                        BaselinkerOrderMirrorProduct.query
+                        .filter_by(baselinker_order_id=order.baselinker_order_id)
+                        .order_by(BaselinkerOrderMirrorProduct.id).all()]
+    if include_documents:
+        data['documents'] = [document.to_dict() for document in
+                             BaselinkerOrderMirrorDocument.query
+                             .filter_by(baselinker_order_id=order.baselinker_order_id)
+                             .order_by(BaselinkerOrderMirrorDocument.id).all()]
+    return data
+
+
+def refresh_order(order_id: int, include_documents: bool = False, service=None) -> bool:
+    """
+    Pobiera zamówienie (i opcjonalnie dokumenty) z API i zapisuje w kopii
+
+    Returns:
+        False, gdy Baselinker nie zwrócił zamówienia
+    Raises:
+        Exception przy błędzie API/połączenia
+    """
+    if service is None:
+        from .service import BaselinkerService
+        service = BaselinkerService()
+
+    response = service._make_request('getOrders', {
+        'order_id': int(order_id),
+        'include_custom_extra_fields': True,
+        'get_unconfirmed_orders': True
+    })
+    if response.get('status') != 'SUCCESS':
+        raise RuntimeError(response.get('error_message') or 'Błąd API getOrders')
+
+    orders = response.get('orders', [])
+    if not orders:
+        return False
+
+    _TABLES.ensure()
+    if not mirror_orders(orders):
+        raise RuntimeError('Nie udało się zapisać kopii zamówienia')
+
+    if include_documents:
+        invoices_response = service._make_request('getInvoices', {'order_id': int(order_id)})
+        if invoices_response.get('status') != 'SUCCESS':
+            raise RuntimeError(invoices_response.get('error_message') or 'Błąd API getInvoices')
+        mirror_documents(order_id, invoices_response.get('invoices', []))
+
+    return True
+
+
+def get_order_snapshot(order_id: int, include_documents: bool = False, force_refresh: bool = False,
+                       max_age_seconds: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Zamówienie z lokalnej kopii; odświeżane z API, gdy kopia jest nieaktualna
+
+    Returns:
+        {'success', 'order', 'source': 'mirror'|'api', 'stale', 'error'}
+        Przy niedostępnym API zwracana jest ostatnia kopia ze stale=True.
+    """
+    _TABLES.ensure()
+    max_age = get_mirror_max_age() if max_age_seconds is None else max_age_seconds
+    order = _load_order(order_id)
+
+    if order is not None and not force_refresh:
+        # Kopia zapisana bez pól dodatkowych (getOrders bez include_custom_extra_fields) - do odświeżenia
+        fresh = _is_fresh(order.synced_at, max_age) and order.custom_extra_fields is not None
+        if include_documents:
+            fresh = fresh and _is_fresh(order.documents_synced_at, max_age)
+        if fresh:
+            return {'success': True, 'order': _serialize(order, include_documents),
+                    'source': 'mirror', 'stale': False}
+
+    try:
+        found = refresh_order(order_id, include_documents=include_documents)
+    except Exception as e:
+        logger.warning("Nie udało się odświeżyć kopii zamówienia", order_id=order_id, error=str(e))
+        if order is not None:
+            return {'success': True, 'order': _serialize(order, include_documents),
+                    'source': 'mirror', 'stale': True, 'error': str(e)}
+        return {'success': False, 'order': None, 'error': str(e)}
+
+    if not found:
+        return {'success': False, 'order': None, 'error': 'Zamówienie nie znalezione', 'not_found': True}
+
+    order = _load_order(order_id)
+    return {'success': True, 'order': _serialize(order, include_documents),
+            'source': 'api', 'stale': False}
@@ -3,6 +3,7 @@ from flask import render_template, jsonify, request, session, redirect, url_for,
 from . import baselinker_bp
 from .service import BaselinkerService
 from .models import BaselinkerOrderLog, BaselinkerConfig
+from .order_mirror import get_order_snapshot
 from modules.calculator.models import Quote, User, QuoteItemDetails
 from modules.clients.models import Client
 from extensions import db
@@ -262,55 +263,34 @@ def get_order_status(order_id):
                           endpoint='get_order_status')
     
     try:
-        service = BaselinkerService()
-        baselinker_logger.debug("Utworzono instancję BaselinkerService")
-        
-        result = service.get_order_details(order_id)
-        baselinker_logger.debug("Otrzymano wynik z get_order_details",
+        # Lokalna kopia zamówienia; API tylko gdy kopia nieaktualna lub ?refresh=1
+        force_refresh = request.args.get('refresh', '').lower() in ('1', 'true')
+        result = get_order_snapshot(order_id, force_refresh=force_refresh)
+        baselinker_logger.debug("Otrzymano zamówienie z kopii lokalnej",
                                order_id=order_id,
                                result_success=result.get('success'),
-                               has_order_data=bool(result.get('order')))
+                               source=result.get('source'),
+                               stale=result.get('stale'))
         
         if result['success']:
             order_data = result.get('order', {})
-            baselinker_logger.debug("Szczegóły zamówienia z API",
-                                   order_id=order_id,
-                                   baselinker_order_id=order_data.get('order_id'),
-                                   status_id=order_data.get('order_status_id'))
-            
-            # Mapuj ID statusu na nazwę (można rozszerzyć)
-            status_map = {
-                105112: 'Nowe - nieopłacone',
-                155824: 'Nowe - opłacone',
-                138619: 'W produkcji - surowe',
-                148832: 'W produkcji - olejowanie',
-                148831: 'W produkcji - bejcowanie',
-                148830: 'W produkcji - lakierowanie',
-                138620: 'Produkcja zakończona',
-                138623: 'Zamówienie spakowane',
-                105113: 'Paczka zgłoszona do wysyłki',
-                105114: 'Wysłane - kurier',
-                149763: 'Wysłane - transport WoodPower',
-                149777: 'Czeka na odbiór osobisty',
-                138624: 'Dostarczona - kurier',
-                149778: 'Dostarczona - transport WoodPower',
-                149779: 'Odebrane',
-                138625: 'Zamówienie anulowane'
-            }
-            
             order_status_id = order_data.get('order_status_id')
-            status_name = status_map.get(order_status_id, f'Status {order_status_id}')
+            status_name = order_data.get('status_name')
             
             baselinker_logger.info("Pomyślnie zmapowano status zamówienia",
                                   order_id=order_id,
                                   baselinker_order_id=order_data.get('order_id'),
                                   status_id=order_status_id,
-                                  status_name=status_name)
+                                  status_name=status_name,
+                                  source=result.get('source'))
             
             response_data = {
                 'success': True,
                 'status_id': order_status_id,
-                'status_name': status_name
+                'status_name': status_name,
+                'source': result.get('source'),
+                'stale': result.get('stale', False),
+                'synced_at': order_data.get('synced_at')
             }
             
             return jsonify(response_data)
@@ -713,7 +693,8 @@ def get_sales_documents(order_id):
         
         # Wywołaj service do pobrania dokumentów
         service = BaselinkerService()
-        result = service.get_sales_documents(order_id, quote.id)
+        force_refresh = request.args.get('refresh', '').lower() in ('1', 'true')
+        result = service.get_sales_documents(order_id, quote.id, force_refresh=force_refresh)
         
         baselinker_logger.debug("Otrzymano wynik z service",
                                order_id=order_id,
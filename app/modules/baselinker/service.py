@@ -1014,13 +1014,17 @@ class BaselinkerService:
 # sprawdzaj dokumenty sprzedaży - faktura, korekta, e-paragon - modal szczegółów wyceny
 # ============================================
 
-    def get_sales_documents(self, order_id: int, quote_id: int) -> Dict:
+    def get_sales_documents(self, order_id: int, quote_id: int, force_refresh: bool = False) -> Dict:
         """
         Pobiera wszystkie dokumenty sprzedaży dla zamówienia (faktura, korekta, e-paragon)
     
+        Zamówienie i lista dokumentów pochodzą z lokalnej kopii (order_mirror);
+        API wołane jest tylko przy nieaktualnej kopii lub force_refresh.
+    
         Args:
             order_id: ID zamówienia w Baselinker
             quote_id: ID wyceny w CRM
+            force_refresh: Pomiń kopię lokalną i odśwież dane z API
         
         Returns:
             Dict z danymi dokumentów lub błędem
@@ -1051,36 +1055,34 @@ class BaselinkerService:
             }
         
             # ============================================
-            # OPTYMALIZACJA: Pobierz zamówienie RAZ z custom_extra_fields
+            # Zamówienie (z custom_extra_fields) i lista dokumentów z kopii lokalnej
             # ============================================
-            self.logger.info("Pobieranie szczegółów zamówienia z custom_extra_fields", 
-                            order_id=order_id)
+            from .order_mirror import get_order_snapshot
         
-            order_response = self._make_request('getOrders', {
-                'order_id': order_id,
-                'include_custom_extra_fields': True  # ✅ Pobierz wszystko naraz
-            })
+            snapshot = get_order_snapshot(order_id, include_documents=True, force_refresh=force_refresh)
         
-            if order_response.get('status') != 'SUCCESS':
+            if not snapshot.get('success'):
+                if snapshot.get('not_found'):
+                    self.logger.error("Zamówienie nie znalezione", order_id=order_id)
+                    return {
+                        'status': 'error',
+                        'error': 'Zamówienie nie znalezione',
+                        'code': 'ORDER_NOT_FOUND'
+                    }
                 self.logger.error("Nie udało się pobrać szczegółów zamówienia",
                                 order_id=order_id,
-                                error=order_response.get('error_message'))
+                                error=snapshot.get('error'))
                 return {
                     'status': 'error',
                     'error': 'Nie udało się pobrać szczegółów zamówienia',
                     'code': 'ORDER_FETCH_FAILED'
                 }
         
-            orders = order_response.get('orders', [])
-            if not orders:
-                self.logger.error("Zamówienie nie znalezione", order_id=order_id)
-                return {
-                    'status': 'error',
-                    'error': 'Zamówienie nie znalezione',
-                    'code': 'ORDER_NOT_FOUND'
-                }
-        
-            order_data = orders[0]
+            order_data = snapshot['order']
+            invoices = order_data.get('documents', [])
+            result['source'] = snapshot.get('source')
+            result['stale'] = snapshot.get('stale', False)
+            result['synced_at'] = order_data.get('documents_synced_at')
         
             self.logger.debug("Pobrano szczegóły zamówienia",
                              order_id=order_id,
@@ -1111,13 +1113,13 @@ class BaselinkerService:
                 }
             else:
                 # Pobierz fakturę z API
-                invoice_data = self._fetch_invoice(order_id, quote)
+                invoice_data = self._fetch_invoice(order_id, quote, invoices)
                 result['invoice'] = invoice_data
         
             # ============================================
             # KOREKTA - zawsze sprawdzaj (może się pojawić)
             # ============================================
-            correction_data = self._fetch_correction(order_id, quote)
+            correction_data = self._fetch_correction(order_id, quote, invoices)
             result['correction'] = correction_data
         
             # ============================================
@@ -1151,21 +1153,22 @@ class BaselinkerService:
                 'code': 'GENERAL_ERROR'
             }
     
-    def _fetch_invoice(self, order_id: int, quote) -> Dict:
+    def _fetch_invoice(self, order_id: int, quote, invoices: Optional[List[Dict]] = None) -> Dict:
         """Pobiera fakturę z API Baselinker i zapisuje w cache"""
         self.logger.info("Pobieranie faktury z API", order_id=order_id)
         
         try:
-            # Wywołaj API getInvoices
-            response = self._make_request('getInvoices', {'order_id': order_id})
-            
-            if response.get('status') != 'SUCCESS':
-                self.logger.warning("API getInvoices zwróciło błąd",
-                                  order_id=order_id,
-                                  error=response.get('error_message'))
-                return {'exists': False}
-            
-            invoices = response.get('invoices', [])
+            # Lista dokumentów z kopii lokalnej albo z API getInvoices
+            if invoices is None:
+                response = self._make_request('getInvoices', {'order_id': order_id})
+                
+                if response.get('status') != 'SUCCESS':
+                    self.logger.warning("API getInvoices zwróciło błąd",
+                                      order_id=order_id,
+                                      error=response.get('error_message'))
+                    return {'exists': False}
+                
+                invoices = response.get('invoices', [])
 
             # DEBUG: Wypisz wszystkie faktury
             self.logger.info(f"DEBUG: Znalezione faktury: {invoices}")
@@ -1229,20 +1232,21 @@ class BaselinkerService:
                             error=str(e))
             return {'exists': False, 'error': str(e)}
     
-    def _fetch_correction(self, order_id: int, quote) -> Dict:
+    def _fetch_correction(self, order_id: int, quote, invoices: Optional[List[Dict]] = None) -> Dict:
         """Pobiera korektę faktury z API Baselinker"""
         self.logger.info("Sprawdzanie korekty faktury", order_id=order_id)
         
         try:
-            # Wywołaj API getInvoices
-            response = self._make_request('getInvoices', {'order_id': order_id})
-            
-            if response.get('status') != 'SUCCESS':
-                from datetime import datetime
-                quote.baselinker_correction_last_check = datetime.utcnow()
-                return {'exists': False}
-            
-            invoices = response.get('invoices', [])
+            # Lista dokumentów z kopii lokalnej albo z API getInvoices
+            if invoices is None:
+                response = self._make_request('getInvoices', {'order_id': order_id})
+                
+                if response.get('status') != 'SUCCESS':
+                    from datetime import datetime
+                    quote.baselinker_correction_last_check = datetime.utcnow()
+                    return {'exists': False}
+                
+                invoices = response.get('invoices', [])
             
             # Znajdź korektę (type="correction" lub type="corrective")
             correction = next((inv for inv in invoices 
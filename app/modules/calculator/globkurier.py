@@ -0,0 +1,352 @@
+# modules/calculator/globkurier.py
+"""
+Klient API GlobKurier dla wyceny wysyłki
+========================================
+
+- token z /auth/login trzymany w pamięci procesu do wygaśnięcia (exp z JWT
+  lub TOKEN_TTL_SECONDS); 401 z API -> jednorazowe ponowne logowanie,
+- jedna sesja requests z pulą połączeń (keep-alive zamiast nowego TLS
+  przy każdym zapytaniu),
+- cache wyników /products (TTL) po znormalizowanych parametrach paczki
+  z ochroną przed równoległym pobieraniem tego samego klucza,
+- budżet czasu na całe wywołanie (logowanie + zapytanie + ponowienia),
+  zamiast 3 × 30 s z uśpieniami w wątku żądania.
+"""
+
+import base64
+import json
+import re
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from modules.logging import get_structured_logger
+
+logger = get_structured_logger('calculator.globkurier')
+
+# Domyślny budżet czasu na jedno wywołanie get_shipping_quotes [s]
+DEFAULT_TIMEOUT_BUDGET = 15.0
+# Limit czasu nawiązania połączenia [s]
+CONNECT_TIMEOUT = 3.05
+# Ile ponowień przy błędach tymczasowych (w ramach budżetu)
+MAX_RETRIES = 2
+RETRY_BACKOFF = 0.5
+RETRYABLE_STATUS_CODES = (502, 503, 504)
+
+# Token bez exp w JWT - przyjmowany czas życia; odświeżanie z wyprzedzeniem
+TOKEN_TTL_SECONDS = 3600
+TOKEN_REFRESH_MARGIN = 60
+
+QUOTE_CACHE_TTL_SECONDS = 15 * 60
+QUOTE_CACHE_MAX_ENTRIES = 2048
+
+POOL_MAXSIZE = 10
+
+VAT_RATE = 1.23
+
+_POSTCODE_CHARS = re.compile(r'[^0-9A-Z]')
+
+
+class GlobKurierError(Exception):
+    """Błąd wyceny wysyłki; http_status - kod do zwrócenia klientowi"""
+
+    http_status = 500
+
+    def __init__(self, message, http_status=None, upstream_status=None):
+        super().__init__(message)
+        if http_status is not None:
+            self.http_status = http_status
+        self.upstream_status = upstream_status
+
+
+class GlobKurierUnavailable(GlobKurierError):
+    http_status = 503
+
+
+class GlobKurierTimeout(GlobKurierError):
+    http_status = 504
+
+
+class GlobKurierAuthError(GlobKurierError):
+    http_status = 401
+
+
+def normalize_postcode(postcode: Any, country_id: Any = '1') -> str:
+    """'41100', ' 41-100 ' -> '41-100' (PL); inne kraje - wielkie litery bez separatorów"""
+    raw = _POSTCODE_CHARS.sub('', str(postcode or '').upper())
+    if str(country_id) == '1' and len(raw) == 5 and raw.isdigit():
+        return f"{raw[:2]}-{raw[2:]}"
+    return raw
+
+
+def build_parcel_params(length: float, width: float, height: float, weight: float,
+                        sender_country_id='1', receiver_country_id='1',
+                        sender_postcode='01-001', receiver_postcode='41-100') -> Dict[str, Any]:
+    """
+    Parametry zapytania /products - jednocześnie klucz cache
+
+    Wymiary +5 cm na opakowanie i zaokrąglone do cm, waga do 0.01 kg.
+    """
+    return {
+        "width": int(round(width + 5)),
+        "height": int(round(height + 5)),
+        "length": int(round(length + 5)),
+        "weight": f"{round(weight, 2):.2f}",
+        "quantity": 1,
+        "senderCountryId": str(sender_country_id),
+        "receiverCountryId": str(receiver_country_id),
+        "senderPostCode": normalize_postcode(sender_postcode, sender_country_id),
+        "receiverPostCode": normalize_postcode(receiver_postcode, receiver_country_id),
+    }
+
+
+def _token_expiry(token: str) -> float:
+    """Czas wygaśnięcia tokena (exp z payloadu JWT) albo teraz + TOKEN_TTL_SECONDS"""
+    try:
+        payload = token.split('.')[1]
+        payload += '=' * (-len(payload) % 4)
+        exp = json.loads(base64.urlsafe_b64decode(payload)).get('exp')
+        if exp:
+            return float(exp)
+    except (IndexError, ValueError, TypeError, AttributeError):
+        pass
+    return time.time() + TOKEN_TTL_SECONDS
+
+
+class _Deadline:
+    def __init__(self, budget: float):
+        self.expires = time.monotonic() + budget
+
+    def remaining(self) -> float:
+        return self.expires - time.monotonic()
+
+    def timeout(self) -> Tuple[float, float]:
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise GlobKurierTimeout("Przekroczono limit czasu zapytania do GlobKurier")
+        return min(CONNECT_TIMEOUT, remaining), remaining
+
+
+class QuoteCache:
+    """Cache TTL wyników wyceny z limitem wpisów (LRU) i single-flight per klucz"""
+
+    def __init__(self, ttl_seconds: float = QUOTE_CACHE_TTL_SECONDS, max_entries: int = QUOTE_CACHE_MAX_ENTRIES):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries: 'OrderedDict[tuple, Tuple[float, Any]]' = OrderedDict()
+        self._inflight: Dict[tuple, threading.Event] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _get_locked(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires < time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def get_or_load(self, key: tuple, loader, wait_timeout: float) -> Tuple[Any, bool]:
+        """
+        Wartość z cache albo z loader(); równoległe wywołania dla tego samego
+        klucza czekają na pierwsze zamiast odpytywać API ponownie
+
+        Returns:
+            (wartość, czy_z_cache)
+        """
+        while True:
+            with self._lock:
+                value = self._get_locked(key)
+                if value is not None:
+                    self.hits += 1
+                    return value, True
+                event = self._inflight.get(key)
+                if event is None:
+                    event = threading.Event()
+                    self._inflight[key] = event
+                    self.misses += 1
+                    break
+
+            # Ktoś już pobiera ten klucz - czekaj na jego wynik (lub błąd)
+            if not event.wait(max(0.0, wait_timeout)):
+                raise GlobKurierTimeout("Przekroczono limit czasu oczekiwania na wycenę wysyłki")
+            with self._lock:
+                value = self._get_locked(key)
+            if value is not None:
+                self.hits += 1
+                return value, True
+            # Pobranie się nie udało - spróbuj samodzielnie
+
+        try:
+            value = loader()
+            with self._lock:
+                self._entries[key] = (time.monotonic() + self.ttl_seconds, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+            return value, False
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+            event.set()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits, 'misses': self.misses}
+
+
+class GlobKurierClient:
+    """Klient GlobKurier współdzielony przez wątki procesu"""
+
+    def __init__(self, endpoint: str, login: str, password: str):
+        self.endpoint = endpoint.rstrip('/')
+        self.login = login
+        self.password = password
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=POOL_MAXSIZE, max_retries=0)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.session.headers.update({"accept-language": "en"})
+
+        self._token = None
+        self._token_expires = 0.0
+        self._token_lock = threading.Lock()
+        self.quote_cache = QuoteCache()
+
+    # ------------------------------------------------------------------
+
+    def _request(self, method: str, path: str, name: str, deadline: _Deadline, **kwargs):
+        """Wywołanie z ponowieniami przy błędach tymczasowych - w ramach budżetu czasu"""
+        url = self.endpoint + path
+        for attempt in range(MAX_RETRIES + 1):
+            try:
+                response = self.session.request(method, url, timeout=deadline.timeout(), **kwargs)
+                if response.status_code not in RETRYABLE_STATUS_CODES:
+                    return response
+                logger.warning("GlobKurier - błąd tymczasowy", call=name, status=response.status_code,
+                               attempt=attempt + 1)
+                error = GlobKurierUnavailable("Serwis kurierski chwilowo niedostępny. Spróbuj ponownie za chwilę.",
+                                              upstream_status=response.status_code)
+            except requests.exceptions.Timeout:
+                logger.warning("GlobKurier - timeout", call=name, attempt=attempt + 1)
+                error = GlobKurierTimeout("Serwis kurierski nie odpowiada. Spróbuj ponownie za chwilę.")
+            except requests.exceptions.RequestException as e:
+                logger.warning("GlobKurier - błąd połączenia", call=name, error=str(e), attempt=attempt + 1)
+                error = GlobKurierUnavailable("Błąd połączenia z serwisem kurierskim")
+
+            if attempt < MAX_RETRIES and deadline.remaining() > RETRY_BACKOFF * (attempt + 1) + CONNECT_TIMEOUT:
+                time.sleep(RETRY_BACKOFF * (attempt + 1))
+                continue
+            raise error
+
+    def _get_token(self, deadline: _Deadline, force_refresh: bool = False) -> str:
+        with self._token_lock:
+            if (not force_refresh and self._token and
+                    time.time() < self._token_expires - TOKEN_REFRESH_MARGIN):
+                return self._token
+
+            response = self._request('POST', '/auth/login', 'auth/login', deadline,
+                                     json={"email": self.login, "password": self.password})
+            if response.status_code != 200:
+                raise GlobKurierAuthError("Błąd logowania do serwisu kurierskiego",
+                                          upstream_status=response.status_code)
+
+            token = response.json().get("token")
+            if not token:
+                raise GlobKurierAuthError("Nie otrzymano tokena autoryzacyjnego")
+
+            self._token = token
+            self._token_expires = _token_expiry(token)
+            logger.info("GlobKurier - nowy token", expires_in_s=int(self._token_expires - time.time()))
+            return token
+
+    def invalidate_token(self):
+        with self._token_lock:
+            self._token = None
+            self._token_expires = 0.0
+
+    def _fetch_products(self, params: Dict[str, Any], deadline: _Deadline) -> List[Dict[str, Any]]:
+        token = self._get_token(deadline)
+        response = self._request('GET', '/products', 'products', deadline,
+                                 headers={"x-auth-token": token}, params=params)
+
+        if response.status_code == 401:
+            # Token unieważniony po stronie GlobKurier przed czasem - jedno ponowne logowanie
+            token = self._get_token(deadline, force_refresh=True)
+            response = self._request('GET', '/products', 'products', deadline,
+                                     headers={"x-auth-token": token}, params=params)
+
+        if response.status_code != 200:
+            logger.error("GlobKurier - błąd pobierania wyceny", status=response.status_code,
+                         body=response.text[:500])
+            raise GlobKurierError("Nie udało się pobrać wyceny wysyłki",
+                                  http_status=response.status_code,
+                                  upstream_status=response.status_code)
+
+        quote_data = response.json()
+
+        # Łączymy wszystkie kategorie produktów
+        all_products = []
+        for category in quote_data:
+            items = quote_data[category]
+            if isinstance(items, list):
+                all_products.extend(items)
+            else:
+                all_products.append(items)
+
+        return [
+            {
+                "carrierName": product.get("carrierName", "Nieznany"),
+                "grossPrice": product.get("grossPrice", ""),
+                "netPrice": round(product.get("grossPrice", 0) / VAT_RATE, 2) if product.get("grossPrice") else "",
+                "carrierLogoLink": product.get("carrierLogoLink", "")
+            }
+            for product in all_products
+        ]
+
+    def get_shipping_quotes(self, params: Dict[str, Any],
+                            timeout_budget: float = DEFAULT_TIMEOUT_BUDGET) -> Tuple[List[Dict[str, Any]], bool]:
+        """
+        Opcje wysyłki dla paczki (params z build_parcel_params)
+
+        Returns:
+            (lista opcji, czy_z_cache)
+
+        Raises:
+            GlobKurierError: błąd API / logowania / przekroczony budżet czasu
+        """
+        deadline = _Deadline(timeout_budget)
+        key = tuple(sorted(params.items()))
+        result, cached = self.quote_cache.get_or_load(
+            key, lambda: self._fetch_products(params, deadline), wait_timeout=deadline.remaining())
+        # Kopia listy - wywołujący nie modyfikuje wpisu w cache
+        return [dict(option) for option in result], cached
+
+
+_client = None
+_client_key = None
+_client_lock = threading.Lock()
+
+
+def get_globkurier_client(config: Dict[str, Any]) -> GlobKurierClient:
+    """Singleton klienta dla konfiguracji GLOB_KURIER (nowy przy zmianie danych dostępowych)"""
+    global _client, _client_key
+    key = (config["endpoint"], config["login"], config["password"])
+    with _client_lock:
+        if _client is None or _client_key != key:
+            _client = GlobKurierClient(*key)
+            _client_key = key
+        return _client
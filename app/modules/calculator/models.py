@@ -489,6 +489,17 @@ class FinishingTypePrice(db.Model):
     def __repr__(self):
         return f'<FinishingTypePrice {self.name}: {self.price_netto} PLN/m²>'
 
+class PricingCacheVersion(db.Model):
+    """Wersja cennika - podbijana po zmianie cen, workery przeładowują wtedy migawkę (pricing.py)"""
+    __tablename__ = 'pricing_cache_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<PricingCacheVersion {self.version}>'
+
 class FinishingColor(db.Model):
     __tablename__ = 'finishing_colors'
     id = db.Column(db.Integer, primary_key=True)
@@ -0,0 +1,734 @@
+# modules/calculator/pricing.py
+"""
+Serwerowy silnik wyceny kalkulatora
+===================================
+
+Dotychczas cała wycena liczona była w przeglądarce (calculator.js), a serwer
+zapisywał ceny przysłane w payloadzie. Silnik odtwarza te same reguły po
+stronie serwera:
+
+- cena za m³: pierwszy wiersz cennika (kolejność id - jak .find w JS) dla
+  (gatunek, technologia, klasa), w którego przedziale mieści się
+  ceil(grubość) i długość,
+- cena jednostkowa netto = L × W × ceil(T) / 10⁶ × cena_m³ × mnożnik,
+  brutto = netto × 1.23 (bez zaokrągleń - jak w kalkulatorze),
+- wykończenie: pole wszystkich ścian [m²] × ilość × cena za m²,
+  zaokrąglone do groszy (netto, potem brutto).
+
+Cennik, mnożniki i ceny wykończeń są trzymane w migawce (PricingSnapshot)
+z indeksem przedziałów per (gatunek, technologia, klasa). Zmiana cennika
+podbija wersję w tabeli pricing_cache_version - każdy proces sprawdza ją
+co VERSION_CHECK_SECONDS i przeładowuje migawkę po zmianie. Wycena wielu
+wycen naraz (price_quotes) spłaszcza wszystkie warianty × produkty do jednej
+partii i liczy je jednym przebiegiem NumPy (z fallbackiem na czysty Python,
+gdy NumPy nie jest dostępne).
+
+Benchmark przeliczenia historycznych wycen: flask benchmark-pricing.
+"""
+
+import json
+import math
+import sys
+import threading
+import time
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from lazy_tables import LazyTables
+from modules.logging import get_structured_logger
+from .models import FinishingTypePrice, Multiplier, Price, PricingCacheVersion, QuoteItem, QuoteItemDetails
+
+try:
+    import numpy as np
+except ImportError:  # NumPy opcjonalne - silnik działa wtedy w czystym Pythonie
+    np = None
+
+logger = get_structured_logger('calculator.pricing')
+
+VAT_RATE = 1.23
+
+# Kody wariantów kalkulatora -> klucz cennika (musi odpowiadać variantMapping w calculator.js)
+VARIANT_MAPPING = {
+    'dab-lity-ab': ('Dąb', 'Lity', 'A/B'),
+    'dab-lity-bb': ('Dąb', 'Lity', 'B/B'),
+    'dab-micro-ab': ('Dąb', 'Mikrowczep', 'A/B'),
+    'dab-micro-bb': ('Dąb', 'Mikrowczep', 'B/B'),
+    'jes-lity-ab': ('Jesion', 'Lity', 'A/B'),
+    'jes-micro-ab': ('Jesion', 'Mikrowczep', 'A/B'),
+    'buk-lity-ab': ('Buk', 'Lity', 'A/B'),
+    'buk-micro-ab': ('Buk', 'Mikrowczep', 'A/B'),
+}
+
+# (typ, wariant) wykończenia -> (nazwa w finishing_type_prices, cena domyślna za m²)
+FINISHING_PRICE_NAMES = {
+    ('Lakierowanie', 'Bezbarwne'): ('Lakierowane bezbarwne', 200.0),
+    ('Lakierowanie', 'Barwne'): ('Lakierowane barwne', 250.0),
+    ('Olejowanie', None): ('Olejowanie', 250.0),
+}
+
+# Partnerzy z wyborem grupy cenowej (id użytkownika -> dozwolone id mnożników)
+FLEXIBLE_PARTNER_ALLOWED_MULTIPLIERS = {
+    14: [5, 6],
+    15: [5, 6],
+}
+
+# Jak długo migawka cennika jest ważna bez jawnej invalidacji
+SNAPSHOT_TTL_SECONDS = 300
+
+# Co ile sekund proces porównuje wersję cennika z bazą (zmiana w innym workerze)
+VERSION_CHECK_SECONDS = 5
+
+# Jedyny wiersz tabeli pricing_cache_version
+PRICING_VERSION_ID = 1
+
+# Maksymalna liczba linii w jednym bloku macierzy dopasowań (ogranicza pamięć)
+NUMPY_BLOCK_SIZE = 65536
+
+
+def round_money(value: float) -> float:
+    """Zaokrąglenie do groszy połówkami w górę (jak Math.round(x * 100) / 100)"""
+    return math.floor(value * 100 + 0.5) / 100
+
+
+def is_flexible_partner(user) -> bool:
+    return bool(user) and user.role == 'partner' and user.id in FLEXIBLE_PARTNER_ALLOWED_MULTIPLIERS
+
+
+class PriceIntervalIndex:
+    """
+    Indeks przedziałów cennika dla jednej kombinacji (gatunek, technologia, klasa)
+
+    Wiersze w kolejności id; wynikiem jest pierwszy pasujący wiersz, tak jak
+    priceIndex[key].find(...) w kalkulatorze.
+    """
+
+    def __init__(self, rows: List[Tuple[float, float, float, float, float]]):
+        self.rows = rows
+        if np is not None and rows:
+            table = np.asarray(rows, dtype=np.float64)
+            self._thickness_min = table[:, 0]
+            self._thickness_max = table[:, 1]
+            self._length_min = table[:, 2]
+            self._length_max = table[:, 3]
+            self._price = table[:, 4]
+
+    def lookup(self, thickness: float, length: float) -> Optional[float]:
+        """Cena za m³ dla pojedynczego wymiaru (grubość już zaokrąglona w górę)"""
+        for thickness_min, thickness_max, length_min, length_max, price in self.rows:
+            if thickness_min <= thickness <= thickness_max and length_min <= length <= length_max:
+                return price
+        return None
+
+    def lookup_many(self, thicknesses, lengths):
+        """
+        Ceny za m³ dla wektora wymiarów (NumPy)
+
+        Returns:
+            ndarray: ceny, NaN gdy brak pasującego przedziału
+        """
+        result = np.full(len(thicknesses), np.nan)
+        if not self.rows:
+            return result
+
+        for start in range(0, len(thicknesses), NUMPY_BLOCK_SIZE):
+            t = thicknesses[start:start + NUMPY_BLOCK_SIZE, None]
+            l = lengths[start:start + NUMPY_BLOCK_SIZE, None]
+            mask = (
+                (t >= self._thickness_min) & (t <= self._thickness_max) &
+                (l >= self._length_min) & (l <= self._length_max)
+            )
+            first = mask.argmax(axis=1)
+            hit = mask[np.arange(len(first)), first]
+            result[start:start + NUMPY_BLOCK_SIZE] = np.where(hit, self._price[first], np.nan)
+
+        return result
+
+
+class _VariantGroups(dict):
+    """Kod wariantu -> pozycja grupy cennika; nieznany kod -> -1"""
+
+    def __missing__(self, key):
+        return -1
+
+
+class PricingSnapshot:
+    """Niezmienna migawka cennika, mnożników i cen wykończeń"""
+
+    def __init__(self, price_rows: Iterable, multipliers: Iterable, finishing_prices: Iterable):
+        grouped: Dict[Tuple[str, str, str], list] = {}
+        for row in price_rows:
+            grouped.setdefault((row.species, row.technology, row.wood_class), []).append((
+                float(row.thickness_min), float(row.thickness_max),
+                float(row.length_min), float(row.length_max),
+                float(row.price_per_m3)
+            ))
+        self.indexes = {key: PriceIntervalIndex(rows) for key, rows in grouped.items()}
+
+        # Grupa wariantu: pozycja w self.group_keys; -1 = nieznany wariant
+        self.group_keys = list(self.indexes)
+        group_positions = {key: position for position, key in enumerate(self.group_keys)}
+        self.variant_groups = _VariantGroups(
+            (code, group_positions.get(key, -1)) for code, key in VARIANT_MAPPING.items()
+        )
+
+        self.multipliers = {}
+        self.multipliers_by_id = {}
+        for m in multipliers:
+            self.multipliers[m.client_type] = float(m.multiplier)
+            self.multipliers_by_id[m.id] = (m.client_type, float(m.multiplier))
+
+        self.finishing_prices = {f.name: float(f.price_netto) for f in finishing_prices}
+        self.loaded_at = time.time()
+
+    @classmethod
+    def load(cls) -> 'PricingSnapshot':
+        return cls(
+            Price.query.order_by(Price.id).all(),
+            Multiplier.query.all(),
+            FinishingTypePrice.query.filter_by(is_active=True).all()
+        )
+
+    def finishing_price_per_m2(self, finishing_type: Optional[str], finishing_variant: Optional[str]) -> float:
+        if not finishing_type or finishing_type == 'Surowe':
+            return 0.0
+        if finishing_type == 'Olejowanie':
+            finishing_variant = None
+        entry = FINISHING_PRICE_NAMES.get((finishing_type, finishing_variant))
+        if not entry:
+            return 0.0
+        name, default = entry
+        return self.finishing_prices.get(name) or default
+
+    def lookup_price(self, variant_code: str, thickness: float, length: float) -> Optional[float]:
+        group = self.variant_groups[variant_code]
+        if group < 0:
+            return None
+        return self.indexes[self.group_keys[group]].lookup(math.ceil(thickness), length)
+
+
+class PricingEngine:
+    """
+    Wycena wariantów, produktów i całych wycen na podstawie migawki cennika
+
+    Linia = (wariant, długość, szerokość, grubość, ilość, mnożnik). Wszystkie
+    metody zbiorcze sprowadzają się do price_lines, liczonego wektorowo.
+    """
+
+    def __init__(self, ttl_seconds: int = SNAPSHOT_TTL_SECONDS,
+                 version_check_seconds: float = VERSION_CHECK_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self.version_check_seconds = version_check_seconds
+        self._snapshot: Optional[PricingSnapshot] = None
+        self._version: Optional[int] = None
+        self._version_checked_at = 0.0
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_snapshot(cls, snapshot: 'PricingSnapshot') -> 'PricingEngine':
+        """Silnik na stałej migawce - bez dostępu do bazy (np. w procesach roboczych)"""
+        engine = cls(ttl_seconds=float('inf'), version_check_seconds=float('inf'))
+        engine._snapshot = snapshot
+        return engine
+
+    # ------------------------------------------------------------------
+    # Migawka cennika
+    # ------------------------------------------------------------------
+
+    def snapshot(self) -> PricingSnapshot:
+        snapshot = self._snapshot
+        now = time.time()
+        if (snapshot is not None and now - snapshot.loaded_at < self.ttl_seconds
+                and now - self._version_checked_at < self.version_check_seconds):
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            now = time.time()
+            version = None
+            if snapshot is not None and now - snapshot.loaded_at < self.ttl_seconds:
+                if now - self._version_checked_at < self.version_check_seconds:
+                    return snapshot
+                version = read_pricing_version(default=self._version)
+                self._version_checked_at = now
+                if version == self._version:
+                    return snapshot
+
+            # Wersja odczytana przed cennikiem - zmiana w trakcie ładowania wymusi kolejne
+            self._version = read_pricing_version() if version is None else version
+            self._version_checked_at = now
+            snapshot = PricingSnapshot.load()
+            self._snapshot = snapshot
+            logger.debug("Załadowano migawkę cennika",
+                         price_groups=len(snapshot.indexes),
+                         multipliers=len(snapshot.multipliers),
+                         version=self._version)
+        return snapshot
+
+    def invalidate(self):
+        """Wymusza przeładowanie cennika przy następnej wycenie (po zmianie cen)"""
+        with self._lock:
+            self._snapshot = None
+
+    def resolve_multiplier(self, user, client_type: Optional[str]) -> Tuple[Optional[str], float]:
+        """
+        Grupa cenowa i mnożnik tak, jak ustala je kalkulator
+
+        Standardowy partner ma stały mnożnik z konta; pozostali wybierają grupę,
+        a flexible partner tylko spośród dozwolonych. Nieznana grupa -> 1.0.
+        """
+        if user is not None and user.role == 'partner' and not is_flexible_partner(user):
+            if user.multiplier:
+                return user.multiplier.client_type, float(user.multiplier.multiplier)
+            return None, 1.0
+
+        snapshot = self.snapshot()
+        if is_flexible_partner(user):
+            allowed = {
+                snapshot.multipliers_by_id[m_id][0]
+                for m_id in FLEXIBLE_PARTNER_ALLOWED_MULTIPLIERS[user.id]
+                if m_id in snapshot.multipliers_by_id
+            }
+            if client_type not in allowed:
+                return client_type, 1.0
+
+        return client_type, snapshot.multipliers.get(client_type, 1.0)
+
+    # ------------------------------------------------------------------
+    # Wycena linii
+    # ------------------------------------------------------------------
+
+    def price_lines(self, variant_codes: List[str], lengths: List[float], widths: List[float],
+                    thicknesses: List[float], quantities: List[int], multipliers: List[float]) -> Dict[str, list]:
+        """
+        Wycenia partię linii (listy równej długości)
+
+        Returns:
+            dict list: price_per_m3 (None = brak ceny), unit_netto, unit_brutto,
+            total_netto, total_brutto (0.0 gdy brak ceny)
+        """
+        snapshot = self.snapshot()
+        if np is not None and variant_codes:
+            return self._price_lines_numpy(snapshot, variant_codes, lengths, widths,
+                                           thicknesses, quantities, multipliers)
+        return self._price_lines_python(snapshot, variant_codes, lengths, widths,
+                                        thicknesses, quantities, multipliers)
+
+    @staticmethod
+    def _price_lines_python(snapshot, variant_codes, lengths, widths, thicknesses, quantities, multipliers):
+        result = {key: [] for key in ('price_per_m3', 'unit_netto', 'unit_brutto', 'total_netto', 'total_brutto')}
+        for code, length, width, thickness, quantity, multiplier in zip(
+                variant_codes, lengths, widths, thicknesses, quantities, multipliers):
+            price = snapshot.lookup_price(code, thickness, length)
+            if price is None:
+                unit_netto = 0.0
+            else:
+                unit_netto = (length / 100) * (width / 100) * (math.ceil(thickness) / 100) * price * multiplier
+            unit_brutto = unit_netto * VAT_RATE
+            result['price_per_m3'].append(price)
+            result['unit_netto'].append(unit_netto)
+            result['unit_brutto'].append(unit_brutto)
+            result['total_netto'].append(unit_netto * quantity)
+            result['total_brutto'].append(unit_brutto * quantity)
+        return result
+
+    @staticmethod
+    def _price_arrays(snapshot, variant_codes, lengths, widths, thicknesses, quantities, multipliers):
+        """Rdzeń wektorowy: kolumny -> tablice NumPy (price_per_m3 = NaN gdy brak ceny)"""
+        count = len(variant_codes)
+        length = np.asarray(lengths, dtype=np.float64)
+        width = np.asarray(widths, dtype=np.float64)
+        thickness = np.ceil(np.asarray(thicknesses, dtype=np.float64))
+        quantity = np.asarray(quantities, dtype=np.float64)
+        multiplier = np.asarray(multipliers, dtype=np.float64)
+
+        groups = np.fromiter(map(snapshot.variant_groups.__getitem__, variant_codes),
+                             dtype=np.int64, count=count)
+        price = np.full(count, np.nan)
+        for group in np.unique(groups):
+            if group < 0:
+                continue
+            positions = np.nonzero(groups == group)[0]
+            index = snapshot.indexes[snapshot.group_keys[group]]
+            price[positions] = index.lookup_many(thickness[positions], length[positions])
+
+        unit_netto = (length / 100) * (width / 100) * (thickness / 100) * price * multiplier
+        unit_netto[np.isnan(price)] = 0.0
+        unit_brutto = unit_netto * VAT_RATE
+
+        return {
+            'price_per_m3': price,
+            'unit_netto': unit_netto,
+            'unit_brutto': unit_brutto,
+            'total_netto': unit_netto * quantity,
+            'total_brutto': unit_brutto * quantity,
+        }
+
+    @classmethod
+    def _price_lines_numpy(cls, snapshot, variant_codes, lengths, widths, thicknesses, quantities, multipliers):
+        arrays = cls._price_arrays(snapshot, variant_codes, lengths, widths, thicknesses, quantities, multipliers)
+        result = {key: values.tolist() for key, values in arrays.items()}
+        result['price_per_m3'] = [p if p == p else None for p in result['price_per_m3']]
+        return result
+
+    # ------------------------------------------------------------------
+    # Wycena produktów / wycen
+    # ------------------------------------------------------------------
+
+    def finishing_cost(self, product: Dict[str, Any]) -> Tuple[float, float]:
+        """Koszt wykończenia produktu (netto, brutto) - dla całej ilości"""
+        price_per_m2 = self.snapshot().finishing_price_per_m2(
+            product.get('finishing_type'), product.get('finishing_variant'))
+        if not price_per_m2:
+            return 0.0, 0.0
+
+        length_m = _to_float(product.get('length')) / 100
+        width_m = _to_float(product.get('width')) / 100
+        thickness_m = _to_float(product.get('thickness')) / 100
+        quantity = _to_quantity(product.get('quantity'))
+
+        surface_m2 = 2 * (length_m * width_m + length_m * thickness_m + width_m * thickness_m) * quantity
+        netto = round_money(surface_m2 * price_per_m2)
+        return netto, round_money(netto * VAT_RATE)
+
+    def price_quotes(self, quotes: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Wycenia wiele wycen jednym przebiegiem
+
+        Każda wycena: {'multiplier': float, 'products': [{length, width, thickness,
+        quantity, finishing_type, finishing_variant, variants}]}, gdzie variants to
+        lista kodów lub słowników {'variant_code', 'is_selected'}; brak variants =
+        wszystkie warianty kalkulatora.
+        """
+        codes, lengths, widths, thicknesses, quantities, multipliers = [], [], [], [], [], []
+        layout = []  # (quote_pos, product_pos, variant_code, is_selected)
+
+        for quote_pos, quote in enumerate(quotes):
+            multiplier = _to_float(quote.get('multiplier'), 1.0)
+            for product_pos, product in enumerate(quote.get('products') or []):
+                length = _to_float(product.get('length'))
+                width = _to_float(product.get('width'))
+                thickness = _to_float(product.get('thickness'))
+                quantity = _to_quantity(product.get('quantity'))
+
+                variants = product.get('variants')
+                if variants is None:
+                    variants = list(VARIANT_MAPPING)
+                for variant in variants:
+                    if isinstance(variant, dict):
+                        code, is_selected = variant.get('variant_code'), bool(variant.get('is_selected'))
+                    else:
+                        code, is_selected = variant, False
+                    code = str(code) if code is not None else None
+                    codes.append(code)
+                    lengths.append(length)
+                    widths.append(width)
+                    thicknesses.append(thickness)
+                    quantities.append(quantity)
+                    multipliers.append(multiplier)
+                    layout.append((quote_pos, product_pos, code, is_selected))
+
+        priced = self.price_lines(codes, lengths, widths, thicknesses, quantities, multipliers)
+
+        results = []
+        for quote in quotes:
+            products = []
+            for product in quote.get('products') or []:
+                finishing_netto, finishing_brutto = self.finishing_cost(product)
+                products.append({
+                    'quantity': _to_quantity(product.get('quantity')),
+                    # Jak calculateSingleVolume w calculator.js - grubość zaokrąglona w górę
+                    'volume_m3': (_to_float(product.get('length')) / 100) *
+                                 (_to_float(product.get('width')) / 100) *
+                                 (math.ceil(_to_float(product.get('thickness'))) / 100),
+                    'finishing_netto': finishing_netto,
+                    'finishing_brutto': finishing_brutto,
+                    'variants': []
+                })
+            results.append({
+                'multiplier': _to_float(quote.get('multiplier'), 1.0),
+                'products': products,
+                'summary': {'products_netto': 0.0, 'products_brutto': 0.0,
+                            'finishing_netto': 0.0, 'finishing_brutto': 0.0}
+            })
+
+        for line, (quote_pos, product_pos, code, is_selected) in enumerate(layout):
+            product = results[quote_pos]['products'][product_pos]
+            product['variants'].append({
+                'variant_code': code,
+                'is_selected': is_selected,
+                'price_per_m3': priced['price_per_m3'][line],
+                'unit_netto': priced['unit_netto'][line],
+                'unit_brutto': priced['unit_brutto'][line],
+                'total_netto': priced['total_netto'][line],
+                'total_brutto': priced['total_brutto'][line],
+            })
+            if is_selected:
+                summary = results[quote_pos]['summary']
+                summary['products_netto'] += priced['total_netto'][line]
+                summary['products_brutto'] += priced['total_brutto'][line]
+
+        for result in results:
+            summary = result['summary']
+            for product in result['products']:
+                # Jak w kalkulatorze: wykończenie liczy się tylko dla produktu z zaznaczonym wariantem
+                if any(v['is_selected'] for v in product['variants']):
+                    summary['finishing_netto'] += product['finishing_netto']
+                    summary['finishing_brutto'] += product['finishing_brutto']
+            summary['total_netto'] = summary['products_netto'] + summary['finishing_netto']
+            summary['total_brutto'] = summary['products_brutto'] + summary['finishing_brutto']
+
+        return results
+
+    def price_quote(self, products: List[Dict[str, Any]], multiplier: float) -> Dict[str, Any]:
+        return self.price_quotes([{'multiplier': multiplier, 'products': products}])[0]
+
+    # ------------------------------------------------------------------
+    # Przeliczanie zapisanych pozycji wycen
+    # ------------------------------------------------------------------
+
+    def reprice_quote_items(self, rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Przelicza zapisane pozycje wycen według aktualnego cennika
+
+        Args:
+            rows: wynik iter_quote_item_rows (mnożnik pozycji pozostaje bez zmian)
+
+        Returns:
+            list: dla każdej pozycji item_id, old/new price_per_m3, old/new unit_netto
+        """
+        priced = self.price_lines(
+            [row['variant_code'] for row in rows],
+            [row['length_cm'] for row in rows],
+            [row['width_cm'] for row in rows],
+            [row['thickness_cm'] for row in rows],
+            [row['quantity'] for row in rows],
+            [row['multiplier'] for row in rows],
+        )
+        return [
+            {
+                'item_id': row['item_id'],
+                'quote_id': row['quote_id'],
+                'old_price_per_m3': row['price_per_m3'],
+                'new_price_per_m3': priced['price_per_m3'][pos],
+                'old_unit_netto': row['unit_netto'],
+                'new_unit_netto': round_money(priced['unit_netto'][pos]),
+                'new_unit_brutto': round_money(priced['unit_brutto'][pos]),
+            }
+            for pos, row in enumerate(rows)
+        ]
+
+
+def _to_float(value, default: float = 0.0) -> float:
+    try:
+        return float(value) if value not in (None, '') else default
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_quantity(value) -> int:
+    try:
+        quantity = int(value)
+    except (TypeError, ValueError):
+        return 1
+    return quantity if quantity >= 1 else 1
+
+
+def iter_quote_item_rows(chunk_size: int = 5000, quote_ids: Optional[List[int]] = None,
+                         limit: Optional[int] = None) -> Iterator[List[Dict[str, Any]]]:
+    """
+    Zapisane pozycje wycen w porcjach (keyset po quote_items.id)
+
+    Jedno zapytanie na porcję, tylko kolumny potrzebne do wyceny; ilość
+    z quote_items_details. Cena referencyjna to cena przed rabatem.
+    """
+    last_id = 0
+    fetched = 0
+    while True:
+        size = chunk_size if limit is None else min(chunk_size, limit - fetched)
+        if size <= 0:
+            return
+
+        query = db.session.query(
+            QuoteItem.id, QuoteItem.quote_id, QuoteItem.variant_code,
+            QuoteItem.length_cm, QuoteItem.width_cm, QuoteItem.thickness_cm,
+            QuoteItem.multiplier, QuoteItem.price_per_m3, QuoteItem.is_selected,
+            QuoteItem.price_netto, QuoteItem.original_price_netto,
+            QuoteItem.price_brutto, QuoteItem.original_price_brutto,
+            QuoteItem.discount_percentage, QuoteItemDetails.quantity
+        ).outerjoin(
+            QuoteItemDetails,
+            (QuoteItemDetails.quote_id == QuoteItem.quote_id) &
+            (QuoteItemDetails.product_index == QuoteItem.product_index)
+        ).filter(QuoteItem.id > last_id)
+
+        if quote_ids is not None:
+            query = query.filter(QuoteItem.quote_id.in_(quote_ids))
+
+        chunk = query.order_by(QuoteItem.id).limit(size).all()
+        if not chunk:
+            return
+
+        yield [
+            {
+                'item_id': row.id,
+                'quote_id': row.quote_id,
+                'variant_code': row.variant_code,
+                'length_cm': _to_float(row.length_cm),
+                'width_cm': _to_float(row.width_cm),
+                'thickness_cm': _to_float(row.thickness_cm),
+                'multiplier': _to_float(row.multiplier, 1.0),
+                'quantity': _to_quantity(row.quantity),
+                'price_per_m3': _to_float(row.price_per_m3),
+                'unit_netto': _to_float(row.original_price_netto or row.price_netto),
+                'unit_brutto': _to_float(row.original_price_brutto or row.price_brutto),
+                'discount_percentage': _to_float(row.discount_percentage),
+                'is_selected': bool(row.is_selected),
+            }
+            for row in chunk
+        ]
+
+        last_id = chunk[-1].id
+        fetched += len(chunk)
+
+
+_pricing_engine = None
+_pricing_engine_lock = threading.Lock()
+
+
+def get_pricing_engine() -> PricingEngine:
+    """Singleton silnika wyceny (wspólna migawka cennika w procesie)"""
+    global _pricing_engine
+    if _pricing_engine is None:
+        with _pricing_engine_lock:
+            if _pricing_engine is None:
+                _pricing_engine = PricingEngine()
+    return _pricing_engine
+
+
+_VERSION_TABLES = LazyTables(PricingCacheVersion)
+
+
+def read_pricing_version(default: Optional[int] = None) -> Optional[int]:
+    """
+    Bieżąca wersja cennika (osobne połączenie - bez migawki transakcji sesji)
+
+    Błąd odczytu zwraca default - migawka wygasa wtedy tylko po TTL.
+    """
+    table = PricingCacheVersion.__table__
+    try:
+        _VERSION_TABLES.ensure()
+        with db.engine.connect() as conn:
+            version = conn.execute(
+                select(table.c.version).where(table.c.id == PRICING_VERSION_ID)
+            ).scalar()
+        return version or 0
+    except Exception as e:
+        logger.warning("Nie udało się odczytać wersji cennika", error=str(e))
+        return default
+
+
+def bump_pricing_version():
+    """Podbija wersję cennika - wszystkie procesy przeładują migawkę przy kolejnym sprawdzeniu"""
+    _VERSION_TABLES.ensure()
+    table = PricingCacheVersion.__table__
+    for attempt in range(2):
+        try:
+            with db.engine.begin() as conn:
+                updated = conn.execute(
+                    update(table).where(table.c.id == PRICING_VERSION_ID)
+                    .values(version=table.c.version + 1, updated_at=datetime.utcnow())
+                ).rowcount
+                if not updated:
+                    conn.execute(insert(table).values(
+                        id=PRICING_VERSION_ID, version=1, updated_at=datetime.utcnow()
+                    ))
+            return
+        except IntegrityError:
+            # Równoległy pierwszy zapis wiersza - ponów jako UPDATE
+            if attempt:
+                raise
+
+
+def invalidate_pricing_cache():
+    """Do wywołania po zmianie cennika, mnożników lub cen wykończeń (wszystkie procesy)"""
+    bump_pricing_version()
+    get_pricing_engine().invalidate()
+
+
+def benchmark_pricing(rows: List[Dict[str, Any]], rounds: int = 3) -> Dict[str, Any]:
+    """
+    Mierzy przeliczenie pozycji wycen: wektorowo (NumPy) i linia po linii
+
+    Returns:
+        dict: czasy, przepustowość i liczba pozycji, których cena by się zmieniła
+    """
+    engine = get_pricing_engine()
+    snapshot = engine.snapshot()
+    columns = (
+        [row['variant_code'] for row in rows],
+        [row['length_cm'] for row in rows],
+        [row['width_cm'] for row in rows],
+        [row['thickness_cm'] for row in rows],
+        [row['quantity'] for row in rows],
+        [row['multiplier'] for row in rows],
+    )
+
+    def best_of(func):
+        best = None
+        for _ in range(max(1, rounds)):
+            started = time.perf_counter()
+            func(snapshot, *columns)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return best
+
+    results = {'items': len(rows), 'numpy_available': np is not None}
+
+    python_time = best_of(PricingEngine._price_lines_python)
+    results['python_ms'] = round(python_time * 1000, 2)
+    results['python_items_per_s'] = int(len(rows) / python_time) if python_time else None
+
+    if np is not None:
+        numpy_time = best_of(PricingEngine._price_lines_numpy)
+        results['numpy_ms'] = round(numpy_time * 1000, 2)
+        results['numpy_items_per_s'] = int(len(rows) / numpy_time) if numpy_time else None
+        results['speedup'] = round(python_time / numpy_time, 1) if numpy_time else None
+        # Sam rdzeń wektorowy - bez konwersji wyników z powrotem na listy
+        core_time = best_of(PricingEngine._price_arrays)
+        results['numpy_core_ms'] = round(core_time * 1000, 2)
+
+    repriced = engine.reprice_quote_items(rows)
+    results['changed_items'] = sum(
+        1 for r in repriced if abs(r['new_unit_netto'] - r['old_unit_netto']) >= 0.01)
+    results['unpriced_items'] = sum(1 for r in repriced if r['new_price_per_m3'] is None)
+    results['changed_quotes'] = len({
+        r['quote_id'] for r in repriced if abs(r['new_unit_netto'] - r['old_unit_netto']) >= 0.01})
+    return results
+
+
+def register_pricing_cli(app):
+    """Rejestruje komendę flask benchmark-pricing"""
+
+    @app.cli.command('benchmark-pricing')
+    @click.option('--limit', default=None, type=int, help='Maksymalna liczba pozycji wycen (domyślnie wszystkie)')
+    @click.option('--rounds', default=3, help='Liczba powtórzeń (brany najlepszy czas)')
+    @with_appcontext
+    def benchmark_pricing_command(limit, rounds):
+        """Benchmark przeliczenia wszystkich historycznych wycen według aktualnego cennika"""
+        started = time.perf_counter()
+        rows = [row for chunk in iter_quote_item_rows(limit=limit) for row in chunk]
+        load_time = time.perf_counter() - started
+
+        if not rows:
+            print("[benchmark-pricing] Brak pozycji wycen", file=sys.stderr)
+            return
+
+        results = benchmark_pricing(rows, rounds=rounds)
+        results['load_ms'] = round(load_time * 1000, 2)
+        click.echo(json.dumps(results, indent=2, ensure_ascii=False))
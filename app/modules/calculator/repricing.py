@@ -0,0 +1,486 @@
+# modules/calculator/repricing.py
+"""
+Zbiorcze przeliczanie wycen po zmianie cennika
+==============================================
+
+Zadanie (RepricingJob) przechodzi po wycenach z wybranych statusów porcjami
+(keyset po quotes.id), przelicza ich pozycje silnikiem wyceny i zapisuje
+raport różnic CSV (stare vs nowe netto/brutto per wycena). Opcjonalnie
+zapisuje nowe ceny zbiorczo (bulk update per porcja).
+
+- pamięć ograniczona rozmiarem porcji - w pamięci jest tylko bieżąca porcja
+  i co najwyżej 2 porcje na proces roboczy w kolejce,
+- przy dużej historii porcje liczone są w puli procesów (ProcessPoolExecutor);
+  procesy dostają migawkę cennika raz, przy starcie, i nie używają bazy.
+  Pulę tworzy tylko CLI albo scheduler_daemon - przebieg z API z workers > 1
+  czeka w kolejce zadań na daemona (run_queued_repricing_jobs), a bez
+  daemona liczy się w wątku workera aplikacji, bez puli procesów,
+- zapis zmian i raportu zawsze w procesie głównym.
+
+Rabaty pozycji są zachowane: nowa cena przed rabatem pochodzi z cennika,
+cena po rabacie = nowa cena × (1 - rabat%). Mnożnik pozycji się nie zmienia.
+Wartość wyceny (total_price) jest korygowana o różnicę brutto pozycji.
+
+Uruchomienie: flask reprice-quotes lub POST /calculator/api/repricing (admin);
+po zmianie cennika w /settings/prices startuje przebieg "na sucho". Przebiegi
+z API działają jako zadania w tle (modules/jobs) - stan, postęp i wynik są
+w bazie, więc odpytanie trafiające do innego procesu aplikacji je widzi.
+Raporty CSV trafiają do katalogu instancji (REPRICING_REPORTS_DIR,
+domyślnie <instance_path>/repricing_reports).
+"""
+
+import csv
+import os
+import sys
+import time
+import uuid
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional
+
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+from extensions import db
+from modules.jobs import (
+    BackgroundJob, JobCancelled, check_job_cancelled, current_job_context, dispatch_job, get_job,
+    job_handler, job_progress, list_jobs, run_queued_jobs, submit_job,
+)
+from modules.logging import get_structured_logger
+from modules.scheduler import REPRICING_QUEUE_JOB, request_job_run
+from .models import Quote, QuoteItem, QuoteLog
+from .pricing import PricingEngine, get_pricing_engine, iter_quote_item_rows, round_money
+
+logger = get_structured_logger('calculator.repricing')
+
+# Liczba wycen w jednej porcji
+DEFAULT_CHUNK_QUOTES = 200
+
+# Od tylu wycen do przeliczenia opłaca się pula procesów
+PROCESS_POOL_MIN_QUOTES = 5000
+
+# Ile porcji na proces roboczy może czekać w kolejce (ogranicza pamięć)
+MAX_IN_FLIGHT_PER_WORKER = 2
+
+# Zmiana ceny jednostkowej uznawana za istotną
+PRICE_EPSILON = 0.005
+
+REPORT_COLUMNS = (
+    'quote_id', 'quote_number', 'status_id', 'items', 'changed_items', 'unpriced_items',
+    'old_netto', 'new_netto', 'diff_netto', 'old_brutto', 'new_brutto', 'diff_brutto'
+)
+
+
+# Typy zadań w tle: raport "na sucho" (kilka naraz) i zapis zmian (jeden naraz)
+REPRICING_JOB = 'calculator.repricing'
+REPRICING_APPLY_JOB = 'calculator.repricing_apply'
+REPRICING_JOB_TYPES = (REPRICING_JOB, REPRICING_APPLY_JOB)
+
+
+def get_reports_dir() -> str:
+    """Katalog raportów CSV poza drzewem kodu (wymaga kontekstu aplikacji)"""
+    return current_app.config.get('REPRICING_REPORTS_DIR') or os.path.join(
+        current_app.instance_path, 'repricing_reports')
+
+
+# ----------------------------------------------------------------------
+# Obliczenia porcji (bez bazy - wykonywane także w procesach roboczych)
+# ----------------------------------------------------------------------
+
+_worker_engine: Optional[PricingEngine] = None
+
+
+def _init_worker(snapshot):
+    global _worker_engine
+    _worker_engine = PricingEngine.from_snapshot(snapshot)
+
+
+def _diff_chunk_in_worker(quotes, rows):
+    return diff_quote_chunk(_worker_engine, quotes, rows)
+
+
+def diff_quote_chunk(engine: PricingEngine, quotes: List[Dict[str, Any]],
+                     rows: List[Dict[str, Any]]) -> Dict[str, list]:
+    """
+    Porównuje zapisane ceny porcji wycen z cenami według bieżącego cennika
+
+    Returns:
+        dict: quotes (wiersze raportu dla wycen ze zmianami lub bez ceny),
+              item_updates / quote_updates (mapowania do bulk_update_mappings)
+    """
+    repriced = engine.reprice_quote_items(rows)
+
+    totals = {
+        quote['quote_id']: {
+            'items': 0, 'changed_items': 0, 'unpriced_items': 0,
+            'old_netto': 0.0, 'new_netto': 0.0, 'old_brutto': 0.0, 'new_brutto': 0.0
+        }
+        for quote in quotes
+    }
+    item_updates = []
+
+    for row, result in zip(rows, repriced):
+        quote_totals = totals[row['quote_id']]
+        quote_totals['items'] += 1
+
+        discount_factor = 1 - row['discount_percentage'] / 100
+        old_netto = row['unit_netto'] * discount_factor
+        old_brutto = row['unit_brutto'] * discount_factor
+
+        if result['new_price_per_m3'] is None:
+            quote_totals['unpriced_items'] += 1
+            new_netto, new_brutto = old_netto, old_brutto
+        else:
+            new_netto = result['new_unit_netto'] * discount_factor
+            new_brutto = result['new_unit_brutto'] * discount_factor
+            if (abs(result['new_unit_netto'] - row['unit_netto']) >= PRICE_EPSILON or
+                    abs(result['new_unit_brutto'] - row['unit_brutto']) >= PRICE_EPSILON):
+                quote_totals['changed_items'] += 1
+                item_updates.append({
+                    'id': row['item_id'],
+                    'price_per_m3': result['new_price_per_m3'],
+                    'price_netto': round_money(new_netto),
+                    'price_brutto': round_money(new_brutto),
+                    'original_price_netto': result['new_unit_netto'],
+                    'original_price_brutto': result['new_unit_brutto'],
+                })
+
+        if row['is_selected']:
+            quote_totals['old_netto'] += old_netto * row['quantity']
+            quote_totals['new_netto'] += new_netto * row['quantity']
+            quote_totals['old_brutto'] += old_brutto * row['quantity']
+            quote_totals['new_brutto'] += new_brutto * row['quantity']
+
+    report_rows = []
+    quote_updates = []
+    for quote in quotes:
+        quote_totals = totals[quote['quote_id']]
+        if not quote_totals['changed_items'] and not quote_totals['unpriced_items']:
+            continue
+
+        diff_brutto = round_money(quote_totals['new_brutto'] - quote_totals['old_brutto'])
+        report_rows.append({
+            'quote_id': quote['quote_id'],
+            'quote_number': quote['quote_number'],
+            'status_id': quote['status_id'],
+            'items': quote_totals['items'],
+            'changed_items': quote_totals['changed_items'],
+            'unpriced_items': quote_totals['unpriced_items'],
+            'old_netto': round_money(quote_totals['old_netto']),
+            'new_netto': round_money(quote_totals['new_netto']),
+            'diff_netto': round_money(quote_totals['new_netto'] - quote_totals['old_netto']),
+            'old_brutto': round_money(quote_totals['old_brutto']),
+            'new_brutto': round_money(quote_totals['new_brutto']),
+            'diff_brutto': diff_brutto,
+        })
+        if quote_totals['changed_items'] and quote['total_price'] is not None:
+            quote_updates.append({
+                'id': quote['quote_id'],
+                'total_price': round_money(quote['total_price'] + diff_brutto),
+            })
+
+    return {'quotes': report_rows, 'item_updates': item_updates, 'quote_updates': quote_updates}
+
+
+# ----------------------------------------------------------------------
+# Zadanie
+# ----------------------------------------------------------------------
+
+class RepricingJob:
+    """Przebieg przeliczenia wycen: postęp, raport CSV i opcjonalny zapis"""
+
+    def __init__(self, status_ids: Optional[List[int]] = None, only_open: bool = True,
+                 apply: bool = False, workers: int = 0, chunk_size: int = DEFAULT_CHUNK_QUOTES,
+                 user_id: Optional[int] = None, reason: Optional[str] = None,
+                 job_id: Optional[str] = None):
+        self.id = job_id or uuid.uuid4().hex[:12]
+        self.status_ids = list(status_ids) if status_ids else None
+        self.only_open = only_open
+        self.apply = apply
+        self.workers = max(0, int(workers or 0))
+        self.chunk_size = max(1, int(chunk_size))
+        self.user_id = user_id
+        self.reason = reason
+
+        self.state = 'queued'
+        self.error = None
+        self.created_at = datetime.utcnow()
+        self.started_at = None
+        self.finished_at = None
+        self.report_path = None
+
+        self.quotes_total = 0
+        self.quotes_processed = 0
+        self.quotes_changed = 0
+        self.quotes_unpriced = 0
+        self.items_changed = 0
+        self.diff_netto = 0.0
+        self.diff_brutto = 0.0
+        self.used_process_pool = False
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'id': self.id,
+            'state': self.state,
+            'error': self.error,
+            'apply': self.apply,
+            'status_ids': self.status_ids,
+            'only_open': self.only_open,
+            'reason': self.reason,
+            'created_at': self.created_at.isoformat(),
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'quotes_total': self.quotes_total,
+            'quotes_processed': self.quotes_processed,
+            'quotes_changed': self.quotes_changed,
+            'quotes_unpriced': self.quotes_unpriced,
+            'items_changed': self.items_changed,
+            'diff_netto': round_money(self.diff_netto),
+            'diff_brutto': round_money(self.diff_brutto),
+            'used_process_pool': self.used_process_pool,
+            'has_report': bool(self.report_path and os.path.exists(self.report_path)),
+            'report_file': os.path.basename(self.report_path) if self.report_path else None,
+        }
+
+    # ------------------------------------------------------------------
+
+    def _quote_query(self):
+        query = db.session.query(Quote.id, Quote.quote_number, Quote.status_id, Quote.total_price)
+        if self.status_ids:
+            query = query.filter(Quote.status_id.in_(self.status_ids))
+        if self.only_open:
+            query = query.filter(Quote.base_linker_order_id.is_(None))
+        return query
+
+    def _iter_quote_chunks(self) -> Iterator[List[Dict[str, Any]]]:
+        """Wyceny porcjami (keyset po id) - bez OFFSET, stały koszt porcji"""
+        last_id = 0
+        while True:
+            chunk = (self._quote_query()
+                     .filter(Quote.id > last_id)
+                     .order_by(Quote.id)
+                     .limit(self.chunk_size)
+                     .all())
+            if not chunk:
+                return
+            yield [
+                {
+                    'quote_id': row.id,
+                    'quote_number': row.quote_number,
+                    'status_id': row.status_id,
+                    'total_price': float(row.total_price) if row.total_price is not None else None,
+                }
+                for row in chunk
+            ]
+            last_id = chunk[-1].id
+
+    def _iter_work(self) -> Iterator[tuple]:
+        for quotes in self._iter_quote_chunks():
+            quote_ids = [quote['quote_id'] for quote in quotes]
+            rows = [row for part in iter_quote_item_rows(quote_ids=quote_ids) for row in part]
+            yield quotes, rows
+
+    def _handle_result(self, quotes, result, writer):
+        for report_row in result['quotes']:
+            writer.writerow(report_row)
+            if report_row['changed_items']:
+                self.quotes_changed += 1
+                self.diff_netto += report_row['diff_netto']
+                self.diff_brutto += report_row['diff_brutto']
+            if report_row['unpriced_items']:
+                self.quotes_unpriced += 1
+        self.items_changed += len(result['item_updates'])
+
+        if self.apply and result['item_updates']:
+            self._apply_chunk(result)
+
+        self.quotes_processed += len(quotes)
+        job_progress(self.quotes_processed, self.quotes_total, "Przeliczanie wycen")
+        check_job_cancelled()
+
+    def _apply_chunk(self, result):
+        db.session.bulk_update_mappings(QuoteItem, result['item_updates'])
+        if result['quote_updates']:
+            db.session.bulk_update_mappings(Quote, result['quote_updates'])
+        if self.user_id:
+            db.session.bulk_insert_mappings(QuoteLog, [
+                {
+                    'quote_id': row['quote_id'],
+                    'user_id': self.user_id,
+                    'change_time': datetime.utcnow(),
+                    'description': (f"Przeliczono wycenę według nowego cennika "
+                                    f"(różnica brutto: {row['diff_brutto']:.2f} PLN)")[:255],
+                }
+                for row in result['quotes'] if row['changed_items']
+            ])
+        db.session.commit()
+
+    def run(self):
+        """Wykonuje przebieg synchronicznie (wymaga kontekstu aplikacji)"""
+        self.state = 'running'
+        self.started_at = datetime.utcnow()
+        os.makedirs(get_reports_dir(), exist_ok=True)
+        self.report_path = os.path.join(
+            get_reports_dir(), f"repricing_{self.started_at:%Y%m%d_%H%M%S}_{self.id}.csv")
+
+        logger.info("Start przeliczenia wycen", job_id=self.id, apply=self.apply,
+                    status_ids=self.status_ids, only_open=self.only_open)
+        started = time.perf_counter()
+
+        try:
+            self.quotes_total = self._quote_query().order_by(None).count()
+            engine = get_pricing_engine()
+            engine.invalidate()
+            snapshot = engine.snapshot()
+
+            with open(self.report_path, 'w', newline='', encoding='utf-8') as report_file:
+                writer = csv.DictWriter(report_file, fieldnames=REPORT_COLUMNS, delimiter=';')
+                writer.writeheader()
+
+                if self.workers > 1 and self.quotes_total >= PROCESS_POOL_MIN_QUOTES:
+                    self.used_process_pool = True
+                    self._run_in_pool(snapshot, writer)
+                else:
+                    for quotes, rows in self._iter_work():
+                        self._handle_result(quotes, diff_quote_chunk(engine, quotes, rows), writer)
+
+            self.state = 'done'
+        except JobCancelled:
+            db.session.rollback()
+            self.state = 'cancelled'
+            raise
+        except Exception as e:
+            db.session.rollback()
+            self.state = 'error'
+            self.error = str(e)
+            logger.error("Błąd przeliczenia wycen", job_id=self.id, error=str(e), exc_info=True)
+        finally:
+            self.finished_at = datetime.utcnow()
+
+        logger.info("Koniec przeliczenia wycen", job_id=self.id, state=self.state,
+                    quotes_processed=self.quotes_processed, quotes_changed=self.quotes_changed,
+                    items_changed=self.items_changed, diff_brutto=round_money(self.diff_brutto),
+                    duration_s=round(time.perf_counter() - started, 2))
+        return self
+
+    def _run_in_pool(self, snapshot, writer):
+        """Porcje liczone w procesach; kolejka ograniczona, wyniki w kolejności porcji"""
+        max_in_flight = self.workers * MAX_IN_FLIGHT_PER_WORKER
+        pending = deque()
+
+        with ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                 initargs=(snapshot,)) as pool:
+            for quotes, rows in self._iter_work():
+                pending.append((quotes, pool.submit(_diff_chunk_in_worker, quotes, rows)))
+                if len(pending) >= max_in_flight:
+                    done_quotes, future = pending.popleft()
+                    self._handle_result(done_quotes, future.result(), writer)
+
+            while pending:
+                done_quotes, future = pending.popleft()
+                self._handle_result(done_quotes, future.result(), writer)
+
+
+# ----------------------------------------------------------------------
+# Zadania w tle (modules/jobs)
+# ----------------------------------------------------------------------
+
+def _run_repricing(params: Dict[str, Any]) -> Dict[str, Any]:
+    context = current_job_context()
+    job = RepricingJob(job_id=context.job_id if context else None, **params).run()
+    result = job.to_dict()
+    if job.state == 'error':
+        result.update(success=False)
+    return result
+
+
+@job_handler(REPRICING_JOB, title='Raport przeliczenia wycen według cennika', single_instance=False)
+def run_repricing_report(params):
+    return _run_repricing(params)
+
+
+@job_handler(REPRICING_APPLY_JOB, title='Przeliczenie wycen według cennika z zapisem zmian')
+def run_repricing_apply(params):
+    return _run_repricing(params)
+
+
+def start_repricing_job(app=None, status_ids: Optional[List[int]] = None, only_open: bool = True,
+                        apply: bool = False, workers: int = 0, chunk_size: int = DEFAULT_CHUNK_QUOTES,
+                        user_id: Optional[int] = None, reason: Optional[str] = None) -> BackgroundJob:
+    """
+    Zleca przeliczenie jako zadanie w tle
+
+    Raises:
+        JobAlreadyRunning: gdy trwa już przebieg z zapisem zmian
+    """
+    params = {
+        'status_ids': list(status_ids) if status_ids else None,
+        'only_open': only_open,
+        'apply': apply,
+        'workers': workers,
+        'chunk_size': chunk_size,
+        'user_id': user_id,
+        'reason': reason,
+    }
+    job_type = REPRICING_APPLY_JOB if apply else REPRICING_JOB
+    if not workers or workers <= 1:
+        return submit_job(job_type, params=params, user_id=user_id, app=app)
+
+    # Pula procesów nie powstaje w workerze aplikacji - przebieg wykona scheduler_daemon
+    job = submit_job(job_type, params=params, user_id=user_id, app=app, defer=True)
+    if not request_job_run(REPRICING_QUEUE_JOB):
+        logger.warning("Scheduler nie działa - przeliczenie wycen w procesie aplikacji bez puli procesów",
+                       job_id=job.id)
+        job.params = dict(job.params, workers=0)
+        db.session.commit()
+        dispatch_job(job.id, app=app)
+    return job
+
+
+def run_queued_repricing_jobs() -> Dict[str, int]:
+    """Zadanie schedulera: przebiegi zlecone z API (z pulą procesów) w procesie daemona"""
+    return {'jobs': run_queued_jobs(REPRICING_JOB_TYPES)}
+
+
+def get_repricing_job(job_id: str) -> Optional[BackgroundJob]:
+    job = get_job(job_id)
+    return job if job is not None and job.job_type in REPRICING_JOB_TYPES else None
+
+
+def list_repricing_jobs(limit: int = 20) -> List[BackgroundJob]:
+    jobs = [job for job_type in REPRICING_JOB_TYPES for job in list_jobs(job_type=job_type, limit=limit)]
+    return sorted(jobs, key=lambda job: job.created_at, reverse=True)[:limit]
+
+
+def get_report_path(job: BackgroundJob) -> Optional[str]:
+    """Ścieżka raportu CSV zakończonego przebiegu (None - brak raportu)"""
+    report_file = (job.result or {}).get('report_file')
+    if job.status != BackgroundJob.STATUS_SUCCEEDED or not report_file:
+        return None
+    path = os.path.join(get_reports_dir(), os.path.basename(report_file))
+    return path if os.path.exists(path) else None
+
+
+def register_repricing_cli(app):
+    """Rejestruje komendę flask reprice-quotes"""
+
+    @app.cli.command('reprice-quotes')
+    @click.option('--status', 'status_ids', multiple=True, type=int, help='Id statusu wyceny (można powtarzać)')
+    @click.option('--include-ordered', is_flag=True, help='Także wyceny z zamówieniem w Baselinker')
+    @click.option('--apply', is_flag=True, help='Zapisz nowe ceny (domyślnie tylko raport)')
+    @click.option('--workers', default=0, help='Liczba procesów roboczych (0 = w procesie)')
+    @click.option('--chunk', default=DEFAULT_CHUNK_QUOTES, help='Liczba wycen w porcji')
+    @with_appcontext
+    def reprice_quotes_command(status_ids, include_ordered, apply, workers, chunk):
+        """Przelicza wyceny według aktualnego cennika i zapisuje raport różnic CSV"""
+        job = RepricingJob(status_ids=status_ids, only_open=not include_ordered,
+                           apply=apply, workers=workers, chunk_size=chunk,
+                           reason='cli').run()
+        for key, value in job.to_dict().items():
+            click.echo(f"{key}: {value}")
+        click.echo(f"report: {job.report_path}")
+        if job.state == 'error':
+            print(f"[reprice-quotes] Błąd: {job.error}", file=sys.stderr)
+            sys.exit(1)
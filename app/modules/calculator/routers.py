@@ -1,21 +1,28 @@
+import os
 import sys
 import json
 from flask import (
     render_template, session, redirect, url_for,
-    request, jsonify, current_app
+    request, jsonify, current_app, make_response
 )
 from sqlalchemy import text
 from extensions import db
+from query_profiler import query_budget
 from flask import Blueprint, render_template, request, jsonify
 from modules.calculator.models import Quote, QuoteItem, QuoteCounter, QuoteLog, Multiplier, User
-from modules.clients.models import Client
+from modules.clients.models import Client, find_clients
 from datetime import datetime
 from sqlalchemy.exc import SQLAlchemyError
 import logging
-import requests
 from modules.quotes.models import QuoteStatus
 from modules.calculator.models import QuoteItemDetails
 from modules.users.decorators import require_module_access
+from modules.calculator.globkurier import (
+    DEFAULT_TIMEOUT_BUDGET, GlobKurierError, build_parcel_params, get_globkurier_client
+)
+from modules.calculator.pricing import (
+    FLEXIBLE_PARTNER_ALLOWED_MULTIPLIERS, get_pricing_engine, is_flexible_partner, round_money
+)
 
 calculator_bp = Blueprint('calculator', __name__, template_folder='templates', static_folder='static')
 
@@ -42,15 +49,8 @@ def calculator_home():
                 row[key] = float(row[key])
     prices_json = json.dumps(prices_list)
     
-    # ✅ NOWE: Konfiguracja flexible partners
-    FLEXIBLE_PARTNER_IDS = [14, 15]
-    FLEXIBLE_PARTNER_ALLOWED_MULTIPLIERS = {
-        14: [5, 6],
-        15: [5, 6],
-    }
-    
     # Pobieranie mnożników z bazy - filtrowanie per user
-    if user_role == 'partner' and user_id in FLEXIBLE_PARTNER_IDS:
+    if is_flexible_partner(user):
         # Flexible partner - pokaż tylko dozwolone mnożniki
         allowed_ids = FLEXIBLE_PARTNER_ALLOWED_MULTIPLIERS.get(user_id, [])
         multipliers_query = Multiplier.query.filter(Multiplier.id.in_(allowed_ids)).all()
@@ -65,7 +65,7 @@ def calculator_home():
     multipliers_json = json.dumps(multipliers_list)
     
     # ✅ NOWE: Flaga czy to "flexible partner"
-    is_flexible_partner = (user_role == 'partner' and user_id in FLEXIBLE_PARTNER_IDS)
+    flexible_partner = is_flexible_partner(user)
     
     return render_template(
         "calculator.html", 
@@ -76,14 +76,12 @@ def calculator_home():
         user_role=user_role, 
         user_multiplier=user_multiplier,
         user_client_type=user_client_type,
-        is_flexible_partner=is_flexible_partner  # ← NOWY PARAMETR
+        is_flexible_partner=flexible_partner
     )
 
 @calculator_bp.route('/shipping_quote', methods=['POST'])
 @require_module_access('calculator')
 def shipping_quote():
-    import time
-    
     current_app.logger.info(">>> shipping_quote: endpoint wywołany")
     
     shipping_params = request.get_json()
@@ -96,7 +94,7 @@ def shipping_quote():
         original_width  = float(shipping_params.get("width", 0))
         original_height = float(shipping_params.get("height", 0))
         weight          = float(shipping_params.get("weight", 0))
-    except ValueError:
+    except (TypeError, ValueError):
         current_app.logger.error(">>> shipping_quote: Błędne dane wejściowe")
         return jsonify({"error": "Błędne dane wejściowe"}), 400
 
@@ -104,214 +102,43 @@ def shipping_quote():
         current_app.logger.error(">>> shipping_quote: Nieprawidlowe wymiary lub waga")
         return jsonify({"error": "Nieprawidlowe wymiary lub waga"}), 400
 
-    # Dodajemy 5 cm do każdego wymiaru i konwertujemy na liczbę całkowitą
-    length_int = int(round(original_length + 5))
-    width_int  = int(round(original_width + 5))
-    height_int = int(round(original_height + 5))
-
-    # Zaokrąglamy wagę do dwóch miejsc po przecinku i formatujemy jako string
-    weight_2dec = round(weight, 2)
-    weight_str = f"{weight_2dec:.2f}"
-
-    quantity = 1
-    senderCountryId   = shipping_params.get("senderCountryId", "1")
-    receiverCountryId = shipping_params.get("receiverCountryId", "1")
-    senderPostCode    = shipping_params.get("senderPostCode", "01-001")
-    receiverPostCode  = shipping_params.get("receiverPostCode", "41-100")
-
-    query_params = {
-        "width": width_int,
-        "height": height_int,
-        "length": length_int,
-        "weight": weight_str,
-        "quantity": quantity,
-        "senderCountryId": senderCountryId,
-        "receiverCountryId": receiverCountryId,
-        "senderPostCode": senderPostCode,
-        "receiverPostCode": receiverPostCode
-    }
+    # Znormalizowane parametry paczki (+5 cm na opakowanie, waga do 0.01 kg) - także klucz cache
+    query_params = build_parcel_params(
+        original_length, original_width, original_height, weight,
+        sender_country_id=shipping_params.get("senderCountryId", "1"),
+        receiver_country_id=shipping_params.get("receiverCountryId", "1"),
+        sender_postcode=shipping_params.get("senderPostCode", "01-001"),
+        receiver_postcode=shipping_params.get("receiverPostCode", "41-100")
+    )
 
     glob_config = current_app.config.get("GLOB_KURIER")
     if not glob_config:
         current_app.logger.error(">>> shipping_quote: Brak konfiguracji GlobKURIER")
         return jsonify({"error": "Brak konfiguracji GlobKURIER"}), 500
 
-    # ===== NOWE: Konfiguracja timeout i retry =====
-    REQUEST_TIMEOUT = 30  # 30 sekund timeout dla każdego requesta
-    MAX_RETRIES = 2  # Maksymalnie 2 próby (czyli 3 wywołania: pierwsze + 2 retry)
-    RETRY_DELAY = 2  # 2 sekundy przerwy między próbami
-    RETRYABLE_STATUS_CODES = [502, 503, 504]  # Kody błędów, które warto retry'ować
-
-    def make_request_with_retry(request_func, request_name, *args, **kwargs):
-        """
-        Wykonuje request z mechanizmem retry dla błędów tymczasowych
-        """
-        for attempt in range(MAX_RETRIES + 1):
-            try:
-                # Dodaj timeout do kwargs jeśli nie ma
-                if 'timeout' not in kwargs:
-                    kwargs['timeout'] = REQUEST_TIMEOUT
-                
-                current_app.logger.info(f">>> shipping_quote: {request_name} - próba {attempt + 1}/{MAX_RETRIES + 1}")
-                response = request_func(*args, **kwargs)
-                
-                # Jeśli status jest OK lub nie jest retry'owalny, zwróć response
-                if response.status_code == 200 or response.status_code not in RETRYABLE_STATUS_CODES:
-                    return response
-                
-                # Jeśli to błąd retry'owalny i nie jest ostatnia próba, poczekaj i spróbuj ponownie
-                if attempt < MAX_RETRIES:
-                    current_app.logger.warning(
-                        f">>> shipping_quote: {request_name} - błąd {response.status_code}, "
-                        f"retry za {RETRY_DELAY}s..."
-                    )
-                    time.sleep(RETRY_DELAY)
-                    continue
-                
-                # Ostatnia próba też się nie powiodła
-                return response
-                
-            except requests.exceptions.Timeout:
-                current_app.logger.error(f">>> shipping_quote: {request_name} - timeout po {REQUEST_TIMEOUT}s")
-                if attempt < MAX_RETRIES:
-                    current_app.logger.warning(f">>> shipping_quote: {request_name} - retry za {RETRY_DELAY}s...")
-                    time.sleep(RETRY_DELAY)
-                    continue
-                else:
-                    raise
-            except requests.exceptions.RequestException as e:
-                current_app.logger.error(f">>> shipping_quote: {request_name} - wyjątek: {e}")
-                if attempt < MAX_RETRIES:
-                    current_app.logger.warning(f">>> shipping_quote: {request_name} - retry za {RETRY_DELAY}s...")
-                    time.sleep(RETRY_DELAY)
-                    continue
-                else:
-                    raise
-        
-        return None
-
-    # ===== Logowanie do GlobKurier z retry =====
-    auth_url = glob_config["endpoint"] + "/auth/login"
-    login_payload = {
-        "email": glob_config["login"],
-        "password": glob_config["password"]
-    }
-
-    headers = {
-        "Content-Type": "application/json",
-        "accept-language": "en"
-    }
-
-    try:
-        auth_response = make_request_with_retry(
-            requests.post,
-            "auth/login",
-            auth_url,
-            headers=headers,
-            json=login_payload
-        )
-        
-        if not auth_response:
-            current_app.logger.error(">>> shipping_quote: Nie otrzymano odpowiedzi po wszystkich próbach logowania")
-            return jsonify({
-                "error": "Serwis kurierski chwilowo niedostępny. Spróbuj ponownie za chwilę."
-            }), 503
-        
-        if auth_response.status_code != 200:
-            current_app.logger.error(">>> shipping_quote: Blad logowania, status: %s", auth_response.status_code)
-            return jsonify({
-                "error": "Błąd logowania do serwisu kurierskiego",
-                "status": auth_response.status_code
-            }), 401
-        
-        auth_data = auth_response.json()
-        token = auth_data.get("token")
-        if not token:
-            current_app.logger.error(">>> shipping_quote: Nie otrzymano tokena")
-            return jsonify({"error": "Nie otrzymano tokena autoryzacyjnego"}), 401
-            
-    except requests.exceptions.Timeout:
-        current_app.logger.error(">>> shipping_quote: Timeout podczas logowania po wszystkich próbach")
-        return jsonify({
-            "error": "Serwis kurierski nie odpowiada. Spróbuj ponownie za chwilę."
-        }), 504
-    except Exception as e:
-        current_app.logger.error(">>> shipping_quote: Wyjatek podczas logowania: %s", e)
-        return jsonify({
-            "error": "Błąd połączenia z serwisem kurierskim"
-        }), 500
-
-    # ===== Wysyłamy zapytanie do /products z retry =====
-    products_url = glob_config["endpoint"] + "/products"
-    headers_quote = {
-        "accept-language": "en",
-        "x-auth-token": token
-    }
-    
+    client = get_globkurier_client(glob_config)
     try:
-        quote_response = make_request_with_retry(
-            requests.get,
-            "products",
-            products_url,
-            headers=headers_quote,
-            params=query_params
+        result, cached = client.get_shipping_quotes(
+            query_params,
+            timeout_budget=glob_config.get("timeout_budget", DEFAULT_TIMEOUT_BUDGET)
         )
-        
-        if not quote_response:
-            current_app.logger.error(">>> shipping_quote: Nie otrzymano odpowiedzi po wszystkich próbach wyceny")
-            return jsonify({
-                "error": "Serwis kurierski chwilowo niedostępny. Spróbuj ponownie za chwilę."
-            }), 503
-        
-        if quote_response.status_code != 200:
-            current_app.logger.error(
-                ">>> shipping_quote: Blad pobierania wyceny, status: %s, treść: %s", 
-                quote_response.status_code,
-                quote_response.text[:500]  # Loguj tylko pierwsze 500 znaków
-            )
-            return jsonify({
-                "error": "Nie udało się pobrać wyceny wysyłki",
-                "status": quote_response.status_code
-            }), quote_response.status_code
-        
-        quote_data = quote_response.json()
-        
-        # Łączymy wszystkie kategorie produktów
-        all_products = []
-        for category in quote_data:
-            items = quote_data[category]
-            if isinstance(items, list):
-                all_products.extend(items)
-            else:
-                all_products.append(items)
-        
-        if not all_products:
-            result = []
-        else:
-            result = [
-                {
-                    "carrierName": product.get("carrierName", "Nieznany"),
-                    "grossPrice": product.get("grossPrice", ""),
-                    "netPrice": round(product.get("grossPrice", 0) / 1.23, 2) if product.get("grossPrice") else "",
-                    "carrierLogoLink": product.get("carrierLogoLink", "")
-                }
-                for product in all_products
-            ]
-        
-        current_app.logger.info(f">>> shipping_quote: Zwrócono {len(result)} opcji wysyłki")
-        return jsonify(result), 200
-        
-    except requests.exceptions.Timeout:
-        current_app.logger.error(">>> shipping_quote: Timeout podczas pobierania wyceny po wszystkich próbach")
-        return jsonify({
-            "error": "Serwis kurierski nie odpowiada. Spróbuj ponownie za chwilę."
-        }), 504
+    except GlobKurierError as e:
+        current_app.logger.error(f">>> shipping_quote: {e} (status GlobKurier: {e.upstream_status})")
+        payload = {"error": str(e)}
+        if e.upstream_status:
+            payload["status"] = e.upstream_status
+        return jsonify(payload), e.http_status
     except Exception as e:
         current_app.logger.error(">>> shipping_quote: Wyjatek podczas pobierania wyceny: %s", e)
         return jsonify({
             "error": "Błąd podczas pobierania wyceny wysyłki"
         }), 500
 
+    current_app.logger.info(f">>> shipping_quote: Zwrócono {len(result)} opcji wysyłki (cache: {cached})")
+    response = jsonify(result)
+    response.headers['X-Cache'] = 'HIT' if cached else 'MISS'
+    return response, 200
+
 logger = logging.getLogger(__name__)
 
 @calculator_bp.route('/api/finishing-prices', methods=['GET'])
@@ -333,6 +160,65 @@ def get_finishing_prices():
         current_app.logger.error(f"Błąd pobierania cen wykończeń: {str(e)}")
         return jsonify({'error': 'Błąd pobierania cen wykończeń'}), 500
 
+# Limit linii (warianty × produkty) w jednym żądaniu wyceny zbiorczej
+MAX_PRICING_LINES = 20000
+
+@calculator_bp.route('/api/price', methods=['POST'])
+@require_module_access('calculator')
+def api_price():
+    """
+    Wycena po stronie serwera - pojedyncza wycena lub wiele naraz
+
+    Body: {"client_type": ..., "products": [...]} albo
+          {"quotes": [{"key": ..., "client_type": ..., "products": [...]}, ...]}
+    Produkt: length, width, thickness, quantity, finishing_type,
+    finishing_variant, variants (lista kodów; brak = wszystkie warianty).
+    Mnożnik ustalany jest na serwerze na podstawie konta i grupy cenowej.
+    """
+    data = request.get_json(silent=True) or {}
+    quotes = data.get('quotes')
+    single = quotes is None
+    if single:
+        quotes = [data]
+
+    if not isinstance(quotes, list) or not all(isinstance(q, dict) for q in quotes):
+        return jsonify({'error': 'Nieprawidłowy format danych'}), 400
+
+    lines = sum(
+        len(p.get('variants') or []) or 8
+        for q in quotes for p in (q.get('products') or []) if isinstance(p, dict)
+    )
+    if lines > MAX_PRICING_LINES:
+        return jsonify({'error': f'Za dużo pozycji do wyceny ({lines} > {MAX_PRICING_LINES})'}), 400
+
+    user = User.query.filter_by(email=session.get('user_email')).first()
+    engine = get_pricing_engine()
+
+    requests_data = []
+    client_types = []
+    for quote in quotes:
+        client_type, multiplier = engine.resolve_multiplier(user, quote.get('client_type'))
+        client_types.append(client_type)
+        requests_data.append({
+            'multiplier': multiplier,
+            'products': [p for p in (quote.get('products') or []) if isinstance(p, dict)]
+        })
+
+    try:
+        results = engine.price_quotes(requests_data)
+    except SQLAlchemyError:
+        current_app.logger.exception("[api_price] Błąd ładowania cennika")
+        return jsonify({'error': 'Błąd ładowania cennika'}), 500
+
+    for quote, client_type, result in zip(quotes, client_types, results):
+        result['client_type'] = client_type
+        if 'key' in quote:
+            result['key'] = quote['key']
+
+    if single:
+        return jsonify(results[0])
+    return jsonify({'quotes': results})
+
 @calculator_bp.route('/save_quote', methods=['POST'])
 @require_module_access('calculator')
 def save_quote():
@@ -396,6 +282,25 @@ def save_quote():
         if not products:
             return jsonify({"error": "Brakuje produktow."}), 400
 
+        # Ceny liczone po stronie serwera - kwoty z payloadu służą tylko do kontroli
+        pricing_engine = get_pricing_engine()
+        pricing_user = User.query.filter_by(email=user_email).first()
+        quote_client_type, quote_multiplier = pricing_engine.resolve_multiplier(pricing_user, quote_client_type)
+        priced_quote = pricing_engine.price_quote(products, quote_multiplier)
+
+        client_total_price = total_price
+        total_price = round_money(
+            priced_quote['summary']['total_brutto'] + float(shipping_brutto or 0)
+        )
+        try:
+            if abs(float(client_total_price or 0) - total_price) >= 0.01:
+                current_app.logger.warning(
+                    f"[save_quote] Suma z kalkulatora ({client_total_price}) różni się od wyceny serwera "
+                    f"({total_price}) - zapisuję cenę serwera"
+                )
+        except (TypeError, ValueError):
+            pass
+
         now = datetime.utcnow()
         year = now.year
         month = now.month
@@ -437,7 +342,7 @@ def save_quote():
         db.session.add(quote)
         db.session.flush()
 
-        for i, product in enumerate(products):
+        for i, (product, priced_product) in enumerate(zip(products, priced_quote['products'])):
             variants = product.get('variants', [])
 
             if not variants:
@@ -452,8 +357,8 @@ def save_quote():
             finishing_variant = product.get("finishing_variant")
             finishing_color = product.get("finishing_color")
             finishing_gloss_level = product.get("finishing_gloss_level")
-            finishing_price_netto = product.get("finishing_netto", 0.0)
-            finishing_price_brutto = product.get("finishing_brutto", 0.0)
+            finishing_price_netto = priced_product['finishing_netto']
+            finishing_price_brutto = priced_product['finishing_brutto']
             
             # Zapisz szczegóły wykończenia dla produktu
             item_details = QuoteItemDetails(
@@ -469,14 +374,11 @@ def save_quote():
             )
             db.session.add(item_details)
 
-            for j, variant in enumerate(variants):
-                # POPRAWKA: Oblicz ceny jednostkowe dzieląc przez quantity
-                final_price_netto = variant.get('final_price_netto', 0.0)
-                final_price_brutto = variant.get('final_price_brutto', 0.0)
-                
-                # Podziel przez quantity aby otrzymać ceny jednostkowe
-                unit_price_netto = final_price_netto / product_quantity if product_quantity > 0 else 0.0
-                unit_price_brutto = final_price_brutto / product_quantity if product_quantity > 0 else 0.0
+            for j, (variant, priced_variant) in enumerate(zip(variants, priced_product['variants'])):
+                # Ceny jednostkowe z silnika wyceny
+                final_price_brutto = priced_variant['total_brutto']
+                unit_price_netto = priced_variant['unit_netto']
+                unit_price_brutto = priced_variant['unit_brutto']
                 
                 # ✅ NOWE: Pobierz informację o dostępności wariantu
                 is_available = variant.get('is_available', True)
@@ -489,9 +391,9 @@ def save_quote():
                     length_cm=product.get('length'),
                     width_cm=product.get('width'),
                     thickness_cm=product.get('thickness'),
-                    volume_m3=variant.get('volume_m3', 0.0),
-                    price_per_m3=variant.get('price_per_m3', 0.0),
-                    multiplier=variant.get('multiplier', 1.0),
+                    volume_m3=priced_product['volume_m3'],
+                    price_per_m3=priced_variant['price_per_m3'] or 0.0,
+                    multiplier=quote_multiplier,
                     price_netto=unit_price_netto,      # CENA JEDNOSTKOWA
                     price_brutto=unit_price_brutto,    # CENA JEDNOSTKOWA
                     is_selected=variant.get('is_selected', False),
@@ -510,6 +412,13 @@ def save_quote():
 
         db.session.commit()
 
+        # Pre-generacja modeli AR w tle - link do wyceny od razu z gotowym podglądem
+        try:
+            from modules.preview3d_ar.services import start_background_prewarm
+            start_background_prewarm(current_app._get_current_object(), quote_id=quote.id)
+        except Exception as e:
+            current_app.logger.warning(f"[save_quote] Nie udało się uruchomić pre-generacji AR: {e}")
+
         return jsonify({
             "message": "Wycena zapisana.", 
             "quote_number": quote_number,
@@ -523,13 +432,13 @@ def save_quote():
 
 
 @calculator_bp.route('/search_clients', methods=['GET'])
+@query_budget(8)
 @require_module_access('calculator')
 def search_clients():
     term = request.args.get('q', '').strip()
     if len(term) < 3:
         return jsonify([])
 
-    from modules.clients.models import Client
     from modules.users.models import User
 
     # Pobierz aktualnego użytkownika
@@ -541,15 +450,8 @@ def search_clients():
     if not user:
         return jsonify([])
 
-    # ✅ NOWE: Bazowe query - WSZYSCY klienci (usunięto filtrowanie per rola)
-    base_query = Client.query.filter(
-        (Client.client_number.ilike(f"%{term}%")) |
-        (Client.client_name.ilike(f"%{term}%")) |
-        (Client.email.ilike(f"%{term}%")) |
-        (Client.phone.ilike(f"%{term}%"))
-    )
-
-    matches = base_query.all()
+    # ✅ NOWE: WSZYSCY klienci (usunięto filtrowanie per rola) - indeks trigramowy, od najlepszego dopasowania
+    matches = find_clients(term, fields=('client_number', 'client_name', 'email', 'phone'))
 
     # ✅ NOWE: Segreguj klientów na własnych i cudzych
     own_clients = []
@@ -620,4 +522,75 @@ def latest_quotes():
             "public_token": q.public_token
         })
 
-    return jsonify(result)
\ No newline at end of file
+    return jsonify(result)
+
+
+def _current_admin():
+    """Zalogowany użytkownik, jeśli jest administratorem (inaczej None)"""
+    user = User.query.filter_by(email=session.get('user_email')).first()
+    return user if user and user.role == 'admin' else None
+
+
+@calculator_bp.route('/api/repricing', methods=['GET', 'POST'])
+@require_module_access('calculator')
+def api_repricing():
+    """
+    GET  - lista ostatnich przebiegów przeliczenia wycen
+    POST - start przebiegu: {"status_ids": [...], "include_ordered": false, "apply": false}
+    """
+    from modules.calculator.repricing import list_repricing_jobs, start_repricing_job
+    from modules.jobs import JobAlreadyRunning, job_conflict_response, job_submitted_response
+
+    admin = _current_admin()
+    if not admin:
+        return jsonify({'error': 'Brak uprawnień'}), 403
+
+    if request.method == 'GET':
+        return jsonify({'jobs': [job.to_dict() for job in list_repricing_jobs()]})
+
+    data = request.get_json(silent=True) or {}
+    try:
+        status_ids = [int(s) for s in (data.get('status_ids') or [])]
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Nieprawidłowe status_ids'}), 400
+
+    try:
+        job = start_repricing_job(
+            current_app._get_current_object(),
+            status_ids=status_ids,
+            only_open=not data.get('include_ordered', False),
+            apply=bool(data.get('apply', False)),
+            workers=current_app.config.get('REPRICING_WORKERS', 0),
+            user_id=admin.id,
+            reason='api'
+        )
+    except JobAlreadyRunning as e:
+        return job_conflict_response(e)
+
+    return job_submitted_response(job, message='Przeliczenie wycen uruchomione w tle')
+
+
+@calculator_bp.route('/api/repricing/<job_id>', methods=['GET'])
+@require_module_access('calculator')
+def api_repricing_status(job_id):
+    """Postęp przebiegu; ?format=csv zwraca raport różnic"""
+    from modules.calculator.repricing import get_report_path, get_repricing_job
+
+    if not _current_admin():
+        return jsonify({'error': 'Brak uprawnień'}), 403
+
+    job = get_repricing_job(job_id)
+    if not job:
+        return jsonify({'error': 'Nie znaleziono przebiegu'}), 404
+
+    if request.args.get('format') == 'csv':
+        report_path = get_report_path(job)
+        if not report_path:
+            return jsonify({'error': 'Raport nie jest jeszcze gotowy'}), 409
+        with open(report_path, 'rb') as report_file:
+            response = make_response(report_file.read())
+        response.headers['Content-Type'] = 'text/csv; charset=utf-8'
+        response.headers['Content-Disposition'] = f'attachment; filename={os.path.basename(report_path)}'
+        return response
+
+    return jsonify(job.to_dict())
@@ -1,5 +1,6 @@
 # modules/clients/models.py
 from extensions import db
+from search_index import SearchScope
 
 class Client(db.Model):
     __tablename__ = 'clients'
@@ -37,4 +38,22 @@ class Client(db.Model):
     created_by = db.relationship('User', foreign_keys=[created_by_user_id], backref='created_clients')
     
     def __repr__(self):
-        return f"<Client {self.client_name}>"
\ No newline at end of file
+        return f"<Client {self.client_name}>"
+
+
+# Wyszukiwarka klientów (kalkulator, moduł klientów) - indeks trigramowy w pamięci
+CLIENT_SEARCH = SearchScope('clients', Client, fields=(
+    'client_number', 'client_name', 'email', 'phone', 'invoice_nip'
+))
+
+# Maksymalna liczba podpowiedzi wyszukiwarki klientów
+CLIENT_SEARCH_LIMIT = 50
+
+
+def find_clients(term, fields=None, limit=CLIENT_SEARCH_LIMIT):
+    """Klienci pasujący do frazy (jak ILIKE '%fraza%'), od najlepszego dopasowania"""
+    client_ids = CLIENT_SEARCH.search(term, limit=limit, fields=fields)
+    if not client_ids:
+        return []
+    clients_by_id = {client.id: client for client in Client.query.filter(Client.id.in_(client_ids))}
+    return [clients_by_id[client_id] for client_id in client_ids if client_id in clients_by_id]
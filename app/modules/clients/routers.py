@@ -1,8 +1,10 @@
 # modules/clients/routers.py
 from flask import Blueprint, render_template, jsonify, request, session
-from .models import Client
+from .models import Client, find_clients
 from modules.quotes.models import QuoteStatus
 from extensions import db
+from query_profiler import query_budget
+from geo_lookup import region_from_postcode
 from . import clients_bp
 from modules.calculator.models import Quote
 from modules.users.models import User
@@ -222,68 +224,9 @@ GUS_BASE_URL = "https://wl-api.mf.gov.pl/api/search/nip/"
 def get_voivodeship_from_zipcode(zip_code):
     """
     Mapuje kod pocztowy na województwo
-    Bazuje na pierwszych 2 cyfrach kodu pocztowego
+    Bazuje na prefiksie kodu pocztowego (wspólne tablice z geo_lookup)
     """
-    if not zip_code or len(zip_code) < 2:
-        return None
-    
-    # Wyciągnij pierwsze 2 cyfry
-    prefix = zip_code[:2]
-    
-    # Mapowanie przedziałów kodów pocztowych na województwa
-    voivodeship_map = {
-        # Dolnośląskie: 50-59
-        **{str(i).zfill(2): 'dolnośląskie' for i in range(50, 60)},
-        
-        # Kujawsko-pomorskie: 85-87
-        **{str(i).zfill(2): 'kujawsko-pomorskie' for i in range(85, 88)},
-        
-        # Lubelskie: 20-24
-        **{str(i).zfill(2): 'lubelskie' for i in range(20, 25)},
-        
-        # Lubuskie: 65-68
-        **{str(i).zfill(2): 'lubuskie' for i in range(65, 69)},
-        
-        # Łódzkie: 90-99
-        **{str(i).zfill(2): 'łódzkie' for i in range(90, 100)},
-        
-        # Małopolskie: 30-34
-        **{str(i).zfill(2): 'małopolskie' for i in range(30, 35)},
-        
-        # Mazowieckie: 00-09, 95-97 (Warszawa + okolice)
-        **{str(i).zfill(2): 'mazowieckie' for i in range(0, 10)},
-        **{str(i).zfill(2): 'mazowieckie' for i in range(95, 98)},
-        **{str(i).zfill(2): 'mazowieckie' for i in [5, 6, 7, 8, 9]},  # 05-09
-        
-        # Opolskie: 45-49
-        **{str(i).zfill(2): 'opolskie' for i in range(45, 50)},
-        
-        # Podkarpackie: 35-39
-        **{str(i).zfill(2): 'podkarpackie' for i in range(35, 40)},
-        
-        # Podlaskie: 15-19
-        **{str(i).zfill(2): 'podlaskie' for i in range(15, 20)},
-        
-        # Pomorskie: 80-84
-        **{str(i).zfill(2): 'pomorskie' for i in range(80, 85)},
-        
-        # Śląskie: 40-44
-        **{str(i).zfill(2): 'śląskie' for i in range(40, 45)},
-        
-        # Świętokrzyskie: 25-29
-        **{str(i).zfill(2): 'świętokrzyskie' for i in range(25, 30)},
-        
-        # Warmińsko-mazurskie: 10-14
-        **{str(i).zfill(2): 'warmińsko-mazurskie' for i in range(10, 15)},
-        
-        # Wielkopolskie: 60-64
-        **{str(i).zfill(2): 'wielkopolskie' for i in range(60, 65)},
-        
-        # Zachodniopomorskie: 70-79
-        **{str(i).zfill(2): 'zachodniopomorskie' for i in range(70, 80)},
-    }
-    
-    return voivodeship_map.get(prefix, None)
+    return region_from_postcode(zip_code)
 
 @clients_bp.route('/api/gus_lookup')
 @require_module_access('clients')
@@ -354,6 +297,7 @@ def gus_lookup():
 
 
 @clients_bp.route('/search_in_database', methods=['GET'])
+@query_budget(10)
 @require_module_access('clients')
 def search_in_database():
     """
@@ -379,34 +323,32 @@ def search_in_database():
     if not user:
         return jsonify([])
 
-    # Wyszukiwanie w całej bazie (dla wszystkich ról)
-    base_query = Client.query.filter(
-        (Client.client_number.ilike(f"%{term}%")) |
-        (Client.client_name.ilike(f"%{term}%")) |
-        (Client.email.ilike(f"%{term}%")) |
-        (Client.phone.ilike(f"%{term}%")) |
-        (Client.invoice_nip.ilike(f"%{term}%"))
-    )
+    # Wyszukiwanie w całej bazie (dla wszystkich ról) - indeks trigramowy, od najlepszego dopasowania
+    matches = find_clients(term)
 
-    matches = base_query.all()
+    # Data najnowszej wyceny każdego klienta - jedno zapytanie dla wszystkich wyników
+    latest_quote_dates = dict(
+        db.session.query(Quote.client_id, db.func.max(Quote.created_at))
+        .filter(Quote.client_id.in_([client.id for client in matches]))
+        .group_by(Quote.client_id)
+        .all()
+    ) if matches else {}
 
     results = []
     six_months_ago = datetime.utcnow() - timedelta(days=180)
 
     for client in matches:
         is_own_client = client.created_by_user_id == user_id
-
-        # Pobierz najnowszą wycenę dla tego klienta
-        latest_quote = Quote.query.filter_by(client_id=client.id).order_by(Quote.created_at.desc()).first()
+        latest_quote_date = latest_quote_dates.get(client.id)
 
         # Sprawdź czy ostatnia wycena jest młodsza niż 6 miesięcy
-        has_recent_quote = latest_quote and latest_quote.created_at > six_months_ago
+        has_recent_quote = latest_quote_date and latest_quote_date > six_months_ago
 
         # Przygotuj dane klienta
         client_data = {
             "id": client.id,
             "is_own_client": is_own_client,
-            "latest_quote_date": latest_quote.created_at.strftime("%Y-%m-%d") if latest_quote else None,
+            "latest_quote_date": latest_quote_date.strftime("%Y-%m-%d") if latest_quote_date else None,
         }
 
         # Zawsze pokazujemy nazwę i imię
@@ -94,4 +94,22 @@ class HelpArticle(db.Model):
     def increment_views(self):
         """Zwiększ licznik wyświetleń"""
         self.views_count += 1
-        db.session.commit()
\ No newline at end of file
+        db.session.commit()
+
+class HelpSearchDocument(db.Model):
+    """
+    Dokument indeksu wyszukiwania - czysty tekst artykułu (bez HTML)
+
+    Zapisywany przy tworzeniu/edycji/publikacji artykułu; indeks odwrócony
+    w pamięci procesu budowany jest z tej tabeli (services/search_index.py).
+    """
+    __tablename__ = 'help_search_documents'
+
+    article_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    title = db.Column(db.String(255), nullable=False)
+    plain_text = db.Column(db.Text, nullable=False)
+    is_published = db.Column(db.Boolean, default=True, nullable=False)
+    indexed_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    def __repr__(self):
+        return f'<HelpSearchDocument {self.article_id}: {self.title}>'
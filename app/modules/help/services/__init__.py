@@ -43,6 +43,14 @@ from .search_service import (
     log_search_query
 )
 
+# Search Index
+from .search_index import (
+    index_article,
+    remove_article,
+    rebuild_search_documents,
+    register_help_search_cli
+)
+
 # Media Service
 from .media_service import (
     upload_image,
@@ -84,6 +92,12 @@ __all__ = [
     'get_popular_searches',
     'log_search_query',
     
+    # Search Index
+    'index_article',
+    'remove_article',
+    'rebuild_search_documents',
+    'register_help_search_cli',
+    
     # Media Service
     'upload_image',
     'get_all_media',
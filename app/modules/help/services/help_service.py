@@ -4,6 +4,7 @@ Główny serwis logiki biznesowej dla modułu Help
 from extensions import db
 from ..models import HelpArticle, HelpCategory
 from .slug_generator import generate_unique_slug, validate_slug
+from .search_index import index_article, invalidate_search_index, remove_article
 from bs4 import BeautifulSoup
 import bleach
 from datetime import datetime
@@ -284,7 +285,10 @@ def create_article(title, content, category_id, author_id, slug=None,
         )
         
         db.session.add(article)
+        db.session.flush()
+        index_article(article)
         db.session.commit()
+        invalidate_search_index()
         
         return {'success': True, 'article': article}
         
@@ -345,7 +349,9 @@ def update_article(article_id, title=None, content=None, category_id=None,
             article.is_published = is_published
         
         article.updated_at = datetime.utcnow()
+        index_article(article)
         db.session.commit()
+        invalidate_search_index()
         
         return {'success': True, 'article': article}
         
@@ -371,7 +377,9 @@ def delete_article(article_id):
     
     try:
         db.session.delete(article)
+        remove_article(article_id)
         db.session.commit()
+        invalidate_search_index()
         return {'success': True}
         
     except Exception as e:
@@ -397,7 +405,9 @@ def toggle_article_visibility(article_id):
     try:
         article.is_published = not article.is_published
         article.updated_at = datetime.utcnow()
+        index_article(article)
         db.session.commit()
+        invalidate_search_index()
         
         return {'success': True, 'is_published': article.is_published}
         
@@ -0,0 +1,415 @@
+"""
+Indeks odwrócony wyszukiwarki Help (BM25)
+
+Tekst artykułu jest oczyszczany z HTML raz - przy tworzeniu, edycji
+i zmianie publikacji - i zapisywany w help_search_documents. Z tej tabeli
+każdy proces buduje w pamięci indeks odwrócony:
+
+- normalizacja polska: małe litery, bez znaków diakrytycznych, odrzucenie
+  słów pomijalnych, prosty stemming (obcięcie najdłuższej końcówki fleksyjnej),
+- ranking BM25 (tytuł liczony z wagą TITLE_WEIGHT),
+- okna fragmentów (excerpt) wyznaczone przy budowie - przy wyszukiwaniu
+  wybierane jest okno z największą liczbą trafionych słów,
+- type-ahead: ostatnie słowo frazy dopasowuje też terminy zaczynające się
+  od niego ('kalku' -> 'kalkulator'), liczy się najlepsze z rozwinięć.
+
+Dokument zapisywany jest w transakcji artykułu (index_article bez commit).
+
+Świeżość między procesami: sygnatura tabeli (liczba wierszy, max indexed_at)
+sprawdzana co INDEX_CHECK_SECONDS; zmiana w bieżącym procesie unieważnia
+indeks od razu.
+"""
+import bisect
+import math
+import re
+import sys
+import threading
+import time
+import unicodedata
+from datetime import datetime
+from html import escape
+
+from extensions import db
+from lazy_tables import LazyTables
+from sqlalchemy import func
+from ..models import HelpArticle, HelpSearchDocument
+
+
+# Parametry BM25
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+# Słowo w tytule liczy się jak tyle wystąpień w treści
+TITLE_WEIGHT = 3
+
+# Okna fragmentów: długość i krok (okna zachodzą na siebie)
+EXCERPT_LENGTH = 200
+EXCERPT_STEP = 100
+
+# Jak często sprawdzać, czy inny proces nie zmienił dokumentów
+INDEX_CHECK_SECONDS = 30
+
+# Minimalna długość rdzenia po obcięciu końcówki
+MIN_STEM_LENGTH = 4
+
+# Type-ahead: minimalna długość ostatniego słowa i limit rozwinięć prefiksu
+PREFIX_MIN_LENGTH = 3
+PREFIX_EXPANSION_LIMIT = 50
+
+STOPWORDS = frozenset("""
+a aby ale albo ani az bez bo by byc byl byla bylo byly czy dla do gdy gdzie go
+i ich ile im ja jak jaki jakie jako je jej jest jesli jez juz ktora ktore ktory
+lub ma mi mnie moze na nad nie niz o od oraz po pod przez przy sa sie ta tak
+te tego tej ten to tu tym u w we wiec z za ze
+""".split())
+
+# Końcówki fleksyjne (po złożeniu znaków diakrytycznych), od najdłuższych
+_SUFFIXES = tuple(sorted("""
+owaniami owaniach owaniem owania owanie owaniu
+aniami aniach aniem ania anie aniu eniami eniach eniem enia enie eniu
+ami ach owi owie owa owe owy owej owych owym owymi ego emu ych ymi ich imi
+ej ym im om em ie ia iu ow en ze
+a e i o u y
+""".split(), key=len, reverse=True))
+
+_WORD_RE = re.compile(r'\w+', re.UNICODE)
+
+
+def fold(text):
+    """Małe litery bez polskich znaków ('Łódź' -> 'lodz')"""
+    text = text.lower().replace('ł', 'l')
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def stem(word):
+    """Prosty stemming polski: obcina najdłuższą pasującą końcówkę"""
+    if len(word) <= MIN_STEM_LENGTH or word.isdigit():
+        return word
+    for suffix in _SUFFIXES:
+        if word.endswith(suffix) and len(word) - len(suffix) >= MIN_STEM_LENGTH:
+            return word[:-len(suffix)]
+    return word
+
+
+def normalize_word(word):
+    """Słowo -> termin indeksu (None dla słów pomijalnych)"""
+    folded = fold(word)
+    if len(folded) < 2 or folded in STOPWORDS:
+        return None
+    return stem(folded)
+
+
+def tokenize(text):
+    """Tekst -> lista terminów indeksu"""
+    terms = []
+    for match in _WORD_RE.finditer(text or ''):
+        term = normalize_word(match.group(0))
+        if term:
+            terms.append(term)
+    return terms
+
+
+def _build_windows(text):
+    """Okna fragmentów (start, end, zbiór terminów) na granicach słów"""
+    windows = []
+    length = len(text)
+    start = 0
+    while True:
+        end = min(length, start + EXCERPT_LENGTH)
+        if end < length:
+            space = text.rfind(' ', start, end)
+            if space > start:
+                end = space
+        windows.append((start, end, frozenset(tokenize(text[start:end]))))
+        if end >= length:
+            break
+        next_start = text.find(' ', start + EXCERPT_STEP, end)
+        start = next_start + 1 if next_start != -1 else end
+    return windows
+
+
+def highlight_terms(text, terms):
+    """Escapuje tekst i podświetla słowa, których termin jest w terms"""
+    parts = []
+    last = 0
+    for match in _WORD_RE.finditer(text):
+        if normalize_word(match.group(0)) in terms:
+            parts.append(escape(text[last:match.start()]))
+            parts.append(f'<strong class="highlight">{escape(match.group(0))}</strong>')
+            last = match.end()
+    parts.append(escape(text[last:]))
+    return ''.join(parts)
+
+
+class HelpSearchIndex:
+    """
+    Indeks odwrócony artykułów w pamięci
+
+    Args:
+        documents: Iterowalne (article_id, title, plain_text, is_published)
+    """
+
+    def __init__(self, documents):
+        self.postings = {}      # termin -> {article_id: ważone tf}
+        self.title_terms = {}   # article_id -> zbiór terminów tytułu
+        self.content_terms = {}  # article_id -> zbiór terminów treści
+        self.lengths = {}
+        self.texts = {}
+        self.windows = {}
+        self.published = {}
+
+        for article_id, title, plain_text, is_published in documents:
+            title_tokens = tokenize(title)
+            content_tokens = tokenize(plain_text)
+
+            frequencies = {}
+            for term in content_tokens:
+                frequencies[term] = frequencies.get(term, 0) + 1
+            for term in title_tokens:
+                frequencies[term] = frequencies.get(term, 0) + TITLE_WEIGHT
+            for term, tf in frequencies.items():
+                self.postings.setdefault(term, {})[article_id] = tf
+
+            self.title_terms[article_id] = frozenset(title_tokens)
+            self.content_terms[article_id] = frozenset(content_tokens)
+            self.lengths[article_id] = len(content_tokens) + TITLE_WEIGHT * len(title_tokens)
+            self.texts[article_id] = plain_text or ''
+            self.windows[article_id] = _build_windows(plain_text or '')
+            self.published[article_id] = bool(is_published)
+
+        self.avg_length = (sum(self.lengths.values()) / len(self.lengths)) if self.lengths else 0.0
+        self.sorted_terms = sorted(self.postings)
+
+    def __len__(self):
+        return len(self.lengths)
+
+    def _idf(self, term):
+        df = len(self.postings.get(term, ()))
+        return math.log(1 + (len(self.lengths) - df + 0.5) / (df + 0.5))
+
+    def _expand_prefix(self, word):
+        """Terminy ostatniego słowa frazy: jego termin + terminy zaczynające się od niego"""
+        expanded = []
+        term = normalize_word(word)
+        if term and term in self.postings:
+            expanded.append(term)
+
+        prefix = fold(word)
+        if len(prefix) >= PREFIX_MIN_LENGTH:
+            position = bisect.bisect_left(self.sorted_terms, prefix)
+            for candidate in self.sorted_terms[position:position + PREFIX_EXPANSION_LIMIT]:
+                if not candidate.startswith(prefix):
+                    break
+                if candidate != term:
+                    expanded.append(candidate)
+        return expanded
+
+    def _term_scores(self, term, published_only):
+        """Wkład BM25 terminu dla każdego artykułu, który go zawiera"""
+        avg_length = self.avg_length or 1.0
+        idf = self._idf(term)
+        scores = {}
+        for article_id, tf in self.postings.get(term, {}).items():
+            if published_only and not self.published[article_id]:
+                continue
+            norm = BM25_K1 * (1 - BM25_B + BM25_B * self.lengths[article_id] / avg_length)
+            scores[article_id] = idf * tf * (BM25_K1 + 1) / (tf + norm)
+        return scores
+
+    def search(self, query, limit=20, published_only=True):
+        """
+        Ostatnie słowo frazy dopasowywane jest także jako prefiks (type-ahead)
+
+        Returns:
+            list: (article_id, score, match_type, excerpt) malejąco po score
+        """
+        words = _WORD_RE.findall(query or '')
+        if not words:
+            return []
+        terms = list(dict.fromkeys(term for term in map(normalize_word, words[:-1]) if term))
+        last_terms = [term for term in self._expand_prefix(words[-1]) if term not in terms]
+        if not terms and not last_terms:
+            return []
+
+        scores = {}
+        for term in terms:
+            for article_id, score in self._term_scores(term, published_only).items():
+                scores[article_id] = scores.get(article_id, 0.0) + score
+
+        # Rozwinięcia ostatniego słowa to alternatywy - liczy się najlepsze trafienie
+        best_last = {}
+        for term in last_terms:
+            for article_id, score in self._term_scores(term, published_only).items():
+                if score > best_last.get(article_id, 0.0):
+                    best_last[article_id] = score
+        for article_id, score in best_last.items():
+            scores[article_id] = scores.get(article_id, 0.0) + score
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))[:limit]
+        query_terms = frozenset(terms) | frozenset(last_terms)
+        return [
+            (article_id, score, self._match_type(article_id, query_terms), self.excerpt(article_id, query_terms))
+            for article_id, score in ranked
+        ]
+
+    def _match_type(self, article_id, query_terms):
+        in_title = bool(self.title_terms[article_id] & query_terms)
+        in_content = bool(self.content_terms[article_id] & query_terms)
+        if in_title and in_content:
+            return 'both'
+        return 'title' if in_title else 'content'
+
+    def excerpt(self, article_id, query_terms):
+        """Fragment treści z podświetleniem - okno z największą liczbą trafionych terminów"""
+        text = self.texts[article_id]
+        windows = self.windows[article_id]
+        if not windows:
+            return ''
+
+        best = max(windows, key=lambda window: len(window[2] & query_terms))
+        start, end, _terms = best if best[2] & query_terms else windows[0]
+
+        excerpt = highlight_terms(text[start:end], query_terms)
+        if start > 0:
+            excerpt = '...' + excerpt
+        if end < len(text):
+            excerpt = excerpt + '...'
+        return excerpt
+
+
+# ==================== INDEKS PROCESU ====================
+
+_index = None
+_index_signature = None
+_index_checked_at = 0.0
+_index_lock = threading.Lock()
+_TABLES = LazyTables(HelpSearchDocument)
+
+
+def _documents_signature():
+    count, last_indexed = db.session.query(
+        func.count(HelpSearchDocument.article_id),
+        func.max(HelpSearchDocument.indexed_at)
+    ).one()
+    return count, last_indexed
+
+
+def get_search_index():
+    """Indeks procesu - przebudowywany, gdy zmieniły się dokumenty"""
+    global _index, _index_signature, _index_checked_at
+
+    now = time.monotonic()
+    if _index is not None and now - _index_checked_at < INDEX_CHECK_SECONDS:
+        return _index
+
+    with _index_lock:
+        if _index is not None and now - _index_checked_at < INDEX_CHECK_SECONDS:
+            return _index
+
+        _TABLES.ensure()
+        signature = _documents_signature()
+        if signature[0] == 0 and HelpArticle.query.limit(1).count():
+            # Pierwsze uruchomienie - zbuduj dokumenty z istniejących artykułów
+            rebuild_search_documents()
+            signature = _documents_signature()
+
+        if _index is None or signature != _index_signature:
+            rows = db.session.query(
+                HelpSearchDocument.article_id,
+                HelpSearchDocument.title,
+                HelpSearchDocument.plain_text,
+                HelpSearchDocument.is_published
+            ).all()
+            _index = HelpSearchIndex(rows)
+            _index_signature = signature
+
+        _index_checked_at = now
+        return _index
+
+
+def invalidate_search_index():
+    """Wymusza sprawdzenie dokumentów przy następnym wyszukiwaniu"""
+    global _index_checked_at
+    _index_checked_at = 0.0
+
+
+# ==================== AKTUALIZACJA DOKUMENTÓW ====================
+
+def _document_values(article, strip_html_tags):
+    return {
+        'title': article.title,
+        'plain_text': strip_html_tags(article.content),
+        'is_published': bool(article.is_published),
+        'indexed_at': datetime.utcnow()
+    }
+
+
+def index_article(article):
+    """
+    Zapisuje dokument indeksu dla artykułu (po utworzeniu/edycji/publikacji)
+
+    Dokument trafia do transakcji artykułu (bez osobnego commit) - wywołujący
+    zatwierdza oba zapisy razem, a po commit woła invalidate_search_index().
+    Błąd indeksowania cofa tylko savepoint dokumentu i nie przerywa zapisu
+    artykułu - dokument zostanie odtworzony przy następnej edycji lub przez
+    flask rebuild-help-index.
+    """
+    from .search_service import strip_html_tags
+
+    # Błąd zapisu samego artykułu obsługuje wywołujący
+    db.session.flush()
+    try:
+        _TABLES.ensure()
+        with db.session.begin_nested():
+            values = _document_values(article, strip_html_tags)
+            document = db.session.get(HelpSearchDocument, article.id)
+            if document is None:
+                db.session.add(HelpSearchDocument(article_id=article.id, **values))
+            else:
+                for key, value in values.items():
+                    setattr(document, key, value)
+    except Exception as e:
+        print(f"[Help] Błąd indeksowania artykułu {article.id}: {e}", file=sys.stderr)
+
+
+def remove_article(article_id):
+    """Usuwa dokument indeksu usuniętego artykułu (w transakcji usunięcia, jak index_article)"""
+    try:
+        _TABLES.ensure()
+        with db.session.begin_nested():
+            HelpSearchDocument.query.filter_by(article_id=article_id).delete()
+    except Exception as e:
+        print(f"[Help] Błąd usuwania artykułu {article_id} z indeksu: {e}", file=sys.stderr)
+
+
+def rebuild_search_documents():
+    """
+    Odtwarza help_search_documents ze wszystkich artykułów
+
+    Returns:
+        int: liczba zaindeksowanych artykułów
+    """
+    from .search_service import strip_html_tags
+
+    _TABLES.ensure()
+    HelpSearchDocument.query.delete()
+    articles = HelpArticle.query.all()
+    for article in articles:
+        db.session.add(HelpSearchDocument(article_id=article.id, **_document_values(article, strip_html_tags)))
+    db.session.commit()
+    invalidate_search_index()
+    return len(articles)
+
+
+def register_help_search_cli(app):
+    """Rejestruje komendę flask rebuild-help-index"""
+    import click
+    from flask.cli import with_appcontext
+
+    @app.cli.command('rebuild-help-index')
+    @with_appcontext
+    def rebuild_help_index_command():
+        """Przebudowuje indeks wyszukiwania artykułów Help"""
+        count = rebuild_search_documents()
+        click.echo(f"[rebuild-help-index] Zaindeksowano artykułów: {count}")
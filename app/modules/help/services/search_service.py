@@ -2,7 +2,7 @@
 Serwis wyszukiwania artykułów Help (full-text search)
 """
 from ..models import HelpArticle, HelpCategory
-from sqlalchemy import or_, func
+from .search_index import get_search_index
 import re
 from html import unescape
 from bs4 import BeautifulSoup
@@ -10,7 +10,7 @@ from bs4 import BeautifulSoup
 
 def search_articles(query, limit=20, published_only=True):
     """
-    Wyszukuje artykuły po tytule i treści
+    Wyszukuje artykuły po tytule i treści (indeks BM25, search_index.py)
     
     Args:
         query (str): Fraza do wyszukania
@@ -21,65 +21,42 @@ def search_articles(query, limit=20, published_only=True):
         list: Lista słowników z wynikami:
             {
                 'article': HelpArticle object,
-                'relevance': float (0-1),
+                'relevance': float (0-1, względem najlepszego wyniku),
                 'excerpt': str (fragment z podświetleniem),
-                'match_type': str ('title' | 'content' | 'both')
+                'match_type': str ('title' | 'content' | 'both'),
+                'score': float (BM25)
             }
     """
     if not query or not query.strip():
         return []
     
-    query = query.strip()
-    
-    # Bazowe query
-    base_query = HelpArticle.query
+    hits = get_search_index().search(query.strip(), limit=limit, published_only=published_only)
+    if not hits:
+        return []
     
+    # Jedno zapytanie po obiekty artykułów (kolejność z rankingu)
+    articles = {
+        article.id: article
+        for article in HelpArticle.query.filter(HelpArticle.id.in_([hit[0] for hit in hits])).all()
+    }
     if published_only:
-        base_query = base_query.filter(HelpArticle.is_published == True)
-    
-    # Wyszukiwanie - LIKE dla kompatybilności (FULLTEXT wymaga MySQL z MyISAM/InnoDB z full-text index)
-    search_pattern = f"%{query}%"
+        articles = {article_id: article for article_id, article in articles.items() if article.is_published}
     
-    results = base_query.filter(
-        or_(
-            HelpArticle.title.ilike(search_pattern),
-            HelpArticle.content.ilike(search_pattern)
-        )
-    ).all()
-    
-    # Przetwarzanie wyników z oceną trafności
+    top_score = hits[0][1] or 1.0
     processed_results = []
-    
-    for article in results:
-        # Sprawdź gdzie wystąpiła fraza
-        title_match = query.lower() in article.title.lower()
-        content_match = query.lower() in strip_html_tags(article.content).lower()
-        
-        # Określ typ dopasowania
-        if title_match and content_match:
-            match_type = 'both'
-            relevance = 1.0
-        elif title_match:
-            match_type = 'title'
-            relevance = 0.9
-        else:
-            match_type = 'content'
-            relevance = 0.7
-        
-        # Wygeneruj excerpt (fragment z podświetleniem)
-        excerpt = generate_excerpt(article.content, query)
-        
+    for article_id, score, match_type, excerpt in hits:
+        article = articles.get(article_id)
+        if article is None:
+            continue
         processed_results.append({
             'article': article,
-            'relevance': relevance,
+            'relevance': round(score / top_score, 3),
             'excerpt': excerpt,
-            'match_type': match_type
+            'match_type': match_type,
+            'score': score
         })
     
-    # Sortuj po trafności (title match > content match)
-    processed_results.sort(key=lambda x: x['relevance'], reverse=True)
-    
-    return processed_results[:limit]
+    return processed_results
 
 
 def generate_excerpt(html_content, query, excerpt_length=200):
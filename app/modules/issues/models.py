@@ -13,6 +13,8 @@ Data: 2025-01-20
 
 from extensions import db
 from datetime import datetime
+from sqlalchemy import func, inspect, select, text
+import sys
 
 # ============================================================================
 # HELPER FUNCTION - Formatowanie dat
@@ -65,16 +67,26 @@ class Ticket(db.Model):
     
     # Daty
     created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow, index=True)
-    updated_at = db.Column(db.DateTime, nullable=True, onupdate=datetime.utcnow, index=True)
+    updated_at = db.Column(db.DateTime, nullable=True, default=datetime.utcnow, onupdate=datetime.utcnow, index=True)
     first_response_at = db.Column(db.DateTime, nullable=True)
     closed_at = db.Column(db.DateTime, nullable=True)
     
+    # Liczniki utrzymywane przez TicketService (lista ticketów bez ładowania wiadomości)
+    messages_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    attachments_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    last_message_at = db.Column(db.DateTime, nullable=True)
+    
     # Relacje
     created_by = db.relationship('User', foreign_keys=[created_by_user_id], backref='created_tickets')
     assigned_to = db.relationship('User', foreign_keys=[assigned_to_user_id], backref='assigned_tickets')
     messages = db.relationship('TicketMessage', back_populates='ticket', cascade='all, delete-orphan', order_by='TicketMessage.created_at')
     attachments = db.relationship('TicketAttachment', back_populates='ticket', cascade='all, delete-orphan')
     
+    # Paginacja keyset listy ticketów (updated_at DESC, id DESC)
+    __table_args__ = (
+        db.Index('ix_issues_tickets_updated_id', 'updated_at', 'id'),
+    )
+    
     def __repr__(self):
         return f"<Ticket #{self.ticket_number}: {self.title[:30]}>"
     
@@ -98,8 +110,9 @@ class Ticket(db.Model):
             'updated_at': format_datetime_utc(self.updated_at),  # ← ZMIENIONE
             'first_response_at': format_datetime_utc(self.first_response_at),  # ← ZMIENIONE
             'closed_at': format_datetime_utc(self.closed_at),  # ← ZMIENIONE
-            'messages_count': len(self.messages) if self.messages else 0,
-            'attachments_count': len(self.attachments) if self.attachments else 0,
+            'messages_count': self.messages_count or 0,
+            'attachments_count': self.attachments_count or 0,
+            'last_message_at': format_datetime_utc(self.last_message_at),
             'created_by': {
                 'id': self.created_by_user_id,
                 'email': self.created_by.email if self.created_by else None,
@@ -253,4 +266,84 @@ class TicketEvent(db.Model):
             'new_value': self.new_value,
             'extra_data': self.extra_data,
             'created_at': format_datetime_utc(self.created_at)  # ← ZMIENIONE
-        }
\ No newline at end of file
+        }
+
+
+# ============================================================================
+# LICZNIKI TICKETÓW - schemat i przeliczanie
+# ============================================================================
+
+# Kolumny dodane do istniejącej tabeli issues_tickets (brak systemu migracji)
+_TICKET_COUNTER_COLUMNS = ('messages_count', 'attachments_count', 'last_message_at')
+
+
+def recalculate_ticket_counters(ticket_ids=None):
+    """
+    Przelicza liczniki ticketów z tabel wiadomości i załączników
+    
+    Args:
+        ticket_ids: Lista ID ticketów (None = wszystkie)
+    """
+    tickets = Ticket.__table__
+    messages = TicketMessage.__table__
+    attachments = TicketAttachment.__table__
+    
+    stmt = tickets.update().values(
+        messages_count=select(func.count(messages.c.id))
+            .where(messages.c.ticket_id == tickets.c.id).scalar_subquery(),
+        attachments_count=select(func.count(attachments.c.id))
+            .where(attachments.c.ticket_id == tickets.c.id).scalar_subquery(),
+        last_message_at=select(func.max(messages.c.created_at))
+            .where(messages.c.ticket_id == tickets.c.id).scalar_subquery(),
+        # Wartość bieżąca - bez tego onupdate nadpisałby updated_at
+        updated_at=tickets.c.updated_at
+    )
+    if ticket_ids is not None:
+        stmt = stmt.where(tickets.c.id.in_(list(ticket_ids)))
+    
+    with db.engine.begin() as conn:
+        conn.execute(stmt)
+
+
+def ensure_ticket_counter_columns():
+    """
+    Dodaje kolumny liczników i indeks keyset do istniejącej tabeli
+    issues_tickets oraz wypełnia je (jednorazowo, przy starcie aplikacji)
+    """
+    try:
+        inspector = inspect(db.engine)
+        if not inspector.has_table(Ticket.__tablename__):
+            return
+        
+        existing = {column['name'] for column in inspector.get_columns(Ticket.__tablename__)}
+        missing = [name for name in _TICKET_COUNTER_COLUMNS if name not in existing]
+        indexes = {index['name'] for index in inspector.get_indexes(Ticket.__tablename__)}
+        if not missing and 'ix_issues_tickets_updated_id' in indexes:
+            return
+        
+        dialect = db.engine.dialect
+        with db.engine.begin() as conn:
+            for name in missing:
+                column = Ticket.__table__.c[name]
+                ddl = f"ALTER TABLE {Ticket.__tablename__} ADD COLUMN {name} {column.type.compile(dialect=dialect)}"
+                if column.server_default is not None:
+                    ddl += f" NOT NULL DEFAULT {column.server_default.arg}"
+                conn.execute(text(ddl))
+            
+            # Tickety bez aktualizacji - updated_at = created_at (klucz sortowania listy)
+            conn.execute(text(
+                f"UPDATE {Ticket.__tablename__} SET updated_at = created_at WHERE updated_at IS NULL"
+            ))
+        
+        if 'ix_issues_tickets_updated_id' not in indexes:
+            for index in Ticket.__table__.indexes:
+                if index.name == 'ix_issues_tickets_updated_id':
+                    index.create(bind=db.engine)
+        
+        if missing:
+            recalculate_ticket_counters()
+        
+        print(f"[Issues] Dodano liczniki ticketów: {', '.join(missing) or 'indeks keyset'}", file=sys.stderr)
+    
+    except Exception as e:
+        print(f"[Issues] Błąd aktualizacji schematu issues_tickets: {e}", file=sys.stderr)
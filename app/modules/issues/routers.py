@@ -17,6 +17,7 @@ from modules.logging import get_logger
 from .services import TicketService, AttachmentService, NotificationService
 from .models import Ticket, TicketMessage, TicketAttachment, TicketEvent
 from extensions import db
+from query_profiler import query_budget
 import os
 
 # Logger
@@ -62,6 +63,7 @@ def ticket_detail(ticket_number):
 # ============================================================================
 
 @issues_bp.route('/api/tickets', methods=['GET'])
+@query_budget(6)
 @require_module_access('issues')
 def api_get_tickets():
     """
@@ -69,14 +71,16 @@ def api_get_tickets():
     
     Query params:
         - status: filtrowanie po statusie (opcjonalne)
-        - limit: limit wyników (domyślnie 50)
-        - offset: offset dla paginacji
+        - limit: limit wyników (domyślnie 50, max 200)
+        - cursor: next_cursor z poprzedniej strony (paginacja keyset)
+        - offset: offset dla paginacji (zgodność wsteczna)
     
     Response:
         {
             "success": true,
             "tickets": [...],
-            "total": 10
+            "total": 10,           # tylko dla pierwszej strony
+            "next_cursor": "..."   # null = ostatnia strona
         }
     """
     try:
@@ -85,22 +89,31 @@ def api_get_tickets():
         
         # Parametry
         status = request.args.get('status')
-        limit = int(request.args.get('limit', 50))
+        limit = max(1, min(int(request.args.get('limit', 50)), 200))
         offset = int(request.args.get('offset', 0))
+        cursor = request.args.get('cursor') or None
         
         # Pobierz tickety
-        tickets_data = TicketService.get_user_tickets(
-            user_id=user_id,
-            is_admin=(user.role == 'admin'),
-            status=status,
-            limit=limit,
-            offset=offset
-        )
+        try:
+            tickets_data = TicketService.get_user_tickets(
+                user_id=user_id,
+                is_admin=(user.role == 'admin'),
+                status=status,
+                limit=limit,
+                offset=offset,
+                cursor=cursor
+            )
+        except ValueError as e:
+            return jsonify({
+                'success': False,
+                'error': str(e)
+            }), 400
         
         return jsonify({
             'success': True,
             'tickets': [t.to_dict() for t in tickets_data['tickets']],
-            'total': tickets_data['total']
+            'total': tickets_data['total'],
+            'next_cursor': tickets_data['next_cursor']
         })
     
     except Exception as e:
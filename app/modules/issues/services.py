@@ -19,7 +19,10 @@ from flask_mail import Message
 from .models import Ticket, TicketMessage, TicketAttachment, TicketEvent
 from .utils import generate_ticket_number
 from datetime import datetime
+from sqlalchemy import and_, or_
+from sqlalchemy.orm import joinedload
 from werkzeug.utils import secure_filename
+import base64
 import os
 import uuid
 
@@ -88,6 +91,10 @@ class TicketService:
             )
             db.session.add(message)
             db.session.flush()
+            
+            # Liczniki ticketu
+            ticket.messages_count = 1
+            ticket.last_message_at = message.created_at
         
             # Przypisz załączniki
             if attachment_ids:
@@ -100,6 +107,7 @@ class TicketService:
                         if attachment.user_id == user_id:
                             attachment.ticket_id = ticket.id
                             attachment.message_id = message.id
+                            ticket.attachments_count += 1
                             logger.info(f"📎 Przypisano: ticket_id={ticket.id}, message_id={message.id}")
                             # Przenieś plik z temp do folderu ticketu
                             AttachmentService.move_attachment_to_ticket(att_id, ticket_number)
@@ -163,8 +171,10 @@ class TicketService:
             db.session.add(message)
             db.session.flush()
             
-            # Aktualizuj updated_at ticketu
+            # Aktualizuj updated_at i liczniki ticketu (inkrementacja w SQL - równoległe odpowiedzi)
             ticket.updated_at = datetime.utcnow()
+            ticket.messages_count = Ticket.messages_count + 1
+            ticket.last_message_at = message.created_at
             
             # Jeśli admin wysyła odpowiedź, automatycznie przypisz go do ticketa
             if user.role == 'admin' and not ticket.assigned_to_user_id:
@@ -201,13 +211,19 @@ class TicketService:
             
             # Przypisz załączniki
             if attachment_ids:
+                attached_count = 0
                 for att_id in attachment_ids[:5]:
                     attachment = TicketAttachment.query.get(att_id)
                     if attachment and attachment.user_id == user_id:
+                        if attachment.ticket_id != ticket_id:
+                            attached_count += 1
                         attachment.message_id = message.id
                         attachment.ticket_id = ticket_id
                         # Przenieś plik z temp do folderu ticketu
                         AttachmentService.move_attachment_to_ticket(att_id, ticket.ticket_number)
+                
+                if attached_count:
+                    ticket.attachments_count = Ticket.attachments_count + attached_count
             
             db.session.commit()
             
@@ -347,21 +363,46 @@ class TicketService:
             logger.error(f"Błąd przypisywania ticketu: {e}")
             raise
     
+    @staticmethod
+    def encode_cursor(ticket: Ticket) -> str:
+        """Kursor keyset (updated_at, id) ostatniego ticketu na stronie"""
+        raw = f"{(ticket.updated_at or ticket.created_at).isoformat()}|{ticket.id}"
+        return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+    
+    @staticmethod
+    def decode_cursor(cursor: str) -> tuple:
+        """
+        Raises:
+            ValueError: Nieprawidłowy kursor
+        """
+        try:
+            raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+            updated_at, ticket_id = raw.split('|', 1)
+            return datetime.fromisoformat(updated_at), int(ticket_id)
+        except Exception:
+            raise ValueError("Nieprawidłowy kursor paginacji")
+    
     @staticmethod
     def get_user_tickets(user_id: int, is_admin: bool = False, 
-                        status: str = None, limit: int = 50, offset: int = 0) -> dict:
+                        status: str = None, limit: int = 50, offset: int = 0,
+                        cursor: str = None, with_total: bool = None) -> dict:
         """
         Pobiera tickety użytkownika
         
+        Paginacja keyset po (updated_at DESC, id DESC): kolejna strona przez
+        cursor z poprzedniej odpowiedzi. offset obsługiwany dla zgodności.
+        
         Args:
             user_id: ID użytkownika
             is_admin: Czy użytkownik jest adminem
             status: Filtr po statusie
             limit: Limit wyników
-            offset: Offset dla paginacji
+            offset: Offset dla paginacji (gdy brak cursor)
+            cursor: Kursor z next_cursor poprzedniej strony
+            with_total: Czy liczyć total (domyślnie tylko dla pierwszej strony)
         
         Returns:
-            dict: {'tickets': [...], 'total': int}
+            dict: {'tickets': [...], 'total': int|None, 'next_cursor': str|None}
         """
         try:
             # Admin widzi wszystkie, user tylko swoje
@@ -374,17 +415,41 @@ class TicketService:
             if status:
                 query = query.filter_by(status=status)
             
-            # Sortowanie
-            query = query.order_by(Ticket.updated_at.desc())
-            
-            total = query.count()
-            tickets = query.limit(limit).offset(offset).all()
+            if with_total is None:
+                with_total = not cursor and not offset
+            total = query.order_by(None).count() if with_total else None
+            
+            # Pozycja po ostatnim tickecie poprzedniej strony
+            if cursor:
+                cursor_updated_at, cursor_id = TicketService.decode_cursor(cursor)
+                query = query.filter(or_(
+                    Ticket.updated_at < cursor_updated_at,
+                    and_(Ticket.updated_at == cursor_updated_at, Ticket.id < cursor_id)
+                ))
+            
+            # Sortowanie + autorzy/przypisani w jednym zapytaniu (to_dict)
+            query = query.options(
+                joinedload(Ticket.created_by),
+                joinedload(Ticket.assigned_to)
+            ).order_by(Ticket.updated_at.desc(), Ticket.id.desc())
+            
+            if offset and not cursor:
+                query = query.offset(offset)
+            tickets = query.limit(limit + 1).all()
+            
+            next_cursor = None
+            if len(tickets) > limit:
+                tickets = tickets[:limit]
+                next_cursor = TicketService.encode_cursor(tickets[-1])
             
             return {
                 'tickets': tickets,
-                'total': total
+                'total': total,
+                'next_cursor': next_cursor
             }
         
+        except ValueError:
+            raise
         except Exception as e:
             logger.error(f"Błąd pobierania ticketów: {e}")
             raise
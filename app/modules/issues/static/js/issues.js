@@ -172,6 +172,7 @@ IssuesCommon.getTickets = async function (filters = {}) {
     if (filters.status) params.append('status', filters.status);
     if (filters.limit) params.append('limit', filters.limit);
     if (filters.offset) params.append('offset', filters.offset);
+    if (filters.cursor) params.append('cursor', filters.cursor);
 
     const url = `${IssuesCommon.config.apiBaseUrl}/tickets?${params.toString()}`;
     return await IssuesCommon.ajax('GET', url);
@@ -0,0 +1,57 @@
+# app/modules/jobs/__init__.py
+"""
+Moduł Jobs - zadania w tle
+==========================
+
+Długie operacje (ręczne synchronizacje Baselinker, zapis zamówień do raportów,
+przeliczanie priorytetów) uruchamiane są jako zadania w puli wątków zamiast
+w requeście HTTP.
+
+Features:
+- Trwałe rekordy zadań i zdarzeń (background_jobs, background_job_events)
+- Postęp i logi na żywo (polling po kursorze lub SSE)
+- Anulowanie zadania
+- Jedno aktywne zadanie danego typu naraz (blokada na poziomie bazy)
+"""
+
+from flask import Blueprint
+import os
+
+_current_dir = os.path.dirname(os.path.abspath(__file__))
+
+jobs_bp = Blueprint(
+    'jobs',
+    __name__,
+    static_folder=os.path.join(_current_dir, 'static'),
+    url_prefix='/jobs'
+)
+
+# Import routes na końcu aby uniknąć circular imports
+from . import routers
+from .routers import job_conflict_response, job_submitted_response
+
+from .models import BackgroundJob, BackgroundJobEvent
+from .runner import (
+    JobAlreadyRunning,
+    JobCancelled,
+    cancel_job,
+    check_job_cancelled,
+    current_job_context,
+    dispatch_job,
+    get_job,
+    get_job_events,
+    job_handler,
+    job_log,
+    job_progress,
+    list_jobs,
+    register_job_type,
+    run_queued_jobs,
+    submit_job,
+)
+
+__all__ = [
+    'jobs_bp', 'BackgroundJob', 'BackgroundJobEvent',
+    'JobAlreadyRunning', 'JobCancelled', 'cancel_job', 'check_job_cancelled', 'current_job_context',
+    'dispatch_job', 'get_job', 'get_job_events', 'job_handler', 'job_log', 'job_progress', 'list_jobs',
+    'register_job_type', 'run_queued_jobs', 'submit_job', 'job_conflict_response', 'job_submitted_response',
+]
@@ -0,0 +1,117 @@
+# app/modules/jobs/models.py
+"""
+Modele zadań w tle
+
+Modele:
+- BackgroundJob: zadanie (typ, parametry, stan, postęp, wynik)
+- BackgroundJobEvent: logi zadania - odczyt przyrostowy po id (kursor)
+"""
+
+from datetime import datetime
+
+from extensions import db
+
+
+def format_datetime_utc(dt):
+    """Datetime UTC z oznaczeniem strefy 'Z' (poprawna interpretacja w JS)"""
+    if dt is None:
+        return None
+    return dt.strftime('%Y-%m-%dT%H:%M:%S') + 'Z'
+
+
+class BackgroundJob(db.Model):
+    """
+    Zadanie w tle
+
+    active_key = klucz blokady (domyślnie job_type) dopóki zadanie jest
+    w kolejce lub trwa (NULL po zakończeniu) - unikalny indeks gwarantuje
+    jedno aktywne zadanie danego typu także przy kilku procesach aplikacji.
+    """
+    __tablename__ = 'background_jobs'
+
+    STATUS_QUEUED = 'queued'
+    STATUS_RUNNING = 'running'
+    STATUS_SUCCEEDED = 'succeeded'
+    STATUS_FAILED = 'failed'
+    STATUS_CANCELLED = 'cancelled'
+
+    ACTIVE_STATUSES = (STATUS_QUEUED, STATUS_RUNNING)
+
+    id = db.Column(db.String(32), primary_key=True)
+    job_type = db.Column(db.String(64), nullable=False, index=True)
+    title = db.Column(db.String(200))
+    active_key = db.Column(db.String(64), unique=True)
+
+    status = db.Column(db.String(20), nullable=False, default=STATUS_QUEUED, index=True)
+    params = db.Column(db.JSON)
+    result = db.Column(db.JSON)
+    error = db.Column(db.Text)
+
+    progress_current = db.Column(db.Integer, nullable=False, default=0)
+    progress_total = db.Column(db.Integer)
+    progress_message = db.Column(db.String(255))
+    cancel_requested = db.Column(db.Boolean, nullable=False, default=False)
+
+    created_by = db.Column(db.Integer)
+    worker = db.Column(db.String(100))
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    heartbeat_at = db.Column(db.DateTime)
+
+    def __repr__(self):
+        return f'<BackgroundJob {self.job_type} {self.id}: {self.status}>'
+
+    @property
+    def is_active(self):
+        return self.status in self.ACTIVE_STATUSES
+
+    def to_dict(self, include_result=True):
+        data = {
+            'id': self.id,
+            'job_type': self.job_type,
+            'title': self.title,
+            'status': self.status,
+            'is_active': self.is_active,
+            'progress': {
+                'current': self.progress_current or 0,
+                'total': self.progress_total,
+                'percent': (round(100.0 * (self.progress_current or 0) / self.progress_total, 1)
+                            if self.progress_total else None),
+                'message': self.progress_message,
+            },
+            'cancel_requested': bool(self.cancel_requested),
+            'error': self.error,
+            'created_by': self.created_by,
+            'created_at': format_datetime_utc(self.created_at),
+            'started_at': format_datetime_utc(self.started_at),
+            'finished_at': format_datetime_utc(self.finished_at),
+        }
+        if include_result:
+            data['result'] = self.result
+        return data
+
+
+class BackgroundJobEvent(db.Model):
+    """Wpis logu zadania"""
+    __tablename__ = 'background_job_events'
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(32), nullable=False)
+    level = db.Column(db.String(10), nullable=False, default='info')
+    message = db.Column(db.Text, nullable=False)
+    context = db.Column(db.JSON)
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.Index('ix_background_job_events_job_id_id', 'job_id', 'id'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'level': self.level,
+            'message': self.message,
+            'context': self.context,
+            'timestamp': format_datetime_utc(self.created_at),
+        }
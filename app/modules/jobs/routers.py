@@ -0,0 +1,167 @@
+# app/modules/jobs/routers.py
+"""
+API zadań w tle
+
+- GET  /jobs/api/<job_id>                  - stan zadania
+- GET  /jobs/api/<job_id>/events?after=N   - nowe logi po kursorze + stan
+- GET  /jobs/api/<job_id>/stream           - to samo jako Server-Sent Events
+- POST /jobs/api/<job_id>/cancel           - anulowanie
+- GET  /jobs/api/list?type=...&active=1    - ostatnie zadania (np. powrót do
+                                             trwającego zadania po odświeżeniu)
+
+Zadanie widzi i anuluje tylko użytkownik, który je uruchomił, oraz admini
+(zadania systemowe bez created_by - tylko admini).
+"""
+
+import json
+import time
+
+from flask import Response, jsonify, request, stream_with_context
+from flask_login import current_user, login_required
+
+from extensions import db
+from modules.logging import get_structured_logger
+from . import jobs_bp
+from .runner import cancel_job, get_job, get_job_events, list_jobs
+
+logger = get_structured_logger('jobs.routers')
+
+# Po tylu sekundach strumień SSE jest zamykany - EventSource łączy się
+# ponownie z Last-Event-ID (nie blokuje workera Passengera na długo)
+SSE_MAX_SECONDS = 55
+SSE_POLL_SECONDS = 1.0
+
+MAX_EVENTS_PER_REQUEST = 500
+
+
+def _job_not_found():
+    return jsonify({'success': False, 'error': 'Nie znaleziono zadania'}), 404
+
+
+def _owner_filter():
+    """None dla adminów (wszystkie zadania), w pozostałych przypadkach id zalogowanego użytkownika"""
+    return None if current_user.is_admin() else current_user.id
+
+
+def _get_accessible_job(job_id):
+    """Zadanie, jeśli bieżący użytkownik może je oglądać; cudze zadania jak nieistniejące"""
+    job = get_job(job_id)
+    if job is None:
+        return None
+    owner = _owner_filter()
+    if owner is not None and job.created_by != owner:
+        return None
+    return job
+
+
+@jobs_bp.route('/api/<job_id>', methods=['GET'])
+@login_required
+def api_job(job_id):
+    job = _get_accessible_job(job_id)
+    if job is None:
+        return _job_not_found()
+    return jsonify({'success': True, 'job': job.to_dict()})
+
+
+@jobs_bp.route('/api/<job_id>/events', methods=['GET'])
+@login_required
+def api_job_events(job_id):
+    job = _get_accessible_job(job_id)
+    if job is None:
+        return _job_not_found()
+
+    after = request.args.get('after', 0, type=int)
+    limit = min(request.args.get('limit', 200, type=int), MAX_EVENTS_PER_REQUEST)
+    events = get_job_events(job_id, after_id=after, limit=limit)
+
+    return jsonify({
+        'success': True,
+        'job': job.to_dict(include_result=not job.is_active),
+        'events': [event.to_dict() for event in events],
+        'next_cursor': events[-1].id if events else after,
+        'has_more': len(events) == limit
+    })
+
+
+@jobs_bp.route('/api/<job_id>/stream', methods=['GET'])
+@login_required
+def api_job_stream(job_id):
+    if _get_accessible_job(job_id) is None:
+        return _job_not_found()
+
+    after = request.headers.get('Last-Event-ID', type=int) or request.args.get('after', 0, type=int)
+
+    def generate(cursor):
+        deadline = time.monotonic() + SSE_MAX_SECONDS
+        last_state = None
+        yield 'retry: 2000\n\n'
+        while True:
+            # Nowa transakcja w każdej iteracji - inaczej (REPEATABLE READ) brak nowych wierszy
+            db.session.rollback()
+
+            for event in get_job_events(job_id, after_id=cursor, limit=MAX_EVENTS_PER_REQUEST):
+                cursor = event.id
+                yield f"id: {event.id}\nevent: log\ndata: {json.dumps(event.to_dict())}\n\n"
+
+            job = get_job(job_id)
+            state = job.to_dict(include_result=not job.is_active)
+            if state != last_state:
+                last_state = state
+                yield f"event: job\ndata: {json.dumps(state)}\n\n"
+
+            if not job.is_active:
+                yield "event: done\ndata: {}\n\n"
+                return
+            if time.monotonic() > deadline:
+                return
+            time.sleep(SSE_POLL_SECONDS)
+
+    response = Response(stream_with_context(generate(after)), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@jobs_bp.route('/api/<job_id>/cancel', methods=['POST'])
+@login_required
+def api_job_cancel(job_id):
+    if _get_accessible_job(job_id) is None:
+        return _job_not_found()
+    job = cancel_job(job_id)
+
+    logger.info("Anulowanie zadania w tle", job_id=job_id, status=job.status)
+    return jsonify({'success': True, 'job': job.to_dict(include_result=False)})
+
+
+@jobs_bp.route('/api/list', methods=['GET'])
+@login_required
+def api_job_list():
+    jobs = list_jobs(
+        job_type=request.args.get('type') or None,
+        active_only=request.args.get('active') in ('1', 'true'),
+        limit=min(request.args.get('limit', 20, type=int), 100),
+        created_by=_owner_filter()
+    )
+    return jsonify({'success': True, 'jobs': [job.to_dict(include_result=False) for job in jobs]})
+
+
+def job_submitted_response(job, message='Zadanie uruchomione w tle'):
+    """Odpowiedź 202 endpointów uruchamiających zadania"""
+    return jsonify({
+        'success': True,
+        'message': message,
+        'job_id': job.id,
+        'job': job.to_dict(include_result=False),
+        'events_url': f'/jobs/api/{job.id}/events',
+        'stream_url': f'/jobs/api/{job.id}/stream'
+    }), 202
+
+
+def job_conflict_response(exc):
+    """Odpowiedź 409 przy aktywnym zadaniu tego samego typu"""
+    return jsonify({
+        'success': False,
+        'error': 'Zadanie tego typu jest już w toku',
+        'job_id': exc.job.id if exc.job else None,
+        'job': exc.job.to_dict(include_result=False) if exc.job else None
+    }), 409
@@ -0,0 +1,495 @@
+# app/modules/jobs/runner.py
+"""
+Wykonywanie zadań w tle
+=======================
+
+- rejestr typów zadań: register_job_type() / @job_handler - handler dostaje
+  słownik parametrów i zwraca wynik (dict zapisywany jako JSON),
+- submit_job() zapisuje rekord i przekazuje zadanie do puli wątków procesu;
+  dla typów single_instance drugi submit przy aktywnym zadaniu rzuca
+  JobAlreadyRunning (unikalny active_key w bazie),
+- submit_job(defer=True) tylko zapisuje rekord - zadanie wykonuje inny
+  proces przez run_queued_jobs() (np. scheduler_daemon dla zadań, które nie
+  powinny działać w workerze aplikacji) albo ten sam przez dispatch_job(),
+- w trakcie zadania kod serwisów raportuje przez job_log(), job_progress()
+  i sprawdza anulowanie przez check_job_cancelled() - poza zadaniem te
+  funkcje nic nie robią, więc serwisy działają też z CLI/crona,
+- logi i postęp zapisywane są osobnym połączeniem (autocommit), więc są
+  widoczne dla UI od razu, niezależnie od transakcji handlera,
+- zadania bez sygnału procesu (restart Passengera) oznaczane są jako
+  nieudane przy kolejnym submit tego typu.
+"""
+
+import json
+import os
+import socket
+import sys
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from sqlalchemy import insert, select, update
+from sqlalchemy.exc import IntegrityError
+
+from extensions import db
+from lazy_tables import LazyTables
+from modules.logging import get_structured_logger
+from .models import BackgroundJob, BackgroundJobEvent
+
+logger = get_structured_logger('jobs.runner')
+
+# Liczba równoległych zadań w jednym procesie
+DEFAULT_JOB_WORKERS = 2
+
+# Co ile sekund proces potwierdza, że zadanie trwa
+HEARTBEAT_SECONDS = 30
+
+# Zadanie bez sygnału dłużej niż to uznawane jest za przerwane
+STALE_AFTER_SECONDS = 10 * 60
+
+# Minimalny odstęp zapisów postępu i odczytów flagi anulowania
+PROGRESS_MIN_INTERVAL = 0.5
+CANCEL_CHECK_INTERVAL = 1.0
+
+MAX_EVENT_MESSAGE_LENGTH = 2000
+
+JobType = namedtuple('JobType', ['handler', 'title', 'lock_key'])
+
+_job_types: Dict[str, JobType] = {}
+
+
+_TABLES = LazyTables(BackgroundJob, BackgroundJobEvent)
+_executor = None
+_executor_lock = threading.Lock()
+
+_running_jobs = set()
+_running_lock = threading.Lock()
+_heartbeat_thread = None
+
+_local = threading.local()
+
+
+class JobAlreadyRunning(Exception):
+    """Zadanie tego typu jest już w kolejce lub trwa"""
+
+    def __init__(self, job: Optional[BackgroundJob]):
+        self.job = job
+        super().__init__("Zadanie tego typu jest już w toku")
+
+
+class JobCancelled(Exception):
+    """Zadanie anulowane przez użytkownika"""
+
+
+def _json_safe(value):
+    """Wynik/kontekst do zapisu w kolumnie JSON (daty, Decimal -> str)"""
+    if value is None:
+        return None
+    return json.loads(json.dumps(value, default=str))
+
+
+# ============================================================================
+# REJESTR TYPÓW ZADAŃ
+# ============================================================================
+
+def register_job_type(job_type: str, handler: Callable[[Dict[str, Any]], Any],
+                      title: Optional[str] = None, single_instance: bool = True,
+                      lock_key: Optional[str] = None):
+    """
+    Rejestruje handler typu zadania
+
+    Args:
+        single_instance: jedno aktywne zadanie naraz
+        lock_key: wspólna blokada kilku typów (domyślnie job_type)
+    """
+    key = (lock_key or job_type) if single_instance else None
+    _job_types[job_type] = JobType(handler, title or job_type, key)
+
+
+def job_handler(job_type: str, title: Optional[str] = None, single_instance: bool = True,
+                lock_key: Optional[str] = None):
+    """Dekorator: @job_handler('reports.sync', title='Synchronizacja raportów')"""
+
+    def decorator(func):
+        register_job_type(job_type, func, title=title, single_instance=single_instance,
+                          lock_key=lock_key)
+        return func
+
+    return decorator
+
+
+# ============================================================================
+# KONTEKST ZADANIA (logi, postęp, anulowanie)
+# ============================================================================
+
+class JobContext:
+    """Kontekst wykonywanego zadania - zapisy osobnym połączeniem"""
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self._last_progress_at = 0.0
+        self._last_cancel_check_at = 0.0
+        self._cancelled = False
+
+    def log(self, message: str, level: str = 'info', **context):
+        with db.engine.begin() as conn:
+            conn.execute(insert(BackgroundJobEvent.__table__).values(
+                job_id=self.job_id,
+                level=level,
+                message=str(message)[:MAX_EVENT_MESSAGE_LENGTH],
+                context=_json_safe(context) if context else None,
+                created_at=datetime.utcnow()
+            ))
+
+    def progress(self, current: int, total: Optional[int] = None, message: Optional[str] = None):
+        now = time.monotonic()
+        is_final = total is not None and current >= total
+        if not is_final and now - self._last_progress_at < PROGRESS_MIN_INTERVAL:
+            return
+        self._last_progress_at = now
+
+        values = {'progress_current': int(current), 'heartbeat_at': datetime.utcnow()}
+        if total is not None:
+            values['progress_total'] = int(total)
+        if message is not None:
+            values['progress_message'] = str(message)[:255]
+        with db.engine.begin() as conn:
+            conn.execute(update(BackgroundJob.__table__)
+                         .where(BackgroundJob.__table__.c.id == self.job_id)
+                         .values(**values))
+
+    def check_cancelled(self):
+        if not self._cancelled:
+            now = time.monotonic()
+            if now - self._last_cancel_check_at < CANCEL_CHECK_INTERVAL:
+                return
+            self._last_cancel_check_at = now
+            with db.engine.connect() as conn:
+                self._cancelled = bool(conn.execute(
+                    BackgroundJob.__table__.select()
+                    .with_only_columns(BackgroundJob.__table__.c.cancel_requested)
+                    .where(BackgroundJob.__table__.c.id == self.job_id)
+                ).scalar())
+        if self._cancelled:
+            raise JobCancelled()
+
+
+def current_job_context() -> Optional[JobContext]:
+    return getattr(_local, 'context', None)
+
+
+def job_log(message: str, level: str = 'info', **context):
+    """Log zadania widoczny w UI (poza zadaniem - nic nie robi)"""
+    ctx = current_job_context()
+    if ctx is None:
+        return
+    try:
+        ctx.log(message, level, **context)
+    except Exception as e:
+        print(f"[Jobs] Błąd zapisu logu zadania {ctx.job_id}: {e}", file=sys.stderr)
+
+
+def job_progress(current: int, total: Optional[int] = None, message: Optional[str] = None):
+    """Postęp zadania (poza zadaniem - nic nie robi)"""
+    ctx = current_job_context()
+    if ctx is None:
+        return
+    try:
+        ctx.progress(current, total, message)
+    except Exception as e:
+        print(f"[Jobs] Błąd zapisu postępu zadania {ctx.job_id}: {e}", file=sys.stderr)
+
+
+def check_job_cancelled():
+    """Rzuca JobCancelled, gdy użytkownik anulował bieżące zadanie"""
+    ctx = current_job_context()
+    if ctx is not None:
+        ctx.check_cancelled()
+
+
+# ============================================================================
+# WYKONANIE
+# ============================================================================
+
+def _worker_name() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _get_executor(app) -> ThreadPoolExecutor:
+    global _executor
+
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                workers = int(app.config.get('JOB_WORKERS', DEFAULT_JOB_WORKERS))
+                _executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='job')
+    return _executor
+
+
+def _heartbeat_loop(app):
+    while True:
+        time.sleep(HEARTBEAT_SECONDS)
+        with _running_lock:
+            job_ids = list(_running_jobs)
+        if not job_ids:
+            continue
+        try:
+            with app.app_context():
+                with db.engine.begin() as conn:
+                    conn.execute(update(BackgroundJob.__table__)
+                                 .where(BackgroundJob.__table__.c.id.in_(job_ids))
+                                 .values(heartbeat_at=datetime.utcnow()))
+        except Exception as e:
+            print(f"[Jobs] Błąd heartbeat zadań: {e}", file=sys.stderr)
+
+
+def _ensure_heartbeat(app):
+    global _heartbeat_thread
+
+    with _running_lock:
+        if _heartbeat_thread is None or not _heartbeat_thread.is_alive():
+            _heartbeat_thread = threading.Thread(target=_heartbeat_loop, args=(app,),
+                                                 name='job-heartbeat', daemon=True)
+            _heartbeat_thread.start()
+
+
+def _finish(job_id: str, status: str, result=None, error: Optional[str] = None):
+    table = BackgroundJob.__table__
+    values = {
+        'status': status,
+        'result': _json_safe(result),
+        'error': error,
+        'active_key': None,
+        'finished_at': datetime.utcnow(),
+        'heartbeat_at': datetime.utcnow(),
+    }
+    if status == BackgroundJob.STATUS_SUCCEEDED:
+        values['progress_current'] = db.func.coalesce(table.c.progress_total, table.c.progress_current)
+    with db.engine.begin() as conn:
+        conn.execute(update(table).where(table.c.id == job_id).values(**values))
+
+
+def _execute(app, job_id: str):
+    with app.app_context():
+        table = BackgroundJob.__table__
+        with db.engine.begin() as conn:
+            claimed = conn.execute(update(table)
+                                   .where(table.c.id == job_id, table.c.status == BackgroundJob.STATUS_QUEUED)
+                                   .values(status=BackgroundJob.STATUS_RUNNING,
+                                           started_at=datetime.utcnow(),
+                                           heartbeat_at=datetime.utcnow(),
+                                           worker=_worker_name())).rowcount
+        if not claimed:
+            # Anulowane przed startem
+            return
+
+        job = db.session.get(BackgroundJob, job_id)
+        spec = _job_types.get(job.job_type)
+        params = dict(job.params or {})
+        db.session.remove()
+
+        ctx = JobContext(job_id)
+        _local.context = ctx
+        with _running_lock:
+            _running_jobs.add(job_id)
+        started = time.perf_counter()
+
+        status, result, error = BackgroundJob.STATUS_FAILED, None, None
+        try:
+            if spec is None:
+                raise RuntimeError(f"Nieznany typ zadania: {job.job_type}")
+            ctx.log(f"Start zadania: {spec.title}")
+            result = spec.handler(params)
+            if isinstance(result, dict) and result.get('success') is False:
+                error = str(result.get('error') or 'Zadanie zakończone niepowodzeniem')
+            else:
+                status = BackgroundJob.STATUS_SUCCEEDED
+            ctx.log(f"Zakończono zadanie ({round(time.perf_counter() - started, 1)} s)",
+                    'info' if status == BackgroundJob.STATUS_SUCCEEDED else 'error')
+        except JobCancelled:
+            status = BackgroundJob.STATUS_CANCELLED
+            ctx.log("Zadanie anulowane", 'warning')
+        except Exception as e:
+            error = str(e)
+            logger.error("Błąd zadania w tle", job_id=job_id, job_type=job.job_type, error=error)
+            try:
+                ctx.log(f"Błąd: {error}", 'error')
+            except Exception:
+                pass
+        finally:
+            _local.context = None
+            with _running_lock:
+                _running_jobs.discard(job_id)
+            try:
+                db.session.rollback()
+                _finish(job_id, status, result=result, error=error)
+            except Exception as e:
+                print(f"[Jobs] Błąd zapisu wyniku zadania {job_id}: {e}", file=sys.stderr)
+            finally:
+                db.session.remove()
+
+
+def _expire_stale_jobs(lock_key: str):
+    """Zadania porzucone przez zatrzymany proces zwalniają blokadę"""
+    cutoff = datetime.utcnow() - timedelta(seconds=STALE_AFTER_SECONDS)
+    table = BackgroundJob.__table__
+    with db.engine.begin() as conn:
+        conn.execute(update(table)
+                     .where(table.c.active_key == lock_key,
+                            table.c.status.in_(BackgroundJob.ACTIVE_STATUSES),
+                            db.func.coalesce(table.c.heartbeat_at, table.c.created_at) < cutoff)
+                     .values(status=BackgroundJob.STATUS_FAILED,
+                             error='Zadanie przerwane (brak sygnału procesu)',
+                             active_key=None,
+                             finished_at=datetime.utcnow()))
+
+
+def submit_job(job_type: str, params: Optional[Dict[str, Any]] = None,
+               user_id: Optional[int] = None, title: Optional[str] = None, app=None,
+               defer: bool = False) -> BackgroundJob:
+    """
+    Zapisuje zadanie i uruchamia je w puli wątków procesu
+
+    Args:
+        defer: Tylko zapis - zadanie zostaje w kolejce dla run_queued_jobs()
+            lub dispatch_job()
+
+    Raises:
+        ValueError: nieznany typ zadania
+        JobAlreadyRunning: aktywne zadanie z tą samą blokadą (single_instance)
+    """
+    spec = _job_types.get(job_type)
+    if spec is None:
+        raise ValueError(f"Nieznany typ zadania: {job_type}")
+
+    if app is None:
+        from flask import current_app
+        app = current_app._get_current_object()
+
+    _TABLES.ensure()
+    if spec.lock_key:
+        _expire_stale_jobs(spec.lock_key)
+
+    job = BackgroundJob(
+        id=uuid.uuid4().hex,
+        job_type=job_type,
+        title=title or spec.title,
+        active_key=spec.lock_key,
+        status=BackgroundJob.STATUS_QUEUED,
+        params=_json_safe(params or {}),
+        created_by=user_id,
+        created_at=datetime.utcnow()
+    )
+    db.session.add(job)
+    try:
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        raise JobAlreadyRunning(BackgroundJob.query.filter_by(active_key=spec.lock_key).first())
+
+    logger.info("Zakolejkowano zadanie w tle", job_id=job.id, job_type=job_type, user_id=user_id,
+                deferred=defer)
+
+    if not defer:
+        dispatch_job(job.id, app=app)
+    return job
+
+
+def dispatch_job(job_id: str, app=None):
+    """Przekazuje zakolejkowane zadanie do puli wątków tego procesu"""
+    if app is None:
+        from flask import current_app
+        app = current_app._get_current_object()
+
+    _ensure_heartbeat(app)
+    _get_executor(app).submit(_execute, app, job_id)
+
+
+def run_queued_jobs(job_types: List[str], app=None) -> int:
+    """
+    Wykonuje w bieżącym wątku zakolejkowane zadania podanych typów (od najstarszych)
+
+    Przejęcie zadania to warunkowy UPDATE w _execute - przy kilku procesach
+    każde zadanie wykona jeden. Zwraca liczbę sprawdzonych zadań.
+    """
+    if app is None:
+        from flask import current_app
+        app = current_app._get_current_object()
+
+    _TABLES.ensure()
+    table = BackgroundJob.__table__
+    with db.engine.connect() as conn:
+        job_ids = [row[0] for row in conn.execute(
+            select(table.c.id)
+            .where(table.c.job_type.in_(list(job_types)),
+                   table.c.status == BackgroundJob.STATUS_QUEUED)
+            .order_by(table.c.created_at)
+        )]
+
+    if job_ids:
+        _ensure_heartbeat(app)
+    for job_id in job_ids:
+        _execute(app, job_id)
+    return len(job_ids)
+
+
+# ============================================================================
+# ODCZYT I ANULOWANIE
+# ============================================================================
+
+def get_job(job_id: str) -> Optional[BackgroundJob]:
+    _TABLES.ensure()
+    return db.session.get(BackgroundJob, job_id)
+
+
+def get_job_events(job_id: str, after_id: int = 0, limit: int = 200) -> List[BackgroundJobEvent]:
+    """Zdarzenia zadania po kursorze (id ostatniego odebranego zdarzenia)"""
+    _TABLES.ensure()
+    return (BackgroundJobEvent.query
+            .filter(BackgroundJobEvent.job_id == job_id, BackgroundJobEvent.id > after_id)
+            .order_by(BackgroundJobEvent.id)
+            .limit(limit)
+            .all())
+
+
+def list_jobs(job_type: Optional[str] = None, active_only: bool = False, limit: int = 20,
+              created_by: Optional[int] = None) -> List[BackgroundJob]:
+    """Ostatnie zadania (created_by - tylko zadania uruchomione przez tego użytkownika)"""
+    _TABLES.ensure()
+    query = BackgroundJob.query
+    if job_type:
+        query = query.filter(BackgroundJob.job_type == job_type)
+    if created_by is not None:
+        query = query.filter(BackgroundJob.created_by == created_by)
+    if active_only:
+        query = query.filter(BackgroundJob.status.in_(BackgroundJob.ACTIVE_STATUSES))
+    return query.order_by(BackgroundJob.created_at.desc()).limit(limit).all()
+
+
+def cancel_job(job_id: str) -> Optional[BackgroundJob]:
+    """
+    Anuluje zadanie: z kolejki - od razu, trwające - flaga sprawdzana przez
+    handler w check_job_cancelled()
+    """
+    job = get_job(job_id)
+    if job is None or not job.is_active:
+        return job
+
+    table = BackgroundJob.__table__
+    with db.engine.begin() as conn:
+        dequeued = conn.execute(update(table)
+                                .where(table.c.id == job_id, table.c.status == BackgroundJob.STATUS_QUEUED)
+                                .values(status=BackgroundJob.STATUS_CANCELLED,
+                                        cancel_requested=True,
+                                        active_key=None,
+                                        finished_at=datetime.utcnow())).rowcount
+        if not dequeued:
+            conn.execute(update(table).where(table.c.id == job_id).values(cancel_requested=True))
+
+    JobContext(job_id).log("Anulowano przed startem" if dequeued else "Zgłoszono anulowanie", 'warning')
+    db.session.expire(job)
+    return job
@@ -0,0 +1,125 @@
+/**
+ * job-progress.js
+ * Śledzenie zadań w tle (modules/jobs) - polling logów po kursorze
+ *
+ * Użycie:
+ *   const result = await JobProgress.run('/reports/api/sync', payload, {
+ *       onEvent: (event) => console.log(event.message),
+ *       onProgress: (job) => console.log(job.progress.percent)
+ *   });
+ *
+ * run() wysyła POST; gdy endpoint odpowie 202 z job_id - czeka na koniec
+ * zadania i zwraca jego wynik (ten sam JSON, który endpoint zwracał
+ * wcześniej synchronicznie). Inna odpowiedź zwracana jest bez zmian.
+ */
+
+(function (window) {
+    'use strict';
+
+    const POLL_INTERVAL_MS = 1000;
+    const MAX_POLL_INTERVAL_MS = 5000;
+
+    function delay(ms) {
+        return new Promise(resolve => setTimeout(resolve, ms));
+    }
+
+    async function fetchJson(url, options = {}) {
+        const response = await fetch(url, {
+            credentials: 'same-origin',
+            headers: { 'Accept': 'application/json', ...(options.headers || {}) },
+            ...options
+        });
+        const data = await response.json().catch(() => ({}));
+        return { response, data };
+    }
+
+    /**
+     * Czeka na zakończenie zadania; zwraca końcowy stan zadania (z result)
+     */
+    async function wait(jobId, options = {}) {
+        const onEvent = options.onEvent || (() => {});
+        const onProgress = options.onProgress || (() => {});
+        let cursor = 0;
+        let interval = options.intervalMs || POLL_INTERVAL_MS;
+        let failures = 0;
+
+        while (true) {
+            let payload;
+            try {
+                const { response, data } = await fetchJson(`/jobs/api/${jobId}/events?after=${cursor}`);
+                if (!response.ok) {
+                    throw new Error(data.error || `HTTP ${response.status}`);
+                }
+                payload = data;
+                failures = 0;
+            } catch (error) {
+                // Chwilowy brak połączenia - ponawiaj z rosnącym odstępem
+                failures += 1;
+                if (failures > 10) {
+                    throw error;
+                }
+                await delay(Math.min(interval * failures, MAX_POLL_INTERVAL_MS));
+                continue;
+            }
+
+            (payload.events || []).forEach(event => onEvent(event));
+            cursor = payload.next_cursor || cursor;
+            onProgress(payload.job);
+
+            if (!payload.job.is_active && !payload.has_more) {
+                return payload.job;
+            }
+            if (!payload.has_more) {
+                await delay(interval);
+            }
+        }
+    }
+
+    async function cancel(jobId) {
+        const { data } = await fetchJson(`/jobs/api/${jobId}/cancel`, { method: 'POST' });
+        return data;
+    }
+
+    /**
+     * POST do endpointu uruchamiającego zadanie i oczekiwanie na wynik
+     */
+    async function run(url, body, options = {}) {
+        const { response, data } = await fetchJson(url, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify(body || {})
+        });
+
+        if (response.status !== 202 || !data.job_id) {
+            if (!response.ok) {
+                const error = new Error(data.error || `HTTP ${response.status}`);
+                error.status = response.status;
+                error.data = data;
+                throw error;
+            }
+            return data;
+        }
+
+        if (options.onStart) {
+            options.onStart(data.job);
+        }
+
+        const job = await wait(data.job_id, options);
+
+        if (job.status === 'cancelled') {
+            const error = new Error('Zadanie anulowane');
+            error.cancelled = true;
+            throw error;
+        }
+        if (job.result) {
+            return job.result;
+        }
+        if (job.status !== 'succeeded') {
+            throw new Error(job.error || 'Zadanie zakończone niepowodzeniem');
+        }
+        return { success: true };
+    }
+
+    window.JobProgress = { run, wait, cancel };
+
+})(window);
@@ -7,6 +7,8 @@ from .logger import AppLogger, get_logger
 from .config import LogConfig
 from .routers import logging_bp
 from .structured_logger import StructuredLogger
+from .reader import LogReader
+from .index import LogIndex, get_log_index
 
 def get_structured_logger(module_name):
     """
@@ -21,4 +23,4 @@ def get_structured_logger(module_name):
     base_logger = AppLogger.get_logger(module_name)
     return StructuredLogger(base_logger)
 
-__all__ = ['AppLogger', 'get_logger', 'get_structured_logger', 'LogConfig', 'logging_bp', 'StructuredLogger']
\ No newline at end of file
+__all__ = ['AppLogger', 'get_logger', 'get_structured_logger', 'LogConfig', 'logging_bp', 'StructuredLogger', 'LogReader', 'LogIndex', 'get_log_index']
\ No newline at end of file
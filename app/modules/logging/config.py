@@ -28,6 +28,12 @@ class LogConfig:
     # Format timestampu
     TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
     
+    # Format zapisu do pliku: 'json' (JSON lines, UTF-8) lub 'text' (LOG_FORMAT)
+    FILE_OUTPUT_FORMAT = 'json'
+    
+    # Limit kolejki QueueHandler -> QueueListener (rekordy ponad limit są odrzucane)
+    QUEUE_MAX_SIZE = 10000
+    
     # Mapowanie kolorów dla tagów (dla panelu admin)
     LEVEL_COLORS = {
         'DEBUG': '#2196F3',    # Niebieski
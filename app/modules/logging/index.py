@@ -0,0 +1,464 @@
+# modules/logging/index.py
+"""
+Indeks plików logów (SQLite) dla wyszukiwania po czasie i polach
+
+Plik logu dzielony jest na bloki (~64 KB, wyrównane do końca linii).
+Dla każdego bloku indeks przechowuje zakres czasu (ts_min/ts_max) oraz
+listę wartości pól kluczowych (order_id, product_id, user_email, level,
+module) - odwrócony indeks field/value -> bloki.
+
+Zapytanie wybiera z indeksu tylko bloki pasujące do filtrów i zakresu
+czasu, a następnie czyta z dysku wyłącznie te bloki (seek + read).
+
+Indeks jest budowany przyrostowo: dla każdego pliku pamiętany jest
+indexed_bytes, więc kolejne aktualizacje czytają tylko nowe bajty.
+Obsługuje zarówno format JSON lines, jak i starszy format tekstowy.
+"""
+
+import glob
+import json
+import os
+import re
+import sqlite3
+import threading
+from datetime import datetime
+
+from .config import LogConfig
+
+
+# Pola indeksowane -> klucze w rekordzie (fields), z których pobieramy wartość
+INDEXED_FIELDS = {
+    'order_id': ('order_id', 'baselinker_order_id', 'internal_order_number'),
+    'product_id': ('product_id', 'short_product_id'),
+    'user_email': ('user_email',),
+    'level': (),
+    'module': (),
+}
+
+TEXT_LINE_PATTERN = re.compile(
+    r'^\[(?P<timestamp>\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2})\] '
+    r'\[(?P<level>[A-Z]+)\] \[(?P<module>[^\]]*)\] \[(?P<user>[^\]]*)\] \[(?P<endpoint>[^\]]*)\] '
+    r'(?P<message>.*)$'
+)
+TEXT_FIELD_PATTERN = re.compile(r'(\w+)=([^\s,;]+)')
+
+
+def parse_log_line(line):
+    """
+    Parsuje pojedynczą linię logu (JSON lines lub format tekstowy)
+
+    Returns:
+        dict | None: timestamp, level, module, user, endpoint, message, fields
+                     lub None dla linii kontynuacji (np. traceback)
+    """
+    line = line.rstrip('\r\n')
+    if not line:
+        return None
+
+    if line.startswith('{'):
+        try:
+            entry = json.loads(line)
+            if isinstance(entry, dict) and 'timestamp' in entry:
+                entry.setdefault('fields', {})
+                return entry
+        except ValueError:
+            return None
+        return None
+
+    match = TEXT_LINE_PATTERN.match(line)
+    if not match:
+        return None
+
+    entry = match.groupdict()
+    entry['fields'] = dict(TEXT_FIELD_PATTERN.findall(entry['message']))
+    return entry
+
+
+def extract_index_values(entry):
+    """Zwraca {field: wartość znormalizowana} dla pól indeksowanych rekordu"""
+    values = {}
+    fields = entry.get('fields') or {}
+
+    for field, keys in INDEXED_FIELDS.items():
+        for key in keys:
+            value = fields.get(key)
+            if value not in (None, '', [], {}):
+                values[field] = str(value).strip().lower()
+                break
+
+    if 'user_email' not in values and entry.get('user') not in (None, '', 'system'):
+        values['user_email'] = str(entry['user']).strip().lower()
+    if entry.get('level'):
+        values['level'] = str(entry['level']).upper()
+    if entry.get('module'):
+        values['module'] = str(entry['module']).lower()
+
+    return values
+
+
+class LogIndex:
+    """Przyrostowy indeks blokowy plików app_*.log"""
+
+    BLOCK_SIZE = 64 * 1024
+    INDEX_FILENAME = 'log_index.db'
+
+    _local_lock = threading.Lock()
+
+    def __init__(self, log_dir=None):
+        self.log_dir = log_dir or LogConfig.LOG_DIR
+        self.db_path = os.path.join(self.log_dir, self.INDEX_FILENAME)
+
+    # ------------------------------------------------------------------
+    # Połączenie i schemat
+    # ------------------------------------------------------------------
+
+    def _connect(self):
+        os.makedirs(self.log_dir, exist_ok=True)
+        conn = sqlite3.connect(self.db_path, timeout=30)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS files (
+                filename TEXT PRIMARY KEY,
+                inode INTEGER NOT NULL,
+                indexed_bytes INTEGER NOT NULL DEFAULT 0,
+                updated_at TEXT
+            );
+            CREATE TABLE IF NOT EXISTS blocks (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                filename TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL,
+                ts_min TEXT,
+                ts_max TEXT,
+                records INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE INDEX IF NOT EXISTS ix_blocks_file_time ON blocks (filename, ts_min, ts_max);
+            CREATE TABLE IF NOT EXISTS postings (
+                field TEXT NOT NULL,
+                value TEXT NOT NULL,
+                block_id INTEGER NOT NULL,
+                PRIMARY KEY (field, value, block_id)
+            ) WITHOUT ROWID;
+        """)
+        return conn
+
+    # ------------------------------------------------------------------
+    # Budowanie
+    # ------------------------------------------------------------------
+
+    def list_log_files(self):
+        return sorted(glob.glob(os.path.join(self.log_dir, 'app_*.log')))
+
+    def update(self, filenames=None):
+        """
+        Indeksuje nowe bajty podanych plików (domyślnie wszystkich app_*.log)
+
+        Returns:
+            dict: {filename: liczba nowych bloków}
+        """
+        paths = self.list_log_files() if filenames is None else [
+            os.path.join(self.log_dir, name) for name in filenames
+        ]
+
+        results = {}
+        with self._local_lock:
+            conn = self._connect()
+            try:
+                for path in paths:
+                    if os.path.exists(path):
+                        results[os.path.basename(path)] = self._update_file(conn, path)
+            finally:
+                conn.close()
+        return results
+
+    def _update_file(self, conn, path):
+        filename = os.path.basename(path)
+        stat = os.stat(path)
+
+        # BEGIN IMMEDIATE - inne procesy czekają zamiast indeksować te same bajty
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute(
+                'SELECT inode, indexed_bytes FROM files WHERE filename = ?', (filename,)
+            ).fetchone()
+
+            start = 0
+            if row:
+                inode, indexed_bytes = row
+                if inode != stat.st_ino or indexed_bytes > stat.st_size:
+                    # Plik podmieniony/obcięty - indeks od nowa
+                    self._remove_file_rows(conn, filename)
+                else:
+                    start = indexed_bytes
+
+            new_blocks = 0
+            position = start
+
+            if stat.st_size > start:
+                with open(path, 'rb') as f:
+                    f.seek(start)
+                    while True:
+                        data = f.read(self.BLOCK_SIZE)
+                        if not data:
+                            break
+
+                        # Blok kończy się na ostatniej pełnej linii
+                        last_newline = data.rfind(b'\n')
+                        if last_newline == -1:
+                            if len(data) < self.BLOCK_SIZE:
+                                break  # niepełna ostatnia linia - zaindeksujemy później
+                            last_newline = len(data) - 1
+                        block = data[:last_newline + 1]
+                        f.seek(position + len(block))
+
+                        self._index_block(conn, filename, position, block)
+                        position += len(block)
+                        new_blocks += 1
+
+            conn.execute(
+                'INSERT OR REPLACE INTO files (filename, inode, indexed_bytes, updated_at) VALUES (?, ?, ?, ?)',
+                (filename, stat.st_ino, position, datetime.now().strftime(LogConfig.TIMESTAMP_FORMAT))
+            )
+            conn.commit()
+            return new_blocks
+
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _index_block(self, conn, filename, offset, block):
+        ts_min = ts_max = None
+        records = 0
+        values = set()
+
+        for raw_line in block.decode('utf-8', errors='replace').splitlines():
+            entry = parse_log_line(raw_line)
+            if entry is None:
+                continue
+
+            records += 1
+            timestamp = entry.get('timestamp')
+            if timestamp:
+                ts_min = timestamp if ts_min is None or timestamp < ts_min else ts_min
+                ts_max = timestamp if ts_max is None or timestamp > ts_max else ts_max
+
+            values.update(extract_index_values(entry).items())
+
+        cursor = conn.execute(
+            'INSERT INTO blocks (filename, offset, length, ts_min, ts_max, records) VALUES (?, ?, ?, ?, ?, ?)',
+            (filename, offset, len(block), ts_min, ts_max, records)
+        )
+        block_id = cursor.lastrowid
+
+        conn.executemany(
+            'INSERT OR IGNORE INTO postings (field, value, block_id) VALUES (?, ?, ?)',
+            [(field, value, block_id) for field, value in values]
+        )
+
+    @staticmethod
+    def _remove_file_rows(conn, filename):
+        conn.execute(
+            'DELETE FROM postings WHERE block_id IN (SELECT id FROM blocks WHERE filename = ?)',
+            (filename,)
+        )
+        conn.execute('DELETE FROM blocks WHERE filename = ?', (filename,))
+        conn.execute('DELETE FROM files WHERE filename = ?', (filename,))
+
+    def remove_file(self, filename):
+        """Usuwa wpisy indeksu dla pliku (np. po cleanupie starych logów)"""
+        with self._local_lock:
+            conn = self._connect()
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                self._remove_file_rows(conn, filename)
+                conn.commit()
+            finally:
+                conn.close()
+
+    # ------------------------------------------------------------------
+    # Wyszukiwanie
+    # ------------------------------------------------------------------
+
+    def search(self, time_from=None, time_to=None, filters=None, text=None, limit=500, refresh=True):
+        """
+        Wyszukuje rekordy logów
+
+        Args:
+            time_from (str): 'YYYY-MM-DD HH:MM:SS' (lub prefiks, np. 'YYYY-MM-DD')
+            time_to (str): jw. - włącznie
+            filters (dict): {field: value} dla pól z INDEXED_FIELDS
+            text (str): Dodatkowy filtr tekstowy (case-insensitive) po treści rekordu
+            limit (int): Maksymalna liczba wyników
+            refresh (bool): Zaktualizuj indeks przed wyszukiwaniem
+
+        Returns:
+            dict: records (najnowsze na końcu), blocks_scanned, truncated
+        """
+        filters = {
+            field: str(value).strip()
+            for field, value in (filters or {}).items()
+            if field in INDEXED_FIELDS and value not in (None, '')
+        }
+        normalized_filters = {
+            field: value.upper() if field == 'level' else value.lower()
+            for field, value in filters.items()
+        }
+        text = text.lower() if text else None
+
+        # Domknij time_to do końca dnia/minuty dla prefiksów
+        if time_to and len(time_to) < 19:
+            time_to = time_to + '\uffff'
+
+        candidate_files = self._files_for_range(time_from, time_to)
+        if refresh:
+            self.update([os.path.basename(path) for path in candidate_files])
+
+        conn = self._connect()
+        try:
+            blocks = self._candidate_blocks(
+                conn, [os.path.basename(p) for p in candidate_files],
+                time_from, time_to, normalized_filters
+            )
+        finally:
+            conn.close()
+
+        records = []
+        truncated = False
+
+        # Od najnowszych bloków - limit obejmuje najświeższe dopasowania
+        for filename, offset, length in reversed(blocks):
+            block_records = self._scan_block(
+                filename, offset, length, time_from, time_to, normalized_filters, text
+            )
+            records = block_records + records
+            if len(records) >= limit:
+                records = records[-limit:]
+                truncated = True
+                break
+
+        return {
+            'records': records,
+            'blocks_scanned': len(blocks),
+            'truncated': truncated
+        }
+
+    def _files_for_range(self, time_from, time_to):
+        """Pliki app_YYYY-MM-DD.log mogące zawierać rekordy z zakresu"""
+        date_from = time_from[:10] if time_from else None
+        date_to = time_to[:10] if time_to else None
+
+        files = []
+        for path in self.list_log_files():
+            date_str = os.path.basename(path)[4:-4]
+            # Plik z rotacji zawiera rekordy od swojej daty wzwyż - nie odrzucamy po date_from
+            if date_to and date_str > date_to:
+                continue
+            files.append(path)
+
+        if date_from:
+            # Najstarszy plik, który może zawierać date_from, to ostatni z datą <= date_from
+            older = [p for p in files if os.path.basename(p)[4:-4] <= date_from]
+            newer = [p for p in files if os.path.basename(p)[4:-4] > date_from]
+            files = older[-1:] + newer
+
+        return files
+
+    @staticmethod
+    def _candidate_blocks(conn, filenames, time_from, time_to, filters):
+        if not filenames:
+            return []
+
+        sql = ['SELECT b.filename, b.offset, b.length FROM blocks b WHERE b.filename IN ({})'.format(
+            ', '.join('?' for _ in filenames)
+        )]
+        params = list(filenames)
+
+        if time_from:
+            sql.append('AND (b.ts_max IS NULL OR b.ts_max >= ?)')
+            params.append(time_from)
+        if time_to:
+            sql.append('AND (b.ts_min IS NULL OR b.ts_min <= ?)')
+            params.append(time_to)
+
+        for field, value in filters.items():
+            sql.append('AND EXISTS (SELECT 1 FROM postings p WHERE p.block_id = b.id AND p.field = ? AND p.value = ?)')
+            params.extend([field, value])
+
+        sql.append('ORDER BY b.filename, b.offset')
+        return conn.execute(' '.join(sql), params).fetchall()
+
+    def _scan_block(self, filename, offset, length, time_from, time_to, filters, text):
+        path = os.path.join(self.log_dir, filename)
+        if not os.path.exists(path):
+            return []
+
+        with open(path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(length)
+
+        matches = []
+        current = None
+        position = offset
+
+        for raw_line in data.splitlines(keepends=True):
+            line = raw_line.decode('utf-8', errors='replace')
+            entry = parse_log_line(line)
+
+            if entry is None:
+                # Linia kontynuacji (traceback) dołączana do poprzedniego rekordu
+                if current is not None:
+                    current['raw'] += line
+                position += len(raw_line)
+                continue
+
+            current = None
+            if self._matches(entry, line, time_from, time_to, filters, text):
+                current = {
+                    'filename': filename,
+                    'offset': position,
+                    'timestamp': entry.get('timestamp'),
+                    'level': entry.get('level'),
+                    'module': entry.get('module'),
+                    'raw': line
+                }
+                matches.append(current)
+            position += len(raw_line)
+
+        return matches
+
+    @staticmethod
+    def _matches(entry, line, time_from, time_to, filters, text):
+        timestamp = entry.get('timestamp') or ''
+        if time_from and timestamp < time_from:
+            return False
+        if time_to and timestamp > time_to:
+            return False
+
+        if filters:
+            values = extract_index_values(entry)
+            for field, value in filters.items():
+                if values.get(field) != value:
+                    return False
+
+        if text and text not in line.lower():
+            return False
+
+        return True
+
+
+# Singleton dla domyślnego katalogu logów
+_index_instance = None
+_index_lock = threading.Lock()
+
+
+def get_log_index():
+    """Pobiera singleton LogIndex dla LogConfig.LOG_DIR"""
+    global _index_instance
+
+    if _index_instance is None:
+        with _index_lock:
+            if _index_instance is None:
+                _index_instance = LogIndex()
+
+    return _index_instance
@@ -3,44 +3,84 @@
 Główne klasy systemu logowania
 """
 
+import atexit
+import json
 import logging
 import logging.handlers
 import os
 import glob
+import queue
 import sys
+import threading
 from datetime import datetime, timedelta
 from flask import request, session, has_request_context
 from .config import LogConfig
 
 
+def get_request_context():
+    """Zwraca (user, endpoint) z kontekstu Flask lub ('system', '-') poza żądaniem"""
+    user = 'system'
+    endpoint = '-'
+    
+    if has_request_context():
+        try:
+            # Pobierz użytkownika z sesji
+            if session and 'user_email' in session:
+                user = session['user_email']
+            
+            # Pobierz endpoint
+            if request and request.endpoint:
+                endpoint = request.endpoint
+            elif request and request.path:
+                endpoint = request.path
+                
+        except RuntimeError:
+            # Poza kontekstem aplikacji
+            pass
+    
+    return user, endpoint
+
+
+def _record_context(record):
+    """Kontekst zapisany w rekordzie (QueueHandler) lub pobrany na bieżąco"""
+    if hasattr(record, 'user'):
+        return record.user, getattr(record, 'endpoint', '-')
+    return get_request_context()
+
+
+def snapshot_fields(fields):
+    """
+    Niezależna kopia pól strukturalnych (typy JSON) do zapisu w innym wątku
+
+    Skalary bez zmian; słowniki, listy i inne obiekty przez JSON (default=str),
+    więc późniejsze zmiany obiektów w wątku żądania nie trafiają do logu.
+    """
+    snapshot = {}
+    for key, value in fields.items():
+        if value is None or isinstance(value, (str, int, float, bool)):
+            snapshot[key] = value
+            continue
+        try:
+            snapshot[key] = json.loads(json.dumps(value, ensure_ascii=False, default=str))
+        except Exception:
+            snapshot[key] = repr(value)
+    return snapshot
+
+
+def _record_module(record):
+    """Nazwa modułu z nazwy loggera (bez prefiksu 'app.')"""
+    module = record.name
+    if module.startswith('app.'):
+        module = module[4:]  # Usuń prefiks 'app.'
+    return module
+
+
 class CustomFormatter(logging.Formatter):
-    """Custom formatter z kontekstem Flask - POPRAWKA ENKODOWANIA"""
+    """Custom formatter z kontekstem Flask - format tekstowy (konsola / FILE_OUTPUT_FORMAT='text')"""
     
     def format(self, record):
-        # Pobierz kontekst z Flask (jeśli dostępny)
-        user = 'system'
-        endpoint = '-'
-        
-        if has_request_context():
-            try:
-                # Pobierz użytkownika z sesji
-                if session and 'user_email' in session:
-                    user = session['user_email']
-                
-                # Pobierz endpoint
-                if request and request.endpoint:
-                    endpoint = request.endpoint
-                elif request and request.path:
-                    endpoint = request.path
-                    
-            except RuntimeError:
-                # Poza kontekstem aplikacji
-                pass
-        
-        # Pobierz nazwę modułu z logger name
-        module = record.name
-        if module.startswith('app.'):
-            module = module[4:]  # Usuń prefiks 'app.'
+        user, endpoint = _record_context(record)
+        module = _record_module(record)
         
         # Formatuj timestamp
         timestamp = datetime.fromtimestamp(record.created).strftime(LogConfig.TIMESTAMP_FORMAT)
@@ -48,10 +88,16 @@ class CustomFormatter(logging.Formatter):
         # POPRAWKA: Bezpieczne formatowanie message
         try:
             message = record.getMessage()
-            # Zachowaj polskie znaki w miarę możliwości
-            safe_message = message.encode('utf-8', errors='replace').decode('utf-8')
+            fields = getattr(record, 'structured_fields', None)
+            if fields:
+                message = f"{message} " + " ".join(
+                    f"{key}={json.dumps(value, ensure_ascii=False, default=str) if isinstance(value, (dict, list)) else value}"
+                    for key, value in fields.items()
+                )
+            if record.exc_info:
+                message = f"{message}\n{self.formatException(record.exc_info)}"
         except Exception as e:
-            safe_message = f"<message_encoding_error: {type(record.msg).__name__}>"
+            message = f"<message_encoding_error: {type(record.msg).__name__}>"
         
         # Buduj sformatowany komunikat - BEZPIECZNIE
         try:
@@ -61,7 +107,7 @@ class CustomFormatter(logging.Formatter):
                 module=module,
                 user=user,
                 endpoint=endpoint,
-                message=safe_message
+                message=message
             )
         except Exception as e:
             # Fallback format
@@ -69,6 +115,80 @@ class CustomFormatter(logging.Formatter):
         
         return formatted_message
 
+
+class JsonLinesFormatter(logging.Formatter):
+    """Formatter JSON lines - jeden rekord = jeden obiekt JSON w linii (UTF-8, bez transkodowania)"""
+    
+    def format(self, record):
+        user, endpoint = _record_context(record)
+        
+        try:
+            message = record.getMessage()
+        except Exception:
+            message = f"<message_format_error: {record.msg!r}>"
+        
+        entry = {
+            'timestamp': datetime.fromtimestamp(record.created).strftime(LogConfig.TIMESTAMP_FORMAT),
+            'level': record.levelname,
+            'module': _record_module(record),
+            'user': user,
+            'endpoint': endpoint,
+            'message': message
+        }
+        
+        fields = getattr(record, 'structured_fields', None)
+        if fields:
+            entry['fields'] = fields
+        
+        if record.exc_info:
+            entry['exception'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry['exception'] = record.exc_text
+        
+        try:
+            return json.dumps(entry, ensure_ascii=False, default=str)
+        except Exception:
+            entry['fields'] = {key: repr(value) for key, value in (fields or {}).items()}
+            return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class ContextQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler dla wątków żądań
+
+    W wątku żądania zapisuje tylko kontekst Flask (user/endpoint) w rekordzie;
+    formatowanie i zapis do pliku wykonuje QueueListener w osobnym wątku.
+    """
+    
+    dropped_records = 0
+    
+    def prepare(self, record):
+        if not hasattr(record, 'user'):
+            record.user, record.endpoint = get_request_context()
+        
+        # Scal argumenty teraz - obiekty mogą zmienić się przed zapisem w listenerze
+        if record.args:
+            try:
+                record.msg = record.getMessage()
+                record.args = None
+            except Exception:
+                pass
+        
+        # Z tego samego powodu pola strukturalne - kopia w wątku wywołującym
+        fields = getattr(record, 'structured_fields', None)
+        if fields:
+            record.structured_fields = snapshot_fields(fields)
+        
+        return record
+    
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            # Nie blokuj żądania przy zalewie logów - odrzuć rekord
+            ContextQueueHandler.dropped_records += 1
+
+
 class TimedRotatingFileHandlerWithCleanup(logging.handlers.TimedRotatingFileHandler):
     """Handler z automatycznym czyszczeniem starych logów"""
     
@@ -80,6 +200,18 @@ class TimedRotatingFileHandlerWithCleanup(logging.handlers.TimedRotatingFileHand
         """Override rollover aby dodać cleanup"""
         super().doRollover()
         self.cleanup_old_logs()
+        self.update_search_index()
+    
+    def update_search_index(self):
+        """Dobudowuje indeks wyszukiwania w tle - nie blokuje zapisu logów"""
+        def _update():
+            try:
+                from .index import get_log_index
+                get_log_index().update()
+            except Exception as e:
+                print(f"[LogIndex] Błąd aktualizacji indeksu: {e}")
+        
+        threading.Thread(target=_update, name='log-index-update', daemon=True).start()
     
     def cleanup_old_logs(self):
         """Usuwa logi starsze niż RETENTION_DAYS"""
@@ -98,18 +230,31 @@ class TimedRotatingFileHandlerWithCleanup(logging.handlers.TimedRotatingFileHand
                         if file_date < cutoff_date:
                             os.remove(log_file)
                             print(f"[LogCleanup] Usunięto stary log: {log_file}")
+                            self._remove_from_index(filename)
                             
                 except (ValueError, OSError) as e:
                     print(f"[LogCleanup] Błąd podczas usuwania {log_file}: {e}")
                     
         except Exception as e:
             print(f"[LogCleanup] Błąd podczas czyszczenia logów: {e}")
+    
+    @staticmethod
+    def _remove_from_index(filename):
+        try:
+            from .index import get_log_index
+            get_log_index().remove_file(filename)
+        except Exception as e:
+            print(f"[LogIndex] Błąd usuwania {filename} z indeksu: {e}")
 
 class AppLogger:
     """Główna klasa systemu logowania"""
     
     _instance = None
     _configured = False
+    _queue = None
+    _queue_handler = None
+    _listener = None
+    _handlers = []
     
     def __new__(cls):
         if cls._instance is None:
@@ -181,12 +326,15 @@ class AppLogger:
                 backupCount=LogConfig.RETENTION_DAYS
             )
         
-        # Ustaw formatter
+        # Ustaw formatter - plik w JSON lines, konsola tekstowo
         formatter = CustomFormatter()
-        handler.setFormatter(formatter)
+        if LogConfig.FILE_OUTPUT_FORMAT == 'json':
+            handler.setFormatter(JsonLinesFormatter())
+        else:
+            handler.setFormatter(formatter)
         
-        # Dodaj handler do root loggera
-        root_logger.addHandler(handler)
+        # Handlery docelowe obsługuje QueueListener (poza wątkiem żądania)
+        target_handlers = [handler]
         
         # POPRAWKA: Console handler z bezpiecznym encoding + fallback
         try:
@@ -218,7 +366,7 @@ class AppLogger:
                 console_handler.stream.flush()
                 
                 # Jeśli się udało, dodaj handler
-                root_logger.addHandler(console_handler)
+                target_handlers.append(console_handler)
                 print("[Logger] Console handler z UTF-8 działa poprawnie")
                 
             except (UnicodeEncodeError, BrokenPipeError, OSError):
@@ -230,6 +378,19 @@ class AppLogger:
             print(f"[Logger] Nie można utworzyć console handler: {e}")
             print("[Logger] Logowanie tylko do pliku - sprawdź logi w logs/app_*.log")
         
+        # Root logger tylko wrzuca rekordy do kolejki - I/O w wątku listenera
+        cls._handlers = target_handlers
+        cls._queue = queue.Queue(LogConfig.QUEUE_MAX_SIZE)
+        cls._queue_handler = ContextQueueHandler(cls._queue)
+        root_logger.addHandler(cls._queue_handler)
+        cls._start_listener()
+        
+        atexit.register(cls.shutdown)
+        if hasattr(os, 'register_at_fork'):
+            # Passenger (smart spawning) forkuje po załadowaniu aplikacji -
+            # wątek listenera nie przeżywa forka, więc uruchamiamy go ponownie
+            os.register_at_fork(after_in_child=cls._restart_after_fork)
+        
         cls._configured = True
         
         # Log pierwszej wiadomości - BEZPIECZNIE
@@ -239,6 +400,38 @@ class AppLogger:
         except Exception as e:
             print(f"[Logger] Błąd pierwszego loga: {e}")
     
+    @classmethod
+    def _start_listener(cls):
+        """Uruchamia QueueListener zapisujący rekordy z kolejki do handlerów"""
+        if cls._queue is None:
+            return
+        
+        cls._listener = logging.handlers.QueueListener(
+            cls._queue, *cls._handlers, respect_handler_level=True
+        )
+        cls._listener.start()
+    
+    @classmethod
+    def _restart_after_fork(cls):
+        """Nowa kolejka i listener w procesie potomnym (blokady kolejki rodzica mogą być zajęte)"""
+        if cls._queue_handler is None:
+            return
+        
+        cls._queue = queue.Queue(LogConfig.QUEUE_MAX_SIZE)
+        cls._queue_handler.queue = cls._queue
+        cls._start_listener()
+    
+    @classmethod
+    def shutdown(cls):
+        """Zatrzymuje listener i zapisuje rekordy pozostałe w kolejce"""
+        listener = cls._listener
+        cls._listener = None
+        if listener is not None:
+            try:
+                listener.stop()
+            except Exception as e:
+                print(f"[Logger] Błąd zatrzymywania QueueListener: {e}")
+    
     @classmethod
     def get_logger(cls, module_name):
         """Zwraca logger dla konkretnego modułu"""
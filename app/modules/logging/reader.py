@@ -0,0 +1,150 @@
+# modules/logging/reader.py
+"""
+Warstwa odczytu plików logów
+
+- tail: ostatnie N linii przez czytanie pliku od końca (koszt ~ rozmiar N linii,
+  nie całego pliku)
+- read_since: przyrostowy odczyt od kursora (offset w bajtach) - tylko nowe,
+  pełne linie; po rotacji/obcięciu pliku kursor jest resetowany
+- follow: generator dla SSE (live tail) oparty o read_since; z resolve_path
+  przechodzi na nowy plik po rotacji dziennej
+"""
+
+import os
+import time
+
+
+class LogReader:
+    """Odczyt plików logów od końca i przyrostowo (kursor bajtowy)"""
+
+    CHUNK_SIZE = 64 * 1024
+    DEFAULT_TAIL_LINES = 250
+    MAX_INCREMENT_BYTES = 1024 * 1024
+
+    @staticmethod
+    def _decode(data: bytes) -> str:
+        return data.decode('utf-8', errors='replace')
+
+    @classmethod
+    def tail(cls, filepath: str, max_lines: int = DEFAULT_TAIL_LINES) -> dict:
+        """
+        Zwraca ostatnie max_lines linii pliku
+
+        Returns:
+            dict: content, lines_count, offset (kursor = rozmiar pliku w chwili odczytu)
+        """
+        with open(filepath, 'rb') as f:
+            f.seek(0, os.SEEK_END)
+            end = f.tell()
+            position = end
+            buffer = b''
+
+            # Cofaj się blokami aż mamy max_lines pełnych linii (+1 na ucięty początek)
+            while position > 0 and buffer.count(b'\n') <= max_lines:
+                read_size = min(cls.CHUNK_SIZE, position)
+                position -= read_size
+                f.seek(position)
+                buffer = f.read(read_size) + buffer
+
+        lines = buffer.splitlines(keepends=True)
+        if position > 0 and lines:
+            # Pierwsza linia bufora może być niepełna
+            lines = lines[1:]
+        last_lines = lines[-max_lines:] if max_lines > 0 else []
+
+        return {
+            'content': cls._decode(b''.join(last_lines)),
+            'lines_count': len(last_lines),
+            'offset': end
+        }
+
+    @classmethod
+    def read_since(cls, filepath: str, offset: int, max_bytes: int = MAX_INCREMENT_BYTES,
+                   tail_lines: int = DEFAULT_TAIL_LINES) -> dict:
+        """
+        Zwraca nowe pełne linie dopisane od kursora offset
+
+        Jeśli plik jest krótszy niż kursor (rotacja/obcięcie), zwraca tail
+        z flagą reset=True - klient powinien zastąpić zawartość konsoli.
+
+        Returns:
+            dict: content, lines_count, offset (nowy kursor), reset
+        """
+        size = os.path.getsize(filepath)
+
+        if offset < 0 or offset > size:
+            result = cls.tail(filepath, tail_lines)
+            result['reset'] = True
+            return result
+
+        if offset == size:
+            return {'content': '', 'lines_count': 0, 'offset': offset, 'reset': False}
+
+        with open(filepath, 'rb') as f:
+            f.seek(offset)
+            data = f.read(min(size - offset, max_bytes))
+
+        # Kursor zawsze na granicy linii - niepełną ostatnią linię oddamy w kolejnym odczycie
+        last_newline = data.rfind(b'\n')
+        if last_newline == -1:
+            if len(data) < max_bytes:
+                return {'content': '', 'lines_count': 0, 'offset': offset, 'reset': False}
+            last_newline = len(data) - 1  # bardzo długa linia - oddaj w kawałkach
+        data = data[:last_newline + 1]
+
+        return {
+            'content': cls._decode(data),
+            'lines_count': data.count(b'\n'),
+            'offset': offset + len(data),
+            'reset': False
+        }
+
+    @classmethod
+    def follow(cls, filepath: str, offset: int = None, poll_interval: float = 1.0,
+               max_duration: float = 300.0, heartbeat_interval: float = 15.0,
+               resolve_path=None):
+        """
+        Generator nowych fragmentów logu (dla SSE)
+
+        Args:
+            resolve_path: Funkcja zwracająca bieżącą ścieżkę logu (sprawdzana
+                przy każdym odczycie) - po rotacji dziennej nowy plik jest
+                czytany od początku z flagą reset=True
+
+        Yields:
+            dict | None: wynik read_since lub None jako heartbeat
+        """
+        if offset is None:
+            result = cls.tail(filepath)
+            result['reset'] = True
+            offset = result['offset']
+            yield result
+
+        started = time.time()
+        last_event = started
+        rolled_over = False
+
+        while time.time() - started < max_duration:
+            time.sleep(poll_interval)
+
+            if resolve_path is not None:
+                current_path = resolve_path()
+                if current_path != filepath:
+                    # Kursor dotyczył poprzedniego pliku
+                    filepath, offset, rolled_over = current_path, 0, True
+
+            if not os.path.exists(filepath):
+                continue
+
+            result = cls.read_since(filepath, offset)
+            if rolled_over:
+                result['reset'] = True
+                rolled_over = False
+            offset = result['offset']
+
+            if result['content'] or result['reset']:
+                last_event = time.time()
+                yield result
+            elif time.time() - last_event >= heartbeat_interval:
+                last_event = time.time()
+                yield None
@@ -5,14 +5,19 @@ Endpointy API dla panelu administracyjnego logów
 
 import os
 import glob
+import json
 from datetime import datetime
-from flask import Blueprint, jsonify, request
+from flask import Blueprint, jsonify, request, Response
+from modules.users.decorators import access_control
 from .config import LogConfig
+from .reader import LogReader
+from .index import get_log_index, INDEXED_FIELDS
 
 logging_bp = Blueprint('logging', __name__)
 
 
 @logging_bp.route('/api/logs/files')
+@access_control(roles=['admin'])
 def list_log_files():
     """Zwraca listę dostępnych plików logów"""
     try:
@@ -52,39 +57,55 @@ def list_log_files():
         }), 500
 
 
+def _resolve_log_path(filename):
+    """Zwraca ścieżkę pliku logu lub None dla niedozwolonej nazwy"""
+    if not filename.startswith('app_') or not filename.endswith('.log'):
+        return None
+    if os.path.basename(filename) != filename:
+        return None
+    return os.path.join(LogConfig.LOG_DIR, filename)
+
+
 @logging_bp.route('/api/logs/read/<filename>')
+@access_control(roles=['admin'])
 def read_log_file(filename):
-    """Zwraca zawartość pliku logu (ostatnie 250 linii)"""
+    """
+    Zwraca zawartość pliku logu
+
+    Bez parametrów: ostatnie 250 linii (odczyt od końca pliku).
+    ?since=<offset>: tylko linie dopisane od kursora z poprzedniej odpowiedzi.
+    """
     try:
         # Sprawdź bezpieczeństwo nazwy pliku
-        if not filename.startswith('app_') or not filename.endswith('.log'):
+        filepath = _resolve_log_path(filename)
+        if filepath is None:
             return jsonify({
                 'success': False,
                 'error': 'Nieprawidłowa nazwa pliku'
             }), 400
         
-        filepath = os.path.join(LogConfig.LOG_DIR, filename)
-        
         if not os.path.exists(filepath):
             return jsonify({
                 'success': False,
                 'error': 'Plik nie istnieje'
             }), 404
         
-        # Przeczytaj ostatnie 250 linii
-        lines = []
-        with open(filepath, 'r', encoding='utf-8') as f:
-            # Czytaj plik od końca
-            lines = f.readlines()
-            
-        # Weź ostatnie 250 linii
-        last_lines = lines[-250:] if len(lines) > 250 else lines
+        since = request.args.get('since', type=int)
+        lines = request.args.get('lines', LogReader.DEFAULT_TAIL_LINES, type=int)
+        
+        if since is None:
+            result = LogReader.tail(filepath, lines)
+            result['reset'] = True
+        else:
+            result = LogReader.read_since(filepath, since, tail_lines=lines)
         
         return jsonify({
             'success': True,
-            'content': ''.join(last_lines),
-            'lines_count': len(last_lines),
-            'total_lines': len(lines)
+            'filename': filename,
+            'content': result['content'],
+            'lines_count': result['lines_count'],
+            'offset': result['offset'],
+            'reset': result['reset']
         })
         
     except Exception as e:
@@ -95,6 +116,7 @@ def read_log_file(filename):
 
 
 @logging_bp.route('/api/logs/current')
+@access_control(roles=['admin'])
 def get_current_log():
     """Zwraca aktualne logi (dla real-time refresh)"""
     try:
@@ -106,4 +128,102 @@ def get_current_log():
         return jsonify({
             'success': False,
             'error': str(e)
-        }), 500
\ No newline at end of file
+        }), 500
+
+
+@logging_bp.route('/api/logs/stream')
+@access_control(roles=['admin'])
+def stream_current_log():
+    """
+    Live tail bieżącego logu przez Server-Sent Events
+
+    Każde zdarzenie to JSON {content, offset, reset}; id zdarzenia = kursor,
+    więc EventSource po ponownym połączeniu wznawia odczyt (Last-Event-ID).
+    Połączenie jest zamykane po 5 minutach, żeby nie blokować workera.
+    Po północy strumień przechodzi na nowy plik dnia (zdarzenie z reset).
+    """
+    filepath = LogConfig.get_log_filepath()
+    
+    if not os.path.exists(filepath):
+        return jsonify({
+            'success': False,
+            'error': 'Plik nie istnieje'
+        }), 404
+    
+    offset = request.headers.get('Last-Event-ID', type=int)
+    if offset is None:
+        offset = request.args.get('since', type=int)
+    
+    def generate():
+        # Natychmiastowy komentarz - klient wie, że strumień nie jest buforowany
+        yield ': connected\n\n'
+        
+        for result in LogReader.follow(filepath, offset=offset,
+                                       resolve_path=LogConfig.get_log_filepath):
+            if result is None:
+                yield ': heartbeat\n\n'
+                continue
+            
+            payload = json.dumps({
+                'content': result['content'],
+                'offset': result['offset'],
+                'reset': result['reset']
+            }, ensure_ascii=False)
+            yield f"id: {result['offset']}\ndata: {payload}\n\n"
+    
+    response = Response(generate(), mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'
+    return response
+
+
+@logging_bp.route('/api/logs/search')
+@access_control(roles=['admin'])
+def search_logs():
+    """
+    Wyszukiwanie w plikach logów przez indeks blokowy
+
+    Parametry: time_from, time_to ('YYYY-MM-DD' lub 'YYYY-MM-DD HH:MM:SS'),
+    order_id, product_id, user_email, level, module, q (tekst), limit.
+    Czytane są tylko bloki plików wskazane przez indeks.
+    """
+    try:
+        LogConfig.ensure_log_dir()
+        
+        filters = {
+            field: request.args.get(field)
+            for field in INDEXED_FIELDS
+            if request.args.get(field)
+        }
+        time_from = request.args.get('time_from') or None
+        time_to = request.args.get('time_to') or None
+        text = request.args.get('q') or None
+        limit = max(1, min(request.args.get('limit', 500, type=int), 5000))
+        
+        if not filters and not text and not time_from and not time_to:
+            return jsonify({
+                'success': False,
+                'error': 'Podaj co najmniej jeden filtr'
+            }), 400
+        
+        result = get_log_index().search(
+            time_from=time_from.replace('T', ' ') if time_from else None,
+            time_to=time_to.replace('T', ' ') if time_to else None,
+            filters=filters,
+            text=text,
+            limit=limit
+        )
+        
+        return jsonify({
+            'success': True,
+            'records': result['records'],
+            'count': len(result['records']),
+            'blocks_scanned': result['blocks_scanned'],
+            'truncated': result['truncated']
+        })
+        
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
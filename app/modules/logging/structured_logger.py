@@ -3,86 +3,62 @@
 Wrapper dla standardowego loggera obsługujący strukturalne logowanie
 """
 import logging
-import json
 from typing import Any, Dict
 
 class StructuredLogger:
-    """Logger wrapper obsługujący dodatkowe parametry kontekstowe"""
-    
+    """
+    Logger wrapper obsługujący dodatkowe parametry kontekstowe
+
+    Parametry trafiają do rekordu jako `structured_fields`; ContextQueueHandler
+    kopiuje je (snapshot_fields) jeszcze w wątku wywołującym. Formatowanie
+    (JSON lines w pliku, key=value na konsoli) wykonuje formatter w wątku
+    QueueListener - i tylko dla rekordów, które przeszły próg poziomu.
+    """
+
     def __init__(self, logger: logging.Logger):
         self._logger = logger
-    
-    def _format_message(self, message: str, **kwargs) -> str:
-        """Formatuje wiadomość z dodatkowymi parametrami - POPRAWKA ENKODOWANIA"""
-        if not kwargs:
-            return message
-        
-        # Konwertuj wszystkie wartości na stringi - BEZPIECZNIE
-        formatted_kwargs = {}
-        for key, value in kwargs.items():
-            try:
-                if isinstance(value, (dict, list)):
-                    # POPRAWKA: ensure_ascii=True dla bezpieczeństwa
-                    formatted_kwargs[key] = json.dumps(value, ensure_ascii=True)
-                else:
-                    # POPRAWKA: Bezpieczna konwersja na string
-                    str_value = str(value)
-                    # Usuń polskie znaki jeśli są problematyczne
-                    safe_value = str_value.encode('ascii', errors='replace').decode('ascii')
-                    formatted_kwargs[key] = safe_value
-            except Exception as e:
-                # Fallback dla problematycznych wartości
-                formatted_kwargs[key] = f"<encoding_error:{type(value).__name__}>"
-        
-        # Buduj suffiks z parametrami
+
+    def _log(self, level: int, message: str, kwargs: Dict[str, Any]):
+        """Wspólna ścieżka logowania - sprawdzenie poziomu przed jakąkolwiek pracą"""
+        if not self._logger.isEnabledFor(level):
+            return
+
+        exc_info = kwargs.pop('exc_info', None)
+        stack_info = kwargs.pop('stack_info', False)
+
         try:
-            params_str = " ".join([f"{k}={v}" for k, v in formatted_kwargs.items()])
-            return f"{message} {params_str}"
-        except Exception as e:
-            # Ostateczny fallback
-            return f"{message} <params_encoding_error>"
-    
+            self._logger.log(
+                level,
+                message,
+                exc_info=exc_info,
+                stack_info=stack_info,
+                extra={'structured_fields': kwargs} if kwargs else None,
+                stacklevel=3
+            )
+        except Exception:
+            # Fallback - loguj tylko podstawową wiadomość
+            self._logger.log(level, f"{message} <formatting_error>")
+
     def debug(self, message: str, **kwargs):
         """Log debug z dodatkowymi parametrami"""
-        try:
-            formatted_msg = self._format_message(message, **kwargs)
-            self._logger.debug(formatted_msg)
-        except Exception as e:
-            # Fallback - loguj tylko podstawową wiadomość
-            self._logger.debug(f"{message} <formatting_error>")
-    
+        self._log(logging.DEBUG, message, kwargs)
+
     def info(self, message: str, **kwargs):
         """Log info z dodatkowymi parametrami"""
-        try:
-            formatted_msg = self._format_message(message, **kwargs)
-            self._logger.info(formatted_msg)
-        except Exception as e:
-            self._logger.info(f"{message} <formatting_error>")
-    
+        self._log(logging.INFO, message, kwargs)
+
     def warning(self, message: str, **kwargs):
         """Log warning z dodatkowymi parametrami"""
-        try:
-            formatted_msg = self._format_message(message, **kwargs)
-            self._logger.warning(formatted_msg)
-        except Exception as e:
-            self._logger.warning(f"{message} <formatting_error>")
-    
+        self._log(logging.WARNING, message, kwargs)
+
     def error(self, message: str, **kwargs):
         """Log error z dodatkowymi parametrami"""
-        try:
-            formatted_msg = self._format_message(message, **kwargs)
-            self._logger.error(formatted_msg)
-        except Exception as e:
-            self._logger.error(f"{message} <formatting_error>")
-    
+        self._log(logging.ERROR, message, kwargs)
+
     def critical(self, message: str, **kwargs):
         """Log critical z dodatkowymi parametrami"""
-        try:
-            formatted_msg = self._format_message(message, **kwargs)
-            self._logger.critical(formatted_msg)
-        except Exception as e:
-            self._logger.critical(f"{message} <formatting_error>")
-    
+        self._log(logging.CRITICAL, message, kwargs)
+
     # Przekieruj inne metody na standardowy logger
     def __getattr__(self, name):
-        return getattr(self._logger, name)
\ No newline at end of file
+        return getattr(self._logger, name)
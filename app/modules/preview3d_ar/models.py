@@ -10,11 +10,89 @@ import sys
 import zipfile
 import shutil
 import random
+import threading
+from contextlib import contextmanager
 from flask import current_app, url_for
 import trimesh
 import numpy as np
 from PIL import Image
 
+try:
+    import fcntl
+except ImportError:  # Windows / środowiska developerskie
+    fcntl = None
+
+# Single-flight: jeden build modelu na klucz cache (wątki + procesy Passengera).
+# Wpis klucza: [threading.Lock, liczba oczekujących] - usuwany po ostatnim buildzie
+_build_locks = {}
+_build_locks_guard = threading.Lock()
+
+
+def _lock_build_file(lock_path):
+    """
+    Blokada pliku <klucz>.lock między procesami
+
+    Plik jest usuwany przez właściciela po zakończeniu buildu, więc po
+    otrzymaniu flock sprawdzamy, czy blokujemy nadal plik widoczny pod
+    ścieżką - jeśli nie, ktoś go usunął w międzyczasie i próbujemy ponownie.
+    """
+    while True:
+        lock_file = open(lock_path, 'a')
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            if os.path.samestat(os.fstat(lock_file.fileno()), os.stat(lock_path)):
+                return lock_file
+        except FileNotFoundError:
+            pass
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+
+def _unlock_build_file(lock_file, lock_path):
+    try:
+        os.remove(lock_path)
+    except OSError:
+        pass
+    finally:
+        fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+
+@contextmanager
+def single_flight(cache_dir, cache_key):
+    """
+    Serializuje generowanie modelu dla danego klucza cache.
+
+    Wątki w obrębie procesu czekają na wspólnym threading.Lock, a między
+    procesami (workery Passengera, daemon) na blokadzie pliku <klucz>.lock.
+    Po wejściu należy ponownie sprawdzić cache - model mógł zostać
+    zbudowany przez żądanie, na które czekaliśmy. Po zakończeniu buildu
+    wpis blokady i plik .lock są usuwane (nie rosną z liczbą wariantów).
+    """
+    with _build_locks_guard:
+        entry = _build_locks.setdefault(cache_key, [threading.Lock(), 0])
+        entry[1] += 1
+
+    try:
+        with entry[0]:
+            lock_path = os.path.join(cache_dir, f"{cache_key}.lock")
+            lock_file = _lock_build_file(lock_path) if fcntl is not None else None
+            try:
+                yield
+            finally:
+                if lock_file is not None:
+                    _unlock_build_file(lock_file, lock_path)
+    finally:
+        with _build_locks_guard:
+            entry[1] -= 1
+            if entry[1] == 0:
+                _build_locks.pop(cache_key, None)
+
+
+def _temp_output_path(final_path):
+    """Ścieżka tymczasowa obok pliku docelowego (atomowy os.replace po zapisie)"""
+    return f"{final_path}.{os.getpid()}.{threading.get_ident()}.part"
+
 class TextureConfig:
     """Konfiguracja tekstur z fallbackiem do szarego koloru"""
 
@@ -149,9 +227,23 @@ class RealityGenerator:
         """Generuje unikalny klucz cache dla produktu"""
         variant = product_data.get('variant_code', '')
         dims = product_data.get('dimensions', {})
-        data_str = f"{variant}-{dims.get('length', 0)}-{dims.get('width', 0)}-{dims.get('thickness', 0)}"
+        # Normalizacja wymiarów: 200, 200.0 i "200" dają ten sam klucz
+        # (viewer, API GLB i warm-up przekazują wymiary w różnych typach)
+        normalized = []
+        for key in ('length', 'width', 'thickness'):
+            try:
+                normalized.append(f"{float(dims.get(key, 0) or 0):g}")
+            except (TypeError, ValueError):
+                normalized.append(str(dims.get(key, 0)))
+        data_str = f"{variant}-{'-'.join(normalized)}"
         return hashlib.md5(data_str.encode()).hexdigest()
 
+    def get_cached_model_path(self, product_data, extension):
+        """Zwraca ścieżkę modelu w cache (jeśli istnieje) lub None"""
+        cache_key = self._generate_cache_key(product_data)
+        path = os.path.join(self.cache_dir, f"{cache_key}.{extension}")
+        return path if os.path.exists(path) else None
+
     def _get_texture_path(self, texture_url):
         """Konwertuje URL tekstury na ścieżkę lokalną"""
         if not texture_url or texture_url.startswith('data:'):
@@ -670,7 +762,7 @@ class RealityGenerator:
             print(f"[RealityGenerator] Creating USDZ with DIRECT server textures", file=sys.stderr)
             
             # Utwórz pliki tymczasowe
-            usd_file = os.path.join(self.temp_dir, 'model.usd')
+            usd_file = os.path.join(self.temp_dir, f"{os.path.basename(output_path)}.usd")
             
             # Zapisz USD
             with open(usd_file, 'w', encoding='utf-8') as f:
@@ -833,7 +925,7 @@ class RealityGenerator:
             print(f"[RealityGenerator] Creating USDZ WITHOUT textures: {output_path}", file=sys.stderr)
             
             # Utwórz pliki tymczasowe
-            usd_file = os.path.join(self.temp_dir, 'model.usd')
+            usd_file = os.path.join(self.temp_dir, f"{os.path.basename(output_path)}.usd")
             
             # Zapisz USD
             with open(usd_file, 'w', encoding='utf-8') as f:
@@ -904,6 +996,28 @@ class RealityGenerator:
                 print(f"[RealityGenerator] USDZ from cache: {usdz_path}", file=sys.stderr)
                 return usdz_path
             
+            with single_flight(self.cache_dir, cache_key):
+                # Równoległe żądanie mogło zbudować model, gdy czekaliśmy na blokadę
+                if os.path.exists(usdz_path):
+                    print(f"[RealityGenerator] USDZ from cache (coalesced): {usdz_path}", file=sys.stderr)
+                    return usdz_path
+
+                return self._build_usdz(product_data, usdz_path)
+            
+        except Exception as e:
+            print(f"[RealityGenerator] Error generating Reality/USDZ: {e}", file=sys.stderr)
+            import traceback
+            traceback.print_exc(file=sys.stderr)
+            raise
+
+    def _build_usdz(self, product_data, usdz_path):
+        """
+        Buduje plik USDZ do pliku tymczasowego i atomowo przenosi go do cache.
+        Wywoływane wyłącznie wewnątrz single_flight() dla klucza cache.
+        """
+        temp_path = _temp_output_path(usdz_path)
+
+        try:
             # Pobierz dane produktu
             variant_code = product_data.get('variant_code', 'unknown')
             dimensions = product_data.get('dimensions', {})
@@ -962,30 +1076,33 @@ class RealityGenerator:
                 print(f"[RealityGenerator] Processed textures: {list(processed_textures.keys())}", file=sys.stderr)
                 
                 usd_content = self._create_wood_geometry_usd_with_textures(dimensions, variant_code, texture_filenames)
-                success = self._create_usdz_with_textures(usd_content, processed_textures, usdz_path)
+                success = self._create_usdz_with_textures(usd_content, processed_textures, temp_path)
             else:
                 print("[RealityGenerator] No textures available - creating model without textures", file=sys.stderr)
                 usd_content = self._create_wood_geometry_usd(dimensions, variant_code)
-                success = self._create_proper_usdz(usd_content, usdz_path)
+                success = self._create_proper_usdz(usd_content, temp_path)
             
             if not success:
                 raise Exception("Failed to create USDZ file")
             
             # DODANA WALIDACJA: Sprawdź finalny plik
-            final_validation = self._validate_usdz(usdz_path)
+            final_validation = self._validate_usdz(temp_path)
             print(f"[RealityGenerator] Final USDZ validation: {final_validation}", file=sys.stderr)
             
             if not final_validation.get('is_valid_zip', False):
                 raise Exception(f"Generated USDZ is not valid: {final_validation}")
             
+            # Atomowa podmiana - czytelnicy nigdy nie widzą niepełnego pliku
+            os.replace(temp_path, usdz_path)
             print(f"[RealityGenerator] USDZ with WORKING textures generated: {usdz_path}", file=sys.stderr)
             return usdz_path
-            
+
         except Exception as e:
-            print(f"[RealityGenerator] Error generating Reality/USDZ: {e}", file=sys.stderr)
-            import traceback
-            traceback.print_exc(file=sys.stderr)
+            print(f"[RealityGenerator] Error building USDZ: {e}", file=sys.stderr)
             raise
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
 
     def cleanup_temp_files(self):
         """Czyści pliki tymczasowe"""
@@ -1128,31 +1245,42 @@ class RealityGenerator:
                     'cached': True
                 }
         
-            # Generuj nowy GLB
-            print(f"[RealityGenerator] Tworzenie nowego GLB: {glb_filename}", file=sys.stderr)
-        
-            # 1. Utwórz geometrię panelu
-            geometry_data = self._create_panel_geometry(product_data['dimensions'])
-        
-            # 2. Przygotuj tekstury
-            textures_data = self._prepare_textures_for_glb(product_data['variant_code'])
-        
-            # 3. Utwórz GLB używając biblioteki gltf (przykład)
-            glb_content = self._create_glb_content(geometry_data, textures_data, product_data)
-        
-            # 4. Zapisz plik GLB
-            with open(glb_path, 'wb') as f:
-                f.write(glb_content)
+            with single_flight(self.cache_dir, cache_key):
+                # Równoległe żądanie mogło zbudować GLB, gdy czekaliśmy na blokadę
+                cached = os.path.exists(glb_path)
+
+                if not cached:
+                    # Generuj nowy GLB
+                    print(f"[RealityGenerator] Tworzenie nowego GLB: {glb_filename}", file=sys.stderr)
+                
+                    # 1. Utwórz geometrię panelu
+                    geometry_data = self._create_panel_geometry(product_data['dimensions'])
+                
+                    # 2. Przygotuj tekstury
+                    textures_data = self._prepare_textures_for_glb(product_data['variant_code'])
+                
+                    # 3. Utwórz GLB używając biblioteki gltf (przykład)
+                    glb_content = self._create_glb_content(geometry_data, textures_data, product_data)
+                
+                    # 4. Zapisz plik GLB (tymczasowy + atomowa podmiana)
+                    temp_path = _temp_output_path(glb_path)
+                    try:
+                        with open(temp_path, 'wb') as f:
+                            f.write(glb_content)
+                        os.replace(temp_path, glb_path)
+                    finally:
+                        if os.path.exists(temp_path):
+                            os.remove(temp_path)
         
             file_size = os.path.getsize(glb_path)
-            print(f"[RealityGenerator] GLB zapisany: {glb_path} ({file_size} bytes)", file=sys.stderr)
+            print(f"[RealityGenerator] GLB {'z cache (coalesced)' if cached else 'zapisany'}: {glb_path} ({file_size} bytes)", file=sys.stderr)
         
             return {
                 'success': True,
                 'file_url': f"/preview3d-ar/ar-models/{glb_filename}",
                 'file_size': file_size,
                 'cache_key': cache_key,
-                'cached': False
+                'cached': cached
             }
         
         except Exception as e:
@@ -1,8 +1,11 @@
 # modules/preview3d_ar/routers.py - NAPRAWIONA WERSJA
 
 from flask import jsonify, request, render_template, current_app, send_file, send_from_directory, url_for, make_response, abort
+from flask_login import current_user, login_required
 from . import preview3d_ar_bp
 from .models import TextureConfig, RealityGenerator
+from .services import ARPrewarmService, start_background_prewarm
+from modules.jobs import JobAlreadyRunning, job_conflict_response
 from modules.calculator.models import Quote, QuoteItem, QuoteItemDetails
 from extensions import db
 from sqlalchemy.orm import joinedload
@@ -613,6 +616,7 @@ def test_endpoint():
             '/api/generate-reality [POST] - Returns USDZ or Reality',
             '/api/generate-usdz [POST] - Backward compatibility',
             '/api/check-textures/<variant> [GET]',
+            '/api/ar-prewarm [POST] - Background warm-up for recent quotes',
             '/<token> [GET]',  # ZMIENIONE z '/quote/<quote_id> [GET]'
             '/modal [GET]',
             '/test [GET]'
@@ -668,6 +672,46 @@ def ar_cleanup():
         print(f"[ar_cleanup] Błąd: {str(e)}", file=sys.stderr)
         return jsonify({'error': f'Błąd serwera: {str(e)}'}), 500
 
+@preview3d_ar_bp.route('/api/ar-prewarm', methods=['POST'])
+@login_required
+def ar_prewarm():
+    """Uruchamia w tle pre-generację modeli AR dla ostatnich wycen (tylko admin)"""
+    if not current_user.is_admin():
+        return jsonify({'error': 'Brak uprawnień administratora'}), 403
+
+    try:
+        data = request.get_json(silent=True) or {}
+        
+        # Zakresy ograniczone - warm-up generuje modele synchronicznie w wątku tła
+        days = ARPrewarmService.clamp_days(data.get('days', ARPrewarmService.DEFAULT_DAYS))
+        limit = ARPrewarmService.clamp_limit(data.get('limit', ARPrewarmService.DEFAULT_LIMIT))
+        quote_id = data.get('quote_id')
+        
+        job = start_background_prewarm(
+            current_app._get_current_object(),
+            days=days,
+            limit=limit,
+            quote_id=int(quote_id) if quote_id is not None else None,
+            user_id=current_user.id
+        )
+        
+        return jsonify({
+            'success': True,
+            'message': 'Pre-generacja modeli AR uruchomiona w tle',
+            'job_id': job.id,
+            'days': days,
+            'limit': limit,
+            'quote_id': quote_id
+        }), 202
+        
+    except JobAlreadyRunning as e:
+        return job_conflict_response(e)
+    except (TypeError, ValueError) as e:
+        return jsonify({'error': f'Nieprawidłowe parametry: {str(e)}'}), 400
+    except Exception as e:
+        print(f"[ar_prewarm] Błąd: {str(e)}", file=sys.stderr)
+        return jsonify({'error': f'Błąd serwera: {str(e)}'}), 500
+
 @preview3d_ar_bp.route('/api/validate-usdz/<filename>')
 def validate_usdz_file(filename):
     """NOWY: Waliduje konkretny plik USDZ"""
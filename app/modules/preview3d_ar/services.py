@@ -0,0 +1,219 @@
+# modules/preview3d_ar/services.py
+"""
+Pre-generacja modeli AR dla wycen
+=================================
+
+Warm-up cache modeli USDZ/GLB dla wariantów i wymiarów z ostatnio
+utworzonych wycen (QuoteItem). Dzięki temu klient otwierający link do
+wyceny dostaje podgląd AR od razu, bez czekania na generator.
+
+- ARPrewarmService.collect_product_data: unikalne (wariant, wymiary) z wycen
+- ARPrewarmService.prewarm: generuje brakujące modele (single-flight w generatorze)
+- start_background_prewarm: zleca warm-up jako zadanie w tle (modules/jobs),
+  z panelu admina lub przy zapisie wyceny - nie z publicznego podglądu
+"""
+
+import sys
+import threading
+import time
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+from extensions import db
+from modules.calculator.models import Quote, QuoteItem
+from modules.jobs import BackgroundJob, job_handler, submit_job
+
+AR_PREWARM_JOB = 'preview3d_ar.prewarm'
+AR_PREWARM_QUOTE_JOB = 'preview3d_ar.prewarm_quote'
+
+
+class ARPrewarmService:
+    """Serwis pre-generacji modeli AR dla popularnych wariantów"""
+
+    DEFAULT_DAYS = 7
+    DEFAULT_LIMIT = 200
+    DEFAULT_FORMATS = ('usdz', 'glb')
+    MAX_DAYS = 30
+    MAX_LIMIT = 500
+
+    # Aktywne przebiegi warm-upu ('recent' lub 'quote:<id>') - jeden na klucz
+    _running = set()
+    _running_lock = threading.Lock()
+
+    @classmethod
+    def clamp_days(cls, days):
+        """Liczba dni w zakresie 1..MAX_DAYS (ValueError dla wartości nieliczbowych)"""
+        return max(1, min(int(days), cls.MAX_DAYS))
+
+    @classmethod
+    def clamp_limit(cls, limit):
+        """Limit pozycji w zakresie 1..MAX_LIMIT (ValueError dla wartości nieliczbowych)"""
+        return max(1, min(int(limit), cls.MAX_LIMIT))
+
+    @staticmethod
+    def collect_product_data(days=DEFAULT_DAYS, limit=DEFAULT_LIMIT, quote_id=None):
+        """
+        Zbiera unikalne kombinacje wariant + wymiary z ostatnich wycen
+
+        Args:
+            days (int): Zakres wstecz (dni) dla wycen
+            limit (int): Maksymalna liczba modeli do przygotowania
+            quote_id (int): Opcjonalnie - tylko pozycje jednej wyceny
+
+        Returns:
+            list: product_data w formacie RealityGenerator (wybrane warianty najpierw)
+        """
+        query = db.session.query(
+            QuoteItem.variant_code,
+            QuoteItem.length_cm,
+            QuoteItem.width_cm,
+            QuoteItem.thickness_cm,
+            QuoteItem.is_selected
+        ).join(Quote, Quote.id == QuoteItem.quote_id)
+
+        if quote_id is not None:
+            query = query.filter(QuoteItem.quote_id == quote_id)
+        else:
+            cutoff = datetime.utcnow() - timedelta(days=days)
+            query = query.filter(Quote.created_at >= cutoff)
+
+        rows = query.order_by(
+            QuoteItem.is_selected.desc(),
+            Quote.created_at.desc()
+        ).all()
+
+        seen = set()
+        product_data_list = []
+        for variant_code, length, width, thickness, _is_selected in rows:
+            if not variant_code or not length or not width or not thickness:
+                continue
+
+            dimensions = {
+                'length': float(length),
+                'width': float(width),
+                'thickness': float(thickness)
+            }
+            key = (variant_code, dimensions['length'], dimensions['width'], dimensions['thickness'])
+            if key in seen:
+                continue
+
+            seen.add(key)
+            product_data_list.append({
+                'variant_code': variant_code,
+                'dimensions': dimensions
+            })
+
+            if len(product_data_list) >= limit:
+                break
+
+        return product_data_list
+
+    @staticmethod
+    def prewarm(product_data_list, formats=DEFAULT_FORMATS):
+        """
+        Generuje brakujące modele dla podanych produktów
+
+        Returns:
+            dict: Statystyki (cached / generated / failed) per format
+        """
+        from .routers import get_reality_generator
+
+        generator = get_reality_generator()
+        stats = {fmt: {'cached': 0, 'generated': 0, 'failed': 0} for fmt in formats}
+
+        for product_data in product_data_list:
+            for fmt in formats:
+                try:
+                    if generator.get_cached_model_path(product_data, fmt):
+                        stats[fmt]['cached'] += 1
+                        continue
+
+                    if fmt == 'usdz':
+                        generator.generate_reality(product_data)
+                    elif fmt == 'glb':
+                        result = generator.generate_glb_file(dict(product_data, format='glb'))
+                        if not result.get('success'):
+                            raise Exception(result.get('error', 'GLB generation failed'))
+
+                    stats[fmt]['generated'] += 1
+
+                except Exception as e:
+                    stats[fmt]['failed'] += 1
+                    print(f"[ARPrewarm] Błąd generowania {fmt} dla {product_data}: {e}", file=sys.stderr)
+
+        return stats
+
+    @classmethod
+    def run(cls, days=DEFAULT_DAYS, limit=DEFAULT_LIMIT, quote_id=None, formats=DEFAULT_FORMATS):
+        """
+        Pełny przebieg warm-upu z ochroną przed równoległym uruchomieniem
+
+        Returns:
+            dict: Podsumowanie przebiegu lub {'skipped': True} gdy już trwa
+        """
+        run_key = f"quote:{quote_id}" if quote_id is not None else 'recent'
+        days, limit = cls.clamp_days(days), cls.clamp_limit(limit)
+
+        with cls._running_lock:
+            if run_key in cls._running:
+                print(f"[ARPrewarm] Warm-up {run_key} już trwa - pomijam", file=sys.stderr)
+                return {'skipped': True, 'run_key': run_key}
+            cls._running.add(run_key)
+
+        started = time.time()
+        try:
+            product_data_list = cls.collect_product_data(days=days, limit=limit, quote_id=quote_id)
+            stats = cls.prewarm(product_data_list, formats=formats)
+            duration = round(time.time() - started, 2)
+
+            print(f"[ARPrewarm] Warm-up {run_key}: {len(product_data_list)} produktów, "
+                  f"{stats} w {duration}s", file=sys.stderr)
+
+            return {
+                'skipped': False,
+                'run_key': run_key,
+                'products': len(product_data_list),
+                'stats': stats,
+                'duration_seconds': duration
+            }
+        finally:
+            with cls._running_lock:
+                cls._running.discard(run_key)
+
+
+# ----------------------------------------------------------------------
+# Zadania w tle (modules/jobs)
+# ----------------------------------------------------------------------
+
+def _run_prewarm(params):
+    # test_request_context - TextureConfig buduje URL-e tekstur przez url_for
+    with current_app.test_request_context('/'):
+        return ARPrewarmService.run(**params)
+
+
+@job_handler(AR_PREWARM_JOB, title='Pre-generacja modeli AR ostatnich wycen')
+def run_recent_prewarm(params):
+    return _run_prewarm(params)
+
+
+@job_handler(AR_PREWARM_QUOTE_JOB, title='Pre-generacja modeli AR wyceny', single_instance=False)
+def run_quote_prewarm(params):
+    return _run_prewarm(params)
+
+
+def start_background_prewarm(app=None, days=ARPrewarmService.DEFAULT_DAYS,
+                             limit=ARPrewarmService.DEFAULT_LIMIT, quote_id=None,
+                             user_id=None) -> BackgroundJob:
+    """
+    Zleca warm-up jako zadanie w tle (nie blokuje żądania HTTP)
+
+    Warm-up ostatnich wycen ma blokadę w bazie - jeden przebieg naraz we
+    wszystkich procesach; warm-up jednej wyceny zlecany jest przy jej zapisie.
+
+    Raises:
+        JobAlreadyRunning: gdy trwa już warm-up ostatnich wycen
+    """
+    params = {'days': days, 'limit': limit, 'quote_id': quote_id}
+    job_type = AR_PREWARM_QUOTE_JOB if quote_id is not None else AR_PREWARM_JOB
+    return submit_job(job_type, params=params, user_id=user_id, app=app)
@@ -22,6 +22,7 @@ from sqlalchemy.orm import relationship, validates
 from sqlalchemy.sql import func
 from extensions import db
 from modules.logging import get_structured_logger
+from search_index import SearchScope
 import pytz
 
 logger = get_structured_logger('production.models')
@@ -34,6 +35,26 @@ def get_local_now():
     poland_tz = pytz.timezone('Europe/Warsaw')
     return datetime.now(poland_tz).replace(tzinfo=None)
 
+def thickness_group_for(thickness_cm):
+    """
+    Grupa grubości dla algorytmu priorytetów
+
+    Returns:
+        str: '0-2.5', '2.6-3.5', '3.6-4.5', '4.6+' lub None (brak grubości)
+    """
+    if not thickness_cm:
+        return None
+
+    thickness = float(thickness_cm)
+    if thickness <= 2.5:
+        return "0-2.5"
+    elif thickness <= 3.5:
+        return "2.6-3.5"
+    elif thickness <= 4.5:
+        return "3.6-4.5"
+    else:
+        return "4.6+"
+
 class ProductionOrderCounter(db.Model):
     """
     Liczniki numerów zamówień produkcyjnych per rok
@@ -256,18 +277,7 @@ class ProductionItem(db.Model):
         Returns:
             str: Grupa grubości ('0-2.5', '2.6-3.5', '3.6-4.5', '4.6+') lub None
         """
-        if not self.parsed_thickness_cm:
-            return None
-            
-        thickness = float(self.parsed_thickness_cm)
-        if thickness <= 2.5:
-            return "0-2.5"
-        elif thickness <= 3.5:
-            return "2.6-3.5"
-        elif thickness <= 4.5:
-            return "3.6-4.5"
-        else:
-            return "4.6+"
+        return thickness_group_for(self.parsed_thickness_cm)
     
     def update_thickness_group(self):
         """
@@ -435,6 +445,13 @@ class ProductionItem(db.Model):
             'duration_minutes': getattr(self, f'{station_code}_duration_minutes')
         })
 
+
+# Wyszukiwarka listy produktów (products-filtered) - indeks trigramowy w pamięci
+PRODUCT_SEARCH = SearchScope('production_items', ProductionItem, fields=(
+    'short_product_id', 'internal_order_number', 'client_name', 'original_product_name'
+))
+
+
 class ProductionPriorityConfig(db.Model):
     """
     Konfiguracja systemu priorytetów dla produktów
@@ -717,4 +734,187 @@ class ProductionSecurityEvent(db.Model):
                 'ip_address': ip_address,
                 'error': str(e)
             })
-            return False
\ No newline at end of file
+            return False
+
+class BaselinkerOutboundCommand(db.Model):
+    """
+    Kolejka wychodzących komend do API Baselinker (setOrderStatus, setOrderFields)
+
+    Komendy zapisywane są w requestach użytkownika i wysyłane przez worker
+    w tle (services/baselinker_queue.py). coalesce_key łączy powtórzone
+    komendy dla tego samego zamówienia - czeka tylko najnowsza wersja.
+    """
+    __tablename__ = 'prod_baselinker_commands'
+
+    id = Column(Integer, primary_key=True)
+    baselinker_order_id = Column(Integer, nullable=False, index=True)
+    internal_order_number = Column(String(50), index=True)
+    method = Column(String(50), nullable=False)
+    coalesce_key = Column(String(100), nullable=False, index=True)
+    parameters = Column(JSON, nullable=False)
+    source = Column(String(50))
+
+    # STAN I PONOWIENIA
+    status = Column(Enum('pending', 'in_progress', 'done', 'failed', name='bl_command_status'),
+                    default='pending', nullable=False)
+    attempts = Column(Integer, default=0, nullable=False)
+    next_attempt_at = Column(DateTime, default=get_local_now, nullable=False)
+    claim_token = Column(String(32))
+    claimed_at = Column(DateTime)
+    last_error = Column(Text)
+
+    # METADANE
+    created_at = Column(DateTime, default=get_local_now, nullable=False)
+    updated_at = Column(DateTime, default=get_local_now, onupdate=get_local_now)
+    completed_at = Column(DateTime)
+
+    __table_args__ = (
+        db.Index('idx_bl_command_status_next', 'status', 'next_attempt_at'),
+    )
+
+    def __repr__(self):
+        return f'<BaselinkerOutboundCommand {self.method} order={self.baselinker_order_id}: {self.status}>'
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'baselinker_order_id': self.baselinker_order_id,
+            'internal_order_number': self.internal_order_number,
+            'method': self.method,
+            'parameters': self.parameters,
+            'source': self.source,
+            'status': self.status,
+            'attempts': self.attempts,
+            'next_attempt_at': self.next_attempt_at.isoformat() if self.next_attempt_at else None,
+            'last_error': self.last_error,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'completed_at': self.completed_at.isoformat() if self.completed_at else None
+        }
+
+
+class ProductionQueueItem(db.Model):
+    """
+    Projekcja aktywnej kolejki produkcyjnej (odczyt stanowisk, dashboardu i priorytetów)
+
+    Wąska kopia rekordów prod_items w statusach kolejki - tylko pola używane
+    przez UI i algorytm priorytetów oraz gotowe teksty do wyświetlenia.
+    id = prod_items.id. Utrzymywana w tej samej transakcji co zmiany
+    ProductionItem (services/queue_projection.py).
+    """
+    __tablename__ = 'prod_queue_items'
+
+    id = Column(Integer, primary_key=True, autoincrement=False)
+    short_product_id = Column(String(16), nullable=False)
+    internal_order_number = Column(String(8), index=True)
+    baselinker_order_id = Column(Integer)
+    original_product_name = Column(Text)
+    current_status = Column(String(32), nullable=False)
+
+    # PRIORYTETY
+    priority_rank = Column(Integer)
+    priority_manual_override = Column(Boolean, default=False, nullable=False)
+    payment_date = Column(DateTime)
+    deadline_date = Column(Date, index=True)
+    created_at = Column(DateTime)
+
+    # SPECYFIKACJA (nazwy jak w ProductionItem)
+    parsed_wood_species = Column(String(50))
+    parsed_technology = Column(String(50))
+    parsed_wood_class = Column(String(10))
+    parsed_finish_state = Column(String(50))
+    parsed_length_cm = Column(Numeric(10, 2))
+    parsed_width_cm = Column(Numeric(10, 2))
+    parsed_thickness_cm = Column(Numeric(10, 2))
+    thickness_group = Column(String(10))
+    volume_m3 = Column(Numeric(10, 4))
+    total_value_net = Column(Numeric(10, 2))
+    client_name = Column(String(255))
+
+    # POLA WYŚWIETLANIA (przeliczane przy zapisie)
+    display_name = Column(String(255))
+    dimensions_text = Column(String(64))
+
+    updated_at = Column(DateTime, default=get_local_now)
+
+    __table_args__ = (
+        db.Index('idx_queue_status_rank', 'current_status', 'priority_rank'),
+    )
+
+    def __repr__(self):
+        return f'<ProductionQueueItem {self.short_product_id}: {self.current_status}, priority_rank={self.priority_rank}>'
+
+    # Aliasy jak w ProductionItem (algorytm priorytetów)
+    @property
+    def species(self):
+        return self.parsed_wood_species
+
+    @property
+    def finish_state(self):
+        return self.parsed_finish_state
+
+    @property
+    def wood_class(self):
+        return self.parsed_wood_class
+
+    @property
+    def is_priority_locked(self):
+        return bool(self.priority_manual_override)
+
+    @property
+    def days_until_deadline(self):
+        if not self.deadline_date:
+            return None
+        return (self.deadline_date - date.today()).days
+
+    @property
+    def is_overdue(self):
+        return bool(self.deadline_date) and date.today() > self.deadline_date
+
+    def get_thickness_group(self):
+        return thickness_group_for(self.parsed_thickness_cm)
+
+    def update_thickness_group(self):
+        self.thickness_group = self.get_thickness_group()
+        return self.thickness_group
+
+
+class ProductionQueueCounter(db.Model):
+    """
+    Liczniki kolejki per status (liczba, m3, wartość, rangi priorytetów)
+
+    Zmieniane o różnice wierszy projekcji w transakcji zmiany produktów.
+    """
+    __tablename__ = 'prod_queue_counters'
+
+    status = Column(String(32), primary_key=True)
+    items_count = Column(Integer, default=0, nullable=False)
+    volume_m3 = Column(Numeric(14, 4), default=0, nullable=False)
+    value_net = Column(Numeric(14, 2), default=0, nullable=False)
+    ranked_count = Column(Integer, default=0, nullable=False)
+    priority_rank_sum = Column(db.BigInteger, default=0, nullable=False)
+    priority_rank_min = Column(Integer)
+    priority_rank_max = Column(Integer)
+    updated_at = Column(DateTime, default=get_local_now)
+
+    def __repr__(self):
+        return f'<ProductionQueueCounter {self.status}: {self.items_count}>'
+
+
+class ProductionItemFacet(db.Model):
+    """
+    Liczba produktów dla wartości filtra listy produktów w danym statusie
+
+    attribute: wood_species / technology / wood_class / thickness / status
+    (facet statusu: value = status, czyli sumy per status).
+    Utrzymywane przez services/item_facets.py.
+    """
+    __tablename__ = 'prod_item_facets'
+
+    attribute = Column(String(32), primary_key=True)
+    value = Column(String(64), primary_key=True)
+    status = Column(String(50), primary_key=True)
+    items_count = Column(Integer, default=0, nullable=False)
+    updated_at = Column(DateTime, default=get_local_now)
+
+    def __repr__(self):
+        return f'<ProductionItemFacet {self.attribute}={self.value} [{self.status}]: {self.items_count}>'
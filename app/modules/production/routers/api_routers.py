@@ -24,10 +24,14 @@ import json
 from datetime import datetime, date, timedelta
 from flask import Blueprint, request, jsonify, current_app, render_template, render_template_string
 from flask_login import login_required, current_user
+from flask_sqlalchemy.pagination import Pagination
 from functools import wraps
 from modules.logging import get_structured_logger
+from modules.jobs import JobAlreadyRunning, job_conflict_response, job_handler, job_submitted_response, submit_job
+from modules.scheduler import PAID_ORDERS_SYNC_JOB, request_job_run
 from typing import Dict, Any
 from extensions import db
+from query_profiler import query_budget
 from sqlalchemy import and_, or_, text, func, distinct
 import traceback
 import pytz
@@ -38,9 +42,12 @@ logger = get_structured_logger('production.api')
 
 # Import modeli produkcji
 try:
-    from ..models import ProductionItem, ProductionError, ProductionSyncLog, ProductionConfig, ProductionPriorityConfig
+    from ..models import ProductionItem, ProductionError, ProductionSyncLog, ProductionConfig, ProductionPriorityConfig, ProductionQueueItem, PRODUCT_SEARCH
 except ImportError:
-    from modules.production.models import ProductionItem, ProductionError, ProductionSyncLog, ProductionConfig, ProductionPriorityConfig
+    from modules.production.models import ProductionItem, ProductionError, ProductionSyncLog, ProductionConfig, ProductionPriorityConfig, ProductionQueueItem, PRODUCT_SEARCH
+
+from ..services.queue_projection import QUEUE_STATUSES, get_status_counters, queue_query
+from ..services.item_facets import STATUS_FACET, get_facet_counts, status_totals, summarize
 
 # ============================================================================
 # DECORATORS - zabezpieczenia dla różnych typów endpointów
@@ -748,6 +755,19 @@ def cron_sync():
             stats_section = sync_result.get('data', {}).get('stats', {})
             error_details = []
             orders_done = []
+        elif request_job_run(PAID_ORDERS_SYNC_JOB):
+            # Daemon schedulera wykona synchronizację - endpoint tylko ją zleca
+            logger.info("CRON: Synchronizacja zlecona schedulerowi", extra={
+                'job_id': PAID_ORDERS_SYNC_JOB
+            })
+            return jsonify({
+                'success': True,
+                'trigger': 'cron',
+                'delegated_to_scheduler': True,
+                'job_id': PAID_ORDERS_SYNC_JOB,
+                'timestamp': get_local_now().isoformat(),
+                'summary': 'Synchronizacja zlecona daemonowi schedulera'
+            }), 202
         else:
             sync_result = sync_service.sync_paid_orders_only()
             stats_section = sync_result
@@ -815,10 +835,41 @@ def cron_sync():
             'timestamp': get_local_now().isoformat()
         }), 500
 
+# Obie ręczne synchronizacje produkcji (modal i dashboard) blokują się wzajemnie
+MANUAL_SYNC_LOCK = 'production.manual_sync'
+
+
+@job_handler('production.sync_modal', title='Ręczna synchronizacja Baselinker (modal)',
+             lock_key=MANUAL_SYNC_LOCK)
+def _baselinker_sync_modal_job(params):
+    """Zadanie w tle dla /sync/baselinker - wynik jak dawniej odpowiedź endpointu"""
+    from ..services.sync_service import manual_sync_with_filtering as run_manual_sync_with_filtering
+
+    result = run_manual_sync_with_filtering(params.get('payload') or {})
+
+    logger.info(
+        "API: Zakończono synchronizację Baselinker (modal)",
+        extra={
+            'user_id': params.get('user_id'),
+            'success': result.get('success'),
+            'orders_processed': result.get('data', {}).get('stats', {}).get('orders_processed'),
+            'products_created': result.get('data', {}).get('stats', {}).get('products_created'),
+            'errors_count': result.get('data', {}).get('stats', {}).get('errors_count')
+        }
+    )
+
+    return result
+
+
 @api_bp.route('/sync/baselinker', methods=['POST'])
 @login_required
 def baselinker_manual_sync_modal():
-    """Endpoint obsługujący manualną synchronizację z Baselinkerem z poziomu modalu."""
+    """
+    Endpoint obsługujący manualną synchronizację z Baselinkerem z poziomu modalu.
+
+    Synchronizacja uruchamiana jest jako zadanie w tle - odpowiedź 202 z job_id,
+    postęp i wynik: /jobs/api/<job_id>/events
+    """
 
     try:
         payload = request.get_json() or {}
@@ -835,25 +886,15 @@ def baselinker_manual_sync_modal():
             }
         )
 
-        from ..services.sync_service import manual_sync_with_filtering as run_manual_sync_with_filtering
-
-        result = run_manual_sync_with_filtering(payload)
-
-        error_message = (result.get('error') or '').lower()
-        status_code = 200 if result.get('success') else (500 if 'nieoczekiwany' in error_message else 400)
-
-        logger.info(
-            "API: Zakończono synchronizację Baselinker (modal)",
-            extra={
-                'user_id': getattr(current_user, 'id', None),
-                'success': result.get('success'),
-                'orders_processed': result.get('data', {}).get('stats', {}).get('orders_processed'),
-                'products_created': result.get('data', {}).get('stats', {}).get('products_created'),
-                'errors_count': result.get('data', {}).get('stats', {}).get('errors_count')
-            }
+        job = submit_job(
+            'production.sync_modal',
+            params={'payload': payload, 'user_id': getattr(current_user, 'id', None)},
+            user_id=getattr(current_user, 'id', None)
         )
+        return job_submitted_response(job, 'Synchronizacja Baselinker uruchomiona w tle')
 
-        return jsonify(result), status_code
+    except JobAlreadyRunning as exc:
+        return job_conflict_response(exc)
 
     except Exception as exc:
         logger.exception(
@@ -870,6 +911,90 @@ def baselinker_manual_sync_modal():
             }
         }), 500
 
+
+@job_handler('production.manual_sync', title='Ręczna synchronizacja Baselinker',
+             lock_key=MANUAL_SYNC_LOCK)
+def _manual_sync_job(params):
+    """Zadanie w tle dla /manual-sync - wynik jak dawniej odpowiedź endpointu"""
+    from ..services.sync_service import get_sync_service
+
+    user_id = params.get('user_id')
+    recalculate_priorities = params.get('recalculate_priorities', True)
+
+    # Wywołaj synchronizację używając istniejącej metody
+    sync_result = get_sync_service().manual_sync_with_filtering(params.get('sync_params') or {})
+
+    logger.info("API: Enhanced synchronizacja zakończona", extra={
+        'user_id': user_id,
+        'sync_success': sync_result.get('success', False) if sync_result else False,
+        'products_created': sync_result.get('data', {}).get('stats', {}).get('products_created', 0) if sync_result else 0
+    })
+
+    # BEZPIECZNA obsługa response
+    if sync_result is None:
+        return {
+            'success': False,
+            'error': 'Brak odpowiedzi z serwisu synchronizacji',
+            'data': {
+                'status': 'failed',
+                'initiated_by': user_id
+            }
+        }
+
+    # ROZSZERZONY RESPONSE (zachowana kompatybilność)
+    if sync_result.get('success'):
+        data_section = sync_result.get('data', {})
+        stats_section = data_section.get('stats', {}) if isinstance(data_section, dict) else {}
+
+        response_data = {
+            'success': True,
+            'message': 'Ręczna synchronizacja zakończona pomyślnie',
+            'data': {
+                'sync_id': f'manual_{int(get_local_now().timestamp())}',
+                'status': 'completed' if stats_section.get('error_count', 0) == 0 else 'partial',
+                'initiated_at': get_local_now().isoformat(),
+                'initiated_by': user_id,
+                'duration_seconds': data_section.get('duration_seconds', 0),
+
+                # ZACHOWANE stats (backward compatibility)
+                'stats': {
+                    'orders_fetched': stats_section.get('orders_fetched', 0),
+                    'products_created': stats_section.get('products_created', 0),
+                    'products_updated': stats_section.get('products_updated', 0),
+                    'products_skipped': stats_section.get('products_skipped', 0),
+                    'error_count': stats_section.get('error_count', 0)
+                },
+
+                # NOWE sekcje - additive
+                'status_changes': {
+                    'orders_moved_to_production': stats_section.get('orders_processed', 0),
+                    'status_change_errors': 0  # TODO: dodaj do sync_service
+                },
+
+                'priority_recalculation': {
+                    'enabled': recalculate_priorities,
+                    'products_updated': 0,  # TODO: dodaj do sync_service
+                    'manual_overrides_preserved': 0,  # TODO: dodaj do sync_service
+                    'calculation_duration': '00:00:00'  # TODO: dodaj do sync_service
+                }
+            }
+        }
+
+        return response_data
+    else:
+        return {
+            'success': False,
+            'error': sync_result.get('error', 'Nieznany błąd synchronizacji'),
+            'data': {
+                'sync_id': f'manual_failed_{int(get_local_now().timestamp())}',
+                'status': 'failed',
+                'initiated_at': get_local_now().isoformat(),
+                'initiated_by': user_id,
+                'error_count': 1
+            }
+        }
+
+
 @api_bp.route('/manual-sync', methods=['POST'])
 @login_required
 def manual_sync():
@@ -880,6 +1005,9 @@ def manual_sync():
     - Użycie manual_sync_with_filtering
     - Proper parameter mapping
     - Safe response handling
+    
+    Synchronizacja uruchamiana jest jako zadanie w tle - odpowiedź 202 z job_id,
+    wynik (dawna odpowiedź endpointu) w job.result
     """
     try:
         data = request.get_json() or {}
@@ -944,78 +1072,19 @@ def manual_sync():
             'respect_manual_overrides': respect_manual_overrides
         }
         
-        # Wywołaj synchronizację używając istniejącej metody
-        sync_result = sync_service.manual_sync_with_filtering(sync_params)
-        
-        logger.info("API: Enhanced synchronizacja zakończona", extra={
-            'user_id': current_user.id,
-            'sync_success': sync_result.get('success', False) if sync_result else False,
-            'products_created': sync_result.get('data', {}).get('stats', {}).get('products_created', 0) if sync_result else 0
-        })
-        
-        # BEZPIECZNA obsługa response
-        if sync_result is None:
-            return jsonify({
-                'success': False,
-                'error': 'Brak odpowiedzi z serwisu synchronizacji',
-                'data': {
-                    'status': 'failed',
-                    'initiated_by': current_user.id
-                }
-            }), 500
-        
-        # ROZSZERZONY RESPONSE (zachowana kompatybilność)
-        if sync_result.get('success'):
-            data_section = sync_result.get('data', {})
-            stats_section = data_section.get('stats', {}) if isinstance(data_section, dict) else {}
-            
-            response_data = {
-                'success': True,
-                'message': 'Ręczna synchronizacja zakończona pomyślnie',
-                'data': {
-                    'sync_id': f'manual_{int(get_local_now().timestamp())}',
-                    'status': 'completed' if stats_section.get('error_count', 0) == 0 else 'partial',
-                    'initiated_at': get_local_now().isoformat(),
-                    'initiated_by': current_user.id,
-                    'duration_seconds': data_section.get('duration_seconds', 0),
-                    
-                    # ZACHOWANE stats (backward compatibility)
-                    'stats': {
-                        'orders_fetched': stats_section.get('orders_fetched', 0),
-                        'products_created': stats_section.get('products_created', 0),
-                        'products_updated': stats_section.get('products_updated', 0),
-                        'products_skipped': stats_section.get('products_skipped', 0),
-                        'error_count': stats_section.get('error_count', 0)
-                    },
-                    
-                    # NOWE sekcje - additive
-                    'status_changes': {
-                        'orders_moved_to_production': stats_section.get('orders_processed', 0),
-                        'status_change_errors': 0  # TODO: dodaj do sync_service
-                    },
-                    
-                    'priority_recalculation': {
-                        'enabled': recalculate_priorities,
-                        'products_updated': 0,  # TODO: dodaj do sync_service
-                        'manual_overrides_preserved': 0,  # TODO: dodaj do sync_service
-                        'calculation_duration': '00:00:00'  # TODO: dodaj do sync_service
-                    }
-                }
-            }
-            
-            return jsonify(response_data), 200
-        else:
-            return jsonify({
-                'success': False,
-                'error': sync_result.get('error', 'Nieznany błąd synchronizacji'),
-                'data': {
-                    'sync_id': f'manual_failed_{int(get_local_now().timestamp())}',
-                    'status': 'failed',
-                    'initiated_at': get_local_now().isoformat(),
-                    'initiated_by': current_user.id,
-                    'error_count': 1
-                }
-            }), 500
+        job = submit_job(
+            'production.manual_sync',
+            params={
+                'sync_params': sync_params,
+                'user_id': current_user.id,
+                'recalculate_priorities': recalculate_priorities
+            },
+            user_id=current_user.id
+        )
+        return job_submitted_response(job, 'Ręczna synchronizacja uruchomiona w tle')
+    
+    except JobAlreadyRunning as exc:
+        return job_conflict_response(exc)
         
     except Exception as e:
         logger.error("API: Błąd enhanced ręcznej synchronizacji", extra={
@@ -1523,7 +1592,8 @@ def complete_packaging():
     
     Działanie:
     1. Zmienia status produktów na 'spakowane'
-    2. Wysyła API call do Baselinker zmieniający status zamówienia na 138623
+    2. Kolejkuje zmianę statusu zamówienia w Baselinker na 138623 (wysyłka w tle,
+       stan: GET /api/baselinker-sync-state)
     
     Autoryzacja: Brak (walidacja IP)
     Returns: JSON status operacji i potwierdzenie aktualizacji Baselinker
@@ -1643,6 +1713,8 @@ def complete_packaging():
         # Sprawdź czy wszystkie produkty z zamówienia są spakowane i zaktualizuj Baselinker
         baselinker_update_success = False
         baselinker_error = None
+        baselinker_command_id = None
+        baselinker_sync_state = None
         
         try:
             # Sprawdź czy wszystkie produkty z tego zamówienia są teraz spakowane
@@ -1658,18 +1730,27 @@ def complete_packaging():
                     'total_products': len(all_products_in_order)
                 })
 
-                # Aktualizuj status w Baselinker
+                # Zakolejkuj zmianę statusu w Baselinker (wysyłka przez worker w tle)
                 try:
                     sync_service = get_sync_service()
                     if sync_service:
-                        baselinker_update_success = sync_service.update_order_status_in_baselinker(internal_order_number)
-                        if not baselinker_update_success:
-                            baselinker_error = "Nie udało się zaktualizować statusu w Baselinker"
+                        from ..services.baselinker_queue import enqueue_order_status, get_order_sync_state
+                        command = enqueue_order_status(
+                            all_products_in_order[0].baselinker_order_id,
+                            sync_service.target_completed_status,
+                            internal_order_number=internal_order_number,
+                            source='packaging'
+                        )
+                        baselinker_update_success = True
+                        baselinker_command_id = command.id
+                        baselinker_sync_state = get_order_sync_state(
+                            internal_order_number=internal_order_number
+                        )['state']
                     else:
                         baselinker_error = "Sync service niedostępny"
                         logger.warning("Sync service niedostępny - pominięto aktualizację Baselinker")
                 except Exception as bl_error:
-                    baselinker_error = f"Błąd komunikacji z Baselinker: {str(bl_error)}"
+                    baselinker_error = f"Błąd kolejkowania aktualizacji Baselinker: {str(bl_error)}"
                     logger.error("Błąd podczas aktualizacji Baselinker", extra={
                         'internal_order_number': internal_order_number,
                         'error': str(bl_error)
@@ -1700,6 +1781,9 @@ def complete_packaging():
                 'baselinker_update': {
                     'attempted': len(completed_products_list) > 0,
                     'success': baselinker_update_success,
+                    'queued': baselinker_command_id is not None,
+                    'command_id': baselinker_command_id,
+                    'sync_state': baselinker_sync_state,
                     'error': baselinker_error
                 },
                 'completed_at': get_local_now().isoformat()
@@ -1738,6 +1822,41 @@ def complete_packaging():
             }
         }), 500
 
+@api_bp.route('/baselinker-sync-state', methods=['GET'])
+@ip_validation_required
+def baselinker_sync_state():
+    """
+    GET /api/baselinker-sync-state?internal_order_number=25_05248
+    
+    Stan wysyłki zakolejkowanych komend Baselinker dla zamówienia
+    (state: none / pending / done / failed)
+    
+    Autoryzacja: Brak (walidacja IP)
+    """
+    internal_order_number = request.args.get('internal_order_number', '').strip()
+    baselinker_order_id = request.args.get('baselinker_order_id', type=int)
+    
+    if not internal_order_number and baselinker_order_id is None:
+        return jsonify({
+            'success': False,
+            'error': 'Wymagany parametr internal_order_number lub baselinker_order_id'
+        }), 400
+    
+    try:
+        from ..services.baselinker_queue import get_order_sync_state
+        state = get_order_sync_state(
+            internal_order_number=internal_order_number or None,
+            baselinker_order_id=baselinker_order_id
+        )
+        return jsonify({'success': True, 'data': state}), 200
+    
+    except Exception as e:
+        logger.error("API: Błąd pobierania stanu synchronizacji Baselinker", extra={
+            'internal_order_number': internal_order_number,
+            'error': str(e)
+        })
+        return jsonify({'success': False, 'error': str(e)}), 500
+
 # ============================================================================
 # ERROR HANDLERS
 # ============================================================================
@@ -1910,9 +2029,10 @@ def dashboard_tab_content():
         dashboard_stats = {}
         
         # Statystyki stacji - POPRAWIONA STRUKTURA dla template
-        cutting_count = ProductionItem.query.filter(ProductionItem.current_status == 'czeka_na_wyciecie').count()
-        assembly_count = ProductionItem.query.filter(ProductionItem.current_status == 'czeka_na_skladanie').count()
-        packaging_count = ProductionItem.query.filter(ProductionItem.current_status == 'czeka_na_pakowanie').count()
+        queue_counters = get_status_counters()
+        cutting_count = queue_counters['czeka_na_wyciecie']['count']
+        assembly_count = queue_counters['czeka_na_skladanie']['count']
+        packaging_count = queue_counters['czeka_na_pakowanie']['count']
         
         # Oblicz dzisiejsze m3 dla każdej stacji
         today_start = datetime.combine(today, datetime.min.time())
@@ -1999,11 +2119,10 @@ def dashboard_tab_content():
             'total_orders': ProductionItem.query.count()
         }
         
-        # Alerty terminów
-        deadline_alerts = ProductionItem.query.filter(
-            ProductionItem.deadline_date <= (today + timedelta(days=3)),
-            ProductionItem.current_status != 'spakowane'
-        ).order_by(ProductionItem.deadline_date.asc()).limit(5).all()
+        # Alerty terminów (produkty w kolejce)
+        deadline_alerts = queue_query().filter(
+            ProductionQueueItem.deadline_date <= (today + timedelta(days=3))
+        ).order_by(ProductionQueueItem.deadline_date.asc()).limit(5).all()
         
         dashboard_stats['deadline_alerts'] = [
             {
@@ -3090,62 +3209,57 @@ def export_products():
 
 # 4. DANE FILTRÓW ENDPOINT
 @api_bp.route('/products/filters-data', methods=['GET'])
+@query_budget(5)
 @login_required
 def get_filters_data():
     """
     GET /production/api/products/filters-data
     
-    Zwraca unikalne wartości dla dropdownów filtrów
+    Zwraca wartości dropdownów filtrów z liczbą produktów (prod_item_facets)
     
-    Returns: JSON z listami unikalnych wartości
+    facet_counts: atrybut -> wartość -> status -> liczba - frontend przelicza
+    z niej etykiety przy zmianie wybranych statusów bez kolejnego zapytania
+    
+    Returns: JSON z listami wartości i licznikami
     """
     try:
-        from ..models import ProductionItem
-        from sqlalchemy import func, distinct
-        
-        # Pobierz unikalne wartości dla filtrów
+        counts = get_facet_counts()
+        totals = summarize(counts)
+        
+        def facet_options(attribute):
+            values = totals.get(attribute, {})
+            return [
+                {'value': value, 'label': f"{value} ({values[value]})", 'count': values[value]}
+                for value in sorted(values, key=lambda item: (-values[item], item))
+            ]
         
-        # Statusy - z enum w modelu
+        # Statusy - z enum w modelu, liczniki z facetu statusu
+        status_counts = totals.get(STATUS_FACET, {})
         statuses = [
-            {'value': 'czeka_na_wyciecie', 'label': 'Czeka na wycięcie'},
-            {'value': 'czeka_na_skladanie', 'label': 'Czeka na składanie'},
-            {'value': 'czeka_na_pakowanie', 'label': 'Czeka na pakowanie'},
-            {'value': 'spakowane', 'label': 'Spakowane'},
-            {'value': 'wstrzymane', 'label': 'Wstrzymane'}
+            {'value': value, 'label': f"{label} ({status_counts.get(value, 0)})", 'count': status_counts.get(value, 0)}
+            for value, label in (
+                ('czeka_na_wyciecie', 'Czeka na wycięcie'),
+                ('czeka_na_skladanie', 'Czeka na składanie'),
+                ('czeka_na_pakowanie', 'Czeka na pakowanie'),
+                ('spakowane', 'Spakowane'),
+                ('wstrzymane', 'Wstrzymane')
+            )
         ]
         
-        # Gatunki drewna
-        wood_species_query = db.session.query(distinct(ProductionItem.parsed_wood_species))\
-                                      .filter(ProductionItem.parsed_wood_species.isnot(None))\
-                                      .filter(ProductionItem.parsed_wood_species != '')\
-                                      .all()
-        wood_species = [{'value': item[0], 'label': item[0]} for item in wood_species_query]
-        
-        # Technologie
-        technology_query = db.session.query(distinct(ProductionItem.parsed_technology))\
-                                    .filter(ProductionItem.parsed_technology.isnot(None))\
-                                    .filter(ProductionItem.parsed_technology != '')\
-                                    .all()
-        technologies = [{'value': item[0], 'label': item[0]} for item in technology_query]
-        
-        # Klasy drewna
-        wood_class_query = db.session.query(distinct(ProductionItem.parsed_wood_class))\
-                                    .filter(ProductionItem.parsed_wood_class.isnot(None))\
-                                    .filter(ProductionItem.parsed_wood_class != '')\
-                                    .all()
-        wood_classes = [{'value': item[0], 'label': item[0]} for item in wood_class_query]
-        
-        # Zakres priorytetów
-        priority_stats = db.session.query(
-            func.min(ProductionItem.priority_score),
-            func.max(ProductionItem.priority_score),
-            func.avg(ProductionItem.priority_score)
-        ).filter(ProductionItem.priority_score.isnot(None)).first()
+        wood_species = facet_options('wood_species')
+        technologies = facet_options('technology')
+        wood_classes = facet_options('wood_class')
+        thicknesses = sorted(facet_options('thickness'), key=lambda option: float(option['value'][:-2]))
+        
+        # Zakres priorytetów (priority_rank) z liczników projekcji kolejki
+        ranked = [counter for counter in get_status_counters().values() if counter['ranked_count']]
+        ranked_total = sum(counter['ranked_count'] for counter in ranked)
         
         priority_range = {
-            'min': int(priority_stats[0]) if priority_stats[0] else 0,
-            'max': int(priority_stats[1]) if priority_stats[1] else 200,
-            'avg': int(priority_stats[2]) if priority_stats[2] else 100
+            'min': min(counter['min_priority_rank'] for counter in ranked) if ranked else 0,
+            'max': max(counter['max_priority_rank'] for counter in ranked) if ranked else 200,
+            'avg': int(sum(counter['avg_priority_rank'] * counter['ranked_count'] for counter in ranked)
+                       / ranked_total) if ranked_total else 100
         }
         
         # Ostatnie 30 dni dla date picker
@@ -3162,9 +3276,11 @@ def get_filters_data():
             'wood_species': wood_species,
             'technologies': technologies,
             'wood_classes': wood_classes,
+            'thicknesses': thicknesses,
+            'facet_counts': counts,
             'priority_range': priority_range,
             'date_suggestions': date_suggestions,
-            'total_products': ProductionItem.query.count()
+            'total_products': sum(status_counts.values())
         }
         
         logger.info("Pobrano dane filtrów", extra={
@@ -3255,7 +3371,33 @@ def update_single_product_priority(product_id):
         }), 500
 
 
+# Powyżej tylu trafień wyszukiwanie zostaje przy ILIKE (filtr IN po id nic nie daje)
+SEARCH_MATCH_LIMIT = 5000
+
+
+class RankedPagination(Pagination):
+    """
+    Strona wyników w kolejności trafności z indeksu wyszukiwania
+
+    Kolejność stron liczona w Pythonie na liście id (ranked_ids), z bazy
+    ładowane są tylko wiersze bieżącej strony - bez CASE po tysiącach id.
+    """
+
+    def _query_items(self):
+        ranked_ids = self._query_args['ranked_ids']
+        page_ids = ranked_ids[self._query_offset:self._query_offset + self.per_page]
+        if not page_ids:
+            return []
+        model = self._query_args['model']
+        rows = {row.id: row for row in self._query_args['query'].filter(model.id.in_(page_ids))}
+        return [rows[product_id] for product_id in page_ids if product_id in rows]
+
+    def _query_count(self):
+        return len(self._query_args['ranked_ids'])
+
+
 @api_bp.route('/products-filtered', methods=['GET', 'POST'])
+@query_budget(8)
 @login_required
 def products_filtered():
     """
@@ -3270,46 +3412,68 @@ def products_filtered():
         # ZMIANA: domyślnie sortuj po priority_rank zamiast priority_score
         sort_by = request.args.get('sort_by', 'priority_rank')
         # ZMIANA: dla priority_rank używamy ASC (1,2,3...)
-        default_order = 'asc' if sort_by == 'priority_rank' else 'desc'
+        default_order = 'asc' if sort_by in ('priority_rank', 'relevance') else 'desc'
         sort_order = request.args.get('sort_order', default_order)
         
-        # Rozpocznij query od wszystkich produktów
-        query = ProductionItem.query
+        # Status z kolejki - wąska projekcja (prod_queue_items), pozostałe - prod_items
+        if status_filter in QUEUE_STATUSES:
+            model = ProductionQueueItem
+            query = queue_query()
+        else:
+            model = ProductionItem
+            query = ProductionItem.query
         
         # Filtrowanie po statusie
         if status_filter and status_filter != 'all':
-            query = query.filter(ProductionItem.current_status == status_filter)
+            query = query.filter(model.current_status == status_filter)
         
-        # Wyszukiwanie - bez zmian
+        # Wyszukiwanie - indeks trigramowy PRODUCT_SEARCH (id z prod_items = id projekcji)
+        search_ids = None
         if search_query:
+            search_ids = PRODUCT_SEARCH.search(search_query, limit=SEARCH_MATCH_LIMIT + 1)
+            if len(search_ids) <= SEARCH_MATCH_LIMIT:
+                query = query.filter(model.id.in_(search_ids))
+            else:
+                search_ids = None
+        
+        if search_query and search_ids is None:
             search_pattern = f"%{search_query}%"
             search_conditions = []
             
-            if hasattr(ProductionItem, 'original_product_name'):
-                search_conditions.append(ProductionItem.original_product_name.ilike(search_pattern))
-            if hasattr(ProductionItem, 'short_product_id'):
-                search_conditions.append(ProductionItem.short_product_id.ilike(search_pattern))
-            if hasattr(ProductionItem, 'internal_order_number'):
-                search_conditions.append(ProductionItem.internal_order_number.ilike(search_pattern))
-            if hasattr(ProductionItem, 'client_name'):
-                search_conditions.append(ProductionItem.client_name.ilike(search_pattern))
+            if hasattr(model, 'original_product_name'):
+                search_conditions.append(model.original_product_name.ilike(search_pattern))
+            if hasattr(model, 'short_product_id'):
+                search_conditions.append(model.short_product_id.ilike(search_pattern))
+            if hasattr(model, 'internal_order_number'):
+                search_conditions.append(model.internal_order_number.ilike(search_pattern))
+            if hasattr(model, 'client_name'):
+                search_conditions.append(model.client_name.ilike(search_pattern))
             
             if search_conditions:
                 query = query.filter(or_(*search_conditions))
         
         # ZMIANA: Sortowanie - priority_rank jako główne sortowanie
+        # Trafność działa tylko z indeksem - przy ILIKE (ponad SEARCH_MATCH_LIMIT trafień) domyślna kolejność
+        relevance_applied = sort_by == 'relevance' and search_ids is not None
+        ranked_ids = None
+        if relevance_applied:
+            matching_ids = {row[0] for row in query.with_entities(model.id)}
+            ranked_ids = [product_id for product_id in search_ids if product_id in matching_ids]
+            if sort_order == 'desc':
+                ranked_ids.reverse()
+        
         sort_column = None
-        if sort_by == 'priority_rank' and hasattr(ProductionItem, 'priority_rank'):
-            sort_column = ProductionItem.priority_rank
-        elif sort_by == 'priority_score' and hasattr(ProductionItem, 'priority_score'):
+        if sort_by == 'priority_rank' and hasattr(model, 'priority_rank'):
+            sort_column = model.priority_rank
+        elif sort_by == 'priority_score' and hasattr(model, 'priority_score'):
             # KOMPATYBILNOŚĆ: nadal obsługuj priority_score requests
-            sort_column = ProductionItem.priority_score
-        elif sort_by == 'deadline_date' and hasattr(ProductionItem, 'deadline_date'):
-            sort_column = ProductionItem.deadline_date
-        elif sort_by == 'created_at' and hasattr(ProductionItem, 'created_at'):
-            sort_column = ProductionItem.created_at
-        elif sort_by == 'short_product_id' and hasattr(ProductionItem, 'short_product_id'):
-            sort_column = ProductionItem.short_product_id
+            sort_column = model.priority_score
+        elif sort_by == 'deadline_date' and hasattr(model, 'deadline_date'):
+            sort_column = model.deadline_date
+        elif sort_by == 'created_at' and hasattr(model, 'created_at'):
+            sort_column = model.created_at
+        elif sort_by == 'short_product_id' and hasattr(model, 'short_product_id'):
+            sort_column = model.short_product_id
         
         if sort_column is not None:
             if sort_order == 'desc':
@@ -3318,17 +3482,22 @@ def products_filtered():
                 query = query.order_by(sort_column.asc())
         else:
             # ZMIANA: domyślne sortowanie po priority_rank ASC zamiast ID
-            if hasattr(ProductionItem, 'priority_rank'):
-                query = query.order_by(ProductionItem.priority_rank.asc())
+            if hasattr(model, 'priority_rank'):
+                query = query.order_by(model.priority_rank.asc())
             else:
-                query = query.order_by(ProductionItem.id.desc())
-        
-        # Paginacja - bez zmian
-        paginated = query.paginate(
-            page=page,
-            per_page=per_page,
-            error_out=False
-        )
+                query = query.order_by(model.id.desc())
+        
+        # Paginacja - bez wyszukiwania liczba produktów z facetu statusu zamiast COUNT
+        if ranked_ids is not None:
+            paginated = RankedPagination(page=page, per_page=per_page, max_per_page=None, error_out=False,
+                                         query=query, model=model, ranked_ids=ranked_ids)
+        elif search_query:
+            paginated = query.paginate(page=page, per_page=per_page, error_out=False)
+        else:
+            paginated = query.paginate(page=page, per_page=per_page, error_out=False, count=False)
+            paginated.total = status_totals(
+                None if status_filter in ('', 'all') else [status_filter]
+            )
         
         # ZMIANA: Przygotuj dane produktów - dodaj priority_rank do response
         products_data = []
@@ -3403,7 +3572,9 @@ def products_filtered():
                 'status': status_filter,
                 'search': search_query,
                 'sort_by': sort_by,
-                'sort_order': sort_order
+                'sort_order': sort_order,
+                # False gdy sort_by=relevance zignorowano (zbyt wiele trafień - wyszukiwanie ILIKE)
+                'relevance_applied': relevance_applied
             }
         })
         
@@ -4089,13 +4260,12 @@ def dashboard_data():
         
         from ..models import ProductionItem, ProductionError
         
-        # Pobierz dane stacji produkcyjnych
+        # Pobierz dane stacji produkcyjnych (liczniki projekcji kolejki)
         stations_data = []
+        queue_counters = get_status_counters()
         
         # Stacja wycinania
-        cutting_count = ProductionItem.query.filter(
-            ProductionItem.current_status == 'czeka_na_wyciecie'
-        ).count()
+        cutting_count = queue_counters['czeka_na_wyciecie']['count']
         
         stations_data.append({
             'code': 'cutting',
@@ -4106,9 +4276,7 @@ def dashboard_data():
         })
         
         # Stacja składania
-        assembly_count = ProductionItem.query.filter(
-            ProductionItem.current_status == 'czeka_na_skladanie'
-        ).count()
+        assembly_count = queue_counters['czeka_na_skladanie']['count']
         
         stations_data.append({
             'code': 'assembly', 
@@ -4119,9 +4287,7 @@ def dashboard_data():
         })
         
         # Stacja pakowania
-        packaging_count = ProductionItem.query.filter(
-            ProductionItem.current_status == 'czeka_na_pakowanie'
-        ).count()
+        packaging_count = queue_counters['czeka_na_pakowanie']['count']
         
         stations_data.append({
             'code': 'packaging',
@@ -4150,10 +4316,9 @@ def dashboard_data():
         
         # Sprawdź opóźnione zamówienia
         today = date.today()
-        deadline_alerts = ProductionItem.query.filter(
-            ProductionItem.deadline_date <= (today + timedelta(days=3)),
-            ProductionItem.current_status != 'spakowane'
-        ).order_by(ProductionItem.deadline_date.asc()).limit(10).all()
+        deadline_alerts = queue_query().filter(
+            ProductionQueueItem.deadline_date <= (today + timedelta(days=3))
+        ).order_by(ProductionQueueItem.deadline_date.asc()).limit(10).all()
         
         alerts_data = [
             {
@@ -4656,6 +4821,79 @@ logger.info("Zainicjalizowano API routers modułu production", extra={
 # API ROUTERS - NOWE ENDPOINTY - ENHANCED PRIORITY SYSTEM
 # ============================================================================
 
+@job_handler('production.recalculate_priorities', title='Reset i przeliczenie priorytetów')
+def _recalculate_all_priorities_job(params):
+    """Zadanie w tle dla /recalculate-all-priorities"""
+    from ..services.priority_service import get_priority_calculator
+    from ..models import ProductionItem
+
+    user_id = params.get('user_id')
+
+    # Sprawdź ile produktów ma manual override przed resetem
+    manual_overrides_before = ProductionItem.query.filter_by(priority_manual_override=True).count()
+
+    # Resetuj wszystkie manual overrides
+    updated_count = db.session.query(ProductionItem)\
+                            .filter_by(priority_manual_override=True)\
+                            .update({'priority_manual_override': False})
+    db.session.commit()
+
+    logger.info("API: Zresetowano manual overrides", extra={
+        'manual_overrides_reset': updated_count,
+        'user_id': user_id
+    })
+
+    # Wywołaj pełne przeliczenie priorytetów
+    priority_calculator = get_priority_calculator()
+    calculation_result = priority_calculator.recalculate_all_priorities()
+
+    if calculation_result.get('success'):
+        logger.info("API: Reset priorytetów zakończony pomyślnie", extra={
+            'user_id': user_id,
+            'products_updated': calculation_result.get('products_updated', 0),
+            'calculation_duration': calculation_result.get('calculation_duration', '00:00:00'),
+            'manual_overrides_reset': updated_count
+        })
+
+        return {
+            'success': True,
+            'message': f'Zresetowano priorytety {calculation_result.get("products_updated", 0)} produktów',
+            'data': {
+                'reset_performed_at': get_local_now().isoformat(),
+                'reset_by': user_id,
+                'manual_overrides_reset': updated_count,
+                'manual_overrides_before': manual_overrides_before,
+
+                'priority_recalculation': {
+                    'products_updated': calculation_result.get('products_updated', 0),
+                    'calculation_duration': calculation_result.get('calculation_duration', '00:00:00'),
+                    'weeks_processed': calculation_result.get('weeks_processed', 0),
+                    'algorithm': 'payment_date_weekly_grouping'
+                },
+
+                'statistics': calculation_result.get('statistics', {}),
+                'performance_metrics': calculation_result.get('performance_metrics', {})
+            }
+        }
+    else:
+        # Rollback manual overrides jeśli przeliczenie nie powiodło się
+        db.session.rollback()
+
+        logger.error("API: Błąd przeliczenia po reset", extra={
+            'user_id': user_id,
+            'error': calculation_result.get('error', 'Unknown error')
+        })
+
+        return {
+            'success': False,
+            'error': f'Błąd przeliczenia priorytetów: {calculation_result.get("error", "Unknown error")}',
+            'data': {
+                'reset_rolled_back': True,
+                'manual_overrides_preserved': manual_overrides_before
+            }
+        }
+
+
 @api_bp.route('/recalculate-all-priorities', methods=['POST'])
 @login_required
 def reset_all_priorities():
@@ -4672,7 +4910,7 @@ def reset_all_priorities():
     }
     
     Autoryzacja: admin
-    Returns: JSON z szczegółowym raportem przeliczenia
+    Returns: 202 z job_id; raport przeliczenia w job.result
     """
     try:
         data = request.get_json() or {}
@@ -4691,72 +4929,15 @@ def reset_all_priorities():
             'client_ip': request.remote_addr
         })
         
-        from ..services.priority_service import get_priority_calculator
-        from ..models import ProductionItem
-        
-        # Sprawdź ile produktów ma manual override przed resetem
-        manual_overrides_before = ProductionItem.query.filter_by(priority_manual_override=True).count()
-        
-        # Resetuj wszystkie manual overrides
-        updated_count = db.session.query(ProductionItem)\
-                                .filter_by(priority_manual_override=True)\
-                                .update({'priority_manual_override': False})
-        db.session.commit()
-        
-        logger.info("API: Zresetowano manual overrides", extra={
-            'manual_overrides_reset': updated_count,
-            'user_id': current_user.id
-        })
-        
-        # Wywołaj pełne przeliczenie priorytetów
-        priority_calculator = get_priority_calculator()
-        calculation_result = priority_calculator.recalculate_all_priorities()
-        
-        if calculation_result.get('success'):
-            logger.info("API: Reset priorytetów zakończony pomyślnie", extra={
-                'user_id': current_user.id,
-                'products_updated': calculation_result.get('products_updated', 0),
-                'calculation_duration': calculation_result.get('calculation_duration', '00:00:00'),
-                'manual_overrides_reset': updated_count
-            })
-            
-            return jsonify({
-                'success': True,
-                'message': f'Zresetowano priorytety {calculation_result.get("products_updated", 0)} produktów',
-                'data': {
-                    'reset_performed_at': get_local_now().isoformat(),
-                    'reset_by': current_user.id,
-                    'manual_overrides_reset': updated_count,
-                    'manual_overrides_before': manual_overrides_before,
-                    
-                    'priority_recalculation': {
-                        'products_updated': calculation_result.get('products_updated', 0),
-                        'calculation_duration': calculation_result.get('calculation_duration', '00:00:00'),
-                        'weeks_processed': calculation_result.get('weeks_processed', 0),
-                        'algorithm': 'payment_date_weekly_grouping'
-                    },
-                    
-                    'statistics': calculation_result.get('statistics', {}),
-                    'performance_metrics': calculation_result.get('performance_metrics', {})
-                }
-            }), 200
-        else:
-            # Rollback manual overrides jeśli przeliczenie nie powiodło się
-            db.session.rollback()
-            
-            logger.error("API: Błąd przeliczenia po reset", extra={
-                'user_id': current_user.id,
-                'error': calculation_result.get('error', 'Unknown error')
-            })
-            
-            return jsonify({
-                'success': False,
-                'error': f'Błąd przeliczenia priorytetów: {calculation_result.get("error", "Unknown error")}',
-                'data': {
-                    'reset_rolled_back': True,
-                    'manual_overrides_preserved': manual_overrides_before
-                }
-            }), 500
+        job = submit_job(
+            'production.recalculate_priorities',
+            params={'user_id': current_user.id},
+            user_id=current_user.id
+        )
+        return job_submitted_response(job, 'Przeliczanie priorytetów uruchomione w tle')
+    
+    except JobAlreadyRunning as exc:
+        return job_conflict_response(exc)
         
     except Exception as e:
         db.session.rollback()
@@ -52,7 +52,8 @@ def dashboard():
             'user_role': getattr(current_user, 'role', 'unknown')
         })
         
-        from ..models import ProductionItem
+        from ..models import ProductionItem, ProductionQueueItem
+        from ..services.queue_projection import STATION_STATUSES, get_status_counters, queue_query
         
         # Podstawowe statystyki - zgodnie z PRD API response structure
         dashboard_stats = {
@@ -75,23 +76,24 @@ def dashboard():
             }
         }
         
-        # Statystyki per stanowisko
+        # Statystyki per stanowisko (oczekujące - liczniki projekcji kolejki)
         today = date.today()
+        queue_counters = get_status_counters()
         
         # Cutting - oczekujące
-        cutting_pending = ProductionItem.query.filter_by(current_status='czeka_na_wyciecie').count()
+        cutting_pending = queue_counters['czeka_na_wyciecie']['count']
         cutting_today_m3 = db.session.query(db.func.sum(ProductionItem.volume_m3))\
                                     .filter(ProductionItem.cutting_completed_at >= datetime.combine(today, datetime.min.time()))\
                                     .scalar() or 0.0
         
         # Assembly - oczekujące  
-        assembly_pending = ProductionItem.query.filter_by(current_status='czeka_na_skladanie').count()
+        assembly_pending = queue_counters['czeka_na_skladanie']['count']
         assembly_today_m3 = db.session.query(db.func.sum(ProductionItem.volume_m3))\
                                      .filter(ProductionItem.assembly_completed_at >= datetime.combine(today, datetime.min.time()))\
                                      .scalar() or 0.0
         
         # Packaging - oczekujące
-        packaging_pending = ProductionItem.query.filter_by(current_status='czeka_na_pakowanie').count()
+        packaging_pending = queue_counters['czeka_na_pakowanie']['count']
         packaging_today_m3 = db.session.query(db.func.sum(ProductionItem.volume_m3))\
                                       .filter(ProductionItem.packaging_completed_at >= datetime.combine(today, datetime.min.time()))\
                                       .scalar() or 0.0
@@ -125,9 +127,8 @@ def dashboard():
         }
         
         # Alerty deadline - produkty zbliżające się do terminu
-        deadline_alerts = ProductionItem.query.filter(
-            ProductionItem.deadline_date <= date.today() + timedelta(days=3),
-            ProductionItem.current_status.in_(['czeka_na_wyciecie', 'czeka_na_skladanie', 'czeka_na_pakowanie'])
+        deadline_alerts = queue_query(STATION_STATUSES.values()).filter(
+            ProductionQueueItem.deadline_date <= date.today() + timedelta(days=3)
         ).limit(5).all()
         
         dashboard_stats['deadline_alerts'] = [
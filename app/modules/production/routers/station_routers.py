@@ -83,37 +83,14 @@ def get_products_for_station(station_code, limit=50, sort_by='priority'):
         List[Dict]: Lista produktów z dodatkowymi informacjami
     """
     try:
-        from ..models import ProductionItem
-        from sqlalchemy import asc, desc
+        from ..services.queue_projection import STATION_STATUSES, station_items
         
-        # Mapowanie statusów na stanowiska
-        status_map = {
-            'cutting': 'czeka_na_wyciecie',
-            'assembly': 'czeka_na_skladanie',
-            'packaging': 'czeka_na_pakowanie'
-        }
-        
-        if station_code not in status_map:
+        if station_code not in STATION_STATUSES:
             logger.warning("Nieprawidłowy kod stanowiska", extra={'station_code': station_code})
             return []
         
-        # Query podstawowy
-        query = ProductionItem.query.filter_by(
-            current_status=status_map[station_code]
-        )
-        
-        # Sortowanie - POPRAWIONE POD NOWY MODEL (priority_rank)
-        if sort_by == 'priority':
-            query = query.order_by(asc(ProductionItem.priority_rank))
-        elif sort_by == 'deadline':
-            query = query.order_by(asc(ProductionItem.deadline_date))
-        elif sort_by == 'created_at':
-            query = query.order_by(asc(ProductionItem.created_at))
-        else:
-            query = query.order_by(asc(ProductionItem.priority_rank))
-        
-        # Wykonanie query
-        products = query.limit(limit).all()
+        # Projekcja kolejki (prod_queue_items) - sortowanie po randze / terminie / dacie utworzenia
+        products = station_items(station_code, sort_by=sort_by, limit=limit)
         
         # Przygotowanie danych z dodatkowymi informacjami
         products_data = []
@@ -160,11 +137,6 @@ def get_products_for_station(station_code, limit=50, sort_by='priority'):
                 deadline_color = 'unknown'
                 deadline_class = 'deadline-unknown'
             
-            # Formatowanie wymiarów w MM
-            dimensions_text = ''
-            if all([product.parsed_length_cm, product.parsed_width_cm, product.parsed_thickness_cm]):
-                dimensions_text = f"{int(product.parsed_length_cm * 10)} × {int(product.parsed_width_cm * 10)} × {int(product.parsed_thickness_cm * 10)} mm"
-            
             # POPRAWKA: Bezpieczne pobieranie volume_m3
             try:
                 volume_m3 = float(product.volume_m3) if product.volume_m3 else 0.0
@@ -209,7 +181,7 @@ def get_products_for_station(station_code, limit=50, sort_by='priority'):
                 'wood_species': product.parsed_wood_species,
                 'technology': product.parsed_technology,
                 'wood_class': product.parsed_wood_class,
-                'dimensions': dimensions_text,
+                'dimensions': product.dimensions_text or '',
                 'finish_state': product.parsed_finish_state,
                 'thickness_group': product.thickness_group,
                 
@@ -217,7 +189,7 @@ def get_products_for_station(station_code, limit=50, sort_by='priority'):
                 'client_name': product.client_name,
                 
                 # Formatowane teksty dla UI
-                'display_name': _format_product_display_name(product),
+                'display_name': product.display_name,
                 'display_priority': f"#{priority_rank} - {priority_label}",
                 'display_deadline': _format_deadline_display(product),
                 'display_value': f"{total_value:.2f} PLN" if total_value > 0 else "—",
@@ -242,43 +214,6 @@ def get_products_for_station(station_code, limit=50, sort_by='priority'):
         })
         return []
 
-def _format_product_display_name(product):
-    """
-    Formatuje nazwę produktu do wyświetlenia
-    
-    Args:
-        product: Obiekt ProductionItem
-        
-    Returns:
-        str: Sformatowana nazwa
-    """
-    parts = []
-    
-    if product.parsed_wood_species:
-        parts.append(product.parsed_wood_species.title())
-    
-    if product.parsed_technology:
-        parts.append(product.parsed_technology.title())
-    
-    if product.parsed_wood_class:
-        parts.append(f"Klasa {product.parsed_wood_class}")
-    
-    if all([product.parsed_length_cm, product.parsed_width_cm, product.parsed_thickness_cm]):
-        dimensions = f"{product.parsed_length_cm}×{product.parsed_width_cm}×{product.parsed_thickness_cm} cm"
-        parts.append(dimensions)
-    
-    if product.parsed_finish_state and product.parsed_finish_state.lower() != 'surowe':
-        parts.append(product.parsed_finish_state.title())
-    
-    if parts:
-        return " | ".join(parts)
-    else:
-        # Fallback do oryginalnej nazwy (skróconej)
-        original = product.original_product_name or "Brak nazwy"
-        if len(original) > 60:
-            return original[:57] + "..."
-        return original
-
 def _format_deadline_display(product):
     """
     Formatuje deadline do wyświetlenia
@@ -317,22 +252,14 @@ def get_station_summary():
         Dict[str, Dict]: Podsumowanie per stanowisko
     """
     try:
-        from ..models import ProductionItem
-        from sqlalchemy import func
-        
-        # Query dla wszystkich statusów jednocześnie - POPRAWKA: priority_rank zamiast priority_score
-        summary_data = db.session.query(
-            ProductionItem.current_status,
-            func.count(ProductionItem.id).label('count'),
-            func.sum(ProductionItem.volume_m3).label('volume'),
-            func.avg(ProductionItem.priority_rank).label('avg_rank')
-        ).filter(
-            ProductionItem.current_status.in_([
-                'czeka_na_wyciecie',
-                'czeka_na_skladanie', 
-                'czeka_na_pakowanie'
-            ])
-        ).group_by(ProductionItem.current_status).all()
+        from ..services.queue_projection import get_status_counters
+        
+        # Liczniki kolejki per status (prod_queue_counters)
+        counters = get_status_counters()
+        summary_data = [
+            (status, counter['count'], counter['volume_m3'], counter['avg_priority_rank'])
+            for status, counter in counters.items()
+        ]
         
         # Mapowanie na stacje
         status_to_station = {
@@ -606,6 +533,7 @@ def packaging_station():
     """
     try:
         from ..models import ProductionItem
+        from ..services.queue_projection import STATION_STATUSES, order_numbers_in_status
         from sqlalchemy import asc, desc
         
         sort_by = request.args.get('sort', 'priority')
@@ -620,13 +548,8 @@ def packaging_station():
         })
         
         # NOWA LOGIKA: Znajdź zamówienia które mają choć 1 produkt do pakowania
-        orders_with_packaging = db.session.query(
-            ProductionItem.internal_order_number
-        ).filter(
-            ProductionItem.current_status == 'czeka_na_pakowanie'
-        ).distinct().all()
-        
-        order_numbers = [order[0] for order in orders_with_packaging if order[0]]
+        # (z projekcji kolejki; produkty zamówień niżej - z prod_items, bo obejmują też spakowane)
+        order_numbers = order_numbers_in_status(STATION_STATUSES['packaging'])
         
         if not order_numbers:
             products = []
@@ -973,6 +896,7 @@ def ajax_get_orders_packaging():
     """
     try:
         from ..models import ProductionItem
+        from ..services.queue_projection import STATION_STATUSES, order_numbers_in_status
         from sqlalchemy import asc, desc
         
         sort_by = request.args.get('sort', 'priority')
@@ -985,13 +909,8 @@ def ajax_get_orders_packaging():
         })
         
         # KROK 1: Znajdź zamówienia które mają choć 1 produkt do pakowania
-        orders_with_packaging = db.session.query(
-            ProductionItem.internal_order_number
-        ).filter(
-            ProductionItem.current_status == 'czeka_na_pakowanie'
-        ).distinct().all()
-        
-        order_numbers = [order[0] for order in orders_with_packaging]
+        # (z projekcji kolejki; produkty zamówień niżej - z prod_items, bo obejmują też spakowane)
+        order_numbers = order_numbers_in_status(STATION_STATUSES['packaging'])
         
         if not order_numbers:
             return jsonify({
@@ -94,8 +94,9 @@ def get_parser_service():
     global _parser_instance
     
     if _parser_instance is None and ProductNameParser:
-        _parser_instance = ProductNameParser()
-        logger.info("Utworzono singleton ProductNameParser")
+        # Ta sama instancja co parser_service.get_parser_service() - jeden cache LRU
+        from .parser_service import get_parser_service as get_shared_parser_service
+        _parser_instance = get_shared_parser_service()
     
     return _parser_instance
 
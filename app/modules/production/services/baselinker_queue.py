@@ -0,0 +1,474 @@
+# modules/production/services/baselinker_queue.py
+"""
+Kolejka wychodzących komend do Baselinker
+=========================================
+
+Zmiany statusów i pól zamówień (setOrderStatus, setOrderFields - m.in.
+komentarze walidacji) nie są już wysyłane synchronicznie w requestach
+stanowisk i synchronizacji. Zapisywane są w tabeli prod_baselinker_commands
+i wysyłane przez worker w tle:
+
+- coalescing: nowa komenda dla tego samego zamówienia i metody nadpisuje
+  oczekującą (setOrderFields łączy pola), więc wysyłana jest tylko
+  ostatnia wersja,
+- batching: zmiany statusów zgrupowane po docelowym statusie idą jednym
+  wywołaniem setOrderStatuses (przy błędzie - pojedynczo; gdy API nie zna
+  tej metody, dalej tylko pojedyncze setOrderStatus),
+- limit zapytań: odstęp między wywołaniami wg RATE_LIMIT_PER_MINUTE,
+- ponowienia z wykładniczym backoffem, po MAX_ATTEMPTS status 'failed',
+- starsza komenda (ponowienie, partia pobrana po nowszej) nie nadpisuje
+  nowszej o tym samym coalesce_key - jest oznaczana jako superseded.
+
+Kolejkę opróżnia jeden proces - zadanie daemona schedulera (limit zapytań
+liczony w procesie jest więc limitem globalnym). Procesy webowe po dodaniu
+komendy tylko zlecają daemonowi uruchomienie (wake_worker); bez daemona
+kolejkę opróżnia cron: flask drain-baselinker-queue.
+
+Stan synchronizacji zamówienia dla UI: get_order_sync_state().
+"""
+
+import json
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+from extensions import db
+from lazy_tables import LazyTables
+from modules.logging import get_structured_logger
+from ..models import BaselinkerOutboundCommand, get_local_now
+
+logger = get_structured_logger('production.baselinker_queue')
+
+METHOD_SET_STATUS = 'setOrderStatus'
+METHOD_SET_FIELDS = 'setOrderFields'
+METHOD_SET_STATUSES_BATCH = 'setOrderStatuses'
+
+# Baselinker: 100 zapytań/min na token - zostawiamy zapas dla synchronizacji
+RATE_LIMIT_PER_MINUTE = 80
+
+DRAIN_BATCH_SIZE = 100
+MAX_ATTEMPTS = 8
+BACKOFF_BASE_SECONDS = 30
+BACKOFF_MAX_SECONDS = 3600
+
+# Komendy 'in_progress' starsze niż to (np. proces zabity w trakcie) wracają do kolejki
+CLAIM_TIMEOUT_MINUTES = 10
+
+_TABLES = LazyTables(BaselinkerOutboundCommand)
+
+
+def _coalesce_key(method: str, baselinker_order_id: int) -> str:
+    return f"{method}:{baselinker_order_id}"
+
+
+def backoff_seconds(attempts: int) -> float:
+    """Opóźnienie ponowienia po `attempts` nieudanych próbach (z losowym rozrzutem)"""
+    delay = min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** max(attempts - 1, 0)))
+    return delay * random.uniform(0.8, 1.2)
+
+
+# ============================================================================
+# DODAWANIE KOMEND
+# ============================================================================
+
+def enqueue_command(baselinker_order_id: int, method: str, parameters: Dict[str, Any],
+                    internal_order_number: Optional[str] = None, source: Optional[str] = None,
+                    commit: bool = True) -> BaselinkerOutboundCommand:
+    """
+    Dodaje komendę do kolejki lub nadpisuje oczekującą dla tego zamówienia
+
+    Args:
+        parameters: Parametry metody API bez order_id
+        commit: False - wywołujący robi commit i wake_worker() sam
+
+    Returns:
+        BaselinkerOutboundCommand: komenda (nowa lub zaktualizowana)
+    """
+    _TABLES.ensure()
+    key = _coalesce_key(method, baselinker_order_id)
+
+    command = BaselinkerOutboundCommand.query.filter_by(
+        coalesce_key=key, status='pending'
+    ).order_by(BaselinkerOutboundCommand.id.desc()).first()
+
+    if command is not None:
+        if method == METHOD_SET_FIELDS:
+            merged = dict(command.parameters or {})
+            merged.update(parameters)
+            command.parameters = merged
+        else:
+            command.parameters = dict(parameters)
+        command.attempts = 0
+        command.next_attempt_at = get_local_now()
+        command.last_error = None
+        command.source = source or command.source
+        if internal_order_number:
+            command.internal_order_number = internal_order_number
+
+        logger.debug("Połączono komendę Baselinker z oczekującą", extra={
+            'command_id': command.id,
+            'method': method,
+            'baselinker_order_id': baselinker_order_id
+        })
+    else:
+        command = BaselinkerOutboundCommand(
+            baselinker_order_id=baselinker_order_id,
+            internal_order_number=internal_order_number,
+            method=method,
+            coalesce_key=key,
+            parameters=dict(parameters),
+            source=source,
+            status='pending',
+            attempts=0,
+            next_attempt_at=get_local_now()
+        )
+        db.session.add(command)
+
+    if commit:
+        db.session.commit()
+        wake_worker()
+
+    return command
+
+
+def enqueue_order_status(baselinker_order_id: int, status_id: int,
+                         internal_order_number: Optional[str] = None,
+                         source: Optional[str] = None, commit: bool = True) -> BaselinkerOutboundCommand:
+    """Kolejkuje zmianę statusu zamówienia (setOrderStatus)"""
+    return enqueue_command(baselinker_order_id, METHOD_SET_STATUS, {'status_id': int(status_id)},
+                           internal_order_number=internal_order_number, source=source, commit=commit)
+
+
+def enqueue_order_fields(baselinker_order_id: int, fields: Dict[str, Any],
+                         internal_order_number: Optional[str] = None,
+                         source: Optional[str] = None, commit: bool = True) -> BaselinkerOutboundCommand:
+    """Kolejkuje zmianę pól zamówienia (setOrderFields, np. admin_comments)"""
+    return enqueue_command(baselinker_order_id, METHOD_SET_FIELDS, fields,
+                           internal_order_number=internal_order_number, source=source, commit=commit)
+
+
+# ============================================================================
+# WYSYŁKA
+# ============================================================================
+
+class BaselinkerCommandQueue:
+    """
+    Opróżnianie kolejki komend
+
+    Args:
+        api_request: Funkcja (method, parameters) -> odpowiedź JSON Baselinker;
+            domyślnie transport BaselinkerSyncService
+        rate_limit_per_minute: Maksymalna liczba wywołań API na minutę
+    """
+
+    def __init__(self, api_request: Optional[Callable[[str, Dict[str, Any]], Dict[str, Any]]] = None,
+                 rate_limit_per_minute: int = RATE_LIMIT_PER_MINUTE):
+        self._api_request = api_request or self._sync_service_request
+        self._min_interval = 60.0 / max(rate_limit_per_minute, 1)
+        self._last_call_at = 0.0
+        self._throttle_lock = threading.Lock()
+        # Wyłączane, gdy API nie zna metody zbiorczej - bez zbędnego wywołania w każdej partii
+        self._batch_status_supported = True
+
+    @staticmethod
+    def _sync_service_request(method: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        from .sync_service import SyncError, get_sync_service
+
+        service = get_sync_service()
+        if not service.api_key:
+            raise SyncError("Brak klucza API Baselinker")
+        return service._make_api_request({
+            'token': service.api_key,
+            'method': method,
+            'parameters': json.dumps(parameters)
+        })
+
+    def _call(self, method: str, parameters: Dict[str, Any]) -> Dict[str, Any]:
+        with self._throttle_lock:
+            wait = self._last_call_at + self._min_interval - time.monotonic()
+            if wait > 0:
+                time.sleep(wait)
+            self._last_call_at = time.monotonic()
+        return self._api_request(method, parameters)
+
+    # --- pobieranie partii ---
+
+    def release_stale_claims(self) -> int:
+        """Zwraca do kolejki komendy porzucone przez zatrzymany worker"""
+        cutoff = get_local_now() - timedelta(minutes=CLAIM_TIMEOUT_MINUTES)
+        released = BaselinkerOutboundCommand.query.filter(
+            BaselinkerOutboundCommand.status == 'in_progress',
+            BaselinkerOutboundCommand.claimed_at < cutoff
+        ).update({'status': 'pending', 'claim_token': None}, synchronize_session=False)
+        db.session.commit()
+        return released
+
+    def claim_batch(self, limit: int = DRAIN_BATCH_SIZE) -> List[BaselinkerOutboundCommand]:
+        """Rezerwuje partię gotowych komend dla tego workera"""
+        now = get_local_now()
+        ids = [
+            row[0] for row in db.session.query(BaselinkerOutboundCommand.id)
+            .filter(BaselinkerOutboundCommand.status == 'pending',
+                    BaselinkerOutboundCommand.next_attempt_at <= now)
+            .order_by(BaselinkerOutboundCommand.id)
+            .limit(limit)
+            .all()
+        ]
+        if not ids:
+            return []
+
+        token = uuid.uuid4().hex
+        BaselinkerOutboundCommand.query.filter(
+            BaselinkerOutboundCommand.id.in_(ids),
+            BaselinkerOutboundCommand.status == 'pending'
+        ).update({'status': 'in_progress', 'claim_token': token, 'claimed_at': now},
+                 synchronize_session=False)
+        db.session.commit()
+
+        return BaselinkerOutboundCommand.query.filter_by(claim_token=token).order_by(
+            BaselinkerOutboundCommand.id
+        ).all()
+
+    # --- komendy nieaktualne ---
+
+    def _drop_superseded(self, commands: List[BaselinkerOutboundCommand]) -> List[BaselinkerOutboundCommand]:
+        """
+        Oznacza jako superseded komendy, dla których istnieje nowsza o tym
+        samym kluczu (w dowolnym stanie) - wysłanie starszej nadpisałoby nowszy
+        status w Baselinker. setOrderFields traci tylko pola obecne w nowszych.
+
+        Returns:
+            list: komendy do wysłania
+        """
+        if not commands:
+            return []
+        newer_rows = BaselinkerOutboundCommand.query.filter(
+            BaselinkerOutboundCommand.coalesce_key.in_({command.coalesce_key for command in commands}),
+            BaselinkerOutboundCommand.id > min(command.id for command in commands)
+        ).all()
+
+        active = []
+        for command in commands:
+            newer = [row for row in newer_rows
+                     if row.coalesce_key == command.coalesce_key and row.id > command.id]
+            if newer and command.method == METHOD_SET_FIELDS:
+                covered = {field for row in newer for field in (row.parameters or {})}
+                remaining = {field: value for field, value in (command.parameters or {}).items()
+                             if field not in covered}
+                if remaining:
+                    command.parameters = remaining
+                    newer = []
+            if newer:
+                self._mark_done([command], note='superseded')
+                continue
+            active.append(command)
+        return active
+
+    # --- wyniki ---
+
+    def _mark_done(self, commands: List[BaselinkerOutboundCommand], note: Optional[str] = None):
+        now = get_local_now()
+        for command in commands:
+            command.status = 'done'
+            command.attempts += 1
+            command.completed_at = now
+            command.claim_token = None
+            command.last_error = note
+
+    def _mark_retry(self, commands: List[BaselinkerOutboundCommand], error: str):
+        now = get_local_now()
+        # Nowsza komenda powstała w trakcie wysyłki - ponowienie starszej by ją nadpisało
+        for command in self._drop_superseded(commands):
+            command.attempts += 1
+            command.claim_token = None
+            command.last_error = error[:1000]
+            if command.attempts >= MAX_ATTEMPTS:
+                command.status = 'failed'
+                command.completed_at = now
+                logger.error("Komenda Baselinker nieudana - koniec ponowień", extra={
+                    'command_id': command.id,
+                    'method': command.method,
+                    'baselinker_order_id': command.baselinker_order_id,
+                    'attempts': command.attempts,
+                    'error': error
+                })
+            else:
+                command.status = 'pending'
+                command.next_attempt_at = now + timedelta(seconds=backoff_seconds(command.attempts))
+
+    @staticmethod
+    def _response_error(response: Dict[str, Any]) -> Optional[str]:
+        if response.get('status') == 'SUCCESS':
+            return None
+        return f"{response.get('error_code', 'ERROR')}: {response.get('error_message', 'Unknown error')}"
+
+    def _send_single(self, command: BaselinkerOutboundCommand) -> bool:
+        parameters = dict(command.parameters or {})
+        parameters['order_id'] = command.baselinker_order_id
+        try:
+            error = self._response_error(self._call(command.method, parameters))
+        except Exception as e:
+            error = str(e)
+
+        if error:
+            self._mark_retry([command], error)
+            return False
+        self._mark_done([command])
+        return True
+
+    def _send_status_group(self, status_id: int, commands: List[BaselinkerOutboundCommand]) -> int:
+        """Zmiana statusu wielu zamówień jednym wywołaniem; przy błędzie pojedynczo"""
+        if len(commands) > 1 and self._batch_status_supported:
+            try:
+                response = self._call(METHOD_SET_STATUSES_BATCH, {
+                    'order_ids': [command.baselinker_order_id for command in commands],
+                    'status_id': status_id
+                })
+                if not self._response_error(response):
+                    self._mark_done(commands)
+                    return len(commands)
+                if response.get('error_code') == 'ERROR_UNKNOWN_METHOD':
+                    self._batch_status_supported = False
+                logger.warning("Zbiorcza zmiana statusów odrzucona - wysyłka pojedyncza", extra={
+                    'status_id': status_id,
+                    'orders_count': len(commands),
+                    'error': self._response_error(response)
+                })
+            except Exception as e:
+                logger.warning("Błąd zbiorczej zmiany statusów - wysyłka pojedyncza", extra={
+                    'status_id': status_id,
+                    'orders_count': len(commands),
+                    'error': str(e)
+                })
+
+        return sum(1 for command in commands if self._send_single(command))
+
+    def process_batch(self, commands: List[BaselinkerOutboundCommand]) -> Dict[str, int]:
+        """Wysyła zarezerwowaną partię komend"""
+        stats = {'claimed': len(commands), 'sent': 0, 'superseded': 0, 'deferred': 0}
+
+        # Nowsza komenda o tym samym kluczu (w partii lub poza nią) - starsza nie jest wysyłana
+        active = self._drop_superseded(commands)
+        stats['superseded'] = len(commands) - len(active)
+
+        status_groups: Dict[int, List[BaselinkerOutboundCommand]] = {}
+        for command in active:
+            if command.method == METHOD_SET_STATUS:
+                status_groups.setdefault(int(command.parameters['status_id']), []).append(command)
+            elif self._send_single(command):
+                stats['sent'] += 1
+
+        for status_id, group in status_groups.items():
+            stats['sent'] += self._send_status_group(status_id, group)
+
+        stats['deferred'] = len(active) - stats['sent']
+        db.session.commit()
+        return stats
+
+    def drain(self, max_batches: Optional[int] = None) -> Dict[str, int]:
+        """
+        Wysyła gotowe komendy aż do opróżnienia kolejki (lub max_batches partii)
+
+        Returns:
+            dict: claimed, sent, superseded, deferred (ponowienie/failed), released
+        """
+        _TABLES.ensure()
+        totals = {'claimed': 0, 'sent': 0, 'superseded': 0, 'deferred': 0,
+                  'released': self.release_stale_claims()}
+
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            commands = self.claim_batch()
+            if not commands:
+                break
+            for key, value in self.process_batch(commands).items():
+                totals[key] += value
+            batches += 1
+
+        if totals['claimed']:
+            logger.info("Opróżniono kolejkę komend Baselinker", extra=totals)
+        return totals
+
+
+_queue_instance = None
+
+
+def get_command_queue() -> BaselinkerCommandQueue:
+    global _queue_instance
+
+    if _queue_instance is None:
+        _queue_instance = BaselinkerCommandQueue()
+    return _queue_instance
+
+
+# ============================================================================
+# WYBUDZENIE
+# ============================================================================
+
+def wake_worker():
+    """Zleca daemonowi schedulera opróżnienie kolejki po dodaniu komend"""
+    from modules.scheduler import BASELINKER_QUEUE_DRAIN_JOB, request_job_run
+
+    if not request_job_run(BASELINKER_QUEUE_DRAIN_JOB):
+        # Bez daemona komendy czekają na cron - drenaż w procesach webowych
+        # przekroczyłby limit zapytań (każdy proces liczy go osobno)
+        logger.warning("Daemon schedulera nie działa - komendy Baselinker czekają na flask drain-baselinker-queue")
+
+
+# ============================================================================
+# STAN DLA UI
+# ============================================================================
+
+def get_order_sync_state(internal_order_number: Optional[str] = None,
+                         baselinker_order_id: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Stan wysyłki komend dla zamówienia (najnowsza komenda każdej metody)
+
+    Returns:
+        dict: state ('none' | 'pending' | 'done' | 'failed'), commands
+    """
+    _TABLES.ensure()
+    query = BaselinkerOutboundCommand.query
+    if baselinker_order_id is not None:
+        query = query.filter_by(baselinker_order_id=baselinker_order_id)
+    elif internal_order_number:
+        query = query.filter_by(internal_order_number=internal_order_number)
+    else:
+        return {'state': 'none', 'commands': []}
+
+    latest = {}
+    for command in query.order_by(BaselinkerOutboundCommand.id.desc()).limit(20).all():
+        latest.setdefault(command.method, command)
+
+    statuses = {command.status for command in latest.values()}
+    if not statuses:
+        state = 'none'
+    elif 'failed' in statuses:
+        state = 'failed'
+    elif statuses & {'pending', 'in_progress'}:
+        state = 'pending'
+    else:
+        state = 'done'
+
+    return {
+        'state': state,
+        'commands': [command.to_dict() for command in latest.values()]
+    }
+
+
+def register_baselinker_queue_cli(app):
+    """Rejestruje komendę flask drain-baselinker-queue"""
+    import click
+    from flask.cli import with_appcontext
+
+    @app.cli.command('drain-baselinker-queue')
+    @click.option('--max-batches', default=0, help='Maksymalna liczba partii (0 = do opróżnienia)')
+    @with_appcontext
+    def drain_baselinker_queue_command(max_batches):
+        """Wysyła oczekujące komendy Baselinker (cron, gdy daemon schedulera nie działa)"""
+        stats = get_command_queue().drain(max_batches=max_batches or None)
+        print(f"[drain-baselinker-queue] {stats}", file=sys.stderr)
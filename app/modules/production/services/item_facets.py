@@ -0,0 +1,238 @@
+# modules/production/services/item_facets.py
+"""
+Liczniki filtrów (facety) listy produktów produkcji
+===================================================
+
+Dropdowny filtrów listy produktów (gatunek, technologia, klasa, grubość,
+status) potrzebowały SELECT DISTINCT po prod_items i pełnego COUNT.
+Tabela prod_item_facets trzyma liczbę produktów dla każdej trójki
+(atrybut, wartość, status) - cała lista filtrów z licznikami to odczyt
+kilkuset wierszy, a liczniki dla dowolnego wyboru statusów frontend
+sumuje sam (facet_counts), bez kolejnego zapytania.
+
+Utrzymanie przyrostowe, w transakcji zmiany (zdarzenia sesji
+z item_tracking): stare klucze zmienianych / usuwanych produktów są
+odczytywane z bazy przed zmianą, nowe po niej, a liczniki zmieniane
+o różnicę (+1 / -1) na połączeniu sesji - także dla bulk UPDATE po id
+i UPDATE / DELETE z warunkiem.
+
+Liczniki są budowane z istniejących produktów raz, przed pierwszym
+odczytem lub zapisem (znacznik i lease w derived_table_builds). Pełna
+przebudowa: flask rebuild-production-facets.
+"""
+
+import sys
+import time
+from collections import Counter
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, insert, select, update
+
+from extensions import db
+from lazy_tables import DerivedTables
+from modules.logging import get_structured_logger
+from ..models import ProductionItem, ProductionItemFacet, get_local_now
+from .item_tracking import install_item_tracking, register_item_consumer
+
+logger = get_structured_logger('production.item_facets')
+
+STATUS_FACET = 'status'
+
+# Atrybut facetu -> kolumna prod_items
+FACET_COLUMNS = {
+    'wood_species': 'parsed_wood_species',
+    'technology': 'parsed_technology',
+    'wood_class': 'parsed_wood_class',
+    'thickness': 'parsed_thickness_cm',
+}
+
+# Kolumny, których zmiana przesuwa liczniki
+TRACKED_FIELDS = ('current_status',) + tuple(FACET_COLUMNS.values())
+
+IDS_PER_CHUNK = 500
+
+
+
+def thickness_value(thickness_cm) -> Optional[str]:
+    """Wartość filtra grubości jak na liście produktów ('4cm', '2.5cm')"""
+    if not thickness_cm:
+        return None
+    return f"{float(thickness_cm):g}cm"
+
+
+def facet_keys(status, values: Dict) -> List[Tuple[str, str, str]]:
+    """
+    Klucze (atrybut, wartość, status) jednego produktu
+
+    Args:
+        values: Wartości kolumn FACET_COLUMNS (nazwy kolumn prod_items)
+    """
+    if not status:
+        return []
+    keys = [(STATUS_FACET, status, status)]
+    for attribute, column in FACET_COLUMNS.items():
+        value = values.get(column)
+        value = thickness_value(value) if attribute == 'thickness' else (value or None)
+        if value:
+            keys.append((attribute, str(value)[:64], status))
+    return keys
+
+
+def _load_keys(conn, item_ids: Iterable[int]) -> Counter:
+    """Klucze facetów produktów wg stanu w bazie (w transakcji `conn`)"""
+    unique_ids = sorted({item_id for item_id in item_ids if item_id is not None})
+    items = ProductionItem.__table__
+    keys = Counter()
+    for start in range(0, len(unique_ids), IDS_PER_CHUNK):
+        chunk = unique_ids[start:start + IDS_PER_CHUNK]
+        rows = conn.execute(
+            select(*(items.c[name] for name in TRACKED_FIELDS)).where(items.c.id.in_(chunk))
+        )
+        for row in rows:
+            keys.update(facet_keys(row.current_status, row._mapping))
+    return keys
+
+
+# ============================================================================
+# ZAPIS LICZNIKÓW
+# ============================================================================
+
+def apply_deltas(conn, deltas: Counter):
+    """Dodaje różnice liczników (klucz -> +n / -n) w transakcji `conn`"""
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    _TABLES.ensure()
+    facets = ProductionItemFacet.__table__
+    now = get_local_now()
+    for (attribute, value, status), delta in sorted(deltas.items()):
+        result = conn.execute(
+            update(facets)
+            .where(facets.c.attribute == attribute, facets.c.value == value, facets.c.status == status)
+            .values(items_count=facets.c.items_count + delta, updated_at=now)
+        )
+        if result.rowcount == 0:
+            conn.execute(insert(facets).values(
+                attribute=attribute, value=value, status=status,
+                items_count=max(delta, 0), updated_at=now
+            ))
+
+
+def rebuild_facets(conn) -> int:
+    """Przelicza całą tabelę facetów z prod_items (w transakcji `conn`)"""
+    _TABLES.ensure()
+    items = ProductionItem.__table__
+    keys = Counter()
+    rows = conn.execute(
+        select(*(items.c[name] for name in TRACKED_FIELDS), func.count().label('items_count'))
+        .group_by(*(items.c[name] for name in TRACKED_FIELDS))
+    )
+    for row in rows:
+        for key in facet_keys(row.current_status, row._mapping):
+            keys[key] += row.items_count
+
+    now = get_local_now()
+    conn.execute(delete(ProductionItemFacet.__table__))
+    if keys:
+        conn.execute(insert(ProductionItemFacet.__table__), [
+            {'attribute': attribute, 'value': value, 'status': status,
+             'items_count': count, 'updated_at': now}
+            for (attribute, value, status), count in keys.items()
+        ])
+    return len(keys)
+
+
+# Budowa z istniejących produktów przed pierwszym odczytem / zapisem (znacznik w bazie)
+_TABLES = DerivedTables('production_item_facets', ProductionItemFacet, build=rebuild_facets)
+
+
+def rebuild_all() -> Dict[str, float]:
+    """Pełna przebudowa facetów w osobnej transakcji"""
+    started = time.perf_counter()
+    written = _TABLES.rebuild()
+    return {
+        'facets': written,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+# ============================================================================
+# ŚLEDZENIE ZMIAN (item_tracking)
+# ============================================================================
+
+def _apply_changes(conn, item_ids, old_keys):
+    """Różnica kluczy po zmianie (usunięte produkty nie mają już wierszy) i przed nią"""
+    deltas = _load_keys(conn, item_ids)
+    deltas.subtract(old_keys or Counter())
+    apply_deltas(conn, deltas)
+
+
+def install_facet_tracking():
+    """Rejestruje liczniki w śledzeniu zmian prod_items (raz na proces, wszystkie sesje)"""
+    register_item_consumer('item_facets', TRACKED_FIELDS, apply=_apply_changes, capture=_load_keys,
+                           prepare=_TABLES.ensure_built)
+    install_item_tracking()
+
+
+# ============================================================================
+# ODCZYT
+# ============================================================================
+
+def get_facet_counts() -> Dict[str, Dict[str, Dict[str, int]]]:
+    """
+    Pełna macierz liczników: atrybut -> wartość -> status -> liczba produktów
+
+    Frontend sumuje ją dla wybranych statusów, więc zmiana filtra statusu
+    nie wymaga zapytania.
+    """
+    _TABLES.ensure_built()
+    facets = ProductionItemFacet.__table__
+    counts: Dict[str, Dict[str, Dict[str, int]]] = {}
+    rows = db.session.execute(
+        select(facets.c.attribute, facets.c.value, facets.c.status, facets.c.items_count)
+        .where(facets.c.items_count > 0)
+    )
+    for attribute, value, status, items_count in rows:
+        counts.setdefault(attribute, {}).setdefault(value, {})[status] = items_count
+    return counts
+
+
+def summarize(counts: Dict[str, Dict[str, Dict[str, int]]],
+              statuses: Optional[Iterable[str]] = None) -> Dict[str, Dict[str, int]]:
+    """Liczniki wartości dla wybranych statusów (None - wszystkie): atrybut -> wartość -> liczba"""
+    selected = set(statuses) if statuses else None
+    summary = {}
+    for attribute, values in counts.items():
+        summary[attribute] = {}
+        for value, per_status in values.items():
+            total = sum(count for status, count in per_status.items()
+                        if selected is None or status in selected)
+            if total:
+                summary[attribute][value] = total
+    return summary
+
+
+def status_totals(statuses: Optional[Iterable[str]] = None) -> int:
+    """Liczba produktów w podanych statusach (None - wszystkich) bez skanowania prod_items"""
+    _TABLES.ensure_built()
+    facets = ProductionItemFacet.__table__
+    statement = select(func.coalesce(func.sum(facets.c.items_count), 0)).where(
+        facets.c.attribute == STATUS_FACET
+    )
+    if statuses is not None:
+        statement = statement.where(facets.c.status.in_(list(statuses)))
+    return int(db.session.execute(statement).scalar() or 0)
+
+
+def register_item_facets_cli(app):
+    """Rejestruje komendę flask rebuild-production-facets"""
+
+    @app.cli.command('rebuild-production-facets')
+    @with_appcontext
+    def rebuild_production_facets_command():
+        """Przelicza liczniki filtrów produktów z prod_items"""
+        result = rebuild_all()
+        print(f"[rebuild-production-facets] Liczniki: {result['facets']}, "
+              f"czas: {result['duration_ms']} ms", file=sys.stderr)
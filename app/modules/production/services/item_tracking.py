@@ -0,0 +1,183 @@
+# modules/production/services/item_tracking.py
+"""
+Śledzenie zmian prod_items dla tabel pochodnych
+===============================================
+
+Projekcja kolejki (queue_projection) i liczniki filtrów (item_facets) są
+utrzymywane w tej samej transakcji co zmiana ProductionItem. Wykrywanie
+zmian jest wspólne - każda tabela pochodna rejestruje tylko, które kolumny
+ją interesują i jak przenieść zmianę:
+
+    register_item_consumer('queue', PROJECTED_FIELDS, apply=_apply_queue)
+
+- capture(conn, ids) -> stan: odczyt przed zmianą (np. stare klucze
+  liczników); wywoływany dla zapisanych już produktów
+- apply(conn, ids, stan): po zmianie - ids to wszystkie dotknięte produkty
+  (także usunięte, których wierszy już nie ma)
+- prepare(): przed pierwszą zmianą - budowa tabeli z istniejących danych
+  (DerivedTables.ensure_built), inaczej różnice trafiłyby do pustej tabeli
+
+Zdarzenia sesji:
+
+- before_flush: id zmienianych (pola konsumenta) i usuwanych produktów,
+  capture na połączeniu sesji (obiekt mógł być wygaszony po commit)
+- after_flush: id dodanych produktów, apply
+- do_orm_execute: UPDATE / DELETE na prod_items poza obiektami ORM - id
+  z parametrów bulk UPDATE po kluczu albo wybrane warunkiem instrukcji
+  przed jej wykonaniem (raz dla wszystkich konsumentów)
+"""
+
+import threading
+from collections import namedtuple
+from typing import Callable, Dict, Iterable, List, Optional
+
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+
+from ..models import ProductionItem
+
+ItemConsumer = namedtuple('ItemConsumer', ['fields', 'capture', 'apply', 'prepare'])
+
+_SESSION_KEY = 'production_item_changes'
+
+_consumers: Dict[str, ItemConsumer] = {}
+_listeners_installed = False
+_listeners_lock = threading.Lock()
+
+
+def register_item_consumer(name: str, fields: Iterable[str], apply: Callable,
+                           capture: Optional[Callable] = None, prepare: Optional[Callable] = None):
+    """
+    Rejestruje tabelę pochodną prod_items
+
+    Args:
+        name: Nazwa konsumenta (ponowna rejestracja zastępuje poprzednią)
+        fields: Kolumny prod_items, których zmiana dotyczy konsumenta
+        apply: apply(conn, ids, stan) - przeniesienie zmiany
+        capture: capture(conn, ids) -> stan - odczyt przed zmianą (opcjonalnie)
+        prepare: prepare() - przed pierwszą zmianą w procesie (opcjonalnie)
+    """
+    _consumers[name] = ItemConsumer(frozenset(fields), capture, apply, prepare)
+
+
+def _prepare(consumers: Iterable[ItemConsumer]):
+    for consumer in consumers:
+        if consumer.prepare is not None:
+            consumer.prepare()
+
+
+def _capture(consumer: ItemConsumer, conn, item_ids: List[int]):
+    if consumer.capture is None or not item_ids:
+        return None
+    return consumer.capture(conn, item_ids)
+
+
+# ============================================================================
+# ZDARZENIA SESJI
+# ============================================================================
+
+def _before_flush(session, flush_context, instances):
+    deleted_ids = [obj.id for obj in session.deleted if isinstance(obj, ProductionItem)]
+    dirty = [obj for obj in session.dirty
+             if isinstance(obj, ProductionItem) and obj not in session.deleted]
+    if not (deleted_ids or dirty or any(isinstance(obj, ProductionItem) for obj in session.new)):
+        return
+
+    # Budowa tabel przed zapisem tej sesji (osobne połączenie widzi stan sprzed zmiany)
+    _prepare(_consumers.values())
+    pending = {}
+    for name, consumer in _consumers.items():
+        item_ids = list(deleted_ids)
+        for obj in dirty:
+            state = inspect(obj)
+            if any(state.attrs[field].history.has_changes() for field in consumer.fields):
+                item_ids.append(obj.id)
+        if item_ids:
+            pending[name] = (item_ids, _capture(consumer, session.connection(), item_ids))
+    if pending:
+        session.info[_SESSION_KEY] = pending
+
+
+def _after_flush(session, flush_context):
+    pending = session.info.pop(_SESSION_KEY, None) or {}
+    new_ids = [obj.id for obj in session.new if isinstance(obj, ProductionItem)]
+    if not pending and not new_ids:
+        return
+
+    for name, consumer in _consumers.items():
+        item_ids, state = pending.get(name, ([], None))
+        item_ids = item_ids + new_ids
+        if item_ids:
+            consumer.apply(session.connection(), item_ids, state)
+
+
+def _statement_columns(statement) -> Optional[set]:
+    """Kolumny ustawiane przez UPDATE (None - nieznane)"""
+    values = getattr(statement, '_values', None)
+    if not values:
+        return None
+    return {getattr(key, 'key', key) for key in values}
+
+
+def _matching_item_ids(conn, statement) -> List[int]:
+    """Id produktów spełniających warunek UPDATE / DELETE (odczyt przed wykonaniem)"""
+    query = select(ProductionItem.id)
+    if statement.whereclause is not None:
+        query = query.where(statement.whereclause)
+    return [row[0] for row in conn.execute(query)]
+
+
+def _do_orm_execute(orm_execute_state):
+    """UPDATE / DELETE na prod_items poza obiektami ORM"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete):
+        return None
+    statement = orm_execute_state.statement
+    table = getattr(statement, 'table', None)
+    if getattr(table, 'name', None) != ProductionItem.__tablename__:
+        return None
+
+    parameters = orm_execute_state.parameters
+    by_key = isinstance(parameters, (list, tuple)) and parameters and all('id' in row for row in parameters)
+    if by_key:
+        # Bulk UPDATE po kluczu głównym (session.execute(update(ProductionItem), [{'id': ...}]))
+        columns = {field for row in parameters for field in row}
+    else:
+        columns = _statement_columns(statement) if orm_execute_state.is_update else None
+    consumers = [consumer for consumer in _consumers.values()
+                 if columns is None or columns & consumer.fields]
+    if not consumers:
+        return None
+
+    _prepare(consumers)
+    conn = orm_execute_state.session.connection()
+    if by_key:
+        item_ids = [row['id'] for row in parameters]
+    else:
+        # UPDATE / DELETE z warunkiem - id wybrane tym samym warunkiem, zanim wiersze się zmienią
+        item_ids = _matching_item_ids(conn, statement)
+
+    states = [_capture(consumer, conn, item_ids) for consumer in consumers]
+    result = orm_execute_state.invoke_statement()
+    if item_ids:
+        for consumer, state in zip(consumers, states):
+            consumer.apply(conn, item_ids, state)
+    return result
+
+
+def _after_rollback(session):
+    session.info.pop(_SESSION_KEY, None)
+
+
+def install_item_tracking():
+    """Podpina zdarzenia na klasie Session (raz na proces, wszystkie sesje)"""
+    global _listeners_installed
+
+    if _listeners_installed:
+        return
+    with _listeners_lock:
+        if not _listeners_installed:
+            event.listen(Session, 'before_flush', _before_flush)
+            event.listen(Session, 'after_flush', _after_flush)
+            event.listen(Session, 'do_orm_execute', _do_orm_execute)
+            event.listen(Session, 'after_rollback', _after_rollback)
+            _listeners_installed = True
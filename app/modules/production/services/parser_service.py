@@ -6,7 +6,8 @@ Serwis parsowania nazw produktów dla modułu Production
 Implementuje inteligentny system parsowania nazw produktów z Baselinker:
 - Wykorzystanie istniejącego parsera z modułu reports
 - Ekstraktowanie parametrów: gatunek, technologia, klasa, wymiary, wykończenie
-- Cache wyników parsowania dla wydajności
+- Ograniczony cache LRU wyników + trwały cache w tabeli product_name_parse_cache
+  (wspólnej z modułem reports)
 - Fallback do wartości domyślnych przy błędach
 - Obsługa różnych formatów nazw produktów
 
@@ -24,12 +25,16 @@ Data: 2025-01-08
 
 import re
 import threading
-from datetime import datetime, timedelta
 from typing import Dict, Any, Optional, Tuple, List
 from modules.logging import get_structured_logger
+from modules.reports.parser import KeywordScanner, ParseResultLRU, PARSE_LRU_SIZE
 
 logger = get_structured_logger('production.parser')
 
+# Wersja logiki parsera produkcji (razem z wersją parsera reports) - zmiana
+# unieważnia wyniki zapisane w product_name_parse_cache
+PRODUCTION_PARSER_VERSION = 1
+
 class ParsingError(Exception):
     """Wyjątek dla błędów parsowania"""
     pass
@@ -42,16 +47,15 @@ class ProductNameParser:
     funkcjonalnościami specyficznymi dla modułu produkcji.
     """
     
-    def __init__(self, cache_duration_minutes=120):
+    def __init__(self, cache_size=PARSE_LRU_SIZE):
         """
         Inicjalizacja parsera z cache
         
         Args:
-            cache_duration_minutes (int): Czas życia cache w minutach
+            cache_size (int): Maksymalna liczba wyników w cache LRU
         """
-        self.cache_duration = timedelta(minutes=cache_duration_minutes)
-        self._parse_cache = {}
-        self._cache_timestamps = {}
+        self._parse_cache = ParseResultLRU(maxsize=cache_size)
+        self._persistent_cache = None
         self._lock = threading.RLock()
         
         # Import parsera z modułu reports
@@ -59,11 +63,11 @@ class ProductNameParser:
         self._init_reports_parser()
         
         # Wzorce regex dla dodatkowego parsowania
-        self._dimension_patterns = [
+        self._dimension_patterns = [re.compile(pattern) for pattern in (
             r'(\d+(?:[.,]\d+)?)\s*[x×]\s*(\d+(?:[.,]\d+)?)\s*[x×]\s*(\d+(?:[.,]\d+)?)',  # 120x80x2.5
             r'(\d+(?:[.,]\d+)?)\s*/\s*(\d+(?:[.,]\d+)?)\s*/\s*(\d+(?:[.,]\d+)?)',        # 120/80/2.5
             r'(\d+(?:[.,]\d+)?)\s*-\s*(\d+(?:[.,]\d+)?)\s*-\s*(\d+(?:[.,]\d+)?)',        # 120-80-2.5
-        ]
+        )]
         
         # Mapowanie wykończeń
         self._finish_mapping = {
@@ -143,8 +147,22 @@ class ProductNameParser:
             'mikrowczep': 'mikrowczep'
         }
         
+        # Wszystkie mapowania w jednym skanerze - jedno przejście po nazwie
+        self._keyword_scanner = KeywordScanner({
+            'wood_species': self._wood_species_mapping,
+            'technology': self._technology_mapping,
+            'technology_fallback': {
+                'solid': 'deska',
+                'jednolita': 'deska',
+                'glued': 'klejonka',
+                'klejona': 'klejonka'
+            },
+            'finish_state': self._finish_mapping,
+            'wood_class': self._wood_class_mapping,
+        })
+        
         logger.info("Inicjalizacja ProductNameParser", extra={
-            'cache_duration_minutes': cache_duration_minutes,
+            'cache_size': cache_size,
             'reports_parser_available': self._reports_parser is not None
         })
     
@@ -204,13 +222,9 @@ class ProductNameParser:
         
         # Sprawdzenie cache
         if use_cache:
-            with self._lock:
-                cache_key = self._get_cache_key(normalized_name)
-                if self._is_cache_valid(cache_key):
-                    logger.debug("Wynik parsowania z cache", extra={
-                        'product_name': product_name[:50]
-                    })
-                    return self._parse_cache[cache_key].copy()
+            cached = self._parse_cache.get(normalized_name)
+            if cached is not None:
+                return self._copy_result(cached)
         
         try:
             # Parsowanie główne
@@ -218,10 +232,7 @@ class ProductNameParser:
             
             # Zapisanie w cache
             if use_cache:
-                with self._lock:
-                    cache_key = self._get_cache_key(normalized_name)
-                    self._parse_cache[cache_key] = result.copy()
-                    self._cache_timestamps[cache_key] = datetime.now()
+                self._parse_cache.put(normalized_name, self._copy_result(result))
             
             logger.info("Sparsowano nazwę produktu", extra={
                 'product_name': product_name[:50],
@@ -242,6 +253,41 @@ class ProductNameParser:
             return self._get_default_parsing_result(product_name, 
                                                   errors=[f'Błąd parsowania: {str(e)}'])
     
+    @staticmethod
+    def _copy_result(result: Dict[str, Any]) -> Dict[str, Any]:
+        """Kopia wyniku - lista błędów jest jedynym mutowalnym polem"""
+        copied = dict(result)
+        copied['parsing_errors'] = list(result.get('parsing_errors') or [])
+        return copied
+    
+    def _get_persistent_cache(self):
+        """Trwały cache (tabela wspólna z reports) - tworzony przy pierwszym użyciu"""
+        if self._persistent_cache is None:
+            with self._lock:
+                if self._persistent_cache is None:
+                    from modules.reports.parse_cache import PersistentParseCache
+                    from modules.reports.parser import PARSER_VERSION
+                    self._persistent_cache = PersistentParseCache(
+                        kind='production',
+                        # Wynik zależy też od parsera reports - obie wersje w jednej liczbie
+                        version=PARSER_VERSION * 1000 + PRODUCTION_PARSER_VERSION,
+                        parse_func=lambda name: self._perform_parsing(self._normalize_product_name(name), name),
+                        lru=self._parse_cache,
+                        key_func=self._normalize_product_name
+                    )
+        return self._persistent_cache
+    
+    def prefetch(self, product_names: List[str]) -> Dict[str, int]:
+        """
+        Ładuje wyniki dla nazw do cache LRU z tabeli product_name_parse_cache
+        (brakujące parsuje i zapisuje) - wywoływane przed pętlą po zamówieniach
+        """
+        try:
+            return self._get_persistent_cache().prefetch(product_names)
+        except Exception as e:
+            logger.warning("Błąd prefetch wyników parsowania", extra={'error': str(e)})
+            return {}
+    
     def _normalize_product_name(self, product_name: str) -> str:
         """
         Normalizuje nazwę produktu do parsowania
@@ -308,8 +354,11 @@ class ProductNameParser:
             else:
                 errors.append("Nie znaleziono wymiarów w nazwie")
             
+            # 3-6. Słowa kluczowe - jedno przejście skanera
+            keywords = self._keyword_scanner.match(normalized_name)
+            
             # 3. Parsowanie gatunku drewna
-            wood_species = self._parse_wood_species(normalized_name)
+            wood_species = keywords.get('wood_species')
             if wood_species:
                 result['wood_species'] = wood_species
                 confidence_factors.append(0.7)
@@ -317,7 +366,7 @@ class ProductNameParser:
                 errors.append("Nie rozpoznano gatunku drewna")
             
             # 4. Parsowanie technologii
-            technology = self._parse_technology(normalized_name)
+            technology = keywords.get('technology') or keywords.get('technology_fallback')
             if technology:
                 result['technology'] = technology
                 confidence_factors.append(0.6)
@@ -325,7 +374,7 @@ class ProductNameParser:
                 errors.append("Nie rozpoznano technologii")
             
             # 5. Parsowanie wykończenia
-            finish_state = self._parse_finish_state(normalized_name)
+            finish_state = keywords.get('finish_state')
             if finish_state:
                 result['finish_state'] = finish_state
                 confidence_factors.append(0.6)
@@ -334,7 +383,7 @@ class ProductNameParser:
                 result['finish_state'] = 'surowe'
             
             # 6. Parsowanie klasy drewna
-            wood_class = self._parse_wood_class(normalized_name)
+            wood_class = keywords.get('wood_class')
             if wood_class:
                 result['wood_class'] = wood_class
                 confidence_factors.append(0.5)
@@ -410,7 +459,7 @@ class ProductNameParser:
             Optional[Dict[str, float]]: Słownik z wymiarami lub None
         """
         for pattern in self._dimension_patterns:
-            match = re.search(pattern, name)
+            match = pattern.search(name)
             if match:
                 try:
                     dims = [float(dim.replace(',', '.')) for dim in match.groups()]
@@ -438,11 +487,7 @@ class ProductNameParser:
         Returns:
             Optional[str]: Gatunek drewna lub None
         """
-        for key, species in self._wood_species_mapping.items():
-            if key in name:
-                return species
-        
-        return None
+        return self._keyword_scanner.match(name).get('wood_species')
     
     def _parse_technology(self, name: str) -> Optional[str]:
         """
@@ -454,17 +499,10 @@ class ProductNameParser:
         Returns:
             Optional[str]: Technologia lub None
         """
-        for key, tech in self._technology_mapping.items():
-            if key in name:
-                return tech
-        
-        # Domyślna technologia na podstawie innych wskazówek
-        if 'solid' in name or 'jednolita' in name:
-            return 'deska'
-        elif 'glued' in name or 'klejona' in name:
-            return 'klejonka'
+        keywords = self._keyword_scanner.match(name)
         
-        return None
+        # Domyślna technologia na podstawie innych wskazówek (solid/glued)
+        return keywords.get('technology') or keywords.get('technology_fallback')
     
     def _parse_finish_state(self, name: str) -> Optional[str]:
         """
@@ -476,11 +514,7 @@ class ProductNameParser:
         Returns:
             Optional[str]: Stan wykończenia lub None
         """
-        for key, finish in self._finish_mapping.items():
-            if key in name:
-                return finish
-        
-        return None
+        return self._keyword_scanner.match(name).get('finish_state')
     
     def _parse_wood_class(self, name: str) -> Optional[str]:
         """
@@ -492,11 +526,7 @@ class ProductNameParser:
         Returns:
             Optional[str]: Klasa wykończenia lub None
         """
-        for key, finish in self._wood_class_mapping.items():
-            if key in name:
-                return finish
-        
-        return None
+        return self._keyword_scanner.match(name).get('wood_class')
     
     def _get_default_parsing_result(self, original_name: str, errors: List[str] = None) -> Dict[str, Any]:
         """
@@ -524,43 +554,16 @@ class ProductNameParser:
             'parsing_errors': errors or []
         }
     
-    def _get_cache_key(self, normalized_name: str) -> str:
+    def invalidate_cache(self, persistent: bool = False):
         """
-        Generuje klucz cache dla nazwy produktu
+        Invaliduje cache parsowania
         
         Args:
-            normalized_name (str): Znormalizowana nazwa
-            
-        Returns:
-            str: Klucz cache
+            persistent (bool): Usuń także wpisy produkcji z product_name_parse_cache
         """
-        import hashlib
-        return hashlib.md5(normalized_name.encode()).hexdigest()
-    
-    def _is_cache_valid(self, cache_key: str) -> bool:
-        """
-        Sprawdza czy wpis w cache jest ważny
-        
-        Args:
-            cache_key (str): Klucz cache
-            
-        Returns:
-            bool: True jeśli cache jest ważny
-        """
-        if cache_key not in self._parse_cache:
-            return False
-            
-        if cache_key not in self._cache_timestamps:
-            return False
-            
-        cache_age = datetime.now() - self._cache_timestamps[cache_key]
-        return cache_age < self.cache_duration
-    
-    def invalidate_cache(self):
-        """Invaliduje cały cache parsowania"""
-        with self._lock:
-            self._parse_cache.clear()
-            self._cache_timestamps.clear()
+        self._parse_cache.clear()
+        if persistent:
+            self._get_persistent_cache().clear()
             
         logger.info("Invalidated parser cache")
     
@@ -571,26 +574,14 @@ class ProductNameParser:
         Returns:
             Dict[str, Any]: Statystyki cache
         """
-        with self._lock:
-            now = datetime.now()
-            valid_entries = 0
-            
-            for key in self._cache_timestamps:
-                if (now - self._cache_timestamps[key]) < self.cache_duration:
-                    valid_entries += 1
-            
-            return {
-                'total_entries': len(self._parse_cache),
-                'valid_entries': valid_entries,
-                'expired_entries': len(self._parse_cache) - valid_entries,
-                'cache_duration_minutes': self.cache_duration.total_seconds() / 60,
-                'cache_hit_ratio': self._calculate_hit_ratio()
-            }
-    
-    def _calculate_hit_ratio(self) -> float:
-        """Oblicza współczynnik trafień cache (placeholder)"""
-        # W pełnej implementacji można by śledzić hits/misses
-        return 0.0
+        stats = self._parse_cache.stats()
+        return {
+            'total_entries': stats['size'],
+            'max_entries': stats['maxsize'],
+            'hits': stats['hits'],
+            'misses': stats['misses'],
+            'cache_hit_ratio': stats['hit_ratio']
+        }
     
     def parse_multiple_products(self, product_names: List[str], use_cache: bool = True) -> List[Dict[str, Any]]:
         """
@@ -605,6 +596,9 @@ class ProductNameParser:
         """
         results = []
         
+        if use_cache:
+            self.prefetch(product_names)
+        
         for name in product_names:
             try:
                 result = self.parse_product_name(name, use_cache)
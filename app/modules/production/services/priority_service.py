@@ -98,8 +98,9 @@ class NewPriorityCalculator:
             with self._lock:
                 logger.info("Rozpoczęcie przeliczania wszystkich priorytetów v2.0")
                 
-                # KROK 1: Pobieranie wszystkich aktywnych produktów
+                # KROK 1: Pobieranie wszystkich aktywnych produktów (projekcja kolejki)
                 products = self.get_active_products_for_prioritization()
+                original_values = {p.id: (p.priority_rank, p.thickness_group) for p in products}
                 logger.info(f"Pobrano {len(products)} aktywnych produktów z kolejki")
                 
                 if not products:
@@ -139,8 +140,9 @@ class NewPriorityCalculator:
                 # KROK 7: Przypisanie numeracji sekwencyjnej
                 ranking_result = self.assign_sequential_ranks(all_sorted_products)
                 
-                # KROK 8: Commit zmian w bazie danych
+                # KROK 8: Zapis zmienionych rang do prod_items i commit
                 from extensions import db
+                products_written = self.write_priority_changes(products, original_values)
                 db.session.commit()
                 
                 duration = (datetime.now() - start_time).total_seconds()
@@ -150,6 +152,7 @@ class NewPriorityCalculator:
                     'products_processed': len(products),
                     'products_prioritized': ranking_result['products_updated'],
                     'manual_overrides_preserved': ranking_result['manual_overrides_preserved'],
+                    'products_written': products_written,
                     'weekly_groups_processed': len(weekly_groups),
                     'duration_seconds': round(duration, 2),
                     'algorithm_version': '2.0',
@@ -183,21 +186,24 @@ class NewPriorityCalculator:
         - Wykluczone: produkty już spakowane przez ostatnie stanowisko
         
         Returns:
-            List[ProductionItem]: Lista aktywnych produktów
+            List[ProductionQueueItem]: Lista aktywnych produktów z projekcji kolejki,
+            odłączonych od sesji (rangi zapisuje write_priority_changes do prod_items)
         """
         try:
-            from ..models import ProductionItem
+            from extensions import db
+            from ..models import ProductionQueueItem
+            from .queue_projection import queue_query
             
             # Query wszystkich produktów w statusach aktywnych
-            query = ProductionItem.query.filter(
-                ProductionItem.current_status.in_(self.active_statuses)
-            ).order_by(
-                func.isnull(ProductionItem.payment_date),
-                ProductionItem.payment_date.asc(),
-                ProductionItem.created_at.asc()
+            query = queue_query(self.active_statuses).order_by(
+                ProductionQueueItem.payment_date.is_(None),
+                ProductionQueueItem.payment_date.asc(),
+                ProductionQueueItem.created_at.asc()
             )
             
             products = query.all()
+            for product in products:
+                db.session.expunge(product)
             
             logger.debug("Pobrano produkty dla priorytetyzacji", extra={
                 'total_count': len(products),
@@ -506,6 +512,35 @@ class NewPriorityCalculator:
         logger.info("Przypisano numery priorytetów", extra=result)
         return result
     
+    def write_priority_changes(self, products: List, original_values: Dict[int, Tuple]) -> int:
+        """
+        Zapisuje do prod_items zmienione priority_rank / thickness_group
+        
+        Jeden UPDATE po kluczu głównym dla wszystkich zmienionych produktów;
+        projekcję tych produktów odświeża queue_projection (do_orm_execute).
+        
+        Args:
+            products: Produkty z get_active_products_for_prioritization (po przypisaniu rang)
+            original_values: {id: (priority_rank, thickness_group)} sprzed przeliczenia
+            
+        Returns:
+            int: Liczba zapisanych produktów
+        """
+        from extensions import db
+        from sqlalchemy import update
+        from ..models import ProductionItem
+        
+        rows = [
+            {'id': product.id, 'priority_rank': product.priority_rank, 'thickness_group': product.thickness_group}
+            for product in products
+            if (product.priority_rank, product.thickness_group) != original_values.get(product.id)
+        ]
+        if rows:
+            db.session.execute(update(ProductionItem), rows)
+        
+        logger.debug(f"Zapisano zmienione priorytety: {len(rows)} produktów")
+        return len(rows)
+    
     def get_reserved_ranks(self) -> Set[int]:
         """
         Pobiera numery priorytetów zarezerwowane przez manual overrides
@@ -514,16 +549,16 @@ class NewPriorityCalculator:
             Set[int]: Zestaw zajętych numerów priorytetów
         """
         try:
-            from ..models import ProductionItem
+            from ..models import ProductionQueueItem
+            from .queue_projection import queue_query
             
-            # Query produktów z manual override i przypisanym priority_rank
-            reserved_products = ProductionItem.query.filter(
-                ProductionItem.priority_manual_override == True,
-                ProductionItem.priority_rank.isnot(None),
-                ProductionItem.current_status.in_(self.active_statuses)
-            ).all()
+            # Rangi produktów z manual override (projekcja kolejki)
+            reserved_rows = queue_query(self.active_statuses).filter(
+                ProductionQueueItem.priority_manual_override == True,
+                ProductionQueueItem.priority_rank.isnot(None)
+            ).with_entities(ProductionQueueItem.priority_rank).all()
             
-            reserved_ranks = {p.priority_rank for p in reserved_products if p.priority_rank}
+            reserved_ranks = {row[0] for row in reserved_rows if row[0]}
             
             logger.debug(f"Znaleziono {len(reserved_ranks)} zarezerwowanych rangów: {sorted(reserved_ranks)}")
             return reserved_ranks
@@ -760,34 +795,29 @@ def get_priority_statistics() -> Dict[str, Any]:
         Dict[str, Any]: Statystyki priorytetów
     """
     try:
-        from ..models import ProductionItem
+        from ..models import ProductionQueueItem
+        from .queue_projection import get_status_counters, queue_query
         
-        # Policz produkty w kolejce
-        active_count = ProductionItem.query.filter(
-            ProductionItem.current_status.in_([
-                'czeka_na_wyciecie', 'czeka_na_skladanie', 
-                'czeka_na_pakowanie', 'w_realizacji'
-            ])
-        ).count()
+        active_statuses = get_priority_calculator().active_statuses
+        
+        # Produkty w kolejce (liczniki projekcji)
+        counters = get_status_counters()
+        active_count = sum(counters[status]['count'] for status in active_statuses)
         
-        # Policz manual overrides
-        manual_overrides = ProductionItem.query.filter(
-            ProductionItem.priority_manual_override == True,
-            ProductionItem.current_status.in_([
-                'czeka_na_wyciecie', 'czeka_na_skladanie', 
-                'czeka_na_pakowanie', 'w_realizacji'
-            ])
+        # Manual overrides
+        manual_overrides = queue_query(active_statuses).filter(
+            ProductionQueueItem.priority_manual_override == True
         ).count()
         
-        # Ostatnia aktualizacja (najnowszy updated_at)
-        latest_update = ProductionItem.query.filter(
-            ProductionItem.priority_rank.isnot(None)
-        ).order_by(ProductionItem.updated_at.desc()).first()
+        # Ostatnia aktualizacja rang (zapis projekcji)
+        last_calculation = queue_query().filter(
+            ProductionQueueItem.priority_rank.isnot(None)
+        ).with_entities(func.max(ProductionQueueItem.updated_at)).scalar()
         
         return {
             'active_products_count': active_count,
             'manual_overrides_count': manual_overrides,
-            'last_calculation': latest_update.updated_at if latest_update else None,
+            'last_calculation': last_calculation,
             'algorithm_version': '2.0',
             'algorithm_type': 'payment_date_weekly_grouping'
         }
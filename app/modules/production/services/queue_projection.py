@@ -0,0 +1,395 @@
+# modules/production/services/queue_projection.py
+"""
+Projekcja aktywnej kolejki produkcyjnej
+=======================================
+
+Stanowiska, zakładki dashboardu i algorytm priorytetów czytały szeroką
+tabelę prod_items z różnymi filtrami i sortowaniem. Odczyty kolejki idą
+teraz do dwóch wąskich tabel:
+
+- prod_queue_items - produkty w statusach QUEUE_STATUSES, tylko pola
+  potrzebne UI i priorytetom + gotowe display_name / dimensions_text
+- prod_queue_counters - liczniki per status (liczba, m3, wartość, rangi)
+
+Utrzymanie w tej samej transakcji co zmiana ProductionItem (zdarzenia
+sesji z item_tracking): dodane, usunięte i zmienione (w PROJECTED_FIELDS)
+rekordy - także przez query.update() / bulk update - są przepisywane
+z prod_items, a liczniki ich statusów (starych i nowych) zmieniane o różnicę
+między starym a nowym wierszem projekcji - na połączeniu sesji, więc
+rollback cofa też projekcję.
+
+Projekcja jest budowana z istniejących produktów raz, przed pierwszym
+odczytem lub zapisem (znacznik i lease w derived_table_builds - budują nie
+wszystkie procesy naraz). Pełna przebudowa: flask rebuild-production-queue.
+"""
+
+import sys
+import time
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, insert, select, update
+
+from extensions import db
+from lazy_tables import DerivedTables
+from modules.logging import get_structured_logger
+from ..models import ProductionItem, ProductionQueueCounter, ProductionQueueItem, get_local_now
+from .item_tracking import install_item_tracking, register_item_consumer
+
+logger = get_structured_logger('production.queue_projection')
+
+# Statusy produktów w kolejce (spakowane i anulowane - poza projekcją)
+QUEUE_STATUSES = (
+    'czeka_na_wyciecie',
+    'czeka_na_skladanie',
+    'czeka_na_pakowanie',
+    'w_realizacji',
+    'wstrzymane',
+)
+
+STATION_STATUSES = {
+    'cutting': 'czeka_na_wyciecie',
+    'assembly': 'czeka_na_skladanie',
+    'packaging': 'czeka_na_pakowanie',
+}
+
+# Kolumny prod_items kopiowane do projekcji (nazwy identyczne)
+PROJECTED_FIELDS = (
+    'short_product_id', 'internal_order_number', 'baselinker_order_id',
+    'original_product_name', 'current_status', 'priority_rank',
+    'priority_manual_override', 'payment_date', 'deadline_date', 'created_at',
+    'parsed_wood_species', 'parsed_technology', 'parsed_wood_class',
+    'parsed_finish_state', 'parsed_length_cm', 'parsed_width_cm',
+    'parsed_thickness_cm', 'thickness_group', 'volume_m3', 'total_value_net',
+    'client_name',
+)
+
+# Liczniki statusu zmieniane o różnicę (min / max rangi - odczyt z indeksu)
+COUNTER_FIELDS = ('items_count', 'volume_m3', 'value_net', 'ranked_count', 'priority_rank_sum')
+
+# Ile id odświeżać jednym zapytaniem
+IDS_PER_CHUNK = 500
+
+
+
+# ============================================================================
+# POLA WYŚWIETLANIA
+# ============================================================================
+
+def format_display_name(item) -> str:
+    """Nazwa produktu do wyświetlenia (specyfikacja albo skrócona nazwa oryginalna)"""
+    parts = []
+
+    if item.parsed_wood_species:
+        parts.append(item.parsed_wood_species.title())
+
+    if item.parsed_technology:
+        parts.append(item.parsed_technology.title())
+
+    if item.parsed_wood_class:
+        parts.append(f"Klasa {item.parsed_wood_class}")
+
+    if all([item.parsed_length_cm, item.parsed_width_cm, item.parsed_thickness_cm]):
+        parts.append(f"{item.parsed_length_cm}×{item.parsed_width_cm}×{item.parsed_thickness_cm} cm")
+
+    if item.parsed_finish_state and item.parsed_finish_state.lower() != 'surowe':
+        parts.append(item.parsed_finish_state.title())
+
+    if parts:
+        return " | ".join(parts)[:255]
+
+    original = item.original_product_name or "Brak nazwy"
+    if len(original) > 60:
+        return original[:57] + "..."
+    return original
+
+
+def format_dimensions_mm(item) -> str:
+    """Wymiary w mm ('2000 × 500 × 40 mm') lub pusty tekst"""
+    if all([item.parsed_length_cm, item.parsed_width_cm, item.parsed_thickness_cm]):
+        return (f"{int(item.parsed_length_cm * 10)} × {int(item.parsed_width_cm * 10)} × "
+                f"{int(item.parsed_thickness_cm * 10)} mm")
+    return ''
+
+
+# ============================================================================
+# ZAPIS PROJEKCJI
+# ============================================================================
+
+def _projection_rows(conn, id_filter=None) -> List[Dict]:
+    """Wiersze projekcji liczone z prod_items (id_filter - warunek na prod_items.id)"""
+    items = ProductionItem.__table__
+    statement = select(items.c.id, *(items.c[name] for name in PROJECTED_FIELDS)).where(
+        items.c.current_status.in_(QUEUE_STATUSES)
+    )
+    if id_filter is not None:
+        statement = statement.where(id_filter)
+
+    now = get_local_now()
+    rows = []
+    for row in conn.execute(statement):
+        values = dict(row._mapping)
+        values['priority_manual_override'] = bool(values['priority_manual_override'])
+        values['display_name'] = format_display_name(row)
+        values['dimensions_text'] = format_dimensions_mm(row)
+        values['updated_at'] = now
+        rows.append(values)
+    return rows
+
+
+def _recount_counters(conn, statuses: Iterable[str]):
+    """Przelicza liczniki podanych statusów z prod_queue_items (pełna agregacja)"""
+    statuses = sorted({status for status in statuses if status})
+    if not statuses:
+        return
+
+    queue = ProductionQueueItem.__table__
+    counters = ProductionQueueCounter.__table__
+    totals = {
+        row.current_status: row for row in conn.execute(
+            select(
+                queue.c.current_status,
+                func.count().label('items_count'),
+                func.coalesce(func.sum(queue.c.volume_m3), 0).label('volume_m3'),
+                func.coalesce(func.sum(queue.c.total_value_net), 0).label('value_net'),
+                func.count(queue.c.priority_rank).label('ranked_count'),
+                func.coalesce(func.sum(queue.c.priority_rank), 0).label('priority_rank_sum'),
+                func.min(queue.c.priority_rank).label('priority_rank_min'),
+                func.max(queue.c.priority_rank).label('priority_rank_max'),
+            )
+            .where(queue.c.current_status.in_(statuses))
+            .group_by(queue.c.current_status)
+        )
+    }
+
+    now = get_local_now()
+    for status in statuses:
+        row = totals.get(status)
+        values = {
+            'items_count': row.items_count if row else 0,
+            'volume_m3': Decimal(str(row.volume_m3)) if row else Decimal('0'),
+            'value_net': Decimal(str(row.value_net)) if row else Decimal('0'),
+            'ranked_count': row.ranked_count if row else 0,
+            'priority_rank_sum': int(row.priority_rank_sum) if row else 0,
+            'priority_rank_min': row.priority_rank_min if row else None,
+            'priority_rank_max': row.priority_rank_max if row else None,
+            'updated_at': now,
+        }
+        result = conn.execute(update(counters).where(counters.c.status == status).values(values))
+        if result.rowcount == 0:
+            conn.execute(insert(counters).values(status=status, **values))
+
+
+def _add_to_deltas(deltas: Dict[str, Dict], row, sign: int):
+    """Dodaje (sign=1) lub odejmuje (sign=-1) wiersz projekcji od różnic liczników statusu"""
+    delta = deltas.setdefault(row['current_status'], {
+        'items_count': 0, 'volume_m3': Decimal('0'), 'value_net': Decimal('0'),
+        'ranked_count': 0, 'priority_rank_sum': 0, 'ranks_changed': False,
+    })
+    delta['items_count'] += sign
+    delta['volume_m3'] += sign * Decimal(str(row['volume_m3'] or 0))
+    delta['value_net'] += sign * Decimal(str(row['total_value_net'] or 0))
+    if row['priority_rank'] is not None:
+        delta['ranked_count'] += sign
+        delta['priority_rank_sum'] += sign * int(row['priority_rank'])
+        delta['ranks_changed'] = True
+
+
+def _apply_counter_deltas(conn, deltas: Dict[str, Dict]):
+    """
+    Zmienia liczniki statusów o różnice (bez agregacji całego statusu)
+
+    Min / max rangi nie da się cofnąć różnicą - dla statusów ze zmienionymi
+    rangami są odczytywane z indeksu (current_status, priority_rank).
+    """
+    queue = ProductionQueueItem.__table__
+    counters = ProductionQueueCounter.__table__
+    now = get_local_now()
+    for status, delta in sorted(deltas.items()):
+        if not (delta['items_count'] or delta['volume_m3'] or delta['value_net'] or delta['ranks_changed']):
+            continue
+        ranks = {}
+        if delta['ranks_changed']:
+            ranks['priority_rank_min'], ranks['priority_rank_max'] = conn.execute(
+                select(func.min(queue.c.priority_rank), func.max(queue.c.priority_rank))
+                .where(queue.c.current_status == status)
+            ).one()
+        result = conn.execute(
+            update(counters).where(counters.c.status == status).values(
+                {**{field: counters.c[field] + delta[field] for field in COUNTER_FIELDS},
+                 'updated_at': now, **ranks}
+            )
+        )
+        if result.rowcount == 0:
+            # Pierwszy produkt w statusie - licznik startuje od zera
+            conn.execute(insert(counters).values(
+                {**{field: delta[field] for field in COUNTER_FIELDS},
+                 'status': status, 'updated_at': now, **ranks}
+            ))
+
+
+def refresh_items(conn, item_ids: Iterable[int]) -> int:
+    """
+    Przepisuje projekcję podanych produktów z prod_items (w transakcji `conn`)
+
+    Liczniki statusów zmieniają się o różnicę między starymi i nowymi
+    wierszami projekcji tych produktów.
+
+    Returns:
+        int: liczba produktów, które są w kolejce po odświeżeniu
+    """
+    unique_ids = sorted({item_id for item_id in item_ids if item_id is not None})
+    if not unique_ids:
+        return 0
+
+    _TABLES.ensure()
+    queue = ProductionQueueItem.__table__
+    items = ProductionItem.__table__
+    deltas: Dict[str, Dict] = {}
+    written = 0
+    for start in range(0, len(unique_ids), IDS_PER_CHUNK):
+        chunk = unique_ids[start:start + IDS_PER_CHUNK]
+        old_rows = conn.execute(
+            select(queue.c.current_status, queue.c.volume_m3, queue.c.total_value_net, queue.c.priority_rank)
+            .where(queue.c.id.in_(chunk))
+        )
+        for row in old_rows:
+            _add_to_deltas(deltas, row._mapping, -1)
+        rows = _projection_rows(conn, items.c.id.in_(chunk))
+        conn.execute(delete(queue).where(queue.c.id.in_(chunk)))
+        if rows:
+            conn.execute(insert(queue), rows)
+        for row in rows:
+            _add_to_deltas(deltas, row, 1)
+        written += len(rows)
+
+    _apply_counter_deltas(conn, deltas)
+    return written
+
+
+def rebuild_projection(conn) -> int:
+    """Pełne przepisanie projekcji i liczników (w transakcji `conn`)"""
+    _TABLES.ensure()
+    rows = _projection_rows(conn)
+    conn.execute(delete(ProductionQueueItem.__table__))
+    for start in range(0, len(rows), IDS_PER_CHUNK):
+        conn.execute(insert(ProductionQueueItem.__table__), rows[start:start + IDS_PER_CHUNK])
+    _recount_counters(conn, QUEUE_STATUSES)
+    return len(rows)
+
+
+# Budowa z istniejących produktów przed pierwszym odczytem / zapisem (znacznik w bazie)
+_TABLES = DerivedTables('production_queue', ProductionQueueItem, ProductionQueueCounter,
+                        build=rebuild_projection)
+
+
+def rebuild_all() -> Dict[str, float]:
+    """Pełna przebudowa projekcji w osobnej transakcji"""
+    started = time.perf_counter()
+    written = _TABLES.rebuild()
+    return {
+        'items': written,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+# ============================================================================
+# ŚLEDZENIE ZMIAN (item_tracking)
+# ============================================================================
+
+def _apply_changes(conn, item_ids, state):
+    refresh_items(conn, item_ids)
+
+
+def install_queue_tracking():
+    """Rejestruje projekcję w śledzeniu zmian prod_items (raz na proces, wszystkie sesje)"""
+    register_item_consumer('queue_projection', PROJECTED_FIELDS, apply=_apply_changes,
+                           prepare=_TABLES.ensure_built)
+    install_item_tracking()
+
+
+# ============================================================================
+# ODCZYT
+# ============================================================================
+
+def queue_query(statuses: Optional[Iterable[str]] = None):
+    """Query po ProductionQueueItem (opcjonalnie zawężone do statusów)"""
+    _TABLES.ensure_built()
+    query = ProductionQueueItem.query
+    if statuses is not None:
+        query = query.filter(ProductionQueueItem.current_status.in_(list(statuses)))
+    return query
+
+
+def station_items(station_code: str, sort_by: str = 'priority', limit: Optional[int] = None) -> List[ProductionQueueItem]:
+    """Produkty oczekujące na stanowisku (sort_by: priority|deadline|created_at)"""
+    status = STATION_STATUSES.get(station_code)
+    if status is None:
+        return []
+
+    sort_columns = {
+        'priority': ProductionQueueItem.priority_rank,
+        'deadline': ProductionQueueItem.deadline_date,
+        'created_at': ProductionQueueItem.created_at,
+    }
+    query = queue_query([status]).order_by(
+        sort_columns.get(sort_by, ProductionQueueItem.priority_rank).asc()
+    )
+    if limit:
+        query = query.limit(limit)
+    return query.all()
+
+
+def order_numbers_in_status(status: str) -> List[str]:
+    """Numery zamówień z choć jednym produktem w danym statusie"""
+    _TABLES.ensure_built()
+    rows = db.session.execute(
+        select(ProductionQueueItem.internal_order_number)
+        .where(ProductionQueueItem.current_status == status)
+        .distinct()
+    )
+    return [row[0] for row in rows if row[0]]
+
+
+def get_status_counters() -> Dict[str, Dict]:
+    """
+    Liczniki kolejki per status
+
+    Returns:
+        dict: status -> count, volume_m3, value_net, ranked_count,
+        avg_priority_rank, min_priority_rank, max_priority_rank
+        (wszystkie QUEUE_STATUSES, także puste)
+    """
+    _TABLES.ensure_built()
+    counters = {
+        status: {
+            'count': 0, 'volume_m3': 0.0, 'value_net': 0.0, 'ranked_count': 0,
+            'avg_priority_rank': None, 'min_priority_rank': None, 'max_priority_rank': None,
+        }
+        for status in QUEUE_STATUSES
+    }
+    for counter in ProductionQueueCounter.query.all():
+        counters[counter.status] = {
+            'count': counter.items_count,
+            'volume_m3': float(counter.volume_m3 or 0),
+            'value_net': float(counter.value_net or 0),
+            'ranked_count': counter.ranked_count,
+            'avg_priority_rank': (counter.priority_rank_sum / counter.ranked_count
+                                  if counter.ranked_count else None),
+            'min_priority_rank': counter.priority_rank_min,
+            'max_priority_rank': counter.priority_rank_max,
+        }
+    return counters
+
+
+def register_queue_projection_cli(app):
+    """Rejestruje komendę flask rebuild-production-queue"""
+
+    @app.cli.command('rebuild-production-queue')
+    @with_appcontext
+    def rebuild_production_queue_command():
+        """Przebudowuje projekcję kolejki produkcyjnej z prod_items"""
+        result = rebuild_all()
+        print(f"[rebuild-production-queue] Produkty w kolejce: {result['items']}, "
+              f"czas: {result['duration_ms']} ms", file=sys.stderr)
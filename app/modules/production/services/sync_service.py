@@ -10,19 +10,37 @@ import json
 import math
 import requests
 from datetime import datetime, date, timedelta
-from typing import Dict, Any, List, Optional, Tuple
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from sqlalchemy import and_, or_
 from sqlalchemy.exc import IntegrityError
 from extensions import db
 from modules.logging import get_structured_logger
+from modules.jobs import JobCancelled, check_job_cancelled, job_log, job_progress
 import pytz
 
 logger = get_structured_logger('production.sync.v2')
 
+# getOrders zwraca maksymalnie tyle zamówień na wywołanie
+BASELINKER_ORDERS_PAGE_SIZE = 100
+
+# Okno i limit stron pobierania opłaconych zamówień przez CRON
+CRON_FETCH_DAYS_BACK = 14
+CRON_FETCH_MAX_PAGES = 50
+
+# Liczniki sumowane między stronami synchronizacji CRON
+CRON_SUMMED_STATS = (
+    'orders_processed', 'products_created', 'products_updated', 'products_skipped',
+    'errors_count', 'status_changes_count', 'status_change_errors'
+)
+
 def get_local_now():
     poland_tz = pytz.timezone('Europe/Warsaw')
     return datetime.now(poland_tz).replace(tzinfo=None)
 
+def _order_confirmed_at(order: Dict[str, Any]) -> int:
+    """Znacznik date_confirmed zamówienia (date_add dla niepotwierdzonych)"""
+    return int(order.get('date_confirmed') or order.get('date_add') or 0)
+
 class SyncError(Exception):
     pass
 
@@ -226,10 +244,49 @@ class BaselinkerSyncService:
         try:
             logger.info("CRON: Rozpoczęcie automatycznej synchronizacji opłaconych zamówień")
             
-            orders_data = self._fetch_paid_orders_for_cron()
-            logger.info(f"CRON: Pobrano {len(orders_data)} zamówień ze statusu 'Nowe - opłacone'")
+            from modules.baselinker.order_mirror import mirror_orders
             
-            if not orders_data:
+            # Strony przetwarzane od razu po pobraniu - bez gromadzenia całej listy;
+            # priorytety przeliczane raz, po wszystkich stronach
+            processing_result = {key: 0 for key in CRON_SUMMED_STATS}
+            orders_processed_list = []
+            error_details = []
+            orders_fetched = 0
+            pages_processed = 0
+            fetch_error = None
+
+            orders_pages = self._iter_paid_orders_for_cron()
+            while True:
+                try:
+                    orders_page = next(orders_pages, None)
+                except SyncError as e:
+                    if pages_processed == 0:
+                        raise
+                    # Zapisane strony zostają; reszta zamówień w kolejnym uruchomieniu
+                    fetch_error = str(e)
+                    error_details.append({'error': 'Fetch interrupted', 'details': fetch_error})
+                    processing_result['errors_count'] += 1
+                    break
+                if orders_page is None:
+                    break
+
+                pages_processed += 1
+                orders_fetched += len(orders_page)
+                mirror_orders(orders_page)
+                logger.info(f"CRON: Strona {pages_processed} - {len(orders_page)} zamówień ze statusu 'Nowe - opłacone'")
+
+                page_result = self.process_orders_with_priority_logic(
+                    orders_page,
+                    sync_type='cron',
+                    auto_status_change=True,
+                    recalculate_priorities=False
+                )
+                for key in CRON_SUMMED_STATS:
+                    processing_result[key] += page_result.get(key, 0)
+                orders_processed_list.extend(page_result.get('orders_processed_list', []))
+                error_details.extend(page_result.get('error_details', []))
+
+            if not orders_fetched:
                 result = {
                     'success': True,
                     'orders_processed': 0,
@@ -244,14 +301,18 @@ class BaselinkerSyncService:
                     db.session.commit()
                     
                 return result
-            
-            processing_result = self.process_orders_with_priority_logic(
-                orders_data, 
-                sync_type='cron',
-                auto_status_change=True
-            )
 
-            orders_processed_list = processing_result.get('orders_processed_list', [])
+            priority_recalc_result = {}
+            if processing_result['products_created'] > 0:
+                priority_recalc_result = self._recalculate_priorities_after_sync()
+
+            processing_result.update({
+                'success': processing_result['errors_count'] == 0 or processing_result['products_created'] > 0,
+                'error_details': error_details,
+                'priority_recalc_triggered': bool(priority_recalc_result),
+                'priority_recalc_duration': priority_recalc_result.get('calculation_duration', '00:00:00'),
+                'manual_overrides_preserved': priority_recalc_result.get('manual_overrides_preserved', 0)
+            })
             
             if sync_log:
                 sync_log.orders_processed = processing_result['orders_processed']
@@ -275,6 +336,10 @@ class BaselinkerSyncService:
                 'success': processing_result['success'],
                 'sync_type': 'cron_auto',
                 'duration_seconds': round(duration, 2),
+                'orders_fetched': orders_fetched,
+                'pages_processed': pages_processed,
+                'fetch_error': fetch_error,
+                'error_details': error_details,
                 'orders_processed': processing_result['orders_processed'],
                 'orders_processed_list': orders_processed_list,
                 'products_created': processing_result['products_created'],
@@ -317,7 +382,8 @@ class BaselinkerSyncService:
                 'products_created': 0
             }
 
-    def process_orders_with_priority_logic(self, orders_data: List[Dict], sync_type: str = 'manual', auto_status_change: bool = True) -> Dict[str, Any]:
+    def process_orders_with_priority_logic(self, orders_data: List[Dict], sync_type: str = 'manual', auto_status_change: bool = True,
+                                           recalculate_priorities: bool = True) -> Dict[str, Any]:
         logger.info("ENHANCED: Rozpoczęcie przetwarzania zamówień", extra={
             'orders_count': len(orders_data),
             'sync_type': sync_type,
@@ -339,7 +405,12 @@ class BaselinkerSyncService:
         error_details = []
         orders_for_status_change = []
 
-        for order_data in orders_data:
+        self._prefetch_parse_results(orders_data)
+
+        for order_index, order_data in enumerate(orders_data):
+            # Zadanie w tle: postęp i anulowanie między zamówieniami
+            check_job_cancelled()
+            job_progress(order_index, len(orders_data), 'Zapisywanie zamówień')
             try:
                 order_id = None
                 if isinstance(order_data, dict):
@@ -540,7 +611,8 @@ class BaselinkerSyncService:
         
             for order_id in orders_for_status_change:
                 try:
-                    success = self.change_order_status_in_baselinker(order_id, target_status=None)
+                    success = self.queue_order_status_change(order_id, target_status=None,
+                                                             source='sync_priority')
                     if success:
                         processing_stats['status_changes_count'] += 1
                     else:
@@ -553,22 +625,8 @@ class BaselinkerSyncService:
                     })
 
         priority_recalc_result = {}
-        if processing_stats['products_created'] > 0:
-            try:
-                logger.info("Rozpoczęcie przeliczania priorytetów")
-            
-                from ..services.priority_service import get_priority_calculator
-                priority_calculator = get_priority_calculator()
-                priority_recalc_result = priority_calculator.recalculate_all_priorities()
-            
-                logger.info("Zakończono przeliczanie priorytetów", extra={
-                    'products_updated': priority_recalc_result.get('products_updated', 0),
-                    'manual_overrides_preserved': priority_recalc_result.get('manual_overrides_preserved', 0)
-                })
-            
-            except Exception as priority_error:
-                logger.error("Błąd przeliczania priorytetów", extra={'error': str(priority_error)})
-                priority_recalc_result = {'error': str(priority_error)}
+        if recalculate_priorities and processing_stats['products_created'] > 0:
+            priority_recalc_result = self._recalculate_priorities_after_sync()
 
         final_result = {
             'success': processing_stats['errors_count'] == 0 or processing_stats['products_created'] > 0,
@@ -589,10 +647,28 @@ class BaselinkerSyncService:
         logger.info("Zakończono przetwarzanie zamówień", extra=final_result)
         return final_result
 
+    def _recalculate_priorities_after_sync(self) -> Dict[str, Any]:
+        try:
+            logger.info("Rozpoczęcie przeliczania priorytetów")
+
+            from ..services.priority_service import get_priority_calculator
+            priority_calculator = get_priority_calculator()
+            priority_recalc_result = priority_calculator.recalculate_all_priorities()
+
+            logger.info("Zakończono przeliczanie priorytetów", extra={
+                'products_updated': priority_recalc_result.get('products_updated', 0),
+                'manual_overrides_preserved': priority_recalc_result.get('manual_overrides_preserved', 0)
+            })
+            return priority_recalc_result
+
+        except Exception as priority_error:
+            logger.error("Błąd przeliczania priorytetów", extra={'error': str(priority_error)})
+            return {'error': str(priority_error)}
+
     def _create_product_from_order_data(self, order_data: Dict[str, Any], product_data: Dict[str, Any], payment_date: Optional[datetime] = None, sequence_number: int = 1, id_generation_result: Dict[str, Any] = None) -> Optional['ProductionItem']:
         try:
             from ..models import ProductionItem
-            from ..services.parser_service import ProductNameParser
+            from ..services.parser_service import get_parser_service
         
             if not isinstance(product_data, dict):
                 logger.error("product_data nie jest dict")
@@ -613,7 +689,7 @@ class BaselinkerSyncService:
                 return None
         
             try:
-                parser = ProductNameParser()
+                parser = get_parser_service()
                 parsed_data = parser.parse_product_name(original_product_name)
             except Exception as parse_error:
                 logger.warning("Błąd parsowania nazwy", extra={
@@ -835,30 +911,18 @@ class BaselinkerSyncService:
             if len(new_comment) > 200:
                 new_comment = new_comment[:197] + "..."
         
-            request_data = {
-                'token': self.api_key,
-                'method': 'setOrderFields',
-                'parameters': json.dumps({
-                    'order_id': order_id,
-                    'admin_comments': new_comment
-                })
-            }
-        
-            response_data = self._make_api_request(request_data)
+            # Wysyłka przez kolejkę komend (worker w tle, ponowienia)
+            from .baselinker_queue import enqueue_order_fields
+            command = enqueue_order_fields(order_id, {'admin_comments': new_comment},
+                                           source='sync_validation')
         
-            if response_data.get('status') == 'SUCCESS':
-                logger.info("Dodano komentarz walidacji do Baselinker", extra={
-                    'order_id': order_id,
-                    'errors_count': len(errors),
-                    'existing_comment_preserved': bool(existing_comment.strip())
-                })
-                return True
-            else:
-                logger.error("Błąd dodawania komentarza do Baselinker", extra={
-                    'order_id': order_id,
-                    'api_error': response_data.get('error_message')
-                })
-                return False
+            logger.info("Zakolejkowano komentarz walidacji do Baselinker", extra={
+                'order_id': order_id,
+                'command_id': command.id,
+                'errors_count': len(errors),
+                'existing_comment_preserved': bool(existing_comment.strip())
+            })
+            return True
             
         except Exception as e:
             logger.error("Wyjątek podczas dodawania komentarza", extra={
@@ -867,6 +931,46 @@ class BaselinkerSyncService:
             })
             return False
 
+    def queue_order_status_change(self, order_id: int, target_status: Optional[int] = None,
+                                  source: Optional[str] = None) -> bool:
+        """
+        Kolejkuje zmianę statusu zamówienia w Baselinker (wysyłka przez worker w tle)
+        Jeśli target_status=None, automatycznie określa status na podstawie wykończenia
+        """
+        if target_status is None:
+            from ..models import ProductionItem
+            
+            products = ProductionItem.query.filter_by(
+                baselinker_order_id=order_id
+            ).all()
+            
+            if not products:
+                logger.error("Nie znaleziono produktów dla zamówienia", extra={'order_id': order_id})
+                return False
+            
+            target_status = self.determine_production_status_by_finish(products)
+            internal_order_number = products[0].internal_order_number
+        else:
+            internal_order_number = None
+        
+        try:
+            from .baselinker_queue import enqueue_order_status
+            command = enqueue_order_status(order_id, target_status,
+                                           internal_order_number=internal_order_number,
+                                           source=source)
+            logger.info("Zakolejkowano zmianę statusu w Baselinker", extra={
+                'order_id': order_id,
+                'target_status': target_status,
+                'command_id': command.id
+            })
+            return True
+        except Exception as e:
+            logger.error("Błąd kolejkowania zmiany statusu", extra={
+                'order_id': order_id,
+                'error': str(e)
+            })
+            return False
+
     def change_order_status_in_baselinker(self, order_id: int, target_status: Optional[int] = None) -> bool:
         """
         Zmienia status zamówienia w Baselinker
@@ -928,46 +1032,119 @@ class BaselinkerSyncService:
             })
             return False
 
-    def _fetch_paid_orders_for_cron(self) -> List[Dict[str, Any]]:
+    def _iter_paid_orders_for_cron(self) -> Iterator[List[Dict[str, Any]]]:
+        """
+        Strony opłaconych zamówień (status 155824) z ostatnich CRON_FETCH_DAYS_BACK dni
+
+        getOrders zwraca maksymalnie 100 zamówień posortowanych po date_confirmed,
+        więc kursorem jest date_confirmed ostatniego zamówienia strony (włącznie -
+        zamówienia z tej samej sekundy pomijane po order_id). Gdy cała pełna
+        strona ma tę samą sekundę, kolejne strony tej sekundy pobierane są
+        kursorem id_from (następne order_id), a potem od następnej sekundy.
+        Pobieranie trwa do strony niepełnej, więc po zaległościach jedno
+        uruchomienie przetwarza całość.
+        """
         if not self.api_key:
             raise SyncError("Brak klucza API Baselinker")
-        
-        try:
-            date_from_timestamp = int((datetime.now() - timedelta(days=14)).timestamp())
-            
-            logger.info("CRON: Pobieranie opłaconych zamówień", extra={
+
+        cursor = int((datetime.now() - timedelta(days=CRON_FETCH_DAYS_BACK)).timestamp())
+        cursor_order_ids = set()
+        id_from = None
+        pages_fetched = 0
+        orders_yielded = 0
+
+        logger.info("CRON: Pobieranie opłaconych zamówień", extra={
+            'status_id': 155824,
+            'days_back': CRON_FETCH_DAYS_BACK
+        })
+
+        while pages_fetched < CRON_FETCH_MAX_PAGES:
+            parameters = {
                 'status_id': 155824,
-                'days_back': 7
-            })
-            
+                'get_unconfirmed_orders': True,
+                'date_confirmed_from': cursor
+            }
+            if id_from is not None:
+                parameters['id_from'] = id_from
+
             request_data = {
                 'token': self.api_key,
                 'method': 'getOrders',
-                'parameters': json.dumps({
-                    'status_id': 155824,
-                    'get_unconfirmed_orders': True,
-                    'date_confirmed_from': date_from_timestamp,
-                    'date_limit': 100
-                })
+                'parameters': json.dumps(parameters)
             }
-            
-            response_data = self._make_api_request(request_data)
-            
-            if response_data.get('status') == 'SUCCESS':
-                orders = response_data.get('orders', [])
-                
-                logger.info("CRON: Pobrano opłacone zamówienia", extra={
-                    'orders_count': len(orders)
-                })
-                
-                return orders
-            else:
+
+            try:
+                response_data = self._make_api_request(request_data)
+            except Exception as e:
+                logger.error("CRON: Błąd pobierania zamówień", extra={'error': str(e), 'page': pages_fetched + 1})
+                raise SyncError(f'Błąd pobierania zamówień CRON: {str(e)}')
+
+            if response_data.get('status') != 'SUCCESS':
                 error_msg = response_data.get('error_message', 'Unknown error')
+                logger.error("CRON: Błąd pobierania zamówień", extra={'error': error_msg, 'page': pages_fetched + 1})
                 raise SyncError(f'Baselinker API error: {error_msg}')
-                
-        except Exception as e:
-            logger.error("CRON: Błąd pobierania zamówień", extra={'error': str(e)})
-            raise SyncError(f'Błąd pobierania zamówień CRON: {str(e)}')
+
+            orders = response_data.get('orders', []) or []
+            pages_fetched += 1
+
+            if id_from is not None:
+                # Stronicowanie po order_id dotyczy tylko sekundy kursora - późniejsze
+                # zamówienia z mniejszym order_id pobierane są od następnej sekundy bez id_from
+                second_orders = [order for order in orders if _order_confirmed_at(order) == cursor]
+                new_orders = [order for order in second_orders if order.get('order_id') not in cursor_order_ids]
+                if new_orders:
+                    orders_yielded += len(new_orders)
+                    yield new_orders
+
+                if len(second_orders) == BASELINKER_ORDERS_PAGE_SIZE:
+                    cursor_order_ids.update(order.get('order_id') for order in second_orders)
+                    id_from = max(int(order.get('order_id') or 0) for order in second_orders) + 1
+                else:
+                    cursor += 1
+                    cursor_order_ids = set()
+                    id_from = None
+                continue
+
+            new_orders = [order for order in orders if order.get('order_id') not in cursor_order_ids]
+            if new_orders:
+                orders_yielded += len(new_orders)
+                yield new_orders
+
+            if len(orders) < BASELINKER_ORDERS_PAGE_SIZE:
+                break
+
+            if not new_orders:
+                logger.warning("CRON: Strona bez nowych zamówień - przerywam pobieranie", extra={
+                    'date_confirmed_from': cursor,
+                    'page': pages_fetched
+                })
+                break
+
+            page_last_confirmed = max(_order_confirmed_at(order) for order in orders)
+            if page_last_confirmed > cursor:
+                cursor = page_last_confirmed
+                cursor_order_ids = set()
+            cursor_order_ids.update(order.get('order_id') for order in orders
+                                    if _order_confirmed_at(order) == cursor)
+
+            if all(_order_confirmed_at(order) == cursor for order in orders):
+                # Pełna strona z jednej sekundy - date_confirmed_from nie przesunie się,
+                # dalsze zamówienia tej sekundy po order_id
+                id_from = max(int(order.get('order_id') or 0) for order in orders) + 1
+                logger.warning("CRON: Pełna strona zamówień z tej samej sekundy - stronicowanie po order_id", extra={
+                    'date_confirmed': cursor,
+                    'id_from': id_from
+                })
+        else:
+            logger.warning("CRON: Osiągnięto limit stron pobierania", extra={
+                'max_pages': CRON_FETCH_MAX_PAGES,
+                'orders_count': orders_yielded
+            })
+
+        logger.info("CRON: Pobrano opłacone zamówienia", extra={
+            'orders_count': orders_yielded,
+            'pages': pages_fetched
+        })
 
     def _prepare_product_data_enhanced(self, order: Dict[str, Any], product: Dict[str, Any], 
                              product_id: str, id_result: Dict[str, Any], 
@@ -1122,6 +1299,8 @@ class BaselinkerSyncService:
                 if context:
                     entry['context'] = context
                 log_entries.append(entry)
+                if level != 'debug' or debug_mode:
+                    job_log(message, level, **context)
 
                 if level == 'error':
                     logger.error(message, extra={'context': 'manual_sync_enhanced', **{f'ctx_{k}': v for k, v in context.items()}})
@@ -1196,7 +1375,9 @@ class BaselinkerSyncService:
             reports_parser = None
             try:
                 from modules.reports.parser import ProductNameParser as ReportsProductNameParser
+                from modules.reports.parse_cache import prefetch_parse_results, product_names_from_orders
                 reports_parser = ReportsProductNameParser()
+                prefetch_parse_results(product_names_from_orders(orders_after_status))
             except Exception as parser_error:
                 add_log('Nie udało się zainicjować parsera nazw produktów z modułu reports.', 'warning')
 
@@ -1204,7 +1385,9 @@ class BaselinkerSyncService:
 
             qualified_orders = []
 
-            for order in orders_after_status:
+            for order_index, order in enumerate(orders_after_status):
+                check_job_cancelled()
+                job_progress(order_index, len(orders_after_status), 'Filtrowanie zamówień')
                 order_id_val = self._safe_int(order.get('order_id'))
                 if order_id_val is None:
                     stats['errors_count'] += 1
@@ -1394,6 +1577,16 @@ class BaselinkerSyncService:
 
             return response
 
+        except JobCancelled:
+            logger.warning('Enhanced Manual Baselinker sync cancelled')
+
+            if sync_log:
+                db.session.rollback()
+                sync_log.sync_status = 'failed'
+                sync_log.complete_sync(success=False, error_message='Anulowano przez użytkownika')
+                db.session.commit()
+            raise
+
         except SyncError as sync_error:
             logger.warning('Enhanced Manual Baselinker sync validation error', extra={'error': str(sync_error)})
             
@@ -1623,6 +1816,8 @@ class BaselinkerSyncService:
             'error_details': []
         }
         
+        self._prefetch_parse_results(orders_data)
+        
         for order in orders_data:
             try:
                 order_id = order.get('order_id')
@@ -1662,6 +1857,18 @@ class BaselinkerSyncService:
         
         return results
 
+    def _prefetch_parse_results(self, orders_data: List[Dict[str, Any]]) -> None:
+        """Ładuje wyniki parsowania nazw z paczki zamówień do cache (jedno zapytanie)"""
+        try:
+            from ..services.parser_service import get_parser_service
+            from modules.reports.parse_cache import product_names_from_orders
+            
+            names = product_names_from_orders(order for order in orders_data if isinstance(order, dict))
+            if names:
+                get_parser_service().prefetch(names)
+        except Exception as e:
+            logger.warning("Nie udało się wczytać cache parsowania nazw", extra={'error': str(e)})
+
     def _order_already_processed(self, baselinker_order_id: int) -> bool:
         try:
             from ..models import ProductionItem
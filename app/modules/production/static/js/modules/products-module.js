@@ -115,6 +115,9 @@ class ProductsModule {
             // Lista i sortowanie
             products: [],
             filteredProducts: [],
+
+            // Liczniki filtrów z serwera: atrybut -> wartość -> status -> liczba
+            facetCounts: null,
             sortColumn: null,
             sortDirection: 'asc',
 
@@ -890,9 +893,15 @@ class ProductsModule {
         try {
             console.log('[ProductsModule] Loading filters data...');
 
-            // TODO: Endpoint /products/filters-data będzie dodany w kolejnych krokach
-            // Tymczasowo - ekstraktuj opcje filtrów z załadowanych produktów
-            if (this.state.products.length > 0) {
+            // Opcje z licznikami z /products/filters-data (prod_item_facets)
+            const serverFilters = await this.fetchFiltersData();
+            if (serverFilters) {
+                this.updateFilterOptions(serverFilters);
+                this.setupMultiSelectFilters();
+                this.refreshFacetLabels();
+                console.log('[ProductsModule] Filter options loaded from server facets');
+            } else if (this.state.products.length > 0) {
+                // Fallback - ekstraktuj opcje filtrów z załadowanych produktów
                 const filtersData = this.extractFiltersFromProducts(this.state.products);
                 this.updateFilterOptions(filtersData);
                 this.setupMultiSelectFilters();
@@ -907,6 +916,73 @@ class ProductsModule {
         }
     }
 
+    async fetchFiltersData() {
+        try {
+            const response = await fetch('/production/api/products/filters-data', {
+                credentials: 'same-origin'
+            });
+            if (!response.ok) {
+                throw new Error(`HTTP ${response.status}`);
+            }
+
+            const data = await response.json();
+            if (!data.success || !data.filters_data) {
+                throw new Error(data.error || 'Brak danych filtrów');
+            }
+
+            const filtersData = data.filters_data;
+            this.state.facetCounts = filtersData.facet_counts || null;
+            return {
+                woodSpecies: filtersData.wood_species || [],
+                technologies: filtersData.technologies || [],
+                woodClasses: filtersData.wood_classes || [],
+                thicknesses: filtersData.thicknesses || [],
+                statuses: filtersData.statuses || []
+            };
+
+        } catch (error) {
+            console.warn('[ProductsModule] Filters data endpoint unavailable, using loaded products:', error);
+            this.state.facetCounts = null;
+            return null;
+        }
+    }
+
+    /**
+     * Przelicza liczniki w etykietach opcji dla aktualnie wybranych statusów
+     * (suma z facetCounts - bez zapytania do serwera)
+     */
+    refreshFacetLabels() {
+        const facetCounts = this.state.facetCounts;
+        if (!facetCounts) return;
+
+        const selectedStatuses = this.state.currentFilters.statuses || [];
+        const facetDropdowns = {
+            wood_species: 'dropdown-wood-species',
+            technology: 'dropdown-technology',
+            wood_class: 'dropdown-wood-class',
+            thickness: 'dropdown-thickness'
+        };
+
+        Object.entries(facetDropdowns).forEach(([attribute, dropdownId]) => {
+            const dropdown = document.getElementById(dropdownId);
+            if (!dropdown) return;
+
+            const values = facetCounts[attribute] || {};
+            dropdown.querySelectorAll('.multi-select-option:not(.multi-select-all)').forEach(optionDiv => {
+                const checkbox = optionDiv.querySelector('input[type="checkbox"]');
+                const label = optionDiv.querySelector('label');
+                if (!checkbox || !label) return;
+
+                const perStatus = values[checkbox.value] || {};
+                const count = Object.entries(perStatus).reduce((sum, [status, statusCount]) =>
+                    selectedStatuses.length === 0 || selectedStatuses.includes(status) ? sum + statusCount : sum, 0);
+
+                label.textContent = `${checkbox.value} (${count})`;
+                optionDiv.classList.toggle('multi-select-option-empty', count === 0);
+            });
+        });
+    }
+
     extractFiltersFromProducts(products) {
         const filters = {
             woodSpecies: new Set(),
@@ -1114,11 +1190,11 @@ class ProductsModule {
         // Update thickness options  
         this.populateCustomDropdown('dropdown-thickness', 'thicknesses', filtersData.thicknesses);
         
-        // Update status options with friendly names
-        const statusOptions = filtersData.statuses.map(status => ({
+        // Update status options with friendly names (z serwera - już z licznikami)
+        const statusOptions = filtersData.statuses.map(status => typeof status === 'string' ? {
             value: status,
             label: this.getStatusDisplayName(status)
-        }));
+        } : status);
         this.populateCustomDropdown('dropdown-status', 'statuses', statusOptions);
     }
 
@@ -1690,6 +1766,7 @@ class ProductsModule {
 
             this.state.filteredProducts = filtered;
             this.updateFilterBadges();
+            this.refreshFacetLabels();
 
             console.log(`[ProductsModule] Filters applied. ${filtered.length}/${this.state.products.length} products match`);
 
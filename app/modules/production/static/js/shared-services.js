@@ -305,6 +305,19 @@ class ApiClient {
             });
             
             console.log('[ApiClient] Manual sync response:', response);
+            
+            // Synchronizacja działa jako zadanie w tle (202 + job_id) - czekaj na wynik
+            if (response && response.job_id && window.JobProgress) {
+                const job = await window.JobProgress.wait(response.job_id, {
+                    onEvent: options.onEvent,
+                    onProgress: options.onProgress
+                });
+                const result = job.result || { success: false, error: job.error || 'Synchronizacja przerwana' };
+                if (!result.success) {
+                    throw new Error(result.error || 'Błąd synchronizacji');
+                }
+                return result;
+            }
             return response;
             
         } catch (error) {
@@ -709,6 +709,14 @@ async function onCountdownComplete(card, orderNumber) {
 
         window.StationCommon.showSuccess(`Zamówienie ${orderNumber} spakowane`);
 
+        // Status w Baselinker wysyłany jest w tle - sprawdź wynik
+        const baselinkerUpdate = response && response.data && response.data.baselinker_update;
+        if (baselinkerUpdate && baselinkerUpdate.queued) {
+            watchBaselinkerSync(orderNumber);
+        } else if (baselinkerUpdate && baselinkerUpdate.error) {
+            window.StationCommon.showWarning(`Baselinker: ${baselinkerUpdate.error}`);
+        }
+
         // Clear localStorage
         const storageKey = STORAGE_PREFIX + orderNumber;
         localStorage.removeItem(storageKey);
@@ -786,6 +794,40 @@ async function completePackaging(orderNumber, productIds) {
     return await response.json();
 }
 
+/**
+ * Poll Baselinker sync state for a queued order status change
+ */
+const BASELINKER_SYNC_POLL_MS = 3000;
+const BASELINKER_SYNC_MAX_POLLS = 5;
+
+function watchBaselinkerSync(orderNumber, attempt = 1) {
+    setTimeout(async () => {
+        try {
+            const response = await fetch(
+                `/production/api/baselinker-sync-state?internal_order_number=${encodeURIComponent(orderNumber)}`
+            );
+            if (!response.ok) {
+                return;
+            }
+
+            const result = await response.json();
+            const state = result.data ? result.data.state : null;
+
+            if (state === 'done') {
+                window.StationCommon.showSuccess(`Baselinker: zaktualizowano status ${orderNumber}`);
+            } else if (state === 'failed') {
+                window.StationCommon.showError(`Baselinker: nie udało się zaktualizować ${orderNumber}`);
+            } else if (state === 'pending' && attempt < BASELINKER_SYNC_MAX_POLLS) {
+                watchBaselinkerSync(orderNumber, attempt + 1);
+            } else if (state === 'pending') {
+                console.log(`[Packaging] Baselinker update for ${orderNumber} still queued - will retry in background`);
+            }
+        } catch (error) {
+            console.warn(`[Packaging] Baselinker sync state check failed: ${orderNumber}`, error);
+        }
+    }, BASELINKER_SYNC_POLL_MS);
+}
+
 /**
  * Update stats bar
  */
@@ -7,6 +7,7 @@ from modules.baselinker.service import BaselinkerService
 from modules.baselinker.models import BaselinkerConfig
 from modules.users.decorators import require_module_access
 from extensions import db, mail
+from query_profiler import query_budget
 from weasyprint import HTML
 from io import BytesIO
 from flask_mail import Message
@@ -16,7 +17,7 @@ import sys
 from sqlalchemy.orm import joinedload
 from sqlalchemy import func, text
 import re
-from datetime import datetime
+from datetime import datetime, timedelta
 import base64
 import os
 import json
@@ -59,6 +60,115 @@ def get_filtered_quotes_query(base_query):
     # Admin i User widzą wszystkie wyceny
     return base_query
 
+QUOTES_PAGE_DEFAULT = 20
+QUOTES_PAGE_MAX = 200
+QUOTES_SORT_COLUMNS = {
+    'created_at': Quote.created_at,
+    'quote_number': Quote.quote_number,
+}
+
+
+def _apply_quotes_list_filters(query, args):
+    """
+    Filtry listy wycen wykonywane po stronie bazy
+
+    Obsługiwane: quote_number (prefiks), client_number / client_name (fragment),
+    client_id, user_id, source, date_from / date_to (YYYY-MM-DD, włącznie).
+    Filtr statusu jest osobno (_apply_quotes_status_filter), żeby liczniki
+    statusów mogły korzystać z tego samego zapytania.
+    """
+    quote_number = (args.get('quote_number') or '').strip()
+    if quote_number:
+        query = query.filter(Quote.quote_number.ilike(f"{quote_number}%"))
+
+    client_number = (args.get('client_number') or '').strip()
+    if client_number:
+        query = query.filter(Quote.client.has(Client.client_number.ilike(f"%{client_number}%")))
+
+    client_name = (args.get('client_name') or '').strip()
+    if client_name:
+        query = query.filter(Quote.client.has(Client.client_name.ilike(f"%{client_name}%")))
+
+    client_id = args.get('client_id', type=int)
+    if client_id:
+        query = query.filter(Quote.client_id == client_id)
+
+    user_id = args.get('user_id', type=int)
+    if user_id:
+        query = query.filter(Quote.user_id == user_id)
+
+    source = (args.get('source') or '').strip()
+    if source:
+        query = query.filter(Quote.source == source)
+
+    try:
+        date_from = args.get('date_from')
+        if date_from:
+            query = query.filter(Quote.created_at >= datetime.strptime(date_from, '%Y-%m-%d'))
+        date_to = args.get('date_to')
+        if date_to:
+            date_to_end = datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1)
+            query = query.filter(Quote.created_at < date_to_end)
+    except ValueError:
+        pass  # Nieprawidłowa data - filtr pomijany, jak w poprzedniej wersji (JS)
+
+    return query
+
+
+def _selected_status_ids(args, statuses):
+    """Zbiór status_id z parametrów status_id / status (nazwa) lub None"""
+    selected = set()
+    for value in args.getlist('status_id'):
+        if value.isdigit():
+            selected.add(int(value))
+    for name in args.getlist('status'):
+        status = statuses.get(name)
+        if status:
+            selected.add(status["id"])
+        elif name:
+            selected.add(-1)  # nieznana nazwa - brak wyników
+    return selected or None
+
+
+def _apply_quotes_status_filter(query, args, statuses):
+    selected = _selected_status_ids(args, statuses)
+    if selected is None:
+        return query
+    return query.filter(Quote.status_id.in_(selected))
+
+
+def _quotes_status_count_map(filtered_query):
+    """Liczniki {status_id: count} dla przefiltrowanego zapytania listy"""
+    counts_raw = (
+        filtered_query
+        .with_entities(Quote.status_id, func.count(Quote.id))
+        .order_by(None)
+        .group_by(Quote.status_id)
+        .all()
+    )
+    return {status_id: count for status_id, count in counts_raw}
+
+
+def _encode_quotes_cursor(sort_value, quote_id):
+    if isinstance(sort_value, datetime):
+        sort_value = sort_value.isoformat()
+    payload = json.dumps([sort_value, quote_id]).encode('utf-8')
+    return base64.urlsafe_b64encode(payload).decode('ascii')
+
+
+def _decode_quotes_cursor(cursor, sort_column):
+    """Zwraca (wartość sortowania, id) lub None dla pustego/nieprawidłowego kursora"""
+    if not cursor:
+        return None
+    try:
+        sort_value, quote_id = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+        if sort_column.key == 'created_at' and sort_value is not None:
+            sort_value = datetime.fromisoformat(sort_value)
+        return sort_value, int(quote_id)
+    except (ValueError, TypeError):
+        return None
+
+
 def render_client_error(error_type, error_code, error_message, error_details=None, quote_number=None):
     """Renderuje stronę błędu dla klienta"""
     return render_template(
@@ -221,49 +331,113 @@ def quotes_home():
                           is_flexible_partner=is_flexible_partner)  # ✅ NOWY PARAMETR
 
 @quotes_bp.route('/api/quotes')
+@query_budget(6)
 @require_module_access('quotes')
 def api_quotes():
+    """
+    Lista wycen stronicowana kursorem (keyset)
+
+    Parametry: limit, cursor, sort (created_at | -created_at | quote_number | -quote_number)
+    oraz filtry z _apply_quotes_list_filters. Słownik statusów zwracany jest raz
+    na odpowiedź; include_counts=1 dokłada liczniki statusów dla tych samych filtrów.
+    """
     try:
-        # Mapa statusów
+        limit = max(1, min(request.args.get('limit', QUOTES_PAGE_DEFAULT, type=int), QUOTES_PAGE_MAX))
+        sort = request.args.get('sort', '-created_at')
+        if sort.lstrip('-') not in QUOTES_SORT_COLUMNS:
+            sort = '-created_at'
+        descending = sort.startswith('-')
+        sort_column = QUOTES_SORT_COLUMNS[sort.lstrip('-')]
+
         statuses = {
             s.name: {"id": s.id, "name": s.name, "color": s.color_hex}
             for s in QuoteStatus.query.all()
         }
-        # ✅ NOWE: Filtrowanie per rola
-        base_query = Quote.query.order_by(Quote.created_at.desc())
-        quotes = get_filtered_quotes_query(base_query).all()
+        statuses_by_id = {s["id"]: s for s in statuses.values()}
+
+        base_query = _apply_quotes_list_filters(get_filtered_quotes_query(Quote.query), request.args)
+        query = _apply_quotes_status_filter(base_query, request.args, statuses)
+
+        cursor = _decode_quotes_cursor(request.args.get('cursor'), sort_column)
+        if cursor:
+            cursor_value, cursor_id = cursor
+            if descending:
+                query = query.filter(db.or_(
+                    sort_column < cursor_value,
+                    db.and_(sort_column == cursor_value, Quote.id < cursor_id)
+                ))
+            else:
+                query = query.filter(db.or_(
+                    sort_column > cursor_value,
+                    db.and_(sort_column == cursor_value, Quote.id > cursor_id)
+                ))
+
+        order = (sort_column.desc(), Quote.id.desc()) if descending else (sort_column.asc(), Quote.id.asc())
+        quotes = (
+            query
+            .options(
+                joinedload(Quote.client).load_only(Client.id, Client.client_number, Client.client_name),
+                joinedload(Quote.user).load_only(User.id, User.first_name, User.last_name)
+            )
+            .order_by(*order)
+            .limit(limit + 1)
+            .all()
+        )
+
+        has_more = len(quotes) > limit
+        quotes = quotes[:limit]
+
         results = []
         for q in quotes:
             client = q.client
             user = q.user
-            status_data = statuses.get(q.quote_status.name if q.quote_status else None, {})
-            
-            # POPRAWKA: Pobranie opiekuna wyceny (user_id z tabeli quotes)
+            status_data = statuses_by_id.get(q.status_id, {})
+
             quote_caretaker_name = None
             if user:
                 quote_caretaker_name = f"{user.first_name} {user.last_name}".strip()
 
-            result = {
+            results.append({
                 "id": q.id,
                 "quote_number": q.quote_number,
                 "created_at": q.created_at.isoformat() if q.created_at else None,
                 "client_number": client.client_number if client else None,
                 "client_name": client.client_name if client else None,
-                "client_caretaker_name": quote_caretaker_name,  # POPRAWIONE: teraz pokazuje użytkownika wyceny
+                "client_caretaker_name": quote_caretaker_name,
                 "user_id": user.id if user else None,
                 "user_name": f"{user.first_name} {user.last_name}" if user else None,
                 "source": q.source,
                 "status_id": q.status_id,
                 "status_name": status_data.get("name", ""),
                 "status_color": status_data.get("color", "#ccc"),
-                "all_statuses": statuses,
                 "public_url": q.get_public_url(),
                 "base_linker_order_id": q.base_linker_order_id,
-                # DODANE: public_token do pobierania PDF
                 "public_token": q.public_token
-            }
-            results.append(result)
-        return jsonify(results)
+            })
+
+        next_cursor = None
+        if has_more and quotes:
+            last = quotes[-1]
+            next_cursor = _encode_quotes_cursor(getattr(last, sort_column.key), last.id)
+
+        response = {
+            "quotes": results,
+            "statuses": statuses,
+            "next_cursor": next_cursor,
+            "has_more": has_more,
+            "limit": limit
+        }
+
+        if request.args.get('include_counts') in ('1', 'true'):
+            count_map = _quotes_status_count_map(base_query)
+            response["status_counts"] = {str(status_id): count for status_id, count in count_map.items()}
+            selected = _selected_status_ids(request.args, statuses)
+            response["total"] = sum(
+                count for status_id, count in count_map.items()
+                if selected is None or status_id in selected
+            )
+
+        return jsonify(response)
     except Exception as e:
         print(f"[api_quotes] Błąd: {str(e)}", file=sys.stderr)
         return jsonify({"error": "Wystapil blad serwera"}), 500
@@ -453,28 +627,13 @@ def send_email(quote_id):
 @quotes_bp.route('/api/quotes/status-counts')
 @require_module_access('quotes')
 def api_quotes_status_counts():
-    print("[api_quotes_status_counts] Endpoint wywolany", file=sys.stderr)
-
+    """Liczniki statusów - to samo zapytanie (filtry per rola i listy) co /api/quotes"""
     try:
-        # Wyciągamy wszystkie statusy
         statuses = QuoteStatus.query.all()
 
-        # ✅ NOWE: Przygotuj bazowe query z filtrowaniem per rola
-        base_query = db.session.query(Quote.status_id, func.count(Quote.id))
-        
-        # ✅ NOWE: Zastosuj filtrowanie (dla partnera tylko jego wyceny)
-        user_id = session.get('user_id')
-        if user_id:
-            user = User.query.get(user_id)
-            if user and user.role == 'partner':
-                # Partner widzi TYLKO swoje wyceny w licznikach
-                base_query = base_query.filter(Quote.user_id == user_id)
-        
-        # Wykonaj query z grupowaniem
-        counts_raw = base_query.group_by(Quote.status_id).all()
-        count_map = {status_id: count for status_id, count in counts_raw}
+        base_query = _apply_quotes_list_filters(get_filtered_quotes_query(Quote.query), request.args)
+        count_map = _quotes_status_count_map(base_query)
 
-        # Składamy wynik
         counts = []
         for status in statuses:
             counts.append({
@@ -7,6 +7,10 @@ let allQuotes = [];
 let activeStatus = null;
 let currentPage = 1;
 let resultsPerPage = 20;
+let pageCursors = [null];   // kursor startowy każdej odwiedzonej strony (keyset)
+let totalQuotes = 0;
+let quotesRequestId = 0;
+let filterDebounceTimer = null;
 let allUsers = [];
 let currentEditingItem = null;
 let currentQuoteData = null;
@@ -16,9 +20,12 @@ let acceptedQuotes = new Set(); // Set do śledzenia ID zaakceptowanych wycen
 
 document.addEventListener("DOMContentLoaded", () => {
     console.log("[DOMContentLoaded] Inicjalizacja komponentów");
-    fetchQuotes();
     fetchQuotes().then(() => {
         initDownloadModal();
+
+        // NOWA FUNKCJONALNOŚĆ: Sprawdź czy mamy parametr open_quote w URL
+        console.log("[fetchQuotes] Sprawdzam parametr open_quote...");
+        checkForOpenQuoteParameter();
     });
     initStatusPanel();
     fetchUsers();
@@ -156,22 +163,49 @@ function initDownloadModal() {
     });
 }
 
+function buildQuotesQueryParams() {
+    const params = new URLSearchParams();
+    const filters = {
+        quote_number: document.getElementById("quote-number-filter")?.value?.trim(),
+        client_number: document.getElementById("client-number-filter")?.value?.trim(),
+        client_name: document.getElementById("client-name-filter")?.value?.trim(),
+        source: document.getElementById("source-filter")?.value,
+        user_id: document.getElementById("employee-filter")?.value,
+        date_from: document.getElementById("date-from-filter")?.value,
+        date_to: document.getElementById("date-to-filter")?.value,
+        status: activeStatus
+    };
+    Object.entries(filters).forEach(([key, value]) => {
+        if (value) params.append(key, value);
+    });
+    params.append("limit", resultsPerPage);
+    return params;
+}
+
 function fetchQuotes() {
     console.info("[fetchQuotes] Pobieranie wycen z /quotes/api/quotes");
 
-    return fetch("/quotes/api/quotes")
+    const params = buildQuotesQueryParams();
+    const cursor = pageCursors[currentPage - 1];
+    if (cursor) params.append("cursor", cursor);
+    params.append("include_counts", "1");
+
+    // Odpowiedzi starszych zapytań (szybkie pisanie w filtrach) są ignorowane
+    const requestId = ++quotesRequestId;
+
+    return fetch(`/quotes/api/quotes?${params.toString()}`)
         .then(res => res.json())
         .then(data => {
-            allQuotes = data;
-            console.log(`[fetchQuotes] Załadowano ${data.length} wycen`);
-            if (data.length > 0) {
-                allStatuses = data[0].all_statuses;
-            }
-            filterQuotes();
-            
-            // NOWA FUNKCJONALNOŚĆ: Sprawdź czy mamy parametr open_quote w URL
-            console.log("[fetchQuotes] Sprawdzam parametr open_quote...");
-            checkForOpenQuoteParameter();
+            if (requestId !== quotesRequestId) return;
+
+            allQuotes = data.quotes || [];
+            allStatuses = data.statuses || {};
+            totalQuotes = data.total || 0;
+            pageCursors[currentPage] = data.next_cursor;
+            console.log(`[fetchQuotes] Załadowano ${allQuotes.length} wycen (łącznie: ${totalQuotes})`);
+
+            renderQuotesTable(allQuotes);
+            renderPagination(totalQuotes, data.has_more);
         })
         .catch(err => {
             console.error("[fetchQuotes] Błąd pobierania wycen:", err);
@@ -1868,34 +1902,15 @@ function setupProductTabs(quoteData, tabsContainer, itemsContainer) {
 function filterQuotes() {
     console.log("Filtrujemy wyceny...");
 
-    const quoteNumber = document.getElementById("quote-number-filter")?.value?.toLowerCase() || "";
-    const clientNumber = document.getElementById("client-number-filter")?.value?.toLowerCase() || "";
-    const clientName = document.getElementById("client-name-filter")?.value?.toLowerCase() || "";
-    const source = document.getElementById("source-filter")?.value || "";
-    const employee = document.getElementById("employee-filter")?.value || "";
-    const dateFrom = document.getElementById("date-from-filter")?.value;
-    const dateTo = document.getElementById("date-to-filter")?.value;
-
-    const filtered = allQuotes.filter(q => {
-        const createdDate = new Date(q.created_at);
-        const matchDateFrom = !dateFrom || createdDate >= new Date(dateFrom);
-        const matchDateTo = !dateTo || createdDate <= new Date(dateTo);
-
-        return (!quoteNumber || q.quote_number?.toLowerCase().startsWith(quoteNumber)) &&
-            (!clientNumber || (q.client_number || "").toLowerCase().includes(clientNumber)) &&
-            (!clientName || (q.client_name || "").toLowerCase().includes(clientName)) &&
-            (!source || q.source === source) &&
-            (!employee || q.user_id == employee) &&
-            matchDateFrom &&
-            matchDateTo &&
-            (!activeStatus || q.status_name === activeStatus);
-    });
-
-    console.log(`[filterQuotes] Wszystkich wyników: ${filtered.length}, currentPage: ${currentPage}, resultsPerPage: ${resultsPerPage}`);
-    const paginated = filtered.slice((currentPage - 1) * resultsPerPage, currentPage * resultsPerPage);
+    // Zmiana filtrów = nowy zestaw wyników, paginacja od początku
+    currentPage = 1;
+    pageCursors = [null];
+    return fetchQuotes();
+}
 
-    renderQuotesTable(paginated);
-    renderPagination(filtered.length);
+function filterQuotesDebounced() {
+    clearTimeout(filterDebounceTimer);
+    filterDebounceTimer = setTimeout(filterQuotes, 300);
 }
 
 function renderQuotesTable(quotes) {
@@ -1997,10 +2012,7 @@ async function initStatusPanel() {
     statusPanel.innerHTML = "";
 
     try {
-        const [counts, statuses] = await Promise.all([
-            fetch("/quotes/api/quotes/status-counts").then(res => res.json()),
-            fetch("/quotes/api/quotes").then(res => res.json())
-        ]);
+        const counts = await fetch("/quotes/api/quotes/status-counts").then(res => res.json());
 
         const totalCount = counts.reduce((sum, s) => sum + s.count, 0);
         const allBtn = renderStatusButton("Wszystkie", totalCount, "#999", true);
@@ -2020,8 +2032,11 @@ document.addEventListener("DOMContentLoaded", () => {
     ["quote-number-filter", "client-number-filter", "client-name-filter", "source-filter"].forEach(id => {
         const el = document.getElementById(id);
         if (el) {
-            const evt = el.tagName === "SELECT" ? "change" : "input";
-            el.addEventListener(evt, filterQuotes);
+            if (el.tagName === "SELECT") {
+                el.addEventListener("change", filterQuotes);
+            } else {
+                el.addEventListener("input", filterQuotesDebounced);
+            }
         }
     });
 
@@ -2033,7 +2048,7 @@ document.addEventListener("DOMContentLoaded", () => {
     });
 });
 
-function renderPagination(total) {
+function renderPagination(total, hasMore) {
     console.log(`[renderPagination] Łącznie wyników: ${total}, resultsPerPage: ${resultsPerPage}`);
 
     let container = document.getElementById("pagination-container");
@@ -2046,7 +2061,7 @@ function renderPagination(total) {
 
     container.innerHTML = "";
 
-    const totalPages = Math.ceil(total / resultsPerPage);
+    const totalPages = Math.max(1, Math.ceil(total / resultsPerPage));
 
     // Selektor ilości wyników na stronę
     const select = document.createElement("select");
@@ -2062,24 +2077,37 @@ function renderPagination(total) {
 
     select.addEventListener("change", () => {
         resultsPerPage = parseInt(select.value);
-        currentPage = 1;
         filterQuotes();
     });
 
-    // Paginacja
+    // Paginacja kursorem - poprzednia / następna strona
     const pagination = document.createElement("div");
     pagination.className = "quotes-pagination";
 
-    for (let i = 1; i <= totalPages; i++) {
-        const btn = document.createElement("button");
-        btn.textContent = i;
-        if (i === currentPage) btn.classList.add("active");
-        btn.addEventListener("click", () => {
-            currentPage = i;
-            filterQuotes();
-        });
-        pagination.appendChild(btn);
-    }
+    const prevBtn = document.createElement("button");
+    prevBtn.textContent = "‹";
+    prevBtn.disabled = currentPage <= 1;
+    prevBtn.addEventListener("click", () => {
+        currentPage -= 1;
+        fetchQuotes();
+    });
+
+    const pageInfo = document.createElement("button");
+    pageInfo.textContent = `${currentPage} / ${totalPages}`;
+    pageInfo.classList.add("active");
+    pageInfo.disabled = true;
+
+    const nextBtn = document.createElement("button");
+    nextBtn.textContent = "›";
+    nextBtn.disabled = !hasMore;
+    nextBtn.addEventListener("click", () => {
+        currentPage += 1;
+        fetchQuotes();
+    });
+
+    pagination.appendChild(prevBtn);
+    pagination.appendChild(pageInfo);
+    pagination.appendChild(nextBtn);
 
     container.appendChild(pagination);
     container.appendChild(select);
@@ -0,0 +1,311 @@
+# modules/reports/import_stage.py
+"""
+Zbiorczy import zamówień do tabeli raportów
+===========================================
+
+Zapis wybranych zamówień (okno objętości, okno wymiarów, synchronizacja)
+przechodzi przez jeden etap:
+
+1. resolve - jedno przejście po wszystkich produktach paczki: klucz produktu
+   (jak generateProductKey we frontendzie) i poprawki z volume_fixes /
+   dimension_fixes trafiają do kolumn StagedProductFixes; konwersja zamówienia
+   nie szuka już poprawek osobno dla każdego pola
+2. build - rekordy z _convert_order_to_records (ta sama logika co dotąd),
+   zamienione na słowniki kolumn
+3. write - porcjami po IMPORT_BATCH_SIZE zamówień: jeden INSERT (executemany)
+   dla nowych zamówień, a zmiany statusów / płatności istniejących przez
+   ReportStatusUpsert (status_upsert.py); commit po porcji
+
+Zapisy Core omijają sesję ORM, dlatego dni zmienionych rekordów są zgłaszane
+do agregatów mapy (map_stats.mark_days_changed).
+"""
+
+import time
+from typing import Any, Dict, Iterable, List, Optional
+
+from flask import current_app
+from sqlalchemy import insert
+
+from extensions import db
+from modules.jobs import check_job_cancelled, job_progress
+from modules.logging import get_structured_logger
+from .map_stats import mark_days_changed
+from .models import BaselinkerReportOrder
+from .parse_cache import prefetch_parse_results, product_names_from_orders
+from .status_upsert import ReportStatusUpsert
+
+logger = get_structured_logger('reports.import_stage')
+
+# Liczba zamówień w jednej porcji zapisu (nadpisywana przez REPORTS_IMPORT_BATCH_SIZE)
+IMPORT_BATCH_SIZE = 100
+
+# Kolumny nadawane przez bazę / domyślne wartości Core
+_SKIPPED_COLUMNS = ('id', 'created_at', 'updated_at')
+
+def _positive_float(value) -> Optional[float]:
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        return None
+    return number if number > 0 else None
+
+
+def resolve_product_fix(service, order_id, product: Dict, position: int,
+                        volume_fixes: Optional[Dict], dimension_fixes: Optional[Dict]) -> Dict[str, Any]:
+    """
+    Poprawki jednego produktu w postaci gotowej do użycia w konwersji
+
+    Args:
+        service: BaselinkerReportsService (generate_product_key)
+        position: Pozycja produktu w zamówieniu (gdy brak product_index z frontendu)
+        volume_fixes: {product_key: {'volume', 'wood_species', 'technology', 'wood_class'}}
+        dimension_fixes: {order_id: {product_id: {'length_cm', 'width_cm', 'thickness_mm', 'volume_m3'}}}
+
+    Returns:
+        Dict: product_key, volume (łączna objętość pozycji), atrybuty drewna,
+        length_cm / width_cm / thickness_cm, dimension_volume (łączna objętość
+        wpisana w oknie wymiarów)
+    """
+    key_index = product.get('product_index')
+    if key_index is None:
+        key_index = position
+    product_key = service.generate_product_key(order_id, product, key_index)
+
+    volume_fix = (volume_fixes or {}).get(product_key) or {}
+    dimension_fix = {}
+    if dimension_fixes:
+        order_fixes = dimension_fixes.get(str(order_id)) or {}
+        dimension_fix = order_fixes.get(str(product.get('product_id'))) or {}
+
+    thickness_mm = _positive_float(dimension_fix.get('thickness_mm'))
+    return {
+        'product_key': product_key,
+        'volume': _positive_float(volume_fix.get('volume')),
+        'wood_species': volume_fix.get('wood_species') or None,
+        'technology': volume_fix.get('technology') or None,
+        'wood_class': volume_fix.get('wood_class') or None,
+        'length_cm': _positive_float(dimension_fix.get('length_cm')),
+        'width_cm': _positive_float(dimension_fix.get('width_cm')),
+        'thickness_cm': thickness_mm / 10 if thickness_mm else None,
+        'dimension_volume': _positive_float(dimension_fix.get('volume_m3')),
+    }
+
+
+class StagedProductFixes:
+    """
+    Poprawki wszystkich produktów paczki w układzie kolumnowym
+
+    columns[nazwa][i] - wartość dla i-tego produktu paczki;
+    order_slices[n] - zakres (start, end) produktów n-tego zamówienia.
+    """
+
+    COLUMNS = ('product_key', 'volume', 'wood_species', 'technology', 'wood_class',
+               'length_cm', 'width_cm', 'thickness_cm', 'dimension_volume')
+
+    def __init__(self):
+        self.columns: Dict[str, List] = {name: [] for name in self.COLUMNS}
+        self.order_slices: List[tuple] = []
+
+    def __len__(self):
+        return len(self.columns['product_key'])
+
+    def append(self, fix: Dict[str, Any]):
+        for name in self.COLUMNS:
+            self.columns[name].append(fix[name])
+
+    def for_order(self, order_position: int) -> List[Dict[str, Any]]:
+        """Poprawki produktów n-tego zamówienia (indeks = pozycja produktu)"""
+        start, end = self.order_slices[order_position]
+        return [
+            {name: self.columns[name][index] for name in self.COLUMNS}
+            for index in range(start, end)
+        ]
+
+    def fixed_count(self) -> int:
+        """Liczba produktów z jakąkolwiek poprawką"""
+        return sum(
+            1 for index in range(len(self))
+            if any(self.columns[name][index] is not None for name in self.COLUMNS[1:])
+        )
+
+
+class ReportImportStage:
+    """
+    Import paczki zamówień do baselinker_reports_orders
+
+    Args:
+        service: BaselinkerReportsService (konwersja zamówień, mapa statusów)
+        volume_fixes: Poprawki z okna objętości (klucz produktu -> dane)
+        dimension_fixes: Poprawki z okna wymiarów (order_id -> product_id -> dane)
+        batch_size: Liczba zamówień w porcji zapisu
+    """
+
+    def __init__(self, service, volume_fixes: Optional[Dict] = None,
+                 dimension_fixes: Optional[Dict] = None, batch_size: Optional[int] = None):
+        self.service = service
+        self.volume_fixes = volume_fixes or {}
+        self.dimension_fixes = dimension_fixes or {}
+        self.batch_size = max(1, int(
+            batch_size or current_app.config.get('REPORTS_IMPORT_BATCH_SIZE', IMPORT_BATCH_SIZE)
+        ))
+        self.table = BaselinkerReportOrder.__table__
+        self._insert_columns = [c for c in self.table.columns if c.key not in _SKIPPED_COLUMNS]
+
+    # ------------------------------------------------------------------
+    # Etap 1: poprawki
+    # ------------------------------------------------------------------
+
+    def resolve(self, orders: List[Dict]) -> StagedProductFixes:
+        """Jedno przejście po produktach wszystkich zamówień"""
+        staged = StagedProductFixes()
+        for order in orders:
+            start = len(staged)
+            order_id = order.get('order_id')
+            for position, product in enumerate(order.get('products') or []):
+                staged.append(resolve_product_fix(
+                    self.service, order_id, product, position,
+                    self.volume_fixes, self.dimension_fixes
+                ))
+            staged.order_slices.append((start, len(staged)))
+        return staged
+
+    # ------------------------------------------------------------------
+    # Etap 2: wiersze
+    # ------------------------------------------------------------------
+
+    def _insert_row(self, record: BaselinkerReportOrder) -> Dict[str, Any]:
+        row = {}
+        for column in self._insert_columns:
+            value = getattr(record, column.key)
+            if value is None and column.default is not None and column.default.is_scalar:
+                value = column.default.arg
+            row[column.key] = value
+        return row
+
+    def _queue_update(self, upsert: ReportStatusUpsert, order: Dict):
+        """Status i płatność istniejącego zamówienia (typ ceny - tylko rekordom bez typu)"""
+        service = self.service
+        status_id = order.get('order_status_id')
+        price_type_from_api = (order.get('custom_extra_fields') or {}).get('106169', '').strip()
+        normalized_type = price_type_from_api.lower() if price_type_from_api.lower() in ('netto', 'brutto') else ''
+        upsert.add(
+            order['order_id'],
+            price_type_if_empty=normalized_type or None,
+            current_status=service.status_map.get(status_id, f'Status {status_id}'),
+            baselinker_status_id=status_id,
+            paid_amount_net=service._calculate_paid_amount_net(order.get('payment_done', 0), price_type_from_api),
+        )
+
+    # ------------------------------------------------------------------
+    # Etap 3: zapis
+    # ------------------------------------------------------------------
+
+    def _write_batch(self, insert_rows: List[Dict], upsert: ReportStatusUpsert) -> int:
+        """Zapis porcji w jednej transakcji; zwraca liczbę zaktualizowanych rekordów"""
+        if insert_rows:
+            db.session.execute(insert(self.table), insert_rows)
+            mark_days_changed(db.session, (row['date_created'] for row in insert_rows))
+        records_updated = upsert.flush()
+        db.session.commit()
+        return records_updated
+
+    def run(self, orders: Iterable[Dict], update_existing: bool = True) -> Dict[str, Any]:
+        """
+        Importuje zamówienia; istniejące w raportach są aktualizowane
+        (update_existing=True) albo pomijane
+
+        Returns:
+            Dict: orders_processed, orders_added, records_added, orders_updated,
+            records_updated, orders_skipped, batches, errors, duration_ms
+        """
+        started = time.perf_counter()
+        unique_orders = {}
+        for order in orders:
+            order_id = order.get('order_id')
+            if order_id is not None and order_id not in unique_orders:
+                unique_orders[order_id] = order
+        order_list = list(unique_orders.values())
+
+        result = {
+            'orders_processed': 0,
+            'orders_added': 0,
+            'records_added': 0,
+            'orders_updated': 0,
+            'records_updated': 0,
+            'orders_skipped': 0,
+            'batches': 0,
+            'errors': [],
+        }
+        if not order_list:
+            result['duration_ms'] = 0.0
+            return result
+
+        try:
+            prefetch_parse_results(product_names_from_orders(order_list))
+        except Exception as e:
+            logger.warning("Nie udało się wczytać cache parsowania nazw", error=str(e))
+
+        staged = self.resolve(order_list)
+        existing_ids = self.service._get_existing_order_ids(list(unique_orders))
+
+        # Porcje zapisuje _write_batch - bez automatycznego flush w add()
+        upsert = ReportStatusUpsert(batch_size=self.batch_size, commit=False, auto_flush=False)
+        for batch_start in range(0, len(order_list), self.batch_size):
+            check_job_cancelled()
+            batch_positions = range(batch_start, min(batch_start + self.batch_size, len(order_list)))
+            orders_updated_before = upsert.stats['orders_updated']
+
+            insert_rows = []
+            added_orders, processed_orders = 0, 0
+            for position in batch_positions:
+                order = order_list[position]
+                order_id = order['order_id']
+                try:
+                    if order_id in existing_ids:
+                        if not update_existing:
+                            result['orders_skipped'] += 1
+                            continue
+                        self._queue_update(upsert, order)
+                    else:
+                        records = self.service._convert_order_to_records(
+                            order, product_fixes=staged.for_order(position)
+                        )
+                        if records:
+                            insert_rows.extend(self._insert_row(record) for record in records)
+                            added_orders += 1
+                    processed_orders += 1
+                except Exception as e:
+                    logger.error("Błąd przygotowania zamówienia do importu",
+                                 order_id=order_id, error=str(e))
+                    result['errors'].append({'order_id': order_id, 'error': str(e)})
+
+            try:
+                records_updated = self._write_batch(insert_rows, upsert)
+            except Exception as e:
+                db.session.rollback()
+                failed_ids = sorted({order_list[position]['order_id'] for position in batch_positions})
+                logger.error("Błąd zapisu porcji importu",
+                             batch=result['batches'] + 1, orders=len(failed_ids), error=str(e))
+                result['errors'].append({'order_ids': failed_ids, 'error': str(e)})
+            else:
+                result['orders_processed'] += processed_orders
+                result['orders_added'] += added_orders
+                result['records_added'] += len(insert_rows)
+                result['orders_updated'] += upsert.stats['orders_updated'] - orders_updated_before
+                result['records_updated'] += records_updated
+            result['batches'] += 1
+            job_progress(batch_positions.stop, len(order_list), 'Zapis zamówień do raportów')
+
+        result['duration_ms'] = round((time.perf_counter() - started) * 1000, 1)
+        logger.info("Zakończono import zamówień do raportów",
+                    orders=len(order_list),
+                    products=len(staged),
+                    products_with_fixes=staged.fixed_count(),
+                    orders_added=result['orders_added'],
+                    records_added=result['records_added'],
+                    orders_updated=result['orders_updated'],
+                    records_updated=result['records_updated'],
+                    batches=result['batches'],
+                    errors=len(result['errors']),
+                    duration_ms=result['duration_ms'])
+        return result
@@ -0,0 +1,364 @@
+# modules/reports/map_stats.py
+"""
+Statystyki mapy województw - agregaty utrzymywane przyrostowo
+=============================================================
+
+Zamiast ładować wszystkie rekordy raportów z zakresu dat przy każdym
+otwarciu mapy, tabela reports_voivodeship_daily_stats trzyma sumy
+dzień x województwo x kubełek statusu (production / ready / other).
+
+Aktualizacja: nasłuch sesji SQLAlchemy zbiera daty (date_created) rekordów
+BaselinkerReportOrder dodanych, usuniętych lub zmienionych w polach
+istotnych dla mapy. Po commit te dni są przeliczane jednym zapytaniem
+GROUP BY i podmieniane w tabeli agregatów - obejmuje to synchronizację
+raportów, cron statusów i ręczne edycje bez zmian w ich kodzie.
+
+Endpoint mapy sumuje kilkaset wierszy agregatów dla dowolnego zakresu dat.
+Historia jest budowana raz, przed pierwszym odczytem lub odświeżeniem
+(znacznik i lease w derived_table_builds). Pełna przebudowa: flask
+rebuild-map-stats.
+"""
+
+import sys
+import threading
+import time
+from collections import defaultdict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Dict, Iterable, List, Optional
+
+from flask.cli import with_appcontext
+from sqlalchemy import delete, event, func, insert, inspect, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from extensions import db
+from geo_lookup import VOIVODESHIPS, resolve_regions
+from lazy_tables import DerivedTables
+from modules.logging import get_structured_logger
+from .models import BaselinkerReportOrder, VoivodeshipDailyStats
+
+logger = get_structured_logger('reports.map_stats')
+
+# Statusy Baselinker dla grupowania na mapie
+IN_PRODUCTION_STATUSES = frozenset([155824, 138619, 148830, 148831, 148832])  # W produkcji
+READY_STATUSES = frozenset([138620, 138623, 149777])  # Wyprodukowane
+
+BUCKET_PRODUCTION = 'production'
+BUCKET_READY = 'ready'
+BUCKET_OTHER = 'other'
+
+# Pola rekordu, których zmiana wpływa na agregaty
+TRACKED_FIELDS = (
+    'date_created', 'delivery_state', 'delivery_postcode',
+    'baselinker_status_id', 'total_volume', 'value_net'
+)
+
+# Ile dni przeliczać jednym zapytaniem
+DAYS_PER_CHUNK = 62
+
+_SESSION_KEY = 'reports_map_stats_dates'
+
+_listeners_installed = False
+_listeners_lock = threading.Lock()
+
+
+def status_bucket(status_id: Optional[int]) -> str:
+    """Kubełek statusu dla mapy"""
+    if status_id in IN_PRODUCTION_STATUSES:
+        return BUCKET_PRODUCTION
+    if status_id in READY_STATUSES:
+        return BUCKET_READY
+    return BUCKET_OTHER
+
+
+# ============================================================================
+# PRZELICZANIE AGREGATÓW
+# ============================================================================
+
+def _aggregate_days(conn, days: List[date]) -> List[Dict]:
+    """Agregaty dla podanych dni liczone z baselinker_reports_orders"""
+    orders = BaselinkerReportOrder.__table__
+    rows = conn.execute(
+        select(
+            orders.c.date_created,
+            orders.c.delivery_state,
+            orders.c.delivery_postcode,
+            orders.c.baselinker_status_id,
+            func.count().label('rows_count'),
+            func.coalesce(func.sum(orders.c.total_volume), 0).label('volume'),
+            func.coalesce(func.sum(orders.c.value_net), 0).label('value_net'),
+        )
+        .where(orders.c.date_created.in_(days))
+        .group_by(
+            orders.c.date_created,
+            orders.c.delivery_state,
+            orders.c.delivery_postcode,
+            orders.c.baselinker_status_id,
+        )
+    ).all()
+
+    regions = resolve_regions(
+        [row.delivery_state for row in rows],
+        [row.delivery_postcode for row in rows]
+    )
+
+    totals = defaultdict(lambda: [0, Decimal('0'), Decimal('0')])
+    for row, region in zip(rows, regions):
+        key = (row.date_created, region or '', status_bucket(row.baselinker_status_id))
+        bucket = totals[key]
+        bucket[0] += row.rows_count
+        bucket[1] += Decimal(str(row.volume))
+        bucket[2] += Decimal(str(row.value_net))
+
+    now = datetime.utcnow()
+    return [
+        {
+            'stat_date': stat_date,
+            'voivodeship': region,
+            'status_bucket': bucket_name,
+            'rows_count': values[0],
+            'volume': values[1],
+            'value_net': values[2],
+            'updated_at': now,
+        }
+        for (stat_date, region, bucket_name), values in totals.items()
+    ]
+
+
+def _refresh_chunk(conn, days: List[date]) -> int:
+    """
+    Podmienia agregaty podanych dni w transakcji `conn` (upsert po kluczu dnia)
+
+    Wiersze tych dni są blokowane przed agregacją - równoległe odświeżenie
+    tego samego dnia czeka na commit i liczy już z jego danymi.
+    """
+    stats = VoivodeshipDailyStats.__table__
+    existing = {
+        (row.stat_date, row.voivodeship, row.status_bucket): row
+        for row in conn.execute(
+            select(stats.c.id, stats.c.stat_date, stats.c.voivodeship, stats.c.status_bucket,
+                   stats.c.rows_count, stats.c.volume, stats.c.value_net)
+            .where(stats.c.stat_date.in_(days))
+            .with_for_update()
+        )
+    }
+    rows = _aggregate_days(conn, days)
+
+    new_rows = []
+    for row in rows:
+        current = existing.pop((row['stat_date'], row['voivodeship'], row['status_bucket']), None)
+        if current is None:
+            new_rows.append(row)
+        elif (current.rows_count, Decimal(str(current.volume)), Decimal(str(current.value_net))) != \
+                (row['rows_count'], row['volume'], row['value_net']):
+            conn.execute(update(stats).where(stats.c.id == current.id).values(
+                rows_count=row['rows_count'], volume=row['volume'],
+                value_net=row['value_net'], updated_at=row['updated_at']
+            ))
+    if existing:
+        conn.execute(delete(stats).where(stats.c.id.in_([row.id for row in existing.values()])))
+    if new_rows:
+        conn.execute(insert(stats), new_rows)
+    return len(rows)
+
+
+def refresh_days(days: Iterable[date]) -> int:
+    """
+    Przelicza agregaty mapy dla podanych dni (podmiana wierszy tych dni)
+
+    Returns:
+        int: liczba wierszy agregatów tych dni
+    """
+    unique_days = sorted({day for day in days if day is not None})
+    if not unique_days:
+        return 0
+
+    # Niezbudowana tabela - budowa obejmuje też te dni
+    _TABLES.ensure_built()
+    written = 0
+    for start in range(0, len(unique_days), DAYS_PER_CHUNK):
+        chunk = unique_days[start:start + DAYS_PER_CHUNK]
+        try:
+            with db.engine.begin() as conn:
+                written += _refresh_chunk(conn, chunk)
+        except IntegrityError:
+            # Pierwszy wiersz dnia wstawiony równolegle przez inny proces - teraz jest co blokować
+            with db.engine.begin() as conn:
+                written += _refresh_chunk(conn, chunk)
+    return written
+
+
+def _build_stats(conn) -> Dict[str, int]:
+    """Pełne przeliczenie agregatów ze wszystkich rekordów raportów (w transakcji `conn`)"""
+    _TABLES.ensure()
+    stats = VoivodeshipDailyStats.__table__
+    days = sorted(
+        row[0] for row in conn.execute(select(BaselinkerReportOrder.__table__.c.date_created).distinct())
+        if row[0] is not None
+    )
+    conn.execute(delete(stats))
+    written = 0
+    for start in range(0, len(days), DAYS_PER_CHUNK):
+        rows = _aggregate_days(conn, days[start:start + DAYS_PER_CHUNK])
+        if rows:
+            conn.execute(insert(stats), rows)
+        written += len(rows)
+    return {'days': len(days), 'rows': written}
+
+
+# Budowa z istniejących raportów przed pierwszym odczytem / odświeżeniem (znacznik w bazie)
+_TABLES = DerivedTables('reports_map_stats', VoivodeshipDailyStats, build=_build_stats)
+
+
+def rebuild_all() -> Dict[str, int]:
+    """Pełna przebudowa agregatów ze wszystkich rekordów raportów"""
+    started = time.perf_counter()
+    result = _TABLES.rebuild()
+    return {
+        **result,
+        'duration_ms': round((time.perf_counter() - started) * 1000, 1)
+    }
+
+
+# ============================================================================
+# ŚLEDZENIE ZMIAN (nasłuch sesji)
+# ============================================================================
+
+def _touched_days(obj, is_dirty: bool) -> List[date]:
+    """Dni, których agregaty zmienia dany rekord (stara i nowa data przy przeniesieniu)"""
+    state = inspect(obj)
+    if is_dirty and not any(state.attrs[field].history.has_changes() for field in TRACKED_FIELDS):
+        return []
+    history = state.attrs.date_created.history
+    days = [obj.date_created]
+    days.extend(history.deleted or ())
+    return days
+
+
+def _before_flush(session, flush_context, instances):
+    pending = session.info.get(_SESSION_KEY)
+    for collection, is_dirty in ((session.new, False), (session.dirty, True), (session.deleted, False)):
+        for obj in collection:
+            if not isinstance(obj, BaselinkerReportOrder):
+                continue
+            days = _touched_days(obj, is_dirty)
+            if days:
+                if pending is None:
+                    pending = session.info[_SESSION_KEY] = set()
+                pending.update(day for day in days if day is not None)
+
+
+def mark_days_changed(session, days: Iterable[date]):
+    """
+    Zapisy z pominięciem ORM (Core INSERT/UPDATE w imporcie zbiorczym) nie
+    przechodzą przez before_flush - wywołujący zgłasza dni sam, agregaty
+    są przeliczane po commit tej sesji
+    """
+    pending = session.info.setdefault(_SESSION_KEY, set())
+    pending.update(day for day in days if day is not None)
+
+
+def _after_commit(session):
+    days = session.info.pop(_SESSION_KEY, None)
+    if not days:
+        return
+    try:
+        refresh_days(days)
+    except Exception as e:
+        # Agregaty nieaktualne dla tych dni do następnej zmiany lub przebudowy
+        logger.error("Błąd odświeżania agregatów mapy",
+                     days=len(days), error=str(e))
+
+
+def _after_rollback(session):
+    session.info.pop(_SESSION_KEY, None)
+
+
+def install_change_tracking():
+    """Podpina zdarzenia na klasie Session (raz na proces, wszystkie sesje)"""
+    global _listeners_installed
+
+    if _listeners_installed:
+        return
+    with _listeners_lock:
+        if not _listeners_installed:
+            event.listen(Session, 'before_flush', _before_flush)
+            event.listen(Session, 'after_commit', _after_commit)
+            event.listen(Session, 'after_rollback', _after_rollback)
+            _listeners_installed = True
+
+
+# ============================================================================
+# ODCZYT DLA ENDPOINTU MAPY
+# ============================================================================
+
+def _empty_region() -> Dict[str, float]:
+    return {
+        'production_volume': 0.0,
+        'ready_volume': 0.0,
+        'total_volume': 0.0,
+        'production_value_net': 0.0,
+        'ready_value_net': 0.0,
+        'total_value_net': 0.0,
+        'orders_count': 0
+    }
+
+
+def get_map_statistics(date_from: Optional[date] = None, date_to: Optional[date] = None) -> Dict:
+    """
+    Statystyki mapy z agregatów dla zakresu dat
+
+    Returns:
+        dict: regions (klucz województwa -> sumy), processed_rows (wszystkie
+        rekordy w zakresie, także bez rozpoznanego województwa)
+    """
+    _TABLES.ensure_built()
+
+    stats = VoivodeshipDailyStats.__table__
+    query = select(
+        stats.c.voivodeship,
+        stats.c.status_bucket,
+        func.sum(stats.c.rows_count).label('rows_count'),
+        func.sum(stats.c.volume).label('volume'),
+        func.sum(stats.c.value_net).label('value_net'),
+    ).group_by(stats.c.voivodeship, stats.c.status_bucket)
+    if date_from:
+        query = query.where(stats.c.stat_date >= date_from)
+    if date_to:
+        query = query.where(stats.c.stat_date <= date_to)
+
+    regions = {key: _empty_region() for key in VOIVODESHIPS}
+    processed_rows = 0
+    for row in db.session.execute(query):
+        rows_count = int(row.rows_count or 0)
+        processed_rows += rows_count
+        data = regions.get(row.voivodeship)
+        if data is None:
+            continue
+
+        data['orders_count'] += rows_count
+        if row.status_bucket == BUCKET_PRODUCTION:
+            data['production_volume'] += float(row.volume or 0)
+            data['production_value_net'] += float(row.value_net or 0)
+        elif row.status_bucket == BUCKET_READY:
+            data['ready_volume'] += float(row.volume or 0)
+            data['ready_value_net'] += float(row.value_net or 0)
+
+    for data in regions.values():
+        data['total_volume'] = data['production_volume'] + data['ready_volume']
+        data['total_value_net'] = data['production_value_net'] + data['ready_value_net']
+
+    return {'regions': regions, 'processed_rows': processed_rows}
+
+
+def register_map_stats_cli(app):
+    """Rejestruje komendę flask rebuild-map-stats"""
+
+    @app.cli.command('rebuild-map-stats')
+    @with_appcontext
+    def rebuild_map_stats_command():
+        """Przebudowuje agregaty mapy województw z baselinker_reports_orders"""
+        result = rebuild_all()
+        print(f"[rebuild-map-stats] Dni: {result['days']}, wiersze agregatów: {result['rows']}, "
+              f"czas: {result['duration_ms']} ms", file=sys.stderr)
@@ -7,13 +7,28 @@ from extensions import db
 from datetime import datetime, timedelta
 from sqlalchemy import Index
 import re
-from .utils import PostcodeToStateMapper
+from geo_lookup import display_name, normalize_region, region_from_postcode
 from modules.logging import get_structured_logger
 # Inicjalizacja loggera
 reports_logger = get_structured_logger('reports.routers')
 reports_logger.info("✅ reports_logger zainicjowany poprawnie w models.py")
 
 
+# Statusy "wyprodukowane" (gotowe do odbioru / wysłane / dostarczone)
+READY_PICKUP_STATUS_IDS = frozenset([138620, 138623, 105113, 105114, 149763, 149777, 138624, 149778, 149779])
+READY_PICKUP_STATUS_NAMES = (
+    'produkcja zakończona',           # 138620
+    'zamówienie spakowane',           # 138623
+    'paczka zgłoszona do wysyłki',    # 105113
+    'wysłane - kurier',               # 105114
+    'wysłane - transport woodpower',  # 149763
+    'czeka na odbiór osobisty',       # 149777
+    'dostarczona - kurier',           # 138624
+    'dostarczona - transport woodpower', # 149778
+    'odebrane'                        # 149779
+)
+
+
 class BaselinkerReportOrder(db.Model):
     """
     Model dla tabeli raportów zamówień z Baselinker
@@ -488,20 +503,10 @@ class BaselinkerReportOrder(db.Model):
                 self.realization_date = target_date
 
             # Oblicz saldo (wartość netto zamówienia - zapłacono netto)
-            if self.order_amount_net is not None and self.paid_amount_net is not None and self.delivery_cost is not None:
-                # POPRAWKA: Logika zależna od typu ceny zamówienia
-                price_type = (self.price_type or '').strip().lower()
-
-                if price_type == 'netto':
-                    # Zamówienia NETTO: klient płaci produkty netto + kuriera brutto
-                    total_order_to_pay = float(self.order_amount_net) + float(self.delivery_cost)
-                else:
-                    # Zamówienia BRUTTO: porównujemy wszystko na netto
-                    delivery_cost_net = float(self.delivery_cost) / 1.23 if self.delivery_cost else 0.0
-                    total_order_to_pay = float(self.order_amount_net) + delivery_cost_net
-
-                # Saldo = całkowita kwota do zapłaty - zapłacono netto
-                self.balance_due = total_order_to_pay - float(self.paid_amount_net)
+            balance_due = self.compute_balance_due(self.order_amount_net, self.paid_amount_net,
+                                                   self.delivery_cost, self.price_type)
+            if balance_due is not None:
+                self.balance_due = balance_due
 
             # Automatyczne uzupełnianie województwa na podstawie kodu pocztowego
             self.auto_fill_delivery_state()
@@ -554,20 +559,10 @@ class BaselinkerReportOrder(db.Model):
                 self.realization_date = target_date
             
             # Oblicz saldo (wartość netto zamówienia - zapłacono netto)
-            if self.order_amount_net is not None and self.paid_amount_net is not None and self.delivery_cost is not None:
-                # POPRAWKA: Logika zależna od typu ceny zamówienia
-                price_type = (self.price_type or '').strip().lower()
-            
-                if price_type == 'netto':
-                    # Zamówienia NETTO: klient płaci produkty netto + kuriera brutto
-                    total_order_to_pay = float(self.order_amount_net) + float(self.delivery_cost)
-                else:
-                    # Zamówienia BRUTTO: porównujemy wszystko na netto
-                    delivery_cost_net = float(self.delivery_cost) / 1.23 if self.delivery_cost else 0.0
-                    total_order_to_pay = float(self.order_amount_net) + delivery_cost_net
-        
-                # Saldo = całkowita kwota do zapłaty - zapłacono netto
-                self.balance_due = total_order_to_pay - float(self.paid_amount_net)
+            balance_due = self.compute_balance_due(self.order_amount_net, self.paid_amount_net,
+                                                   self.delivery_cost, self.price_type)
+            if balance_due is not None:
+                self.balance_due = balance_due
             
             # Automatyczne uzupełnianie województwa na podstawie kodu pocztowego
             self.auto_fill_delivery_state()
@@ -606,7 +601,7 @@ class BaselinkerReportOrder(db.Model):
         # KROK 2: Jeśli nie ma województwa, ale mamy kod pocztowy - uzupełniamy
         if self.delivery_postcode and self.delivery_postcode.strip():
         
-            auto_state = PostcodeToStateMapper.get_state_from_postcode(self.delivery_postcode)
+            auto_state = display_name(region_from_postcode(self.delivery_postcode))
             if auto_state:
                 self.delivery_state = auto_state
                 # Loguj automatyczne uzupełnienie (nie print, tylko strukturalny log)
@@ -626,85 +621,69 @@ class BaselinkerReportOrder(db.Model):
         if not self.delivery_state:
             return
             
-        state_lower = self.delivery_state.lower().strip()
-        
-        # Mapowanie województw
-        states_map = {
-            'dolnośląskie': 'Dolnośląskie',
-            'dolnoslaskie': 'Dolnośląskie',
-            'kujawsko-pomorskie': 'Kujawsko-Pomorskie',
-            'kujawsko pomorskie': 'Kujawsko-Pomorskie',
-            'lubelskie': 'Lubelskie',
-            'lubuskie': 'Lubuskie',
-            'łódzkie': 'Łódzkie',
-            'lodzkie': 'Łódzkie',
-            'małopolskie': 'Małopolskie',
-            'malopolskie': 'Małopolskie',
-            'mazowieckie': 'Mazowieckie',
-            'opolskie': 'Opolskie',
-            'podkarpackie': 'Podkarpackie',
-            'podlaskie': 'Podlaskie',
-            'pomorskie': 'Pomorskie',
-            'śląskie': 'Śląskie',
-            'slaskie': 'Śląskie',
-            'świętokrzyskie': 'Świętokrzyskie',
-            'swietokrzyskie': 'Świętokrzyskie',
-            'warmińsko-mazurskie': 'Warmińsko-Mazurskie',
-            'warminsko-mazurskie': 'Warmińsko-Mazurskie',
-            'warminsko mazurskie': 'Warmińsko-Mazurskie',
-            'wielkopolskie': 'Wielkopolskie',
-            'zachodniopomorskie': 'Zachodniopomorskie'
-        }
-        
-        # Sprawdź czy istnieje mapowanie
-        normalized = states_map.get(state_lower)
+        normalized = display_name(normalize_region(self.delivery_state))
         if normalized:
             self.delivery_state = normalized
         else:
             # Capitalize pierwszą literę jeśli nie ma mapowania
             self.delivery_state = self.delivery_state.strip().capitalize()
     
+    @staticmethod
+    def compute_balance_due(order_amount_net, paid_amount_net, delivery_cost, price_type):
+        """
+        Saldo zamówienia (None gdy brak danych do obliczenia)
+
+        Zamówienia NETTO: klient płaci produkty netto + kuriera brutto;
+        zamówienia BRUTTO: wszystko porównywane na netto.
+        """
+        if order_amount_net is None or paid_amount_net is None or delivery_cost is None:
+            return None
+
+        if (price_type or '').strip().lower() == 'netto':
+            total_order_to_pay = float(order_amount_net) + float(delivery_cost)
+        else:
+            delivery_cost_net = float(delivery_cost) / 1.23 if delivery_cost else 0.0
+            total_order_to_pay = float(order_amount_net) + delivery_cost_net
+
+        # Saldo = całkowita kwota do zapłaty - zapłacono netto
+        return total_order_to_pay - float(paid_amount_net)
+
+    @staticmethod
+    def compute_production_split(current_status, baselinker_status_id, total_volume, value_net):
+        """
+        Podział na produkcję / gotowe do odbioru wg statusu
+
+        Returns:
+            tuple: (production_volume, production_value_net,
+                    ready_pickup_volume, ready_pickup_value_net)
+        """
+        status_lower = current_status.lower()
+        volume = float(total_volume or 0.0)
+        value = float(value_net or 0.0)
+
+        # Jeśli status zawiera "w produkcji" LUB to "Nowe - opłacone"
+        if 'w produkcji' in status_lower or 'nowe - opłacone' in status_lower:
+            return volume, value, 0.0, 0.0
+
+        # Statusy dla "Wyprodukowane" wg ID, a dla ręcznych wpisów / starych rekordów
+        # bez baselinker_status_id - wg nazwy statusu
+        if ((baselinker_status_id and baselinker_status_id in READY_PICKUP_STATUS_IDS)
+                or any(status_name in status_lower for status_name in READY_PICKUP_STATUS_NAMES)):
+            return 0.0, 0.0, volume, value
+
+        return 0.0, 0.0, 0.0, 0.0
+
     def update_production_fields(self):
         """
         Aktualizuje pola produkcji na podstawie aktualnego statusu
         """
         if not self.current_status:
             return
-    
-        status_lower = self.current_status.lower()
-
-        # Reset wartości
-        self.production_volume = 0.0
-        self.production_value_net = 0.0
-        self.ready_pickup_volume = 0.0
-        self.ready_pickup_value_net = 0.0
 
-        # Jeśli status zawiera "w produkcji" LUB to "Nowe - opłacone"
-        if 'w produkcji' in status_lower or 'nowe - opłacone' in status_lower:
-            self.production_volume = float(self.total_volume or 0.0)
-            self.production_value_net = float(self.value_net or 0.0)
-    
-        # NOWA LOGIKA: Statusy dla "Wyprodukowane" (zamiast tylko "Czeka na odbiór osobisty")
-        # ID statusów: 138620, 138623, 105113, 105114, 149763, 149777, 138624, 149778, 149779
-        elif (self.baselinker_status_id and
-              self.baselinker_status_id in [138620, 138623, 105113, 105114, 149763, 149777, 138624, 149778, 149779]):
-            self.ready_pickup_volume = float(self.total_volume or 0.0)
-            self.ready_pickup_value_net = float(self.value_net or 0.0)
-    
-        # FALLBACK: Sprawdź także po nazwie statusu (dla ręcznych wpisów lub starych rekordów bez baselinker_status_id)
-        elif any(status_name in status_lower for status_name in [
-            'produkcja zakończona',           # 138620
-            'zamówienie spakowane',           # 138623
-            'paczka zgłoszona do wysyłki',    # 105113
-            'wysłane - kurier',               # 105114
-            'wysłane - transport woodpower',  # 149763
-            'czeka na odbiór osobisty',       # 149777
-            'dostarczona - kurier',           # 138624
-            'dostarczona - transport woodpower', # 149778
-            'odebrane'                        # 149779
-        ]):
-            self.ready_pickup_volume = float(self.total_volume or 0.0)
-            self.ready_pickup_value_net = float(self.value_net or 0.0)
+        (self.production_volume, self.production_value_net,
+         self.ready_pickup_volume, self.ready_pickup_value_net) = self.compute_production_split(
+            self.current_status, self.baselinker_status_id, self.total_volume, self.value_net
+        )
     
     def to_dict(self):
         """
@@ -811,4 +790,55 @@ class ReportsSyncLog(db.Model):
     duration_seconds = db.Column(db.Integer, nullable=True)
     
     def __repr__(self):
-        return f'<ReportsSyncLog {self.id}: {self.sync_date}, {self.status}>'
\ No newline at end of file
+        return f'<ReportsSyncLog {self.id}: {self.sync_date}, {self.status}>'
+
+class ProductNameParseCache(db.Model):
+    """
+    Trwały cache wyników parsowania nazw produktów (wspólny dla reports i production)
+
+    Klucz: (parser_kind, name_hash). Wiersze z innym parser_version niż bieżąca
+    wersja parsera są traktowane jako nieaktualne i nadpisywane.
+    """
+    __tablename__ = 'product_name_parse_cache'
+
+    id = db.Column(db.Integer, primary_key=True)
+    parser_kind = db.Column(db.String(20), nullable=False)
+    name_hash = db.Column(db.String(40), nullable=False)
+    product_name = db.Column(db.Text, nullable=False)
+    parser_version = db.Column(db.Integer, nullable=False)
+    result_json = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index('uq_parse_cache_kind_hash', 'parser_kind', 'name_hash', unique=True),
+    )
+
+    def __repr__(self):
+        return f'<ProductNameParseCache {self.parser_kind}: {self.product_name[:40]}>'
+
+
+class VoivodeshipDailyStats(db.Model):
+    """
+    Zagregowane statystyki mapy województw: dzień x województwo x kubełek statusu
+
+    Utrzymywane przyrostowo przez modules/reports/map_stats.py (przeliczenie
+    dni, których dotknęła synchronizacja / cron statusów). voivodeship = ''
+    dla wierszy bez rozpoznanego województwa (liczone do processed_orders).
+    """
+    __tablename__ = 'reports_voivodeship_daily_stats'
+
+    id = db.Column(db.Integer, primary_key=True)
+    stat_date = db.Column(db.Date, nullable=False)
+    voivodeship = db.Column(db.String(30), nullable=False, default='')
+    status_bucket = db.Column(db.String(12), nullable=False, comment="production / ready / other")
+    rows_count = db.Column(db.Integer, nullable=False, default=0)
+    volume = db.Column(db.Numeric(14, 4), nullable=False, default=0)
+    value_net = db.Column(db.Numeric(14, 2), nullable=False, default=0)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        Index('uq_voivodeship_stats_day', 'stat_date', 'voivodeship', 'status_bucket', unique=True),
+    )
+
+    def __repr__(self):
+        return f'<VoivodeshipDailyStats {self.stat_date} {self.voivodeship or "?"} {self.status_bucket}>'
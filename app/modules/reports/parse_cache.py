@@ -0,0 +1,291 @@
+# modules/reports/parse_cache.py
+"""
+Trwały cache wyników parsowania nazw produktów
+==============================================
+
+Te same kilkaset nazw produktów powtarza się w tysiącach zamówień. Wyniki
+parsowania trzymane są w tabeli product_name_parse_cache (wspólnej dla
+reports i production, rozróżnianej przez parser_kind), a przed pętlą po
+zamówieniach wywołujący robi prefetch(nazwy): jedno zapytanie IN ładuje
+znane wyniki do cache LRU procesu, a brakujące są parsowane i zapisywane
+zbiorczo. Pojedyncze wywołania parse_product_name trafiają wtedy w LRU.
+
+Benchmark: flask benchmark-parser (korpus = nazwy produktów z raportów).
+"""
+
+import hashlib
+import json
+import sys
+import time
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import and_, delete, insert, select
+
+from extensions import db
+from lazy_tables import LazyTables
+from modules.logging import get_structured_logger
+from .models import ProductNameParseCache
+from .parser import PARSER_VERSION, ParseResultLRU, ProductNameParser, parse_result_cache
+
+logger = get_structured_logger('reports.parse_cache')
+
+# Pola wyniku parsera reports przechowywane jako Decimal
+REPORTS_DECIMAL_FIELDS = ('length_cm', 'width_cm', 'thickness_cm', 'volume_per_piece')
+
+# Rozmiar porcji dla zapytań IN / wstawień zbiorczych
+CHUNK_SIZE = 500
+
+# Jedna tabela dla wszystkich parserów (kolumna kind)
+_TABLES = LazyTables(ProductNameParseCache)
+
+
+def _json_default(value):
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Nieobsługiwany typ: {type(value).__name__}")
+
+
+class PersistentParseCache:
+    """
+    Cache LRU procesu + tabela product_name_parse_cache dla jednego parsera
+
+    Args:
+        kind: Identyfikator parsera ('reports', 'production')
+        version: Wersja logiki parsera - inna wersja w bazie = wpis nieaktualny
+        parse_func: Parsowanie bez cache (nazwa -> dict)
+        lru: Cache LRU, w który trafiają wyniki
+        key_func: Klucz cache z nazwy (np. normalizacja); domyślnie nazwa
+        decimal_fields: Pola odtwarzane jako Decimal po odczycie z JSON
+    """
+
+    def __init__(self, kind: str, version: int, parse_func: Callable[[str], Dict[str, Any]],
+                 lru: ParseResultLRU, key_func: Optional[Callable[[str], str]] = None,
+                 decimal_fields: Iterable[str] = ()):
+        self.kind = kind
+        self.version = version
+        self.parse_func = parse_func
+        self.lru = lru
+        self.key_func = key_func or (lambda name: name)
+        self.decimal_fields = tuple(decimal_fields)
+
+    @staticmethod
+    def name_hash(key: str) -> str:
+        return hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+    def _decode(self, result_json: str) -> Dict[str, Any]:
+        result = json.loads(result_json)
+        for field in self.decimal_fields:
+            if result.get(field) is not None:
+                result[field] = Decimal(result[field])
+        return result
+
+    def prefetch(self, names: Iterable[str]) -> Dict[str, int]:
+        """
+        Zapewnia, że wyniki dla podanych nazw są w LRU procesu
+
+        Returns:
+            dict: requested, lru_hits, db_hits, parsed
+        """
+        keys = {}
+        for name in names:
+            if name:
+                key = self.key_func(name)
+                if key and key not in keys:
+                    keys[key] = name
+
+        stats = {'requested': len(keys), 'lru_hits': 0, 'db_hits': 0, 'parsed': 0}
+        missing = {key: name for key, name in keys.items() if key not in self.lru}
+        stats['lru_hits'] = len(keys) - len(missing)
+        if not missing:
+            return stats
+
+        try:
+            _TABLES.ensure()
+            stats.update(self._load_and_store(missing))
+        except Exception as e:
+            # Baza niedostępna - parsujemy w pamięci, cache trwały pominięty
+            logger.warning("Błąd trwałego cache parsowania - parsowanie w pamięci",
+                           parser_kind=self.kind, error=str(e))
+            for key, name in missing.items():
+                if key not in self.lru:
+                    self.lru.put(key, self.parse_func(name))
+                    stats['parsed'] += 1
+
+        return stats
+
+    def _load_and_store(self, missing: Dict[str, str]) -> Dict[str, int]:
+        table = ProductNameParseCache.__table__
+        hashes = {self.name_hash(key): key for key in missing}
+        found = {}
+        stale = []
+
+        # Osobne połączenie - nie mieszamy się w transakcję sesji wywołującego
+        with db.engine.begin() as conn:
+            hash_list = list(hashes)
+            for start in range(0, len(hash_list), CHUNK_SIZE):
+                chunk = hash_list[start:start + CHUNK_SIZE]
+                rows = conn.execute(
+                    select(table.c.name_hash, table.c.parser_version, table.c.result_json)
+                    .where(and_(table.c.parser_kind == self.kind, table.c.name_hash.in_(chunk)))
+                ).fetchall()
+                for name_hash, version, result_json in rows:
+                    if version == self.version:
+                        found[name_hash] = result_json
+                    else:
+                        stale.append(name_hash)
+
+            for name_hash, result_json in found.items():
+                self.lru.put(hashes[name_hash], self._decode(result_json))
+
+            new_rows = []
+            for name_hash, key in hashes.items():
+                if name_hash in found:
+                    continue
+                result = self.parse_func(missing[key])
+                self.lru.put(key, result)
+                new_rows.append({
+                    'parser_kind': self.kind,
+                    'name_hash': name_hash,
+                    'product_name': missing[key],
+                    'parser_version': self.version,
+                    'result_json': json.dumps(result, default=_json_default, ensure_ascii=False),
+                    'created_at': datetime.utcnow()
+                })
+
+            if stale:
+                conn.execute(
+                    delete(table).where(and_(table.c.parser_kind == self.kind, table.c.name_hash.in_(stale)))
+                )
+
+            if new_rows:
+                # Równoległy proces mógł zapisać ten sam wpis - duplikaty pomijamy
+                prefix = {'mysql': 'IGNORE', 'sqlite': 'OR IGNORE'}.get(conn.dialect.name)
+                statement = insert(table)
+                if prefix:
+                    statement = statement.prefix_with(prefix)
+                for start in range(0, len(new_rows), CHUNK_SIZE):
+                    conn.execute(statement, new_rows[start:start + CHUNK_SIZE])
+
+        return {'db_hits': len(found), 'parsed': len(missing) - len(found)}
+
+    def clear(self) -> int:
+        """Usuwa wpisy tego parsera z tabeli i czyści LRU"""
+        self.lru.clear()
+        _TABLES.ensure()
+        table = ProductNameParseCache.__table__
+        with db.engine.begin() as conn:
+            result = conn.execute(delete(table).where(table.c.parser_kind == self.kind))
+        return result.rowcount
+
+
+# Cache trwały parsera reports - wynik identyczny z ProductNameParser.parse_product_name
+reports_parse_cache = PersistentParseCache(
+    kind='reports',
+    version=PARSER_VERSION,
+    parse_func=lambda name: ProductNameParser().parse_uncached(name),
+    lru=parse_result_cache,
+    decimal_fields=REPORTS_DECIMAL_FIELDS
+)
+
+
+def prefetch_parse_results(names: Iterable[str]) -> Dict[str, int]:
+    """Ładuje wyniki parsera reports dla nazw do LRU (przed pętlą po zamówieniach)"""
+    return reports_parse_cache.prefetch(names)
+
+
+def product_names_from_orders(orders: Iterable[Dict[str, Any]]) -> List[str]:
+    """Nazwy produktów ze zamówień Baselinker (do prefetch)"""
+    return [
+        (product.get('name') or '').strip()
+        for order in orders
+        for product in (order.get('products') or [])
+    ]
+
+
+# ============================================================================
+# BENCHMARK
+# ============================================================================
+
+def benchmark_parser(names: List[str], rounds: int = 3) -> Dict[str, Any]:
+    """
+    Mierzy parsowanie korpusu nazw: bez cache, z LRU (po rozgrzaniu)
+    oraz prefetch z tabeli (zimne LRU, wpisy w bazie)
+
+    Returns:
+        dict: liczby nazw i czasy w mikrosekundach na nazwę
+    """
+    parser = ProductNameParser()
+    unique_names = list(dict.fromkeys(name for name in names if name))
+
+    def measure(func, corpus):
+        best = None
+        for _ in range(rounds):
+            started = time.perf_counter()
+            for name in corpus:
+                func(name)
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        return round(best * 1_000_000 / max(len(corpus), 1), 2)
+
+    results = {
+        'names': len(names),
+        'unique_names': len(unique_names),
+        'uncached_us': measure(parser.parse_uncached, names),
+    }
+
+    lru = ParseResultLRU(maxsize=max(len(unique_names), 1))
+
+    def lru_parse(name):
+        cached = lru.get(name)
+        if cached is None:
+            cached = parser.parse_uncached(name)
+            lru.put(name, cached)
+        return dict(cached)
+
+    for name in unique_names:
+        lru_parse(name)
+    results['lru_us'] = measure(lru_parse, names)
+
+    store = PersistentParseCache(
+        kind='reports', version=PARSER_VERSION, parse_func=parser.parse_uncached,
+        lru=lru, decimal_fields=REPORTS_DECIMAL_FIELDS
+    )
+    store.prefetch(unique_names)  # zapewnia wpisy w tabeli
+    lru.clear()
+    started = time.perf_counter()
+    prefetch_stats = store.prefetch(unique_names)
+    results['prefetch_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    results['prefetch'] = prefetch_stats
+
+    return results
+
+
+def register_parser_cli(app):
+    """Rejestruje komendę flask benchmark-parser"""
+
+    @app.cli.command('benchmark-parser')
+    @click.option('--limit', default=20000, help='Maksymalna liczba nazw z raportów')
+    @click.option('--rounds', default=3, help='Liczba powtórzeń (brany najlepszy czas)')
+    @with_appcontext
+    def benchmark_parser_command(limit, rounds):
+        """Benchmark parsera nazw produktów na nazwach z baselinker_reports_orders"""
+        from .models import BaselinkerReportOrder
+
+        names = [
+            row[0] for row in
+            db.session.query(BaselinkerReportOrder.raw_product_name)
+            .filter(BaselinkerReportOrder.raw_product_name.isnot(None))
+            .order_by(BaselinkerReportOrder.id.desc())
+            .limit(limit)
+            .all()
+        ]
+        if not names:
+            print("[benchmark-parser] Brak nazw produktów w raportach", file=sys.stderr)
+            return
+
+        results = benchmark_parser(names, rounds=rounds)
+        click.echo(json.dumps(results, indent=2, ensure_ascii=False))
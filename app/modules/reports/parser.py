@@ -11,7 +11,10 @@ POPRAWKA: Rozszerzono obsługę formatów wymiarów:
 """
 
 import re
-from typing import Any, Dict, Optional, Tuple
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
 from decimal import Decimal
 from modules.logging import get_structured_logger
 # Inicjalizacja loggera
@@ -19,6 +22,136 @@ reports_logger = get_structured_logger('reports.routers')
 reports_logger.info("✅ reports_logger zainicjowany poprawnie w parser.py")
 
 
+# Wersja logiki parsowania - zmiana unieważnia wyniki zapisane w product_name_parse_cache
+PARSER_VERSION = 2
+
+# Rozmiar wspólnego (per proces) cache LRU wyników parsowania
+PARSE_LRU_SIZE = 4096
+
+
+class KeywordScanner:
+    """
+    Skaner słów kluczowych wielu kategorii w jednym przejściu
+
+    Jedno skompilowane wyrażenie (lookahead + alternatywa od najdłuższych słów)
+    zwraca dla każdej pozycji tekstu najdłuższe pasujące słowo; krótsze słowa
+    zaczynające się w tym samym miejscu są jego prefiksami, więc ich wystąpienia
+    są znane z góry (tabela prefiksów). Dzięki temu widzimy wszystkie wystąpienia,
+    także nakładające się ('worek opałowy' / 'opałowy' / 'opał').
+
+    Dla każdej kategorii wygrywa słowo o najniższym priorytecie (kolejność
+    w słowniku) - identycznie jak pętla `for key in MAP: if key in name`.
+    """
+
+    def __init__(self, categories: Dict[str, Dict[str, str]]):
+        payloads: Dict[str, List[Tuple[str, int, str]]] = {}
+        for category, mapping in categories.items():
+            for priority, (keyword, value) in enumerate(mapping.items()):
+                payloads.setdefault(keyword, []).append((category, priority, value))
+
+        keywords = sorted(payloads, key=len, reverse=True)
+        self._pattern = re.compile('(?=({}))'.format(self._trie_regex(keywords)))
+
+        # Słowo -> wszystkie słowa kluczowe będące jego prefiksem (łącznie z nim)
+        self._matches = {
+            keyword: [payload for prefix in payloads if keyword.startswith(prefix) for payload in payloads[prefix]]
+            for keyword in keywords
+        }
+
+    @classmethod
+    def _trie_regex(cls, keywords: Iterable[str]) -> str:
+        """
+        Alternatywa słów zapisana jako drzewo prefiksów ('dęb(?:owa|owy|owe)'),
+        dzięki czemu silnik regex odrzuca pozycję po pierwszym znaku zamiast
+        próbować każdego słowa osobno. Dłuższe gałęzie przed końcem słowa -
+        dopasowanie jest zawsze najdłuższe.
+        """
+        trie: Dict[str, Any] = {}
+        for keyword in keywords:
+            node = trie
+            for char in keyword:
+                node = node.setdefault(char, {})
+            node[''] = {}
+        return cls._trie_node_regex(trie)
+
+    @classmethod
+    def _trie_node_regex(cls, node: Dict[str, Any]) -> str:
+        branches = [re.escape(char) + cls._trie_node_regex(child) for char, child in node.items() if char]
+        is_end = '' in node
+        if not branches:
+            return ''
+        if len(branches) == 1 and not is_end:
+            return branches[0]
+        pattern = '(?:' + '|'.join(branches) + ')'
+        return pattern + '?' if is_end else pattern
+
+    def match(self, text: str) -> Dict[str, str]:
+        """Zwraca {kategoria: wartość} dla słów kluczowych znalezionych w tekście"""
+        best: Dict[str, Tuple[int, str]] = {}
+        matches = self._matches
+
+        for keyword in self._pattern.findall(text):
+            for category, priority, value in matches[keyword]:
+                current = best.get(category)
+                if current is None or priority < current[0]:
+                    best[category] = (priority, value)
+
+        return {category: value for category, (_, value) in best.items()}
+
+
+class ParseResultLRU:
+    """Ograniczony cache LRU (thread-safe) nazwa -> wynik parsowania"""
+
+    def __init__(self, maxsize: int = PARSE_LRU_SIZE):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            value = self._data.get(key)
+            if value is None:
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: str, value: Dict[str, Any]):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def __contains__(self, key: str) -> bool:
+        with self._lock:
+            return key in self._data
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / lookups, 4) if lookups else 0.0
+            }
+
+
+# Wspólny cache wyników dla wszystkich instancji parsera w procesie
+parse_result_cache = ParseResultLRU()
+
+
 class ProductNameParser:
     """
     Klasa do parsowania nazw produktów z Baselinker
@@ -120,45 +253,64 @@ class ProductNameParser:
         'tarcicy': 'tarcica',
     }
     
+    # Wymiary: dwa wyrażenia zamiast pięciu (warianty "cm" ze spacją/bez spacji
+    # były podzbiorami \s*cm). Format "x" (×, *) ma pierwszeństwo przed "/".
+    _NUMBER = r'(\d+(?:[,\.]\d+)?)'
+    DIMENSIONS_X_RE = re.compile(r'{n}\s*[×x*]\s*{n}\s*[×x*]\s*{n}\s*cm'.format(n=_NUMBER), re.IGNORECASE)
+    DIMENSIONS_SLASH_RE = re.compile(r'{n}\s*/\s*{n}\s*/\s*{n}\s*cm'.format(n=_NUMBER), re.IGNORECASE)
+
+    # Regex dla klasy drewna
+    CLASS_RE = re.compile(r'([AB]/[AB]|[AB]-[AB])')
+
+    _scanner = None
+    _scanner_lock = threading.Lock()
+
     def __init__(self):
-        # POPRAWKA: Rozszerzone regex dla wymiarów - obsługuje różne separatory i formaty
-        self.dimension_patterns = [
-            # Format z przecinkami jako separatory dziesiętne (np. 90,3x44x2,1 cm)
-            r'(\d+(?:[,\.]\d+)?)\s*[×x*]\s*(\d+(?:[,\.]\d+)?)\s*[×x*]\s*(\d+(?:[,\.]\d+)?)\s*cm',
-            
-            # Format bez spacji przed cm (np. 90x44x2,1cm)
-            r'(\d+(?:[,\.]\d+)?)\s*[×x*]\s*(\d+(?:[,\.]\d+)?)\s*[×x*]\s*(\d+(?:[,\.]\d+)?)cm',
-            
-            # Format ze spacją przed cm (klasyczny, np. 90x44x2,1 cm)
-            r'(\d+(?:[,\.]\d+)?)\s*[×x*]\s*(\d+(?:[,\.]\d+)?)\s*[×x*]\s*(\d+(?:[,\.]\d+)?)\s+cm',
-            
-            # Format z ukośnikami (np. 120/30/2,5 cm)
-            r'(\d+(?:[,\.]\d+)?)\s*/\s*(\d+(?:[,\.]\d+)?)\s*/\s*(\d+(?:[,\.]\d+)?)\s*cm',
-            
-            # Format z ukośnikami bez spacji przed cm
-            r'(\d+(?:[,\.]\d+)?)\s*/\s*(\d+(?:[,\.]\d+)?)\s*/\s*(\d+(?:[,\.]\d+)?)cm',
-        ]
-        
-        # Regex dla klasy drewna
-        self.class_pattern = r'([AB]/[AB]|[AB]-[AB])'
-        
-        # Kompiluj regex'y dla wydajności
-        self.compiled_dimension_patterns = [re.compile(pattern, re.IGNORECASE) for pattern in self.dimension_patterns]
-        self.compiled_class_pattern = re.compile(self.class_pattern)
-    
+        self.compiled_dimension_patterns = [self.DIMENSIONS_X_RE, self.DIMENSIONS_SLASH_RE]
+        self.compiled_class_pattern = self.CLASS_RE
+
+    @classmethod
+    def _get_scanner(cls) -> KeywordScanner:
+        """Skaner słów kluczowych budowany raz na proces (wspólny dla instancji)"""
+        if cls._scanner is None:
+            with cls._scanner_lock:
+                if cls._scanner is None:
+                    cls._scanner = KeywordScanner({
+                        'product_type': cls.PRODUCT_TYPE_MAP,
+                        'wood_species': cls.WOOD_SPECIES_MAP,
+                        'technology': cls.TECHNOLOGY_MAP,
+                        'finish_state': cls.FINISH_MAP,
+                    })
+        return cls._scanner
+
     def parse_product_name(self, product_name: str) -> Dict[str, Any]:
         """
         Parsuje nazwę produktu i wyciąga wszystkie możliwe informacje
+
+        Wynik pochodzi ze wspólnego cache LRU (parse_result_cache); przy braku
+        w cache nazwa jest parsowana jednym przejściem (parse_uncached).
         
         Args:
             product_name (str): Nazwa produktu z Baselinker
             
         Returns:
-            Dict[str, Any]: Słownik z wyciągniętymi informacjami
+            Dict[str, Any]: Słownik z wyciągniętymi informacjami (kopia - można modyfikować)
         """
         if not product_name:
             return self._empty_result()
-        
+
+        cached = parse_result_cache.get(product_name)
+        if cached is None:
+            cached = self.parse_uncached(product_name)
+            parse_result_cache.put(product_name, cached)
+
+        return dict(cached)
+
+    def parse_uncached(self, product_name: str) -> Dict[str, Any]:
+        """Parsowanie bez cache: jedno przejście skanera + jedno wyszukanie wymiarów"""
+        if not product_name:
+            return self._empty_result()
+
         name_lower = product_name.lower()
         result = {
             'product_type': None,      # klejonka/deska
@@ -175,21 +327,16 @@ class ProductNameParser:
         }
         
         try:
-            # 1. Wyciągnij typ produktu
-            result['product_type'] = self._extract_product_type(name_lower)
-            
-            # 2. Wyciągnij gatunek drewna
-            result['wood_species'] = self._extract_wood_species(name_lower)
-            
-            # 3. Wyciągnij technologię
-            result['technology'] = self._extract_technology(name_lower)
+            # 1-3, 5. Typ, gatunek, technologia, wykończenie - jedno przejście skanera
+            keywords = self._get_scanner().match(name_lower)
+            result['product_type'] = keywords.get('product_type', 'klejonka')
+            result['wood_species'] = keywords.get('wood_species')
+            result['technology'] = keywords.get('technology')
+            result['finish_state'] = keywords.get('finish_state', 'surowy')
             
             # 4. Wyciągnij klasę drewna
             result['wood_class'] = self._extract_wood_class(product_name)
             
-            # 5. Wyciągnij wykończenie
-            result['finish_state'] = self._extract_finish_state(name_lower)
-            
             # 6. Wyciągnij wymiary
             dimensions = self._extract_dimensions(product_name)
             if dimensions:
@@ -211,27 +358,15 @@ class ProductNameParser:
         """
         Wyciąga typ produktu - domyślnie klejonka, chyba że znajdzie słowo wskazujące na deskę
         """
-        # Sprawdź czy nazwa zawiera słowa wskazujące na konkretny typ
-        for key, value in self.PRODUCT_TYPE_MAP.items():
-            if key in name_lower:
-                return value
-        
-        # Jeśli nie znaleziono żadnego słowa kluczowego, domyślnie zwróć 'klejonka'
-        return 'klejonka'
+        return self._get_scanner().match(name_lower).get('product_type', 'klejonka')
     
     def _extract_wood_species(self, name_lower: str) -> Optional[str]:
         """Wyciąga gatunek drewna"""
-        for key, value in self.WOOD_SPECIES_MAP.items():
-            if key in name_lower:
-                return value
-        return None
+        return self._get_scanner().match(name_lower).get('wood_species')
     
     def _extract_technology(self, name_lower: str) -> Optional[str]:
         """Wyciąga technologię"""
-        for key, value in self.TECHNOLOGY_MAP.items():
-            if key in name_lower:
-                return value
-        return None
+        return self._get_scanner().match(name_lower).get('technology')
     
     def _extract_wood_class(self, product_name: str) -> Optional[str]:
         """Wyciąga klasę drewna (A/B, B/B)"""
@@ -244,10 +379,7 @@ class ProductNameParser:
     
     def _extract_finish_state(self, name_lower: str) -> str:
         """Wyciąga stan wykończenia"""
-        for key, value in self.FINISH_MAP.items():
-            if key in name_lower:
-                return value
-        return 'surowy'  # domyślnie surowy
+        return self._get_scanner().match(name_lower).get('finish_state', 'surowy')  # domyślnie surowy
     
     def _extract_dimensions(self, product_name: str) -> Optional[Tuple[Decimal, Decimal, Decimal]]:
         """
@@ -260,16 +392,13 @@ class ProductNameParser:
             if match:
                 try:
                     # Zamień przecinki na kropki dla poprawnej konwersji do Decimal
-                    length_str = match.group(1).replace(',', '.')
-                    width_str = match.group(2).replace(',', '.')
-                    thickness_str = match.group(3).replace(',', '.')
-                    
-                    length = Decimal(length_str)
-                    width = Decimal(width_str)
-                    thickness = Decimal(thickness_str)
-                    
-                    return (length, width, thickness)
-                except (ValueError, TypeError) as e:
+                    length, width, thickness = match.groups()
+                    return (
+                        Decimal(length.replace(',', '.')),
+                        Decimal(width.replace(',', '.')),
+                        Decimal(thickness.replace(',', '.'))
+                    )
+                except (ValueError, TypeError, ArithmeticError) as e:
                     # Loguj błąd dla debugowania
                     print(f"[ProductNameParser] Błąd konwersji wymiarów: {e}, input: {match.groups()}")
                     continue
@@ -14,11 +14,20 @@ from flask import render_template, jsonify, request, session, redirect, url_for,
 from datetime import datetime, timedelta, date
 from functools import wraps
 from extensions import db
+from geo_lookup import region_slug
 from . import reports_bp
 from .models import BaselinkerReportOrder, ReportsSyncLog
 from .service import BaselinkerReportsService, get_reports_service
+from .map_stats import get_map_statistics
+from .import_stage import ReportImportStage
+from .status_upsert import ReportStatusUpsert
 from modules.logging import get_structured_logger
-from collections import defaultdict
+from modules.scheduler import REPORTS_STATUS_SYNC_JOB, request_job_run
+from modules.jobs import (
+    JobAlreadyRunning, JobCancelled, check_job_cancelled, job_conflict_response,
+    job_handler, job_log, job_progress, job_submitted_response, submit_job,
+)
+from collections import Counter, defaultdict
 import openpyxl
 from openpyxl.styles import PatternFill, Font, Alignment, Border, Side
 from typing import Dict, Optional, Tuple, List
@@ -400,11 +409,56 @@ def api_get_data():
         }), 500
 
 
+# Synchronizacja raportów i zapis wybranych zamówień korzystają z tego samego
+# serwisu (poprawki wymiarów) - jedno takie zadanie naraz
+REPORTS_SYNC_LOCK = 'reports.sync'
+
+
+@job_handler('reports.sync', title='Synchronizacja raportów z Baselinker', lock_key=REPORTS_SYNC_LOCK)
+def _reports_sync_job(params):
+    """Zadanie w tle dla /api/sync - wynik jak dawniej odpowiedź endpointu"""
+    user_email = params.get('user_email')
+    selected_orders = params.get('selected_orders') or []
+    date_from = datetime.fromisoformat(params['date_from']) if params.get('date_from') else None
+
+    # Pobierz serwis
+    service = get_reports_service()
+    
+    if selected_orders and len(selected_orders) > 0:
+        # Synchronizuj wybrane zamówienia
+        reports_logger.info("Synchronizowanie wybranych zamówień", 
+                          selected_orders_count=len(selected_orders))
+        job_log(f"Synchronizacja {len(selected_orders)} wybranych zamówień")
+        result = _sync_selected_orders(service, selected_orders)
+    else:
+        # ZMIANA: Synchronizuj wszystkie zamówienia (bez ograniczenia 30 dni)
+        reports_logger.info("Synchronizowanie wszystkich zamówień",
+                          has_date_filter=date_from is not None)
+        job_log("Synchronizacja wszystkich zamówień" +
+                (f" od {date_from.date()}" if date_from else ""))
+        result = service.sync_orders(date_from=date_from, sync_type='manual')
+    
+    reports_logger.info("Synchronizacja zakończona",
+                      user_email=user_email,
+                      success=result.get('success'),
+                      orders_processed=result.get('orders_processed', 0),
+                      orders_added=result.get('orders_added', 0),
+                      orders_updated=result.get('orders_updated', 0))
+    job_log(f"Przetworzono {result.get('orders_processed', 0)} zamówień "
+            f"(nowe: {result.get('orders_added', 0)}, zaktualizowane: {result.get('orders_updated', 0)})",
+            'info' if result.get('success') else 'error')
+    
+    return result
+
+
 @reports_bp.route('/api/sync', methods=['POST'])
 @require_module_access('reports')
 def api_sync_with_baselinker():
     """
     API endpoint do synchronizacji z Baselinker
+    
+    Synchronizacja uruchamiana jest jako zadanie w tle - odpowiedź 202 z job_id,
+    wynik (dawna odpowiedź endpointu) w job.result
     """
     user_email = session.get('user_email')
     
@@ -412,7 +466,6 @@ def api_sync_with_baselinker():
         # Pobierz parametry
         data = request.get_json() or {}
         date_from_str = data.get('date_from')
-        date_to_str = data.get('date_to')
         selected_orders = data.get('selected_orders', [])  # Lista ID zamówień do synchronizacji
         
         # ZMIANA: Parsuj daty tylko jeśli podane, nie używaj domyślnie 30 dni
@@ -434,28 +487,19 @@ def api_sync_with_baselinker():
                           selected_orders_count=len(selected_orders),
                           selected_orders=selected_orders[:10])  # Loguj tylko pierwsze 10 ID
         
-        # Pobierz serwis
-        service = get_reports_service()
-        
-        if selected_orders and len(selected_orders) > 0:
-            # Synchronizuj wybrane zamówienia
-            reports_logger.info("Synchronizowanie wybranych zamówień", 
-                              selected_orders_count=len(selected_orders))
-            result = _sync_selected_orders(service, selected_orders)
-        else:
-            # ZMIANA: Synchronizuj wszystkie zamówienia (bez ograniczenia 30 dni)
-            reports_logger.info("Synchronizowanie wszystkich zamówień",
-                              has_date_filter=date_from is not None)
-            result = service.sync_orders(date_from=date_from, sync_type='manual')
-        
-        reports_logger.info("Synchronizacja zakończona",
-                          user_email=user_email,
-                          success=result.get('success'),
-                          orders_processed=result.get('orders_processed', 0),
-                          orders_added=result.get('orders_added', 0),
-                          orders_updated=result.get('orders_updated', 0))
-        
-        return jsonify(result)
+        job = submit_job(
+            'reports.sync',
+            params={
+                'date_from': date_from.isoformat() if date_from else None,
+                'selected_orders': selected_orders,
+                'user_email': user_email
+            },
+            user_id=session.get('user_id')
+        )
+        return job_submitted_response(job, 'Synchronizacja raportów uruchomiona w tle')
+    
+    except JobAlreadyRunning as exc:
+        return job_conflict_response(exc)
         
     except Exception as e:
         reports_logger.error("Błąd synchronizacji",
@@ -1686,7 +1730,9 @@ def _sync_selected_orders(service: BaselinkerReportsService, order_ids: List[int
         failed_orders = []
         
         # Pobierz pełne dane każdego zamówienia
-        for order_id in order_ids:
+        for order_index, order_id in enumerate(order_ids):
+            check_job_cancelled()
+            job_progress(order_index, len(order_ids), 'Pobieranie zamówień z Baselinker')
             try:
                 order = service.get_order_details(order_id)
                 if order:
@@ -1703,6 +1749,9 @@ def _sync_selected_orders(service: BaselinkerReportsService, order_ids: List[int
                 reports_logger.error("Błąd pobierania zamówienia",
                                    order_id=order_id,
                                    error=str(e))
+                job_log(f"Błąd pobierania zamówienia {order_id}: {e}", 'warning')
+        
+        job_progress(len(order_ids), len(order_ids), 'Zapisywanie zamówień')
         
         if not orders:
             error_msg = f'Nie udało się pobrać żadnego z wybranych zamówień. Nieudane: {failed_orders}'
@@ -1745,6 +1794,8 @@ def _sync_selected_orders(service: BaselinkerReportsService, order_ids: List[int
         
         return result
             
+    except JobCancelled:
+        raise
     except Exception as e:
         reports_logger.error("Błąd synchronizacji wybranych zamówień",
                            error=str(e),
@@ -1755,6 +1806,26 @@ def _sync_selected_orders(service: BaselinkerReportsService, order_ids: List[int
             'error': str(e)
         }
 
+def _write_status_batch(status_upsert: ReportStatusUpsert, order_ids: List[int],
+                        failed_batches: List[Dict]) -> bool:
+    """
+    Zapis porcji zmian statusów - poza obsługą błędów pojedynczych zamówień
+
+    Błąd bazy wycofuje sesję, a zamówienia porcji trafiają do failed_batches
+    (jak porcje ReportImportStage); wywołujący dolicza liczniki porcji tylko
+    po udanym zapisie.
+    """
+    try:
+        status_upsert.flush()
+        return True
+    except Exception as e:
+        db.session.rollback()
+        reports_logger.error("Błąd zapisu porcji statusów",
+                           orders=len(order_ids), error=str(e), error_type=type(e).__name__)
+        failed_batches.append({'order_ids': list(order_ids), 'error': str(e)})
+        return False
+
+
 # Synchronizacja statusów
 @reports_bp.route('/api/sync-statuses', methods=['POST'])
 @require_module_access('reports')
@@ -1781,7 +1852,8 @@ def api_sync_statuses():
         ]
         
         # Pobierz zamówienia z bazy które nie mają wykluczonych statusów
-        orders_to_sync = BaselinkerReportOrder.query.filter(
+        # (tylko numery zamówień - rekordy ładuje ReportStatusUpsert porcjami)
+        orders_to_sync = db.session.query(BaselinkerReportOrder.baselinker_order_id).filter(
             BaselinkerReportOrder.baselinker_order_id.isnot(None),
             ~BaselinkerReportOrder.baselinker_status_id.in_(excluded_status_ids),
             ~BaselinkerReportOrder.current_status.in_(excluded_status_names)
@@ -1800,7 +1872,8 @@ def api_sync_statuses():
             })
         
         # Grupuj zamówienia według baselinker_order_id
-        unique_order_ids = list(set(order.baselinker_order_id for order in orders_to_sync))
+        records_per_order = Counter(order.baselinker_order_id for order in orders_to_sync)
+        unique_order_ids = list(records_per_order)
         
         reports_logger.info("Synchronizacja statusów zamówień",
                           user_email=user_email,
@@ -1816,84 +1889,92 @@ def api_sync_statuses():
         internal_number_updated_count = 0
         delivery_updated_count = 0
         sync_start = datetime.utcnow()
-        
-        for order_id in unique_order_ids:
-            try:
-                # Pobierz aktualny status z Baselinker
-                order_details = service.get_order_details(order_id)
+        status_upsert = ReportStatusUpsert(auto_flush=False)
+        failed_batches = []
+        
+        # Porcja zamówień = jeden zapis, poza try/except pojedynczego zamówienia
+        for batch_start in range(0, len(unique_order_ids), status_upsert.batch_size):
+            batch_ids = unique_order_ids[batch_start:batch_start + status_upsert.batch_size]
+            batch = Counter()
+            for order_id in batch_ids:
+                try:
+                    # Pobierz aktualny status z Baselinker
+                    order_details = service.get_order_details(order_id)
                 
-                if order_details:
-                    # Pobierz nowy status
-                    new_status_id = order_details.get('order_status_id')
-                    new_status = service.status_map.get(new_status_id, f'Status {new_status_id}')
+                    if order_details:
+                        # Pobierz nowy status
+                        new_status_id = order_details.get('order_status_id')
+                        new_status = service.status_map.get(new_status_id, f'Status {new_status_id}')
                     
-                    # Pobierz kwotę zapłaconą (brutto -> netto)
-                    payment_done = order_details.get('payment_done', 0)
-                    custom_fields = order_details.get('custom_extra_fields', {})
-                    price_type_from_api = custom_fields.get('106169', '').strip()
+                        # Pobierz kwotę zapłaconą (brutto -> netto)
+                        payment_done = order_details.get('payment_done', 0)
+                        custom_fields = order_details.get('custom_extra_fields', {})
+                        price_type_from_api = custom_fields.get('106169', '').strip()
                     
-                    new_paid_amount_net = service._calculate_paid_amount_net(payment_done, price_type_from_api)
+                        new_paid_amount_net = service._calculate_paid_amount_net(payment_done, price_type_from_api)
                     
-                    # NOWE: Pobierz numer wewnętrzny z extra_field_1
-                    new_internal_number = order_details.get('extra_field_1', '').strip()
+                        # NOWE: Pobierz numer wewnętrzny z extra_field_1
+                        new_internal_number = order_details.get('extra_field_1', '').strip()
                     
-                    # NOWE: Pobierz dane dostawy
-                    new_delivery_method = order_details.get('delivery_method', '').strip()
-                    new_delivery_cost_gross = float(order_details.get('delivery_price', 0))
+                        # NOWE: Pobierz dane dostawy
+                        new_delivery_method = order_details.get('delivery_method', '').strip()
+                        new_delivery_cost_gross = float(order_details.get('delivery_price', 0))
                     
-                    records = BaselinkerReportOrder.query.filter_by(
-                        baselinker_order_id=order_id
-                    ).all()
-
-                    records_updated = 0
-                    for record in records:
-                        record.current_status = new_status
-                        record.baselinker_status_id = new_status_id
-                        record.paid_amount_net = new_paid_amount_net
-                        record.internal_order_number = new_internal_number
-                        record.delivery_method = new_delivery_method
-                        record.delivery_cost = new_delivery_cost_gross
-                        record.updated_at = datetime.utcnow()
-                        record.update_production_fields()
-                        record.calculate_fields()
-                        records_updated += 1
-
-                    if records_updated > 0:
-                        updated_count += records_updated
-                        status_updated_count += 1
-
-                        if new_paid_amount_net > 0:
-                            payment_updated_count += 1
-
-                        if new_internal_number:
-                            internal_number_updated_count += 1
-
-                        if new_delivery_method or new_delivery_cost_gross > 0:
-                            delivery_updated_count += 1
-
-                        reports_logger.debug("Zaktualizowano zamówienie",
-                                           order_id=order_id,
-                                           new_status=new_status,
-                                           new_status_id=new_status_id,
-                                           paid_amount_net=new_paid_amount_net,
-                                           internal_number=new_internal_number,
-                                           delivery_method=new_delivery_method,
-                                           delivery_cost=new_delivery_cost_gross,
-                                           records_updated=records_updated)
+                        status_upsert.add(
+                            order_id,
+                            current_status=new_status,
+                            baselinker_status_id=new_status_id,
+                            paid_amount_net=new_paid_amount_net,
+                            internal_order_number=new_internal_number,
+                            delivery_method=new_delivery_method,
+                            delivery_cost=new_delivery_cost_gross,
+                        )
+
+                        records_count = records_per_order.get(order_id, 0)
+                        if records_count > 0:
+                            batch['status_updated'] += 1
+
+                            if new_paid_amount_net > 0:
+                                batch['payment_updated'] += 1
+
+                            if new_internal_number:
+                                batch['internal_number_updated'] += 1
+
+                            if new_delivery_method or new_delivery_cost_gross > 0:
+                                batch['delivery_updated'] += 1
+
+                            reports_logger.debug("Zaktualizowano zamówienie",
+                                               order_id=order_id,
+                                               new_status=new_status,
+                                               new_status_id=new_status_id,
+                                               paid_amount_net=new_paid_amount_net,
+                                               internal_number=new_internal_number,
+                                               delivery_method=new_delivery_method,
+                                               delivery_cost=new_delivery_cost_gross,
+                                               records_count=records_count)
                     
-                    processed_count += 1
-                else:
-                    reports_logger.warning("Nie udało się pobrać szczegółów zamówienia",
-                                         order_id=order_id)
+                        batch['processed'] += 1
+                    else:
+                        reports_logger.warning("Nie udało się pobrać szczegółów zamówienia",
+                                             order_id=order_id)
                     
-            except Exception as e:
-                reports_logger.error("Błąd synchronizacji statusu zamówienia",
-                                   order_id=order_id,
-                                   error=str(e))
-                continue
+                except Exception as e:
+                    reports_logger.error("Błąd synchronizacji statusu zamówienia",
+                                       order_id=order_id,
+                                       error=str(e))
+                    continue
+
+            # Liczniki porcji tylko po udanym zapisie
+            if _write_status_batch(status_upsert, batch_ids, failed_batches):
+                processed_count += batch['processed']
+                status_updated_count += batch['status_updated']
+                payment_updated_count += batch['payment_updated']
+                internal_number_updated_count += batch['internal_number_updated']
+                delivery_updated_count += batch['delivery_updated']
         
-        # Zapisz zmiany
-        db.session.commit()
+        # Zapisz pozostałe zmiany (tylko rekordy, w których coś się zmieniło)
+        upsert_stats = status_upsert.finish()
+        updated_count = upsert_stats['records_updated']
         
         duration = (datetime.utcnow() - sync_start).total_seconds()
         
@@ -1905,18 +1986,25 @@ def api_sync_statuses():
                           payment_updated_count=payment_updated_count,
                           internal_number_updated_count=internal_number_updated_count,
                           delivery_updated_count=delivery_updated_count,
+                          db_statements=upsert_stats['statements'],
+                          failed_batches=len(failed_batches),
                           duration_seconds=duration)
         
-        return jsonify({
-            'success': True,
+        response = {
+            'success': not failed_batches,
             'message': f'Zsynchronizowano statusy {processed_count} zamówień',
             'orders_processed': processed_count,
             'orders_updated': status_updated_count,
             'records_updated': updated_count,
             'payment_updated_count': payment_updated_count,
             'internal_number_updated': internal_number_updated_count,
-            'delivery_updated': delivery_updated_count
-        })
+            'delivery_updated': delivery_updated_count,
+            'write_errors': failed_batches
+        }
+        if failed_batches:
+            failed_orders = sum(len(failed['order_ids']) for failed in failed_batches)
+            response['error'] = f'Nie zapisano zmian {failed_orders} zamówień (błąd bazy danych)'
+        return jsonify(response)
         
     except Exception as e:
         db.session.rollback()
@@ -2373,11 +2461,64 @@ def _sync_selected_orders_with_volumes(service, order_ids):
             'error': f'Błąd synchronizacji: {str(e)}'
         }
 
+@job_handler('reports.save_selected', title='Zapis wybranych zamówień do raportów', lock_key=REPORTS_SYNC_LOCK)
+def _save_selected_orders_job(params):
+    """Zadanie w tle dla /api/save-selected-orders-with-dimensions"""
+    order_ids = params.get('order_ids') or []
+    dimension_fixes = params.get('dimension_fixes') or {}
+
+    # Sprawdź które zamówienia już istnieją w bazie
+    existing_orders = BaselinkerReportOrder.query.filter(
+        BaselinkerReportOrder.baselinker_order_id.in_(order_ids)
+    ).with_entities(BaselinkerReportOrder.baselinker_order_id).distinct().all()
+    existing_order_ids = {order.baselinker_order_id for order in existing_orders}
+
+    # Filtruj tylko nowe zamówienia
+    new_order_ids = [order_id for order_id in order_ids if order_id not in existing_order_ids]
+
+    if not new_order_ids:
+        return {
+            'success': True,
+            'message': 'Wszystkie wybrane zamówienia już istnieją w bazie danych',
+            'orders_saved': 0,
+            'orders_skipped': len(order_ids)
+        }
+
+    job_log(f"Do zapisania: {len(new_order_ids)} nowych zamówień "
+            f"(pominięte istniejące: {len(order_ids) - len(new_order_ids)})")
+
+    # Pobierz service
+    service = get_reports_service()
+    
+    # Zastosuj poprawki wymiarów jeśli zostały podane
+    if dimension_fixes:
+        service.set_dimension_fixes(dimension_fixes)
+        reports_logger.info("Zastosowano poprawki wymiarów", 
+                          fixes_count=len(dimension_fixes))
+
+    try:
+        # Synchronizuj wybrane zamówienia
+        result = _sync_selected_orders(service, new_order_ids)
+    finally:
+        # Wyczyść poprawki wymiarów (także po błędzie / anulowaniu)
+        if dimension_fixes:
+            service.clear_dimension_fixes()
+
+    if result.get('success'):
+        reports_logger.info("Zapisywanie zamówień z wymiarami zakończone pomyślnie",
+                          orders_processed=result.get('orders_processed', 0),
+                          orders_added=result.get('orders_added', 0))
+    return result
+
+
 @reports_bp.route('/api/save-selected-orders-with-dimensions', methods=['POST'])
 @require_module_access('reports')
 def api_save_selected_orders_with_dimensions():
     """
     NOWY ENDPOINT: Zapisuje wybrane zamówienia z opcjonalnym uzupełnieniem wymiarów
+    
+    Zapis uruchamiany jest jako zadanie w tle - odpowiedź 202 z job_id,
+    wynik w job.result
     """
     user_email = session.get('user_email')
     
@@ -2412,46 +2553,19 @@ def api_save_selected_orders_with_dimensions():
                 'error': 'Błędne ID zamówień'
             }), 400
 
-        # Sprawdź które zamówienia już istnieją w bazie
-        existing_orders = BaselinkerReportOrder.query.filter(
-            BaselinkerReportOrder.baselinker_order_id.in_(order_ids)
-        ).with_entities(BaselinkerReportOrder.baselinker_order_id).distinct().all()
-        existing_order_ids = {order.baselinker_order_id for order in existing_orders}
-
-        # Filtruj tylko nowe zamówienia
-        new_order_ids = [order_id for order_id in order_ids if order_id not in existing_order_ids]
-
-        if not new_order_ids:
-            return jsonify({
-                'success': True,
-                'message': 'Wszystkie wybrane zamówienia już istnieją w bazie danych',
-                'orders_saved': 0,
-                'orders_skipped': len(order_ids)
-            })
-
-        # Pobierz service
-        service = get_reports_service()
-        
-        # Zastosuj poprawki wymiarów jeśli zostały podane
-        if dimension_fixes:
-            service.set_dimension_fixes(dimension_fixes)
-            reports_logger.info("Zastosowano poprawki wymiarów", 
-                              fixes_count=len(dimension_fixes))
-
-        # Synchronizuj wybrane zamówienia
-        result = _sync_selected_orders(service, new_order_ids)
-        
-        # Wyczyść poprawki wymiarów
-        if dimension_fixes:
-            service.clear_dimension_fixes()
-
-        if result.get('success'):
-            reports_logger.info("Zapisywanie zamówień z wymiarami zakończone pomyślnie",
-                              orders_processed=result.get('orders_processed', 0),
-                              orders_added=result.get('orders_added', 0))
-            return jsonify(result)
-        else:
-            return jsonify(result), 500
+        job = submit_job(
+            'reports.save_selected',
+            params={
+                'order_ids': order_ids,
+                'dimension_fixes': dimension_fixes,
+                'user_email': user_email
+            },
+            user_id=session.get('user_id')
+        )
+        return job_submitted_response(job, 'Zapis zamówień uruchomiony w tle')
+    
+    except JobAlreadyRunning as exc:
+        return job_conflict_response(exc)
             
     except Exception as e:
         reports_logger.error("Błąd zapisywania zamówień z wymiarami",
@@ -3754,6 +3868,10 @@ def api_save_orders_with_volumes():
 def _sync_selected_orders_with_volume_analysis(service, order_ids, orders_data):
     """
     FUNKCJA POMOCNICZA: Synchronizuje wybrane zamówienia z uwzględnieniem analizy objętości
+
+    Poprawki objętości (service.volume_fixes) rozwiązywane są raz dla całej
+    paczki, a rekordy zapisywane zbiorczo (ReportImportStage) - jeden INSERT
+    na porcję zamówień zamiast zapisu produkt po produkcie.
     """
     try:
         reports_logger.info("Rozpoczęcie synchronizacji z analizą objętości", 
@@ -3766,95 +3884,19 @@ def _sync_selected_orders_with_volume_analysis(service, order_ids, orders_data):
                 'error': 'Brak danych zamówień do przetworzenia'
             }
 
-        # Przetwórz zamówienia z analizą objętości
-        orders_added = 0
-        orders_processed = 0
-        processing_errors = []
+        stage = ReportImportStage(service, volume_fixes=service.volume_fixes)
+        import_result = stage.run(orders_data, update_existing=False)
 
-        for order_data in orders_data:
-            try:
-                reports_logger.info("Zapisywanie zamówienia z analizą objętości",
-                                  order_id=order_data.get('order_id'),
-                                  products_count=len(order_data.get('products', [])))
-                
-                # ✅ POPRAWKA: Zamiast _convert_order_to_records, użyj indywidualnego przetwarzania
-                # które respektuje product_index z frontendu
-                
-                order_id = order_data.get('order_id')
-                products = order_data.get('products', [])
-                
-                if not products:
-                    reports_logger.warning(f"Zamówienie {order_id} nie ma produktów")
-                    continue
-                
-                saved_records = []
-                
-                # ✅ PRZETWARZAJ KAŻDY PRODUKT INDYWIDUALNIE Z ZACHOWANIEM product_index
-                for product_index, product in enumerate(products):
-                    try:
-                        # ✅ POPRAWKA: Użyj product_index z frontendu jeśli dostępny, w przeciwnym razie enumerate
-                        frontend_product_index = product.get('product_index')
-                        if frontend_product_index is not None:
-                            actual_product_index = frontend_product_index
-                            reports_logger.debug(f"Używam product_index z frontendu: {actual_product_index} dla produktu {product.get('name', 'unknown')}")
-                        else:
-                            actual_product_index = product_index
-                            reports_logger.warning(f"Brak product_index dla produktu {product.get('name', 'unknown')} w zamówieniu {order_id} - używam enumerate: {actual_product_index}")
-                        
-                        # ✅ UŻYJ FUNKCJI Z service.py KTÓRA UŻYWA product_index
-                        record_data = service.prepare_order_record_data_with_volume_analysis(
-                            order_data, product, actual_product_index
-                        )
-                        
-                        # Zapisz rekord
-                        record = service.create_report_record(record_data)
-                        saved_records.append(record)
-                        
-                        reports_logger.debug(f"Zapisano produkt: {product.get('name', 'unknown')} z indeksem {actual_product_index}")
-                        
-                    except Exception as e:
-                        error_msg = f"Błąd zapisywania produktu {product.get('name', 'unknown')}: {str(e)}"
-                        reports_logger.error(error_msg)
-                        processing_errors.append({
-                            'order_id': order_id,
-                            'product_name': product.get('name', 'unknown'),
-                            'error': str(e)
-                        })
-                        continue
-                
-                if saved_records:
-                    # Commit dla całego zamówienia
-                    db.session.commit()
-                    orders_added += len(saved_records)
-                    
-                    # Oblicz łączną objętość dla logowania
-                    total_volume = sum(float(r.total_volume or 0) for r in saved_records)
-                    avg_price = saved_records[0].avg_order_price_per_m3 if saved_records else 0.0
-                    
-                    reports_logger.info("Zapisano rekord zamówienia z objętością", 
-                                      order_id=order_id,
-                                      products_count=len(saved_records),
-                                      avg_order_price_per_m3=avg_price,
-                                      total_volume=total_volume)
-                    orders_processed += 1
-                else:
-                    reports_logger.warning(f"Brak zapisanych produktów dla zamówienia {order_id}")
-                        
-            except Exception as e:
-                db.session.rollback()  # ✅ DODAJ ROLLBACK W PRZYPADKU BŁĘDU
-                error_msg = f"Błąd przetwarzania zamówienia {order_data.get('order_id', 'unknown')}: {str(e)}"
-                processing_errors.append({
-                    'order_id': order_data.get('order_id', 'unknown'),
-                    'error': str(e)
-                })
-                reports_logger.error(error_msg)
-                continue
+        orders_processed = import_result['orders_added']
+        orders_added = import_result['records_added']
+        processing_errors = import_result['errors']
 
         # Przygotuj wynik
         result = {
             'success': True,
             'orders_processed': orders_processed,
             'orders_added': orders_added,
+            'batches': import_result['batches'],
             'message': f'Pomyślnie zapisano {orders_processed} zamówień. Dodano: {orders_added} pozycji.'
         }
         
@@ -3906,340 +3948,20 @@ def api_map_statistics():
                 reports_logger.warning("Nieprawidłowy format date_to", 
                                      date_to=date_to_str, user_email=user_email)
         
-        # Pobierz dane z bazy
-        query = BaselinkerReportOrder.get_filtered_orders(
-            date_from=date_from,
-            date_to=date_to
-        )
-        
-        orders = query.all()
-        
-        reports_logger.info("Pobrano zamówienia dla mapy", 
-                          count=len(orders), 
-                          user_email=user_email,
-                          date_from=date_from.isoformat() if date_from else "wszystkie",
-                          date_to=date_to.isoformat() if date_to else "wszystkie")
-        
-        # Statusy dla grupowania
-        IN_PRODUCTION_STATUSES = [155824, 138619, 148830, 148831, 148832]  # W produkcji
-        READY_STATUSES = [138620, 138623, 149777]  # Wyprodukowane
-        
-        # Inicjalizuj dane dla wszystkich 16 województw
-        voivodeships_data = {}
-        all_voivodeships = [
-            'dolnośląskie', 'kujawsko-pomorskie', 'lubelskie', 'lubuskie',
-            'łódzkie', 'małopolskie', 'mazowieckie', 'opolskie',
-            'podkarpackie', 'podlaskie', 'pomorskie', 'śląskie',
-            'świętokrzyskie', 'warmińsko-mazurskie', 'wielkopolskie',
-            'zachodniopomorskie'
-        ]
-        
-        # Inicjalizuj wszystkie województwa z zerami
-        for voivodeship in all_voivodeships:
-            voivodeships_data[voivodeship] = {
-                'production_volume': 0.0,
-                'ready_volume': 0.0,
-                'total_volume': 0.0,
-                'production_value_net': 0.0,
-                'ready_value_net': 0.0,
-                'total_value_net': 0.0,
-                'orders_count': 0
-            }
-        
-        # Mapowanie nazw województw do kluczy (normalizacja)
-        voivodeship_mapping = {
-            'dolnośląskie': 'dolnośląskie',
-            'dolnoslaskie': 'dolnośląskie',
-            'kujawsko-pomorskie': 'kujawsko-pomorskie',
-            'kujawsko pomorskie': 'kujawsko-pomorskie',
-            'lubelskie': 'lubelskie',
-            'lubuskie': 'lubuskie', 
-            'łódzkie': 'łódzkie',
-            'lódzkie': 'łódzkie',
-            'lodzkie': 'łódzkie',
-            'małopolskie': 'małopolskie',
-            'malopolskie': 'małopolskie',
-            'mazowieckie': 'mazowieckie',
-            'opolskie': 'opolskie',
-            'podkarpackie': 'podkarpackie',
-            'podlaskie': 'podlaskie',
-            'pomorskie': 'pomorskie',
-            'śląskie': 'śląskie',
-            'slaskie': 'śląskie',
-            'sląskie': 'śląskie',
-            'świętokrzyskie': 'świętokrzyskie',
-            'swietokrzyskie': 'świętokrzyskie',
-            'świętokrzyskie': 'świętokrzyskie',
-            'warmińsko-mazurskie': 'warmińsko-mazurskie',
-            'warminsko-mazurskie': 'warmińsko-mazurskie',
-            'warmińsko mazurskie': 'warmińsko-mazurskie',
-            'wielkopolskie': 'wielkopolskie',
-            'zachodniopomorskie': 'zachodniopomorskie'
-        }
-        
-        # Grupuj dane według województw
-        for order in orders:
-            delivery_state = order.delivery_state
-            if not delivery_state:
-                continue
-                
-            # Normalizuj nazwę województwa
-            state_normalized = delivery_state.lower().strip()
-            voivodeship_key = voivodeship_mapping.get(state_normalized)
-            
-            if not voivodeship_key:
-                reports_logger.debug("Nieznane województwo", 
-                                   delivery_state=delivery_state,
-                                   user_email=user_email)
-                continue
-            
-            # Pobierz wartości
-            volume = float(order.total_volume or 0)
-            value_net = float(order.value_net or 0)
-            status_id = order.baselinker_status_id
-            
-            # Zwiększ licznik zamówień
-            voivodeships_data[voivodeship_key]['orders_count'] += 1
-            
-            # Klasyfikuj według statusu
-            if status_id in IN_PRODUCTION_STATUSES:
-                voivodeships_data[voivodeship_key]['production_volume'] += volume
-                voivodeships_data[voivodeship_key]['production_value_net'] += value_net
-            elif status_id in READY_STATUSES:
-                voivodeships_data[voivodeship_key]['ready_volume'] += volume
-                voivodeships_data[voivodeship_key]['ready_value_net'] += value_net
-        
-        # Oblicz łączne wartości
-        for voivodeship_key in voivodeships_data:
-            data = voivodeships_data[voivodeship_key]
-            data['total_volume'] = data['production_volume'] + data['ready_volume']
-            data['total_value_net'] = data['production_value_net'] + data['ready_value_net']
-        
-        # Mapowanie kluczy dla frontendu (z polskich do angielskich ID)
-        frontend_mapping = {
-            'dolnośląskie': 'dolnoslaskie',
-            'kujawsko-pomorskie': 'kujawsko-pomorskie', 
-            'lubelskie': 'lubelskie',
-            'lubuskie': 'lubuskie',
-            'łódzkie': 'lodzkie',
-            'małopolskie': 'malopolskie',
-            'mazowieckie': 'mazowieckie',
-            'opolskie': 'opolskie',
-            'podkarpackie': 'podkarpackie',
-            'podlaskie': 'podlaskie',
-            'pomorskie': 'pomorskie',
-            'śląskie': 'slaskie',
-            'świętokrzyskie': 'swietokrzyskie',
-            'warmińsko-mazurskie': 'warminsko-mazurskie',
-            'wielkopolskie': 'wielkopolskie',
-            'zachodniopomorskie': 'zachodniopomorskie'
-        }
-        
-        # Przekonwertuj klucze dla frontendu
-        frontend_data = {}
-        for polish_key, data in voivodeships_data.items():
-            frontend_key = frontend_mapping.get(polish_key, polish_key)
-            frontend_data[frontend_key] = data
-        
-        # Oblicz statystyki ogólne
-        total_production_volume = sum(data['production_volume'] for data in voivodeships_data.values())
-        total_ready_volume = sum(data['ready_volume'] for data in voivodeships_data.values())
-        total_volume = sum(data['total_volume'] for data in voivodeships_data.values())
-        total_orders = sum(data['orders_count'] for data in voivodeships_data.values())
-        
-        result = {
-            'status': 'success',
-            'data': frontend_data,
-            'summary': {
-                'total_production_volume': total_production_volume,
-                'total_ready_volume': total_ready_volume,
-                'total_volume': total_volume,
-                'total_orders': total_orders,
-                'processed_orders': len(orders),
-                'date_from': date_from.isoformat() if date_from else None,
-                'date_to': date_to.isoformat() if date_to else None
-            }
-        }
-        
-        reports_logger.info("Zwrócono dane mapy", 
-                          summary=result['summary'],
-                          user_email=user_email)
-        
-        return jsonify(result)
-        
-    except Exception as e:
-        reports_logger.error("Błąd API map-statistics", 
-                           error=str(e), 
-                           user_email=session.get('user_email', 'Nieznany'))
-        return jsonify({
-            'status': 'error',
-            'message': 'Błąd podczas pobierania danych mapy',
-            'error': str(e)
-        }), 500
-    """
-    API endpoint dla danych mapy województw
-    Zwraca statystyki produkcji pogrupowane według województw
-    """
-    try:
-        user_email = session.get('user_email', 'Nieznany użytkownik')
-        reports_logger.info("Żądanie danych mapy województw", user_email=user_email)
-        
-        # Pobierz filtry z URL (opcjonalnie)
-        date_from_str = request.args.get('date_from')
-        date_to_str = request.args.get('date_to')
-        
-        # Parsuj daty jeśli podane
-        date_from = None
-        date_to = None
-        
-        if date_from_str:
-            try:
-                date_from = datetime.strptime(date_from_str, '%Y-%m-%d').date()
-            except ValueError:
-                reports_logger.warning("Nieprawidłowy format date_from", 
-                                     date_from=date_from_str, user_email=user_email)
-        
-        if date_to_str:
-            try:
-                date_to = datetime.strptime(date_to_str, '%Y-%m-%d').date()
-            except ValueError:
-                reports_logger.warning("Nieprawidłowy format date_to", 
-                                     date_to=date_to_str, user_email=user_email)
-        
-        # Pobierz dane z bazy
-        query = BaselinkerReportOrder.get_filtered_orders(
-            date_from=date_from,
-            date_to=date_to
-        )
-        
-        orders = query.all()
+        # Sumy z agregatów dzień x województwo x status (map_stats)
+        map_stats = get_map_statistics(date_from=date_from, date_to=date_to)
+        voivodeships_data = map_stats['regions']
         
-        reports_logger.info("Pobrano zamówienia dla mapy", 
-                          count=len(orders), 
+        reports_logger.info("Pobrano agregaty dla mapy", 
+                          processed_rows=map_stats['processed_rows'], 
                           user_email=user_email,
                           date_from=date_from.isoformat() if date_from else "wszystkie",
                           date_to=date_to.isoformat() if date_to else "wszystkie")
         
-        # Statusy dla grupowania
-        IN_PRODUCTION_STATUSES = [155824, 138619, 148830, 148831, 148832]  # W produkcji
-        READY_STATUSES = [138620, 138623, 149777]  # Wyprodukowane
-        
-        # Inicjalizuj dane dla wszystkich 16 województw
-        voivodeships_data = {}
-        all_voivodeships = [
-            'dolnośląskie', 'kujawsko-pomorskie', 'lubelskie', 'lubuskie',
-            'łódzkie', 'małopolskie', 'mazowieckie', 'opolskie',
-            'podkarpackie', 'podlaskie', 'pomorskie', 'śląskie',
-            'świętokrzyskie', 'warmińsko-mazurskie', 'wielkopolskie',
-            'zachodniopomorskie'
-        ]
-        
-        # Inicjalizuj wszystkie województwa z zerami
-        for voivodeship in all_voivodeships:
-            voivodeships_data[voivodeship] = {
-                'production_volume': 0.0,
-                'ready_volume': 0.0,
-                'total_volume': 0.0,
-                'production_value_net': 0.0,
-                'ready_value_net': 0.0,
-                'total_value_net': 0.0,
-                'orders_count': 0
-            }
-        
-        # Mapowanie nazw województw do kluczy (normalizacja)
-        voivodeship_mapping = {
-            'dolnośląskie': 'dolnośląskie',
-            'dolnoslaskie': 'dolnośląskie',
-            'kujawsko-pomorskie': 'kujawsko-pomorskie',
-            'kujawsko pomorskie': 'kujawsko-pomorskie',
-            'lubelskie': 'lubelskie',
-            'lubuskie': 'lubuskie', 
-            'łódzkie': 'łódzkie',
-            'lódzkie': 'łódzkie',
-            'lodzkie': 'łódzkie',
-            'małopolskie': 'małopolskie',
-            'malopolskie': 'małopolskie',
-            'mazowieckie': 'mazowieckie',
-            'opolskie': 'opolskie',
-            'podkarpackie': 'podkarpackie',
-            'podlaskie': 'podlaskie',
-            'pomorskie': 'pomorskie',
-            'śląskie': 'śląskie',
-            'slaskie': 'śląskie',
-            'sląskie': 'śląskie',
-            'świętokrzyskie': 'świętokrzyskie',
-            'swietokrzyskie': 'świętokrzyskie',
-            'świętokrzyskie': 'świętokrzyskie',
-            'warmińsko-mazurskie': 'warmińsko-mazurskie',
-            'warminsko-mazurskie': 'warmińsko-mazurskie',
-            'warmińsko mazurskie': 'warmińsko-mazurskie',
-            'wielkopolskie': 'wielkopolskie',
-            'zachodniopomorskie': 'zachodniopomorskie'
-        }
-        
-        # Grupuj dane według województw
-        for order in orders:
-            delivery_state = order.delivery_state
-            if not delivery_state:
-                continue
-                
-            # Normalizuj nazwę województwa
-            state_normalized = delivery_state.lower().strip()
-            voivodeship_key = voivodeship_mapping.get(state_normalized)
-            
-            if not voivodeship_key:
-                reports_logger.debug("Nieznane województwo", 
-                                   delivery_state=delivery_state,
-                                   user_email=user_email)
-                continue
-            
-            # Pobierz wartości
-            volume = float(order.total_volume or 0)
-            value_net = float(order.value_net or 0)
-            status_id = order.baselinker_status_id
-            
-            # Zwiększ licznik zamówień
-            voivodeships_data[voivodeship_key]['orders_count'] += 1
-            
-            # Klasyfikuj według statusu
-            if status_id in IN_PRODUCTION_STATUSES:
-                voivodeships_data[voivodeship_key]['production_volume'] += volume
-                voivodeships_data[voivodeship_key]['production_value_net'] += value_net
-            elif status_id in READY_STATUSES:
-                voivodeships_data[voivodeship_key]['ready_volume'] += volume
-                voivodeships_data[voivodeship_key]['ready_value_net'] += value_net
-        
-        # Oblicz łączne wartości
-        for voivodeship_key in voivodeships_data:
-            data = voivodeships_data[voivodeship_key]
-            data['total_volume'] = data['production_volume'] + data['ready_volume']
-            data['total_value_net'] = data['production_value_net'] + data['ready_value_net']
-        
-        # Mapowanie kluczy dla frontendu (z polskich do angielskich ID)
-        frontend_mapping = {
-            'dolnośląskie': 'dolnoslaskie',
-            'kujawsko-pomorskie': 'kujawsko-pomorskie', 
-            'lubelskie': 'lubelskie',
-            'lubuskie': 'lubuskie',
-            'łódzkie': 'lodzkie',
-            'małopolskie': 'malopolskie',
-            'mazowieckie': 'mazowieckie',
-            'opolskie': 'opolskie',
-            'podkarpackie': 'podkarpackie',
-            'podlaskie': 'podlaskie',
-            'pomorskie': 'pomorskie',
-            'śląskie': 'slaskie',
-            'świętokrzyskie': 'swietokrzyskie',
-            'warmińsko-mazurskie': 'warminsko-mazurskie',
-            'wielkopolskie': 'wielkopolskie',
-            'zachodniopomorskie': 'zachodniopomorskie'
-        }
-        
-        # Przekonwertuj klucze dla frontendu
+        # Przekonwertuj klucze dla frontendu (identyfikatory mapy SVG)
         frontend_data = {}
         for polish_key, data in voivodeships_data.items():
-            frontend_key = frontend_mapping.get(polish_key, polish_key)
-            frontend_data[frontend_key] = data
+            frontend_data[region_slug(polish_key)] = data
         
         # Oblicz statystyki ogólne
         total_production_volume = sum(data['production_volume'] for data in voivodeships_data.values())
@@ -4255,7 +3977,7 @@ def api_map_statistics():
                 'total_ready_volume': total_ready_volume,
                 'total_volume': total_volume,
                 'total_orders': total_orders,
-                'processed_orders': len(orders),
+                'processed_orders': map_stats['processed_rows'],
                 'date_from': date_from.isoformat() if date_from else None,
                 'date_to': date_to.isoformat() if date_to else None
             }
@@ -4278,88 +4000,87 @@ def api_map_statistics():
         }), 500
 
 # === CRON ENDPOINT - Automatyczna synchronizacja statusów ===
-@reports_bp.route('/api/cron/sync-statuses', methods=['GET'])
-@cron_secret_required
-def api_cron_sync_statuses():
+def run_cron_status_sync() -> Dict:
     """
-    Endpoint CRON do automatycznej synchronizacji statusów zamówień
+    Synchronizacja statusów, płatności i danych dostawy zamówień z Baselinkera
+
+    Wykonywana przez scheduler (zadanie reports.status_sync) lub - gdy daemon
+    schedulera nie działa - bezpośrednio przez endpoint CRON.
+    Zwraca słownik statystyk (odpowiedź endpointu).
+    """
+    # Pobierz serwis
+    service = get_reports_service()
     
-    Wymaga: 
-    - Header: X-Cron-Secret z wartością z config (PRODUCTION_CRON_SECRET)
+    # Pobierz zamówienia które mogą być synchronizowane (wykluczamy tylko 105112 i 138625)
+    excluded_status_ids = [105112, 138625]
+    excluded_status_names = [
+        'Nowe - nieopłacone',
+        'Zamówienie anulowane'
+    ]
     
-    Wywołanie:
-    curl -H "X-Cron-Secret: YOUR_SECRET_KEY" "https://crm.woodpower.pl/reports/api/cron/sync-statuses"
+    # Pobierz zamówienia z bazy które nie mają wykluczonych statusów (ID zamówienia + liczba rekordów)
+    orders_to_sync = db.session.query(
+        BaselinkerReportOrder.baselinker_order_id,
+        db.func.count(BaselinkerReportOrder.id)
+    ).filter(
+        BaselinkerReportOrder.baselinker_order_id.isnot(None),
+        ~BaselinkerReportOrder.baselinker_status_id.in_(excluded_status_ids),
+        ~BaselinkerReportOrder.current_status.in_(excluded_status_names)
+    ).group_by(BaselinkerReportOrder.baselinker_order_id).all()
     
-    Harmonogram w cron:
-    0 2,8,14,20 * * * /usr/bin/curl --silent -H "X-Cron-Secret: SECRET "https://crm.woodpower.pl/reports/api/cron/sync-statuses"
-    """
-    try:
-        reports_logger.info("CRON: Rozpoczęcie synchronizacji statusów",
-                          client_ip=request.remote_addr,
-                          timestamp=datetime.utcnow().isoformat())
-        
-        # Pobierz serwis
-        service = get_reports_service()
-        
-        # Pobierz zamówienia które mogą być synchronizowane (wykluczamy tylko 105112 i 138625)
-        excluded_status_ids = [105112, 138625]
-        excluded_status_names = [
-            'Nowe - nieopłacone',
-            'Zamówienie anulowane'
-        ]
-        
-        # Pobierz zamówienia z bazy które nie mają wykluczonych statusów
-        orders_to_sync = BaselinkerReportOrder.query.filter(
-            BaselinkerReportOrder.baselinker_order_id.isnot(None),
-            ~BaselinkerReportOrder.baselinker_status_id.in_(excluded_status_ids),
-            ~BaselinkerReportOrder.current_status.in_(excluded_status_names)
-        ).all()
-        
-        if not orders_to_sync:
-            reports_logger.info("CRON: Brak zamówień do synchronizacji",
-                              excluded_status_ids=excluded_status_ids)
-            return jsonify({
-                'success': True,
-                'trigger': 'cron',
-                'timestamp': datetime.utcnow().isoformat(),
-                'summary': 'Brak zamówień do synchronizacji',
-                'orders_processed': 0,
-                'orders_updated': 0,
-                'next_run': 'za 6 godzin'
-            }), 200
-        
-        # Grupuj zamówienia według baselinker_order_id
-        unique_order_ids = list(set(order.baselinker_order_id for order in orders_to_sync))
-        
-        reports_logger.info("CRON: Synchronizacja zamówień",
-                          unique_orders=len(unique_order_ids),
-                          total_records=len(orders_to_sync))
-        
-        # Synchronizuj statusy
-        updated_count = 0
-        processed_count = 0
-        payment_updated_count = 0
-        status_updated_count = 0
-        internal_number_updated_count = 0
-        delivery_updated_count = 0
-        errors_count = 0
-        archived_count = 0
-        sync_start = datetime.utcnow()
-        
-        orders_done = []  # Lista przetworzonych zamówień
-        error_details = {
-            'api_errors': [],
-            'archived_orders': []
+    if not orders_to_sync:
+        reports_logger.info("CRON: Brak zamówień do synchronizacji",
+                          excluded_status_ids=excluded_status_ids)
+        return {
+            'success': True,
+            'trigger': 'cron',
+            'timestamp': datetime.utcnow().isoformat(),
+            'summary': 'Brak zamówień do synchronizacji',
+            'orders_processed': 0,
+            'orders_updated': 0,
+            'next_run': 'za 6 godzin'
         }
-        
-        # ✅ DEBUG: Słownik do przechowania przykładowych danych API
-        debug_samples = []
+    
+    unique_order_ids = [order_id for order_id, _ in orders_to_sync]
+    
+    reports_logger.info("CRON: Synchronizacja zamówień",
+                      unique_orders=len(unique_order_ids),
+                      total_records=sum(records_count for _, records_count in orders_to_sync))
 
-        for order_id in unique_order_ids:
+    # Zmiany zapisywane zbiorczo (porcja = jeden SELECT + UPDATE z CASE)
+    status_upsert = ReportStatusUpsert(auto_flush=False)
+    failed_batches = []
+    
+    # Synchronizuj statusy
+    updated_count = 0
+    processed_count = 0
+    payment_updated_count = 0
+    status_updated_count = 0
+    internal_number_updated_count = 0
+    delivery_updated_count = 0
+    errors_count = 0
+    archived_count = 0
+    sync_start = datetime.utcnow()
+    
+    orders_done = []  # Lista przetworzonych zamówień
+    error_details = {
+        'api_errors': [],
+        'archived_orders': []
+    }
+    
+    # ✅ DEBUG: Słownik do przechowania przykładowych danych API
+    debug_samples = []
+
+    # Porcja zamówień = jeden zapis, poza try/except pojedynczego zamówienia
+    for batch_start in range(0, len(unique_order_ids), status_upsert.batch_size):
+        batch_ids = unique_order_ids[batch_start:batch_start + status_upsert.batch_size]
+        batch = Counter()
+        batch_done = []
+        for order_id in batch_ids:
             try:
                 # ✅ POPRAWKA: Pobierz zamówienie BEZ filtrowania statusów
                 order_details = service.get_order_details(order_id, include_excluded_statuses=True)
-                
+            
                 if order_details:
                     # ✅ DEBUG: Zaloguj szczegóły dla pierwszych 3 zamówień + zamówienie 20126171
                     if len(debug_samples) < 3 or order_id == 20126171:
@@ -4373,13 +4094,13 @@ def api_cron_sync_statuses():
                             'main_keys': list(order_details.keys())[:15]
                         }
                         debug_samples.append(debug_info)
-                        
+                    
                         reports_logger.info("CRON DEBUG: Szczegóły zamówienia z API",
                                           **debug_info)
-                    
+                
                     # Pobierz nowy status
                     new_status_id = order_details.get('order_status_id')
-                    
+                
                     # ✅ Konwertuj na int (API może zwracać string)
                     try:
                         new_status_id = int(new_status_id) if new_status_id else None
@@ -4395,88 +4116,80 @@ def api_cron_sync_statuses():
                             'status_id_received': str(new_status_id)
                         })
                         continue
-    
+
                     # ⚠️ Sprawdź czy to wykluczony status - jeśli tak, pomiń
                     if new_status_id in [105112, 138625]:
                         reports_logger.info("CRON: Pominięto zamówienie z wykluczonym statusem",
                                           order_id=order_id,
                                           status_id=new_status_id,
                                           status_name=service.status_map.get(new_status_id, f'Status {new_status_id}'))
-                        processed_count += 1
+                        batch['processed'] += 1
                         continue
-    
+
                     new_status = service.status_map.get(new_status_id, f'Status {new_status_id}')
-                    
+                
                     # Pobierz kwotę zapłaconą (brutto -> netto)
                     payment_done = order_details.get('payment_done', 0)
                     custom_fields = order_details.get('custom_extra_fields', {})
                     price_type_from_api = custom_fields.get('106169', '').strip()
-                    
+                
                     new_paid_amount_net = service._calculate_paid_amount_net(payment_done, price_type_from_api)
-                    
+                
                     # Pobierz numer wewnętrzny z extra_field_1
                     new_internal_number = order_details.get('extra_field_1', '').strip()
-                    
+                
                     # Pobierz dane dostawy
                     new_delivery_method = order_details.get('delivery_method', '').strip()
                     new_delivery_cost_gross = float(order_details.get('delivery_price', 0))
-                    
-                    records = BaselinkerReportOrder.query.filter_by(
-                        baselinker_order_id=order_id
-                    ).all()
-
-                    records_updated = 0
-                    for record in records:
-                        record.current_status = new_status
-                        record.baselinker_status_id = new_status_id
-                        record.paid_amount_net = new_paid_amount_net
-                        record.internal_order_number = new_internal_number
-                        record.delivery_method = new_delivery_method
-                        record.delivery_cost = new_delivery_cost_gross
-                        record.updated_at = datetime.utcnow()
-                        record.update_production_fields()
-                        record.calculate_fields()  # ✅ POPRAWKA #2 - przelicza balance_due
-                        records_updated += 1
-
-                    if records_updated > 0:
-                        updated_count += records_updated
-                        status_updated_count += 1
-                        orders_done.append(order_id)  # Dodaj do listy przetworzonych
-
-                        if new_paid_amount_net > 0:
-                            payment_updated_count += 1
-
-                        if new_internal_number:
-                            internal_number_updated_count += 1
-
-                        if new_delivery_method or new_delivery_cost_gross > 0:
-                            delivery_updated_count += 1
-                    
-                    processed_count += 1
+                
+                    # Saldo i pola produkcji przeliczane przy zapisie porcji
+                    status_upsert.add(
+                        order_id,
+                        current_status=new_status,
+                        baselinker_status_id=new_status_id,
+                        paid_amount_net=new_paid_amount_net,
+                        internal_order_number=new_internal_number,
+                        delivery_method=new_delivery_method,
+                        delivery_cost=new_delivery_cost_gross,
+                    )
+
+                    batch['status_updated'] += 1
+                    batch_done.append(order_id)  # Dodaj do listy przetworzonych
+
+                    if new_paid_amount_net > 0:
+                        batch['payment_updated'] += 1
+
+                    if new_internal_number:
+                        batch['internal_number_updated'] += 1
+
+                    if new_delivery_method or new_delivery_cost_gross > 0:
+                        batch['delivery_updated'] += 1
+                
+                    batch['processed'] += 1
                 else:
                     # ✅ Zamówienie niedostępne (prawdopodobnie archiwum)
                     reports_logger.warning("CRON: Zamówienie nie zwrócone przez API",
                                          order_id=order_id,
                                          reason="get_order_details returned None",
                                          classification="ARCHIVED_OR_UNAVAILABLE")
-            
+        
                     archived_count += 1
                     error_details['archived_orders'].append({
                         'order_id': order_id,
                         'reason': 'Zamówienie niedostępne przez API Baselinker (prawdopodobnie w archiwum lub usunięte)'
                     })
-            
+        
             except Exception as e:
                 # ✅ PRAWDZIWY BŁĄD - wyjątek podczas synchronizacji
                 error_msg = str(e)
                 error_type = type(e).__name__
-        
+    
                 reports_logger.error("CRON: Wyjątek podczas synchronizacji",
                                    order_id=order_id,
                                    error_type=error_type,
                                    error_message=error_msg,
                                    traceback=traceback.format_exc())
-        
+    
                 errors_count += 1
                 error_details['api_errors'].append({
                     'order_id': order_id,
@@ -4484,42 +4197,93 @@ def api_cron_sync_statuses():
                     'error_message': error_msg
                 })
                 continue
+
+        # Liczniki porcji tylko po udanym zapisie
+        if _write_status_batch(status_upsert, batch_ids, failed_batches):
+            processed_count += batch['processed']
+            status_updated_count += batch['status_updated']
+            payment_updated_count += batch['payment_updated']
+            internal_number_updated_count += batch['internal_number_updated']
+            delivery_updated_count += batch['delivery_updated']
+            orders_done.extend(batch_done)
+    
+    # Zapisz pozostałe zmiany
+    upsert_stats = status_upsert.finish()
+    updated_count = upsert_stats['records_updated']
+    
+    duration = (datetime.utcnow() - sync_start).total_seconds()
+    
+    reports_logger.info("CRON: Synchronizacja zakończona",
+                      processed_orders=processed_count,
+                      updated_records=updated_count,
+                      status_updated_count=status_updated_count,
+                      payment_updated_count=payment_updated_count,
+                      db_statements=upsert_stats['statements'],
+                      api_errors_count=errors_count,
+                      archived_orders_count=archived_count,
+                      failed_batches=len(failed_batches),
+                      duration_seconds=duration)
+    error_details['write_errors'] = failed_batches
+    
+    return {
+        'success': not failed_batches,
+        'trigger': 'cron',
+        'timestamp': datetime.utcnow().isoformat(),
+        'summary': ('CRON synchronizacja zakończona pomyślnie' if not failed_batches
+                    else f'CRON synchronizacja zakończona z błędami zapisu ({len(failed_batches)} porcji)'),
+        'orders_done': orders_done,
+        'stats': {
+            'orders_processed': processed_count,
+            'orders_updated': status_updated_count,
+            'records_updated': updated_count,
+            'payment_updated': payment_updated_count,
+            'internal_number_updated': internal_number_updated_count,
+            'delivery_updated': delivery_updated_count,
+            'api_errors': errors_count,
+            'archived_orders': archived_count,
+            'write_errors': sum(len(failed['order_ids']) for failed in failed_batches)
+        },
+        'error_details': error_details,
+        'debug_samples': debug_samples,  # ✅ DEBUG: Przykładowe dane z API
+        'duration_seconds': duration,
+        'next_run': 'za 6 godzin'
+    }
+
+
+@reports_bp.route('/api/cron/sync-statuses', methods=['GET'])
+@cron_secret_required
+def api_cron_sync_statuses():
+    """
+    Endpoint CRON do automatycznej synchronizacji statusów zamówień
+    
+    Wymaga: 
+    - Header: X-Cron-Secret z wartością z config (PRODUCTION_CRON_SECRET)
+    
+    Wywołanie:
+    curl -H "X-Cron-Secret: YOUR_SECRET_KEY" "https://crm.woodpower.pl/reports/api/cron/sync-statuses"
+    
+    Harmonogram w cron:
+    0 2,8,14,20 * * * /usr/bin/curl --silent -H "X-Cron-Secret: SECRET "https://crm.woodpower.pl/reports/api/cron/sync-statuses"
+    """
+    try:
+        reports_logger.info("CRON: Rozpoczęcie synchronizacji statusów",
+                          client_ip=request.remote_addr,
+                          timestamp=datetime.utcnow().isoformat())
         
-        # Zapisz zmiany
-        db.session.commit()
-        
-        duration = (datetime.utcnow() - sync_start).total_seconds()
-        
-        reports_logger.info("CRON: Synchronizacja zakończona",
-                          processed_orders=processed_count,
-                          updated_records=updated_count,
-                          status_updated_count=status_updated_count,
-                          payment_updated_count=payment_updated_count,
-                          api_errors_count=errors_count,
-                          archived_orders_count=archived_count,
-                          duration_seconds=duration)
+        # Gdy działa scheduler_daemon - synchronizację wykona daemon, endpoint tylko ją zleca
+        if request_job_run(REPORTS_STATUS_SYNC_JOB):
+            reports_logger.info("CRON: Synchronizacja statusów zlecona schedulerowi",
+                              job_id=REPORTS_STATUS_SYNC_JOB)
+            return jsonify({
+                'success': True,
+                'trigger': 'cron',
+                'delegated_to_scheduler': True,
+                'job_id': REPORTS_STATUS_SYNC_JOB,
+                'timestamp': datetime.utcnow().isoformat(),
+                'summary': 'Synchronizacja zlecona daemonowi schedulera'
+            }), 202
         
-        return jsonify({
-            'success': True,
-            'trigger': 'cron',
-            'timestamp': datetime.utcnow().isoformat(),
-            'summary': f'CRON synchronizacja zakończona pomyślnie',
-            'orders_done': orders_done,
-            'stats': {
-                'orders_processed': processed_count,
-                'orders_updated': status_updated_count,
-                'records_updated': updated_count,
-                'payment_updated': payment_updated_count,
-                'internal_number_updated': internal_number_updated_count,
-                'delivery_updated': delivery_updated_count,
-                'api_errors': errors_count,
-                'archived_orders': archived_count
-            },
-            'error_details': error_details,
-            'debug_samples': debug_samples,  # ✅ DEBUG: Przykładowe dane z API
-            'duration_seconds': duration,
-            'next_run': 'za 6 godzin'
-        }), 200
+        return jsonify(run_cron_status_sync()), 200
         
     except Exception as e:
         db.session.rollback()
@@ -11,9 +11,12 @@ from datetime import datetime, timedelta, date
 from flask import current_app
 from extensions import db
 from .models import BaselinkerReportOrder, ReportsSyncLog
-from .utils import PostcodeToStateMapper
+from geo_lookup import display_name, region_from_postcode
 from .parser import ProductNameParser
+from .parse_cache import prefetch_parse_results, product_names_from_orders
+from .import_stage import ReportImportStage, resolve_product_fix
 from modules.logging import get_structured_logger
+from modules.baselinker.order_mirror import mirror_orders
 from decimal import Decimal
 
 # Inicjalizacja loggera
@@ -55,6 +58,10 @@ class BaselinkerReportsService:
 
         # NOWE właściwości dla obsługi objętości
         self.volume_fixes = {}  # {product_key: {'volume': X, 'wood_species': Y, ...}}
+        self.dimension_fixes = {}  # {order_id: {product_id: {'length_cm': X, ...}}}
+
+        # Wyniki analyze_product_for_volume_and_attributes (nazwa -> wynik) w obrębie instancji
+        self._analysis_cache = {}
 
     def _is_service_product(self, product_name: str) -> bool:
         """
@@ -136,6 +143,15 @@ class BaselinkerReportsService:
         fix = self.get_volume_fix(product_key)
         return fix.get(attribute) if fix else None
     
+    def _analyze_product(self, product_name):
+        """Analiza nazwy produktu (objętość, atrybuty) - raz na nazwę"""
+        analysis = self._analysis_cache.get(product_name)
+        if analysis is None:
+            from .routers import analyze_product_for_volume_and_attributes
+            analysis = analyze_product_for_volume_and_attributes(product_name)
+            self._analysis_cache[product_name] = analysis
+        return analysis
+
     def get_existing_order_ids(self, order_ids):
         """Zwraca listę ID zamówień które już istnieją w bazie"""
         existing = db.session.query(BaselinkerReportOrder.baselinker_order_id).filter(
@@ -217,11 +233,15 @@ class BaselinkerReportsService:
             dict: Przygotowane dane do zapisu w bazie
         """
         try:
+            # Poprawki produktu - rozwiązane raz dla całej metody
+            fix = resolve_product_fix(self, order_data.get('order_id'), product_data, product_index,
+                                      self.volume_fixes, self.dimension_fixes)
+
             # ✅ UŻYJ ISTNIEJĄCEJ LOGIKI: Stwórz tymczasowe zamówienie z jednym produktem
             temp_order = {**order_data, 'products': [product_data]}
 
             # ✅ WYKORZYSTAJ _convert_order_to_records (ale nie zapisuj do bazy)
-            records = self._convert_order_to_records(temp_order)
+            records = self._convert_order_to_records(temp_order, product_fixes=[fix])
 
             if not records:
                 raise Exception("Nie udało się przetworzyć zamówienia")
@@ -356,30 +376,10 @@ class BaselinkerReportsService:
                               current_product=product_data.get('name'))
 
             # ✅ TYLKO DLA PRODUKTÓW FIZYCZNYCH: DODAJ ANALIZĘ OBJĘTOŚCI
-            # ✅ UŻYJ NOWEJ METODY GENEROWANIA KLUCZY
-            product_key = self.generate_product_key(order_data.get('order_id'), product_data, product_index)
-
-            # ✅ DODAJ DEBUG GENEROWANIA KLUCZA
-            # ✅ SZCZEGÓŁOWY DEBUG GENEROWANIA KLUCZA
-            order_product_id_raw = product_data.get('order_product_id')
-            product_id_raw = product_data.get('product_id')
-
-            self.logger.info("🔑 SZCZEGÓŁOWY DEBUG GENEROWANIA KLUCZA:")
-            self.logger.info(f"   📦 order_id: {order_data.get('order_id')}")
-            self.logger.info(f"   🏷️  product_name: {product_data.get('name', 'BRAK')}")
-            self.logger.info(f"   🆔 order_product_id: '{order_product_id_raw}' (type: {type(order_product_id_raw)})")
-            self.logger.info(f"   🔢 product_id: '{product_id_raw}' (type: {type(product_id_raw)})")
-            self.logger.info(f"   📍 product_index: {product_index}")
-            self.logger.info(f"   ✅ order_product_id not empty: {order_product_id_raw and str(order_product_id_raw).strip()}")
-            self.logger.info(f"   ✅ product_id not empty: {product_id_raw and str(product_id_raw).strip() and str(product_id_raw) != ''}")
-
-            product_key = self.generate_product_key(order_data.get('order_id'), product_data, product_index)
-
-            self.logger.info(f"   🎯 WYGENEROWANY KLUCZ: {product_key}")
+            product_key = fix['product_key']
 
             # Przeprowadź analizę produktu
-            from .routers import analyze_product_for_volume_and_attributes
-            analysis = analyze_product_for_volume_and_attributes(product_name)
+            analysis = self._analyze_product(product_name)
 
             # Nadpisz objętość według nowej analizy
             if analysis['analysis_type'] == 'volume_only':
@@ -397,51 +397,29 @@ class BaselinkerReportsService:
     
             elif analysis['analysis_type'] == 'manual_input_needed':
                 # Użyj ręcznie wprowadzonych danych
-                volume_fix = self.get_volume_fix(product_key)
-            
-                # ✅ DODAJ SZCZEGÓŁOWY DEBUG
-                self.logger.info("🔍 MANUAL_INPUT_NEEDED DEBUG:")
-                self.logger.info(f"   📦 Product key: {product_key}")
-                self.logger.info(f"   🔍 Volume fix found: {volume_fix is not None}")
-                self.logger.info(f"   📊 Volume fix data: {volume_fix}")
-                self.logger.info(f"   🔢 Quantity: {record_data.get('quantity', 1)}")
-            
-                if volume_fix and volume_fix.get('volume'):
-                    total_volume = float(volume_fix['volume'])
+                if fix['volume']:
+                    total_volume = fix['volume']
                     quantity = record_data.get('quantity', 1)
 
                     record_data['total_volume'] = total_volume  # NIE MNÓŻ!
                     record_data['volume_per_piece'] = total_volume / quantity  # PODZIEL!
-                
-                    # ✅ DODAJ DEBUG PO USTAWIENIU
-                    self.logger.info("🔍 PO USTAWIENIU OBJĘTOŚCI:")
-                    self.logger.info(f"   📊 record_data['total_volume']: {record_data.get('total_volume')}")
-                    self.logger.info(f"   📦 record_data['volume_per_piece']: {record_data.get('volume_per_piece')}")
 
                     # Wyczyść wymiary (bo ich nie ma)
                     record_data['length_cm'] = None
                     record_data['width_cm'] = None  
                     record_data['thickness_cm'] = None
                 else:
-                    # ✅ DODAJ DEBUG BRAKU DANYCH
-                    self.logger.warning("⚠️ BRAK VOLUME_FIX - ustawiam objętość na 0")
+                    self.logger.warning("Brak poprawki objętości - ustawiam objętość na 0",
+                                        product_key=product_key)
                     record_data['total_volume'] = 0
                     record_data['volume_per_piece'] = 0
-        
-            # ✅ DODAJ SZCZEGÓŁOWY DEBUG PRZED POBIERANIEM ATRYBUTÓW
-            volume_fix = self.get_volume_fix(product_key)
-            self.logger.debug("Volume fix lookup",
-                              product_key=product_key,
-                              volume_fix_found=volume_fix is not None,
-                              volume_fix_data=volume_fix,
-                              available_fixes=list(self.volume_fixes.keys()) if hasattr(self, 'volume_fixes') else [])
 
             # ✅ TYLKO DLA PRODUKTÓW FIZYCZNYCH: Dodaj atrybuty z ręcznego wprowadzenia lub analizy
             # (dla usług te wartości pozostaną None jak ustawione w _convert_order_to_records)
             # Ręczne dane mają pierwszeństwo przed auto-analizą nazwy
-            wood_species = self.get_volume_fix_attribute(product_key, 'wood_species') or analysis.get('wood_species')
-            technology = self.get_volume_fix_attribute(product_key, 'technology') or analysis.get('technology')
-            wood_class = self.get_volume_fix_attribute(product_key, 'wood_class') or analysis.get('wood_class')
+            wood_species = fix['wood_species'] or analysis.get('wood_species')
+            technology = fix['technology'] or analysis.get('technology')
+            wood_class = fix['wood_class'] or analysis.get('wood_class')
 
             # ✅ NADPISZ TYLKO JEŚLI MAMY NOWE WARTOŚCI (nie nadpisuj None na None)
             if wood_species:
@@ -451,18 +429,14 @@ class BaselinkerReportsService:
             if wood_class:
                 record_data['wood_class'] = wood_class
 
-            # DODAJ DEBUG REZULTATÓW
             self.logger.debug("Attributes assignment",
                               product_key=product_key,
                               wood_species=wood_species,
                               technology=technology,
                               wood_class=wood_class,
-                              from_analysis_wood_species=analysis.get('wood_species'),
-                              from_analysis_technology=analysis.get('technology'),
-                              from_analysis_wood_class=analysis.get('wood_class'),
-                              from_fixes_wood_species=self.get_volume_fix_attribute(product_key, 'wood_species'),
-                              from_fixes_technology=self.get_volume_fix_attribute(product_key, 'technology'),
-                              from_fixes_wood_class=self.get_volume_fix_attribute(product_key, 'wood_class'))
+                              from_fixes_wood_species=fix['wood_species'],
+                              from_fixes_technology=fix['technology'],
+                              from_fixes_wood_class=fix['wood_class'])
 
             # ✅ NOWE: Dodaj avg_order_price_per_m3 do record_data
             # Dla pojedynczych produktów będzie to cena tego produktu
@@ -833,7 +807,7 @@ class BaselinkerReportsService:
     
         # KROK 2: Jeśli nie ma województwa, sprawdzamy kod pocztowy i uzupełniamy
         if postcode and postcode.strip():
-            auto_state = PostcodeToStateMapper.get_state_from_postcode(postcode)
+            auto_state = display_name(region_from_postcode(postcode))
             if auto_state:
                 self.logger.info("Automatyczne uzupełnienie województwa z kodu pocztowego",
                                postcode=postcode,
@@ -966,6 +940,7 @@ class BaselinkerReportsService:
                     self.logger.info("Pobrano pojedyncze zamówienie", 
                                    order_id=order_id,
                                    orders_count=len(orders))
+                    mirror_orders(orders)
                     return orders
                 else:
                     error_msg = result.get('error_message', 'Nieznany błąd API')
@@ -1078,6 +1053,8 @@ class BaselinkerReportsService:
             self.logger.warning("Osiągnięto maksymalną liczbę iteracji", 
                               max_iterations=max_iterations, total_collected=len(all_orders))
 
+        mirror_orders(all_orders)
+
         self.logger.info("Zakończono pobieranie zamówień",
                         total_orders=len(all_orders),
                         iterations_processed=iteration,
@@ -1189,19 +1166,17 @@ class BaselinkerReportsService:
         
             # Przefiltruj nowe zamówienia
             new_orders = [order for order in orders if order['order_id'] not in existing_order_ids]
-            existing_orders = [order for order in orders if order['order_id'] in existing_order_ids]
-        
-            # Dodaj nowe zamówienia
-            added_count = 0
-            if new_orders:
-                self.logger.info("Dodawanie nowych zamówień", count=len(new_orders))
-                added_count = self.add_orders_to_database(new_orders)
         
-            # Aktualizuj istniejące zamówienia (statusy i płatności)
-            updated_count = 0
-            if existing_orders:
-                self.logger.info("Aktualizowanie istniejących zamówień", count=len(existing_orders))
-                updated_count = self._update_existing_orders(existing_orders, existing_order_ids)
+            # Nowe zamówienia - INSERT, istniejące - aktualizacja statusów i płatności (UPDATE),
+            # jedna porcja zapisu na IMPORT_BATCH_SIZE zamówień
+            stage = ReportImportStage(self, volume_fixes=self.volume_fixes,
+                                      dimension_fixes=self.dimension_fixes)
+            import_result = stage.run(orders)
+            added_count = import_result['records_added']
+            updated_count = import_result['records_updated']
+            if import_result['errors']:
+                self.logger.warning("Część zamówień nie została zapisana",
+                                    errors=import_result['errors'][:10])
         
             # Przygotuj listę nowych zamówień do zwrócenia
             new_orders_info = []
@@ -1276,36 +1251,14 @@ class BaselinkerReportsService:
         Returns:
             int: Liczba dodanych rekordów (produktów)
         """
-        added_count = 0
-        
-        for order in orders:
-            try:
-                # Konwertuj zamówienie na rekordy w bazie
-                records = self._convert_order_to_records(order)
-                
-                for record in records:
-                    db.session.add(record)
-                    added_count += 1
-                
-                self.logger.debug("Dodano zamówienie do bazy",
-                                order_id=order['order_id'],
-                                products_count=len(records))
-                
-            except Exception as e:
-                self.logger.error("Błąd dodawania zamówienia",
-                                order_id=order.get('order_id'),
-                                error=str(e))
-                continue
-        
-        try:
-            db.session.commit()
-            self.logger.info("Dodano rekordy do bazy", added_count=added_count)
-        except Exception as e:
-            db.session.rollback()
-            self.logger.error("Błąd zapisu do bazy", error=str(e))
-            raise
-        
-        return added_count
+        # Zbiorczy INSERT porcjami (poprawki wymiarów / objętości serwisu stosowane przy konwersji)
+        stage = ReportImportStage(self, volume_fixes=self.volume_fixes,
+                                  dimension_fixes=self.dimension_fixes)
+        result = stage.run(orders, update_existing=False)
+        if result['errors']:
+            self.logger.warning("Część zamówień nie została dodana",
+                                errors=result['errors'][:10])
+        return result['records_added']
 
     def _calculate_average_order_price_per_m3(self, records: List) -> float:
         """
@@ -1336,9 +1289,15 @@ class BaselinkerReportsService:
             self.logger.error("Błąd obliczania średniej ceny za m³ w zamówieniu", error=str(e))
             return 0.0
     
-    def _convert_order_to_records(self, order: Dict) -> List[BaselinkerReportOrder]:
+    def _convert_order_to_records(self, order: Dict,
+                                  product_fixes: Optional[List[Dict]] = None) -> List[BaselinkerReportOrder]:
         """
         Konwertuje zamówienie z Baselinker na rekordy w bazie (jeden rekord = jeden produkt)
+
+        Args:
+            order: Zamówienie z Baselinker
+            product_fixes: Poprawki produktów rozwiązane wcześniej (ReportImportStage);
+                brak = rozwiązywane tutaj z volume_fixes / dimension_fixes serwisu
         """
         records = []
         products = order.get('products', [])
@@ -1348,6 +1307,13 @@ class BaselinkerReportsService:
                             order_id=order.get('order_id'))
             return records
 
+        if product_fixes is None:
+            product_fixes = [
+                resolve_product_fix(self, order.get('order_id'), product, position,
+                                    self.volume_fixes, self.dimension_fixes)
+                for position, product in enumerate(products)
+            ]
+
         # NOWE: Pobierz informację o typie ceny z custom_extra_fields
         custom_fields = order.get('custom_extra_fields', {})
         price_type_from_api = custom_fields.get('106169', '').strip()
@@ -1411,8 +1377,10 @@ class BaselinkerReportsService:
                 product_type = None
                 product_volume = 0.0
 
-                # ✅ UŻYJ NOWEJ METODY GENEROWANIA KLUCZY
-                product_key = self.generate_product_key(order.get('order_id'), product, product_index)
+                # Klucz produktu i poprawki (zgodnie z frontendem)
+                fix = product_fixes[product_index]
+                product_key = fix['product_key']
+                fixed_volume = fix['volume'] or fix['dimension_volume']
 
                 self.logger.debug("Processing product for volume calculation",
                                 order_id=order.get('order_id'),
@@ -1422,12 +1390,9 @@ class BaselinkerReportsService:
                                 product_id_raw=product.get('product_id'),
                                 generated_key=product_key)
 
-                # ✅ NOWA LOGIKA: Sprawdź volume_fixes NAJPIERW
-                volume_fix = self.get_volume_fix(product_key) if hasattr(self, 'volume_fixes') else None
-
-                if volume_fix and volume_fix.get('volume'):
+                if fixed_volume:
                     # PRZYPADEK 1: Mamy ręczne poprawki objętości
-                    product_volume = float(volume_fix['volume'])
+                    product_volume = fixed_volume
                     total_m3_all_products += product_volume
 
                     self.logger.debug("Użyto volume_fix dla produktu",
@@ -1436,10 +1401,14 @@ class BaselinkerReportsService:
                                     product_key=product_key,
                                     volume_from_fix=product_volume,
                                     quantity=quantity)
+                elif fix['length_cm'] and fix['width_cm'] and fix['thickness_cm']:
+                    # PRZYPADEK 1a: Wymiary uzupełnione w oknie wymiarów
+                    product_volume = (fix['length_cm'] / 100) * (fix['width_cm'] / 100) \
+                        * (fix['thickness_cm'] / 100) * quantity
+                    total_m3_all_products += product_volume
                 else:
                     # PRZYPADEK 2: Użyj analizy nazwy produktu
-                    from .routers import analyze_product_for_volume_and_attributes
-                    analysis = analyze_product_for_volume_and_attributes(product_name)
+                    analysis = self._analyze_product(product_name)
 
                     product_type = analysis.get('product_type')
                     if product_type == 'suszenie':
@@ -1502,7 +1471,7 @@ class BaselinkerReportsService:
                                             order_id=order.get('order_id'),
                                             product_name=product_name,
                                             product_key=product_key,
-                                            has_volume_fix=volume_fix is not None,
+                                            has_volume_fix=False,
                                             parsed_dimensions={
                                                 'length_cm': safe_float_convert(length_cm) if length_cm else None,
                                                 'width_cm': safe_float_convert(width_cm) if width_cm else None,
@@ -1638,8 +1607,9 @@ class BaselinkerReportsService:
                     # === ISTNIEJĄCA LOGIKA DLA PRODUKTÓW FIZYCZNYCH ===
                     parsed_product = self.parser.parse_product_name(product_name)
 
-                    # ✅ WYGENERUJ KLUCZ PRODUKTU ZGODNIE Z FRONTENDEM
-                    product_key = self.generate_product_key(order.get('order_id'), product, product_index)
+                    # Klucz produktu i poprawki rozwiązane przed pętlą objętości
+                    fix = product_fixes[product_index]
+                    product_key = fix['product_key']
                 
                     self.logger.debug("Generated product key for physical product",
                                     order_id=order.get('order_id'),
@@ -1705,8 +1675,7 @@ class BaselinkerReportsService:
                     )
 
                     # ✅ PRZEPROWADŹ ANALIZĘ NAZWY I ZASTOSUJ POPRAWKI OBJĘTOŚCI ORAZ ATRYBUTÓW
-                    from .routers import analyze_product_for_volume_and_attributes
-                    analysis = analyze_product_for_volume_and_attributes(product_name)
+                    analysis = self._analyze_product(product_name)
 
                     if analysis['analysis_type'] == 'volume_only' and analysis.get('volume'):
                         total_volume = float(analysis.get('volume', 0))
@@ -1716,32 +1685,21 @@ class BaselinkerReportsService:
                         record.length_cm = None
                         record.width_cm = None
                         record.thickness_cm = None
-                    elif analysis['analysis_type'] == 'manual_input_needed':
-                        volume_fix = self.get_volume_fix(product_key)
-                        if volume_fix and volume_fix.get('volume'):
-                            total_volume = float(volume_fix['volume'])
-                            qty = record.quantity or 1
-                            record.total_volume = total_volume
-                            record.volume_per_piece = total_volume / qty
-                            record.length_cm = None
-                            record.width_cm = None
-                            record.thickness_cm = None
+                    elif analysis['analysis_type'] == 'manual_input_needed' and fix['volume']:
+                        qty = record.quantity or 1
+                        record.total_volume = fix['volume']
+                        record.volume_per_piece = fix['volume'] / qty
+                        record.length_cm = None
+                        record.width_cm = None
+                        record.thickness_cm = None
 
-                    # ✅ ATRYBUTY DREWNA – PIERWSZEŃSTWO MAJĄ DANE RĘCZNE
-                    wood_species = self.get_volume_fix_attribute(product_key, 'wood_species') or analysis.get('wood_species')
-                    technology = self.get_volume_fix_attribute(product_key, 'technology') or analysis.get('technology')
-                    wood_class = self.get_volume_fix_attribute(product_key, 'wood_class') or analysis.get('wood_class')
-                    if wood_species:
-                        record.wood_species = wood_species
-                    if technology:
-                        record.technology = technology
-                    if wood_class:
-                        record.wood_class = wood_class
+                    # Poprawki z okna uzupełniania wymiarów
+                    self._apply_dimension_fix(record, fix)
 
-                    # Atrybuty drewna – pierwszeństwo mają dane ręczne
-                    wood_species = self.get_volume_fix_attribute(product_key, 'wood_species') or analysis.get('wood_species')
-                    technology = self.get_volume_fix_attribute(product_key, 'technology') or analysis.get('technology')
-                    wood_class = self.get_volume_fix_attribute(product_key, 'wood_class') or analysis.get('wood_class')
+                    # ✅ ATRYBUTY DREWNA – PIERWSZEŃSTWO MAJĄ DANE RĘCZNE
+                    wood_species = fix['wood_species'] or analysis.get('wood_species')
+                    technology = fix['technology'] or analysis.get('technology')
+                    wood_class = fix['wood_class'] or analysis.get('wood_class')
                     if wood_species:
                         record.wood_species = wood_species
                     if technology:
@@ -1845,75 +1803,6 @@ class BaselinkerReportsService:
         
         return {row[0] for row in existing}
     
-    def _update_existing_orders(self, orders: List[Dict], existing_order_ids: set) -> int:
-        """
-        Aktualizuje statusy istniejących zamówień
-        """
-        updated_count = 0
-        
-        for order in orders:
-            order_id = order['order_id']
-            if order_id not in existing_order_ids:
-                continue
-            
-            try:
-                # Pobierz status z Baselinker
-                status_id = order.get('order_status_id')
-                new_status = self.status_map.get(status_id, f'Status {status_id}')
-                
-                # Oblicz zapłaconą kwotę netto z brutto
-                payment_done = order.get('payment_done', 0)
-                custom_fields = order.get('custom_extra_fields', {})
-                price_type_from_api = custom_fields.get('106169', '').strip()
-                
-                paid_amount_net = self._calculate_paid_amount_net(payment_done, price_type_from_api)
-                
-                # Aktualizuj wszystkie rekordy tego zamówienia
-                records = BaselinkerReportOrder.query.filter_by(baselinker_order_id=order_id).all()
-                
-                # NOWE: Sprawdź czy trzeba zaktualizować pola price_type
-                custom_fields = order.get('custom_extra_fields', {})
-                price_type_from_api = custom_fields.get('106169', '').strip()
-
-                for record in records:
-                    if record.current_status != new_status or record.paid_amount_net != paid_amount_net:
-                        record.current_status = new_status
-                        record.baselinker_status_id = status_id
-                        record.paid_amount_net = paid_amount_net
-                        record.updated_at = datetime.utcnow()
-        
-                        record.update_production_fields()
-                        record.calculate_fields()
-        
-                        updated_count += 1
-
-                    if not record.price_type and price_type_from_api:
-                        # Zaktualizuj price_type dla starych rekordów
-                        normalized_type = 'netto' if price_type_from_api.lower() == 'netto' else 'brutto' if price_type_from_api.lower() == 'brutto' else ''
-                        if normalized_type != record.price_type:
-                            record.price_type = normalized_type
-                            self.logger.info("Zaktualizowano price_type dla istniejącego rekordu",
-                                           record_id=record.id,
-                                           order_id=order_id,
-                                           new_price_type=normalized_type)
-                
-            except Exception as e:
-                self.logger.error("Błąd aktualizacji zamówienia",
-                                order_id=order_id,
-                                error=str(e))
-                continue
-        
-        if updated_count > 0:
-            try:
-                db.session.commit()
-                self.logger.info("Zaktualizowano rekordy", updated_count=updated_count)
-            except Exception as e:
-                db.session.rollback()
-                self.logger.error("Błąd zapisu aktualizacji", error=str(e))
-                raise
-        
-        return updated_count
-    
     def get_order_details(self, order_id: int, include_excluded_statuses: bool = False) -> Optional[Dict]:
         """
         Pobiera szczegóły pojedynczego zamówienia z Baselinker
@@ -2094,6 +1983,7 @@ class BaselinkerReportsService:
                                 orders_count=len(orders),
                                 date_from=date_from.date(),
                                 date_to=date_to.date())
+                mirror_orders(orders)
             
                 return {
                     'success': True,
@@ -2288,96 +2178,37 @@ class BaselinkerReportsService:
         self.dimension_fixes = {}
         self.logger.info("Wyczyszczono poprawki wymiarów")
     
-    def _apply_dimension_fixes(self, order_id: int, product_id: int, parsed_data: Dict) -> Dict:
-        """
-        Stosuje poprawki wymiarów dla konkretnego produktu
-        
-        Args:
-            order_id (int): ID zamówienia
-            product_id (int): ID produktu
-            parsed_data (Dict): Sparsowane dane produktu
-            
-        Returns:
-            Dict: Poprawione dane produktu
+    def _apply_dimension_fix(self, record: BaselinkerReportOrder, fix: Dict):
         """
-        if not self.dimension_fixes:
-            return parsed_data
-            
-        order_fixes = self.dimension_fixes.get(str(order_id), {})
-        product_fixes = order_fixes.get(str(product_id), {})
-        
-        if product_fixes:
-            # Zastosuj poprawki
-            if 'length_cm' in product_fixes:
-                parsed_data['length_cm'] = float(product_fixes['length_cm'])
-            if 'width_cm' in product_fixes:
-                parsed_data['width_cm'] = float(product_fixes['width_cm'])
-            if 'thickness_mm' in product_fixes:
-                parsed_data['thickness_mm'] = float(product_fixes['thickness_mm'])
-            # NOWE: nadpisanie objętości per sztuka
-            if 'volume_m3' in product_fixes:
-                parsed_data['volume_override_m3'] = float(product_fixes['volume_m3'])
-                
-            self.logger.info("Zastosowano poprawki wymiarów",
-                           order_id=order_id,
-                           product_id=product_id,
-                           fixes=product_fixes)
-        
-        return parsed_data
-    
-    def _create_report_record(self, order: Dict, product: Dict) -> BaselinkerReportOrder:
-        """
-        Tworzy rekord raportu z zastosowaniem poprawek wymiarów.
+        Stosuje poprawkę wymiarów (rozwiązaną przez resolve_product_fix) do rekordu produktu
+
+        volume_m3 z okna wymiarów to łączna objętość pozycji (jak w polu
+        "objętość" okna: wymiary x ilość). Same wymiary - objętość zostanie
+        przeliczona w calculate_fields.
         """
-        try:
-            # Parsuj nazwę produktu
-            product_name = product.get('name', '')
-            parsed_data = self.parser.parse_product_name(product_name)
-
-            # Zastosuj poprawki wymiarów jeśli są dostępne
-            order_id = order.get('order_id')
-            product_id = product.get('product_id')
-            if order_id and product_id:
-                parsed_data = self._apply_dimension_fixes(order_id, product_id, parsed_data)
-
-            # Oblicz objętość (m³) z priorytetem nadpisania ręcznego
-            quantity = float(product.get('quantity', 0))
-            total_m3 = None
-            # Ręczne nadpisanie objętości per sztuka
-            if parsed_data.get('volume_override_m3') is not None:
-                total_m3 = quantity * parsed_data['volume_override_m3']
-            # Automatyczne obliczenie z wymiarów jeśli brak nadpisania
-            elif all(parsed_data.get(key) for key in ['length_cm', 'width_cm', 'thickness_mm']):
-                length_m = parsed_data['length_cm'] / 100
-                width_m = parsed_data['width_cm'] / 100
-                thickness_m = parsed_data['thickness_mm'] / 1000
-                total_m3 = quantity * length_m * width_m * thickness_m
-
-            # Budowanie rekordu raportu
-            record = BaselinkerReportOrder(
-                order_id=order_id,
-                product_id=product_id,
-                product_name=product_name,
-                quantity=quantity,
-                length_cm=parsed_data.get('length_cm'),
-                width_cm=parsed_data.get('width_cm'),
-                thickness_mm=parsed_data.get('thickness_mm'),
-                # Zapisz objętość do kolumny total_m3 w bazie i ttl m3 w UI
-                total_volume=total_m3,
-                # ... inne pola zgodnie z modelem BaselinkerReportOrder
-            )
+        fixed_dimensions = {
+            name: fix[name] for name in ('length_cm', 'width_cm', 'thickness_cm') if fix[name]
+        }
+        if not fixed_dimensions and not fix['dimension_volume']:
+            return
 
-            return record
+        for name, value in fixed_dimensions.items():
+            setattr(record, name, value)
+
+        qty = record.quantity or 1
+        if fix['dimension_volume']:
+            record.total_volume = fix['dimension_volume']
+            record.volume_per_piece = fix['dimension_volume'] / qty
+        else:
+            record.total_volume = None
+            record.volume_per_piece = None
+
+        self.logger.info("Zastosowano poprawki wymiarów",
+                         order_id=record.baselinker_order_id,
+                         product_key=fix['product_key'],
+                         dimensions=fixed_dimensions,
+                         volume_m3=fix['dimension_volume'])
 
-        except Exception as e:
-            self.logger.error(
-                "Błąd tworzenia rekordu z poprawkami wymiarów",
-                order_id=order.get('order_id'),
-                product_id=order.get('product_id'),
-                error=str(e)
-            )
-            raise
-    
     def _calculate_paid_amount_net(self, payment_done, price_type_from_api):
         """
         Oblicza paid_amount_net na podstawie typu ceny z custom_extra_fields
@@ -2431,49 +2262,23 @@ class BaselinkerReportsService:
                     'error': f'Zamówienie {order_id} już istnieje w bazie danych'
                 }
         
-            saved_records = []
-            processing_errors = []
-        
-            # ✅ POPRAWKA: Dodaj enumerate() aby mieć product_index
-            for product_index, product in enumerate(products):
-                try:
-                    # ✅ POPRAWKA: Przekaż product_index jako trzeci parametr
-                    record_data = self.prepare_order_record_data_with_volume_analysis(
-                        order_data, product, product_index
-                    )
-                
-                    # Zapisz rekord
-                    record = self.create_report_record(record_data)
-                    saved_records.append(record)
-                
-                    # Loguj szczegóły
-                    volume_info = f"objętość: {record_data.get('total_volume', 0):.4f}m³"
-                    if record_data.get('wood_species'):
-                        volume_info += f", gatunek: {record_data.get('wood_species')}"
-                    if record_data.get('technology'):
-                        volume_info += f", technologia: {record_data.get('technology')}"
-                                
-                except Exception as e:
-                    error_msg = f"Błąd zapisywania produktu {product.get('name', 'unknown')}: {str(e)}"
-                    processing_errors.append(error_msg)
-                    reports_logger.error(error_msg)
-                    continue
-        
-            if not saved_records:
+            stage = ReportImportStage(self, volume_fixes=self.volume_fixes,
+                                      dimension_fixes=self.dimension_fixes)
+            import_result = stage.run([order_data], update_existing=False)
+            processing_errors = [error['error'] for error in import_result['errors']]
+
+            if not import_result['records_added']:
                 return {
                     'success': False,
                     'error': f'Nie udało się zapisać żadnych produktów z zamówienia {order_id}',
                     'details': processing_errors
                 }
         
-            # Commit transakcji
-            db.session.commit()
-        
             result = {
                 'success': True,
                 'order_id': order_id,
-                'products_saved': len(saved_records),
-                'message': f'Pomyślnie zapisano {len(saved_records)} produktów z zamówienia {order_id}'
+                'products_saved': import_result['records_added'],
+                'message': f'Pomyślnie zapisano {import_result["records_added"]} produktów z zamówienia {order_id}'
             }
         
             if processing_errors:
@@ -2475,23 +2475,14 @@ class SyncManager {
             console.log('[SyncManager] 📦 Zamówienia do zapisania:', orderIds.length);
 
             // POPRAWKA: Używaj tego samego endpointu co performSaveOrders()
-            const response = await fetch('/reports/api/save-selected-orders-with-dimensions', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json'
-                },
-                body: JSON.stringify({
-                    order_ids: orderIds,                    // tablica ID zamówień
-                    dimension_fixes: this.dimensionFixes || {}   // poprawki wymiarów (może być puste)
-                })
+            // Zapis działa jako zadanie w tle - czekamy na wynik z postępem
+            const result = await window.JobProgress.run('/reports/api/save-selected-orders-with-dimensions', {
+                order_ids: orderIds,                    // tablica ID zamówień
+                dimension_fixes: this.dimensionFixes || {}   // poprawki wymiarów (może być puste)
+            }, {
+                onProgress: (job) => this.updateJobLoading('Zapisywanie zamówień...', job)
             });
 
-            if (!response.ok) {
-                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
-            }
-
-            const result = await response.json();
-
             if (result.success) {
                 console.log('[SyncManager] ✅ Zamówienia zapisane pomyślnie');
 
@@ -2584,19 +2575,11 @@ class SyncManager {
 
             console.log('[SyncManager] 📤 Wysyłanie zamówień do zapisania:', requestData);
 
-            const response = await fetch('/reports/api/save-selected-orders-with-dimensions', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify(requestData)
+            // Zapis działa jako zadanie w tle - czekamy na wynik z postępem
+            const result = await window.JobProgress.run('/reports/api/save-selected-orders-with-dimensions', requestData, {
+                onEvent: (event) => console.log(`[SyncManager] [job] ${event.message}`),
+                onProgress: (job) => this.updateJobLoading('Zapisywanie zamówień...', job)
             });
-
-            if (!response.ok) {
-                throw new Error(`HTTP ${response.status}: ${response.statusText}`);
-            }
-
-            const result = await response.json();
             console.log('[SyncManager] 📥 Wynik zapisywania:', result);
 
             if (result.success) {
@@ -3556,6 +3539,15 @@ class SyncManager {
         }
     }
 
+    updateJobLoading(text, job) {
+        // Postęp zadania w tle w tekście globalnego loadera
+        const progress = job && job.progress;
+        if (progress && progress.percent !== null && progress.percent !== undefined) {
+            const message = progress.message ? ` - ${progress.message}` : '';
+            this.showGlobalLoading(`${text} ${Math.round(progress.percent)}%${message}`);
+        }
+    }
+
     // =====================================================
     // FUNKCJE POMOCNICZE
     // =====================================================
@@ -0,0 +1,244 @@
+# modules/reports/status_upsert.py
+"""
+Zbiorcza aktualizacja statusów i płatności w tabeli raportów
+============================================================
+
+Cron statusów i import zamówień zmieniają w istniejących rekordach tylko
+pola poziomu zamówienia (status, zapłacono, numer wewnętrzny, dostawa).
+Zamiast zapytania i commita na każde zamówienie:
+
+- add(order_id, ...) zbiera zmiany w pamięci (order_id -> nowe wartości)
+- flush() porcjami po STATUS_UPSERT_BATCH_SIZE zamówień:
+  1. jeden SELECT rekordów porcji (tylko kolumny potrzebne do przeliczeń)
+  2. przeliczenie kolumnowe: zmiany rozgłaszane na rekordy zamówienia, potem
+     saldo i podział produkcja / gotowe (reguły z BaselinkerReportOrder)
+  3. porównanie z wartościami w bazie - zapisywane są tylko zmienione rekordy
+  4. jeden UPDATE ... SET kolumna = CASE id WHEN ... END WHERE id IN (...)
+     na ROWS_PER_STATEMENT rekordów
+
+UPDATE z CASE zamiast INSERT ... ON DUPLICATE KEY UPDATE: jedno polecenie na
+porcję także poza MySQL i bez ryzyka odtworzenia rekordu usuniętego w trakcie.
+"""
+
+from datetime import datetime
+from decimal import Decimal
+from typing import Any, Dict, List, Optional
+
+from flask import current_app
+from sqlalchemy import case, select, update
+
+from extensions import db
+from modules.logging import get_structured_logger
+from .map_stats import mark_days_changed
+from .models import BaselinkerReportOrder
+
+logger = get_structured_logger('reports.status_upsert')
+
+# Zamówień w jednej porcji (nadpisywane przez REPORTS_STATUS_UPSERT_BATCH_SIZE)
+STATUS_UPSERT_BATCH_SIZE = 500
+
+# Rekordów w jednym poleceniu UPDATE (2 parametry na rekord i kolumnę)
+ROWS_PER_STATEMENT = 250
+
+# Pola poziomu zamówienia, które można zmienić przez add()
+ORDER_FIELDS = (
+    'current_status', 'baselinker_status_id', 'paid_amount_net',
+    'internal_order_number', 'delivery_method', 'delivery_cost',
+)
+
+# Pola przeliczane z pól zamówienia
+DERIVED_FIELDS = (
+    'balance_due', 'production_volume', 'production_value_net',
+    'ready_pickup_volume', 'ready_pickup_value_net',
+)
+
+WRITE_FIELDS = ORDER_FIELDS + ('price_type',) + DERIVED_FIELDS
+
+# Kolumny odczytywane z bazy (oprócz zapisywanych)
+_READ_FIELDS = ('id', 'baselinker_order_id', 'date_created', 'total_volume',
+                'value_net', 'order_amount_net') + WRITE_FIELDS
+
+
+def _comparable(value):
+    """Wartość do porównania (Decimal z bazy vs float z przeliczeń)"""
+    if isinstance(value, (Decimal, float)):
+        return round(float(value), 4)
+    return value
+
+
+def compute_derived_columns(columns: Dict[str, List]) -> Dict[str, List]:
+    """
+    Saldo i podział produkcja / gotowe dla kolumn rekordów
+
+    Args:
+        columns: Kolumny rekordów (lista wartości na nazwę pola), wartości po zmianach
+
+    Returns:
+        Dict: nowe kolumny DERIVED_FIELDS (bez danych do obliczenia - wartość dotychczasowa)
+    """
+    balance_due = [
+        previous if computed is None else computed
+        for computed, previous in zip(
+            map(BaselinkerReportOrder.compute_balance_due,
+                columns['order_amount_net'], columns['paid_amount_net'],
+                columns['delivery_cost'], columns['price_type']),
+            columns['balance_due'],
+        )
+    ]
+
+    splits = [
+        BaselinkerReportOrder.compute_production_split(status, status_id, volume, value)
+        if status else previous
+        for status, status_id, volume, value, previous in zip(
+            columns['current_status'], columns['baselinker_status_id'],
+            columns['total_volume'], columns['value_net'],
+            zip(columns['production_volume'], columns['production_value_net'],
+                columns['ready_pickup_volume'], columns['ready_pickup_value_net']),
+        )
+    ]
+    production_volume, production_value_net, ready_pickup_volume, ready_pickup_value_net = (
+        list(column) for column in zip(*splits)
+    ) if splits else ([], [], [], [])
+
+    return {
+        'balance_due': balance_due,
+        'production_volume': production_volume,
+        'production_value_net': production_value_net,
+        'ready_pickup_volume': ready_pickup_volume,
+        'ready_pickup_value_net': ready_pickup_value_net,
+    }
+
+
+class ReportStatusUpsert:
+    """
+    Zbiera zmiany statusu / płatności / dostawy zamówień i zapisuje je porcjami
+
+    Args:
+        batch_size: Zamówień w porcji; add() zapisuje porcję po jej zapełnieniu
+        commit: Commit po każdej porcji (False - commit należy do wywołującego)
+        auto_flush: False - add() nigdy nie zapisuje sam, porcje wyznacza
+            wywołujący przez flush() (liczniki i błędy trafiają do jego porcji)
+    """
+
+    def __init__(self, batch_size: Optional[int] = None, commit: bool = True,
+                 auto_flush: bool = True):
+        self.batch_size = max(1, int(
+            batch_size or current_app.config.get('REPORTS_STATUS_UPSERT_BATCH_SIZE', STATUS_UPSERT_BATCH_SIZE)
+        ))
+        self.commit = commit
+        self.auto_flush = auto_flush
+        self.table = BaselinkerReportOrder.__table__
+        self._pending: Dict[int, Dict[str, Any]] = {}
+        self.stats = {
+            'orders_checked': 0,
+            'orders_updated': 0,
+            'records_checked': 0,
+            'records_updated': 0,
+            'statements': 0,
+        }
+
+    def add(self, order_id: int, price_type_if_empty: Optional[str] = None, **fields):
+        """
+        Zmiany jednego zamówienia (wszystkie jego rekordy)
+
+        Args:
+            order_id: baselinker_order_id
+            price_type_if_empty: Typ ceny ustawiany tylko rekordom bez typu
+            **fields: Pola z ORDER_FIELDS
+        """
+        unknown = set(fields) - set(ORDER_FIELDS)
+        if unknown:
+            raise ValueError(f"Nieobsługiwane pola: {', '.join(sorted(unknown))}")
+
+        changes = self._pending.setdefault(order_id, {})
+        changes.update(fields)
+        if price_type_if_empty:
+            changes['_price_type_if_empty'] = price_type_if_empty
+
+        if self.auto_flush and len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def __len__(self):
+        return len(self._pending)
+
+    def flush(self) -> int:
+        """Zapisuje zebrane zmiany; zwraca liczbę zaktualizowanych rekordów"""
+        if not self._pending:
+            return 0
+        pending, self._pending = self._pending, {}
+
+        columns = self._load_columns(list(pending))
+        self.stats['orders_checked'] += len(pending)
+        self.stats['records_checked'] += len(columns['id'])
+        if not columns['id']:
+            return 0
+
+        original = {name: list(columns[name]) for name in WRITE_FIELDS}
+        self._apply_changes(columns, pending)
+        columns.update(compute_derived_columns(columns))
+
+        changed_rows = [
+            index for index in range(len(columns['id']))
+            if any(_comparable(columns[name][index]) != _comparable(original[name][index])
+                   for name in WRITE_FIELDS)
+        ]
+        if changed_rows:
+            self._write(columns, original, changed_rows)
+            mark_days_changed(db.session, (columns['date_created'][index] for index in changed_rows))
+
+        if self.commit:
+            db.session.commit()
+
+        updated_orders = {columns['baselinker_order_id'][index] for index in changed_rows}
+        self.stats['orders_updated'] += len(updated_orders)
+        self.stats['records_updated'] += len(changed_rows)
+        return len(changed_rows)
+
+    def finish(self) -> Dict[str, int]:
+        """Zapisuje resztę zmian i zwraca statystyki"""
+        self.flush()
+        return dict(self.stats)
+
+    # ------------------------------------------------------------------
+
+    def _load_columns(self, order_ids: List[int]) -> Dict[str, List]:
+        columns: Dict[str, List] = {name: [] for name in _READ_FIELDS}
+        statement = (
+            select(*(self.table.c[name] for name in _READ_FIELDS))
+            .where(self.table.c.baselinker_order_id.in_(order_ids))
+        )
+        for row in db.session.execute(statement):
+            for name, value in zip(_READ_FIELDS, row):
+                columns[name].append(value)
+        self.stats['statements'] += 1
+        return columns
+
+    @staticmethod
+    def _apply_changes(columns: Dict[str, List], pending: Dict[int, Dict[str, Any]]):
+        """Rozgłasza zmiany zamówień na ich rekordy"""
+        for index, order_id in enumerate(columns['baselinker_order_id']):
+            changes = pending[order_id]
+            for name, value in changes.items():
+                if name == '_price_type_if_empty':
+                    if not columns['price_type'][index]:
+                        columns['price_type'][index] = value
+                else:
+                    columns[name][index] = value
+
+    def _write(self, columns: Dict[str, List], original: Dict[str, List], changed_rows: List[int]):
+        now = datetime.utcnow()
+        for start in range(0, len(changed_rows), ROWS_PER_STATEMENT):
+            chunk = changed_rows[start:start + ROWS_PER_STATEMENT]
+            ids = [columns['id'][index] for index in chunk]
+            values = {'updated_at': now}
+            for name in WRITE_FIELDS:
+                if all(_comparable(columns[name][index]) == _comparable(original[name][index])
+                       for index in chunk):
+                    continue
+                values[name] = case(
+                    {columns['id'][index]: columns[name][index] for index in chunk},
+                    value=self.table.c.id,
+                    else_=self.table.c[name],
+                )
+            db.session.execute(update(self.table).where(self.table.c.id.in_(ids)).values(values))
+            self.stats['statements'] += 1
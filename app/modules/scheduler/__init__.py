@@ -0,0 +1,33 @@
+# app/modules/scheduler/__init__.py
+"""
+Moduł Scheduler - zadania okresowe
+==================================
+
+Harmonogram synchronizacji (dotychczas wywołania endpointów CRON przez curl)
+wykonywany w osobnym procesie scheduler_daemon.py.
+
+Features:
+- Wyzwalacze interwałowe i cron (IntervalTrigger, CronTrigger)
+- Lease w bazie - przy kilku instancjach daemona zadanie wykonuje jedna
+- Jitter i obsługa spóźnionych terminów (misfire)
+- Metryki i historia uruchomień (scheduler_jobs, scheduler_job_runs)
+"""
+
+from .models import SchedulerJobRun, SchedulerJobState
+from .triggers import CronTrigger, IntervalTrigger
+from .scheduler_service import (
+    BASELINKER_QUEUE_DRAIN_JOB,
+    PAID_ORDERS_SYNC_JOB,
+    REPORTS_STATUS_SYNC_JOB,
+    REPRICING_QUEUE_JOB,
+    get_job_runs,
+    get_job_states,
+    register_scheduler_cli,
+    request_job_run,
+)
+
+__all__ = [
+    'SchedulerJobRun', 'SchedulerJobState', 'CronTrigger', 'IntervalTrigger',
+    'BASELINKER_QUEUE_DRAIN_JOB', 'PAID_ORDERS_SYNC_JOB', 'REPORTS_STATUS_SYNC_JOB', 'REPRICING_QUEUE_JOB',
+    'get_job_runs', 'get_job_states', 'register_scheduler_cli', 'request_job_run',
+]
@@ -0,0 +1,102 @@
+# app/modules/scheduler/models.py
+"""
+Modele schedulera zadań okresowych
+
+Modele:
+- SchedulerJobState: stan zadania (następne uruchomienie, lease, metryki)
+- SchedulerJobRun: historia uruchomień (czas trwania, wynik, błąd)
+"""
+
+from extensions import db
+
+
+class SchedulerJobState(db.Model):
+    """
+    Stan zadania okresowego - jeden wiersz na zadanie
+
+    lease_owner / lease_expires_at: instancja daemona, która wykonuje zadanie;
+    inna instancja może je przejąć dopiero po wygaśnięciu lease.
+    seen_at: ostatni sygnał daemona, który ma to zadanie w rejestrze.
+    """
+    __tablename__ = 'scheduler_jobs'
+
+    job_id = db.Column(db.String(100), primary_key=True)
+    trigger_desc = db.Column(db.String(200))
+    next_run_at = db.Column(db.DateTime)
+    run_requested_at = db.Column(db.DateTime)
+
+    lease_owner = db.Column(db.String(100))
+    lease_expires_at = db.Column(db.DateTime)
+    seen_at = db.Column(db.DateTime)
+
+    last_started_at = db.Column(db.DateTime)
+    last_finished_at = db.Column(db.DateTime)
+    last_status = db.Column(db.String(20))
+    last_error = db.Column(db.Text)
+    last_duration_ms = db.Column(db.Integer)
+
+    runs_count = db.Column(db.Integer, nullable=False, default=0)
+    failures_count = db.Column(db.Integer, nullable=False, default=0)
+    misfires_count = db.Column(db.Integer, nullable=False, default=0)
+    total_duration_ms = db.Column(db.BigInteger, nullable=False, default=0)
+    max_duration_ms = db.Column(db.Integer, nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            'job_id': self.job_id,
+            'trigger': self.trigger_desc,
+            'next_run_at': self.next_run_at.isoformat() if self.next_run_at else None,
+            'run_requested_at': self.run_requested_at.isoformat() if self.run_requested_at else None,
+            'lease_owner': self.lease_owner,
+            'lease_expires_at': self.lease_expires_at.isoformat() if self.lease_expires_at else None,
+            'seen_at': self.seen_at.isoformat() if self.seen_at else None,
+            'last_started_at': self.last_started_at.isoformat() if self.last_started_at else None,
+            'last_finished_at': self.last_finished_at.isoformat() if self.last_finished_at else None,
+            'last_status': self.last_status,
+            'last_error': self.last_error,
+            'last_duration_ms': self.last_duration_ms,
+            'runs_count': self.runs_count or 0,
+            'failures_count': self.failures_count or 0,
+            'misfires_count': self.misfires_count or 0,
+            'avg_duration_ms': (round((self.total_duration_ms or 0) / self.runs_count)
+                                if self.runs_count else None),
+            'max_duration_ms': self.max_duration_ms or 0,
+        }
+
+
+class SchedulerJobRun(db.Model):
+    """Pojedyncze uruchomienie (lub pominięcie) zadania"""
+    __tablename__ = 'scheduler_job_runs'
+
+    STATUS_SUCCESS = 'success'
+    STATUS_ERROR = 'error'
+    STATUS_MISFIRE = 'misfire'
+
+    id = db.Column(db.Integer, primary_key=True)
+    job_id = db.Column(db.String(100), nullable=False)
+    owner = db.Column(db.String(100))
+    scheduled_for = db.Column(db.DateTime)
+    started_at = db.Column(db.DateTime, nullable=False)
+    finished_at = db.Column(db.DateTime)
+    duration_ms = db.Column(db.Integer)
+    status = db.Column(db.String(20), nullable=False)
+    error = db.Column(db.Text)
+    summary = db.Column(db.JSON)
+
+    __table_args__ = (
+        db.Index('ix_scheduler_job_runs_job_started', 'job_id', 'started_at'),
+    )
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'job_id': self.job_id,
+            'owner': self.owner,
+            'scheduled_for': self.scheduled_for.isoformat() if self.scheduled_for else None,
+            'started_at': self.started_at.isoformat() if self.started_at else None,
+            'finished_at': self.finished_at.isoformat() if self.finished_at else None,
+            'duration_ms': self.duration_ms,
+            'status': self.status,
+            'error': self.error,
+            'summary': self.summary,
+        }
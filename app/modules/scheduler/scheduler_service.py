@@ -0,0 +1,599 @@
+# app/modules/scheduler/scheduler_service.py
+"""
+Scheduler zadań okresowych
+==========================
+
+Działa wyłącznie w procesie scheduler_daemon.py - procesy aplikacji webowej
+(Passenger) nie wykonują zadań okresowych, a endpointy CRON jedynie zlecają
+uruchomienie (request_job_run), gdy daemon żyje.
+
+- rejestr zadań: scheduler.add_job(job_id, func, IntervalTrigger/CronTrigger),
+- stan zadań w tabeli scheduler_jobs; przed uruchomieniem daemon przejmuje
+  lease warunkowym UPDATE - przy kilku instancjach daemona zadanie wykona
+  tylko jedna, a lease wygasa sam, gdy proces zginie,
+- jitter: losowe opóźnienie kolejnego terminu (rozkłada start zadań
+  z kilku środowisk / tego samego harmonogramu),
+- misfire: termin spóźniony ponad misfire_grace_time (daemon nie działał,
+  poprzednie uruchomienie trwało za długo) jest pomijany i odnotowany,
+  a zaległe terminy łączone są w jeden następny,
+- metryki: liczniki uruchomień/błędów/pominięć, czasy trwania oraz historia
+  w tabeli scheduler_job_runs (ograniczona do RUN_HISTORY_PER_JOB wpisów).
+"""
+
+import os
+import random
+import socket
+import sys
+import threading
+import time
+import traceback
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, List, Optional
+
+import pytz
+from sqlalchemy import and_, case, insert, or_, update
+
+from extensions import db
+from lazy_tables import LazyTables
+from modules.logging import get_structured_logger
+from .models import SchedulerJobRun, SchedulerJobState
+from .triggers import CronTrigger, IntervalTrigger
+
+logger = get_structured_logger('scheduler.service')
+
+# Co ile sekund pętla schedulera sprawdza terminy
+TICK_SECONDS = 5
+
+# Co ile sekund daemon odświeża seen_at i lease trwających zadań
+HEARTBEAT_SECONDS = 30
+
+# Lease bez odświeżenia dłużej niż to może przejąć inna instancja
+LEASE_SECONDS = 120
+
+# Daemon uznawany za aktywny, jeśli odświeżył seen_at w tym czasie
+DAEMON_ALIVE_SECONDS = 3 * HEARTBEAT_SECONDS
+
+DEFAULT_MISFIRE_GRACE_SECONDS = 300
+
+RUN_HISTORY_PER_JOB = 200
+MAX_ERROR_LENGTH = 4000
+MAX_SUMMARY_VALUE_LENGTH = 200
+
+# Identyfikatory zadań domyślnych (używane też przez endpointy CRON)
+PAID_ORDERS_SYNC_JOB = 'production.paid_orders_sync'
+REPORTS_STATUS_SYNC_JOB = 'reports.status_sync'
+BASELINKER_QUEUE_DRAIN_JOB = 'production.baselinker_queue_drain'
+REPRICING_QUEUE_JOB = 'calculator.repricing_queue'
+_TABLES = LazyTables(SchedulerJobState, SchedulerJobRun)
+
+
+def _local_now() -> datetime:
+    """Czas lokalny (Europe/Warsaw) bez strefy - jak get_local_now() w production"""
+    return datetime.now(pytz.timezone('Europe/Warsaw')).replace(tzinfo=None)
+
+
+def _summarize_result(result: Any) -> Optional[Dict[str, Any]]:
+    """Skrót wyniku zadania do historii - tylko wartości proste"""
+    if not isinstance(result, dict):
+        return None
+    summary = {}
+    for key, value in result.items():
+        if isinstance(value, str):
+            summary[key] = value[:MAX_SUMMARY_VALUE_LENGTH]
+        elif value is None or isinstance(value, (bool, int, float)):
+            summary[key] = value
+    return summary
+
+
+class ScheduledJob:
+    """Zadanie zarejestrowane w schedulerze"""
+
+    def __init__(self, job_id: str, func: Callable[[], Any], trigger, title: Optional[str] = None,
+                 jitter: int = 0, misfire_grace_time: int = DEFAULT_MISFIRE_GRACE_SECONDS):
+        self.id = job_id
+        self.func = func
+        self.trigger = trigger
+        self.title = title or job_id
+        self.jitter = max(0, int(jitter))
+        self.misfire_grace_time = max(0, int(misfire_grace_time))
+
+    def next_run_after(self, now: datetime, previous: Optional[datetime] = None) -> datetime:
+        next_run = self.trigger.next_fire(now, previous)
+        if self.jitter:
+            next_run += timedelta(seconds=random.uniform(0, self.jitter))
+        # Pełne sekundy (DATETIME w MySQL) - zaokrąglenie w górę, żeby termin nie wypadł przed `now`
+        if next_run.microsecond:
+            next_run = next_run.replace(microsecond=0) + timedelta(seconds=1)
+        return next_run
+
+    def __repr__(self):
+        return f'<ScheduledJob {self.id} {self.trigger.describe()}>'
+
+
+class Scheduler:
+    """Pętla schedulera z lease w bazie - jedna instancja na proces daemona"""
+
+    def __init__(self):
+        self._jobs: Dict[str, ScheduledJob] = {}
+        self._app = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._running_ids = set()
+        self._running_lock = threading.Lock()
+        self._last_heartbeat = 0.0
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    # ------------------------------------------------------------------
+    # Rejestr
+    # ------------------------------------------------------------------
+
+    def add_job(self, job_id: str, func: Callable[[], Any], trigger, title: Optional[str] = None,
+                jitter: int = 0, misfire_grace_time: int = DEFAULT_MISFIRE_GRACE_SECONDS) -> ScheduledJob:
+        """Rejestruje (lub zastępuje) zadanie okresowe"""
+        job = ScheduledJob(job_id, func, trigger, title=title, jitter=jitter,
+                           misfire_grace_time=misfire_grace_time)
+        self._jobs[job_id] = job
+        return job
+
+    def remove_job(self, job_id: str):
+        self._jobs.pop(job_id, None)
+
+    def get_jobs(self) -> List[ScheduledJob]:
+        return list(self._jobs.values())
+
+    def get_job(self, job_id: str) -> Optional[ScheduledJob]:
+        return self._jobs.get(job_id)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive() and not self._stop_event.is_set()
+
+    # ------------------------------------------------------------------
+    # Start / stop
+    # ------------------------------------------------------------------
+
+    def start(self, app):
+        """Uruchamia pętlę schedulera (ponowne wywołanie przy działającej pętli nic nie robi)"""
+        if self.running:
+            return
+
+        self._app = app
+        with app.app_context():
+            _TABLES.ensure()
+            self._sync_job_rows()
+
+        self._stop_event.clear()
+        # Domyślnie wątek na zadanie - długa synchronizacja nie blokuje krótkich zadań
+        workers = int(app.config.get('SCHEDULER_WORKERS', 0)) or len(self._jobs)
+        self._executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix='scheduler-job')
+        self._thread = threading.Thread(target=self._loop, name='scheduler-loop', daemon=True)
+        self._thread.start()
+
+        logger.info("Scheduler uruchomiony", owner=self.owner,
+                    jobs=[job.id for job in self.get_jobs()])
+
+    def shutdown(self, wait: bool = False):
+        """Zatrzymuje pętlę i zwalnia lease zadań, których nikt w tym procesie nie wykonuje"""
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=TICK_SECONDS * 2)
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+        if self._app is not None:
+            try:
+                with self._app.app_context():
+                    with self._running_lock:
+                        busy = list(self._running_ids)
+                    table = SchedulerJobState.__table__
+                    condition = table.c.lease_owner == self.owner
+                    if busy:
+                        condition = and_(condition, table.c.job_id.notin_(busy))
+                    with db.engine.begin() as conn:
+                        conn.execute(update(table).where(condition)
+                                     .values(lease_owner=None, lease_expires_at=None))
+            except Exception as e:
+                print(f"[Scheduler] Błąd zwalniania lease: {e}", file=sys.stderr)
+
+        logger.info("Scheduler zatrzymany", owner=self.owner)
+
+    def _sync_job_rows(self):
+        """Zakłada wiersze stanu dla nowych zadań; zmiana wyzwalacza przelicza termin"""
+        now = _local_now()
+        table = SchedulerJobState.__table__
+        states = {state.job_id: state for state in
+                  SchedulerJobState.query.filter(SchedulerJobState.job_id.in_(list(self._jobs))).all()}
+
+        with db.engine.begin() as conn:
+            for job in self.get_jobs():
+                description = job.trigger.describe()
+                state = states.get(job.id)
+                if state is None:
+                    conn.execute(insert(table).values(
+                        job_id=job.id,
+                        trigger_desc=description,
+                        next_run_at=job.next_run_after(now),
+                        seen_at=now,
+                        runs_count=0,
+                        failures_count=0,
+                        misfires_count=0,
+                        total_duration_ms=0,
+                        max_duration_ms=0
+                    ))
+                elif state.trigger_desc != description or state.next_run_at is None:
+                    conn.execute(update(table).where(table.c.job_id == job.id).values(
+                        trigger_desc=description,
+                        next_run_at=job.next_run_after(now),
+                        seen_at=now
+                    ))
+        db.session.remove()
+
+    # ------------------------------------------------------------------
+    # Pętla
+    # ------------------------------------------------------------------
+
+    def _loop(self):
+        while not self._stop_event.is_set():
+            try:
+                with self._app.app_context():
+                    try:
+                        self._tick()
+                    finally:
+                        db.session.remove()
+            except Exception as e:
+                print(f"[Scheduler] Błąd pętli schedulera: {e}", file=sys.stderr)
+            self._stop_event.wait(TICK_SECONDS)
+
+    def _heartbeat(self, now: datetime):
+        """seen_at dla zadań z rejestru + odnowienie lease trwających zadań"""
+        table = SchedulerJobState.__table__
+        with self._running_lock:
+            busy = list(self._running_ids)
+        with db.engine.begin() as conn:
+            conn.execute(update(table).where(table.c.job_id.in_(list(self._jobs)))
+                         .values(seen_at=now))
+            if busy:
+                conn.execute(update(table)
+                             .where(table.c.job_id.in_(busy), table.c.lease_owner == self.owner)
+                             .values(lease_expires_at=now + timedelta(seconds=LEASE_SECONDS)))
+
+    def _tick(self):
+        now = _local_now()
+        if time.monotonic() - self._last_heartbeat >= HEARTBEAT_SECONDS:
+            self._heartbeat(now)
+            self._last_heartbeat = time.monotonic()
+
+        with self._running_lock:
+            busy = set(self._running_ids)
+
+        states = SchedulerJobState.query.filter(
+            SchedulerJobState.job_id.in_([job_id for job_id in self._jobs if job_id not in busy])
+        ).all()
+
+        for state in states:
+            if self._stop_event.is_set():
+                break
+            requested = state.run_requested_at is not None
+            due = state.next_run_at is not None and state.next_run_at <= now
+            if not (due or requested):
+                continue
+            if state.lease_owner and state.lease_expires_at and state.lease_expires_at > now:
+                continue
+            self._dispatch(self._jobs[state.job_id], state, now, requested)
+
+    def _claim(self, job: ScheduledJob, state: SchedulerJobState, now: datetime) -> bool:
+        """
+        Przejęcie lease warunkowym UPDATE - warunek na next_run_at gwarantuje,
+        że termin obsłużony już przez inną instancję nie zostanie powtórzony
+        """
+        table = SchedulerJobState.__table__
+        next_run_condition = (table.c.next_run_at.is_(None) if state.next_run_at is None
+                              else table.c.next_run_at == state.next_run_at)
+        with db.engine.begin() as conn:
+            result = conn.execute(update(table).where(
+                table.c.job_id == job.id,
+                next_run_condition,
+                or_(table.c.lease_owner.is_(None), table.c.lease_expires_at.is_(None),
+                    table.c.lease_expires_at <= now)
+            ).values(
+                lease_owner=self.owner,
+                lease_expires_at=now + timedelta(seconds=LEASE_SECONDS)
+            ))
+        return result.rowcount == 1
+
+    def _dispatch(self, job: ScheduledJob, state: SchedulerJobState, now: datetime, requested: bool):
+        if not self._claim(job, state, now):
+            return
+
+        scheduled_for = state.next_run_at
+        table = SchedulerJobState.__table__
+
+        if scheduled_for is not None and scheduled_for <= now:
+            next_run_at = job.next_run_after(now, previous=scheduled_for)
+        else:
+            # Uruchomienie na żądanie nie przesuwa harmonogramu
+            next_run_at = scheduled_for or job.next_run_after(now)
+
+        late_seconds = (now - scheduled_for).total_seconds() if scheduled_for else 0
+        if not requested and late_seconds > job.misfire_grace_time:
+            self._record_misfire(job, scheduled_for, next_run_at, now, late_seconds)
+            return
+
+        with db.engine.begin() as conn:
+            conn.execute(update(table).where(table.c.job_id == job.id).values(
+                next_run_at=next_run_at,
+                run_requested_at=None,
+                last_started_at=now
+            ))
+
+        with self._running_lock:
+            self._running_ids.add(job.id)
+        try:
+            self._executor.submit(self._run_job, job, scheduled_for if not requested else now)
+        except RuntimeError:
+            # Executor zamknięty (shutdown w trakcie ticka) - zwolnij lease
+            with self._running_lock:
+                self._running_ids.discard(job.id)
+            self._release(job.id)
+
+    def _record_misfire(self, job: ScheduledJob, scheduled_for: datetime, next_run_at: datetime,
+                        now: datetime, late_seconds: float):
+        table = SchedulerJobState.__table__
+        with db.engine.begin() as conn:
+            conn.execute(insert(SchedulerJobRun.__table__).values(
+                job_id=job.id,
+                owner=self.owner,
+                scheduled_for=scheduled_for,
+                started_at=now,
+                finished_at=now,
+                duration_ms=0,
+                status=SchedulerJobRun.STATUS_MISFIRE,
+                error=f"Spóźnienie {int(late_seconds)} s > {job.misfire_grace_time} s"
+            ))
+            conn.execute(update(table).where(table.c.job_id == job.id).values(
+                next_run_at=next_run_at,
+                misfires_count=table.c.misfires_count + 1,
+                lease_owner=None,
+                lease_expires_at=None
+            ))
+
+        logger.warning("Pominięto spóźnione uruchomienie zadania", job_id=job.id,
+                       scheduled_for=scheduled_for.isoformat(), late_seconds=int(late_seconds),
+                       next_run_at=next_run_at.isoformat())
+
+    def _release(self, job_id: str):
+        table = SchedulerJobState.__table__
+        with db.engine.begin() as conn:
+            conn.execute(update(table)
+                         .where(table.c.job_id == job_id, table.c.lease_owner == self.owner)
+                         .values(lease_owner=None, lease_expires_at=None))
+
+    # ------------------------------------------------------------------
+    # Wykonanie
+    # ------------------------------------------------------------------
+
+    def _run_job(self, job: ScheduledJob, scheduled_for: Optional[datetime]):
+        started_at = _local_now()
+        started = time.monotonic()
+        status = SchedulerJobRun.STATUS_SUCCESS
+        error = None
+        summary = None
+
+        logger.info("Start zadania okresowego", job_id=job.id, owner=self.owner)
+
+        try:
+            with self._app.app_context():
+                try:
+                    result = job.func()
+                    summary = _summarize_result(result)
+                    # Serwisy synchronizacji zgłaszają błąd wynikiem, nie wyjątkiem
+                    if isinstance(result, dict) and result.get('success') is False:
+                        status = SchedulerJobRun.STATUS_ERROR
+                        error = str(result.get('error') or result.get('message') or 'success=False')
+                except Exception as e:
+                    db.session.rollback()
+                    status = SchedulerJobRun.STATUS_ERROR
+                    error = f"{type(e).__name__}: {e}\n{traceback.format_exc()}"
+                finally:
+                    db.session.remove()
+
+                duration_ms = int((time.monotonic() - started) * 1000)
+                self._record_run(job, scheduled_for, started_at, duration_ms, status, error, summary)
+        except Exception as e:
+            print(f"[Scheduler] Błąd zapisu wyniku zadania {job.id}: {e}", file=sys.stderr)
+        finally:
+            with self._running_lock:
+                self._running_ids.discard(job.id)
+
+        log = logger.info if status == SchedulerJobRun.STATUS_SUCCESS else logger.error
+        log("Koniec zadania okresowego", job_id=job.id, status=status,
+            duration_ms=int((time.monotonic() - started) * 1000),
+            error=error[:500] if error else None)
+
+    def _record_run(self, job: ScheduledJob, scheduled_for: Optional[datetime], started_at: datetime,
+                    duration_ms: int, status: str, error: Optional[str], summary: Optional[Dict]):
+        table = SchedulerJobState.__table__
+        runs = SchedulerJobRun.__table__
+        finished_at = _local_now()
+        failed = status != SchedulerJobRun.STATUS_SUCCESS
+        error = error[:MAX_ERROR_LENGTH] if error else None
+
+        with db.engine.begin() as conn:
+            conn.execute(insert(runs).values(
+                job_id=job.id,
+                owner=self.owner,
+                scheduled_for=scheduled_for,
+                started_at=started_at,
+                finished_at=finished_at,
+                duration_ms=duration_ms,
+                status=status,
+                error=error,
+                summary=summary
+            ))
+            conn.execute(update(table).where(table.c.job_id == job.id).values(
+                last_finished_at=finished_at,
+                last_status=status,
+                last_error=error,
+                last_duration_ms=duration_ms,
+                runs_count=table.c.runs_count + 1,
+                failures_count=table.c.failures_count + (1 if failed else 0),
+                total_duration_ms=table.c.total_duration_ms + duration_ms,
+                max_duration_ms=case((table.c.max_duration_ms < duration_ms, duration_ms),
+                                     else_=table.c.max_duration_ms),
+                lease_owner=None,
+                lease_expires_at=None
+            ))
+
+            # Historia ograniczona do ostatnich RUN_HISTORY_PER_JOB wpisów
+            threshold = conn.execute(
+                runs.select().with_only_columns(runs.c.id)
+                .where(runs.c.job_id == job.id)
+                .order_by(runs.c.id.desc())
+                .offset(RUN_HISTORY_PER_JOB).limit(1)
+            ).scalar()
+            if threshold is not None:
+                conn.execute(runs.delete().where(runs.c.job_id == job.id, runs.c.id <= threshold))
+
+    # ------------------------------------------------------------------
+    # Podgląd
+    # ------------------------------------------------------------------
+
+    def get_job_stats(self) -> List[Dict[str, Any]]:
+        """Stan i metryki zadań (wymaga kontekstu aplikacji)"""
+        return get_job_states()
+
+
+# ============================================================================
+# API DLA PROCESÓW WEBOWYCH (bez uruchamiania schedulera)
+# ============================================================================
+
+def get_job_states() -> List[Dict[str, Any]]:
+    """Stan i metryki wszystkich zadań zapisanych przez daemon"""
+    _TABLES.ensure()
+    now = _local_now()
+    states = []
+    for state in SchedulerJobState.query.order_by(SchedulerJobState.job_id).all():
+        data = state.to_dict()
+        data['daemon_alive'] = bool(state.seen_at and
+                                    (now - state.seen_at).total_seconds() <= DAEMON_ALIVE_SECONDS)
+        states.append(data)
+    return states
+
+
+def get_job_runs(job_id: str, limit: int = 20) -> List[Dict[str, Any]]:
+    _TABLES.ensure()
+    runs = (SchedulerJobRun.query.filter_by(job_id=job_id)
+            .order_by(SchedulerJobRun.id.desc()).limit(limit).all())
+    return [run.to_dict() for run in runs]
+
+
+def request_job_run(job_id: str) -> bool:
+    """
+    Zleca daemonowi uruchomienie zadania przy najbliższym ticku
+
+    Returns:
+        True, gdy daemon z tym zadaniem działa (zlecenie przyjęte);
+        False - wywołujący powinien wykonać pracę sam
+    """
+    try:
+        _TABLES.ensure()
+        now = _local_now()
+        table = SchedulerJobState.__table__
+        with db.engine.begin() as conn:
+            result = conn.execute(update(table).where(
+                table.c.job_id == job_id,
+                table.c.seen_at >= now - timedelta(seconds=DAEMON_ALIVE_SECONDS)
+            ).values(run_requested_at=now))
+        return result.rowcount == 1
+    except Exception as e:
+        print(f"[Scheduler] Błąd zlecenia zadania {job_id}: {e}", file=sys.stderr)
+        return False
+
+
+# ============================================================================
+# ZADANIA DOMYŚLNE
+# ============================================================================
+
+def _sync_paid_orders():
+    from modules.production.services.sync_service import get_sync_service
+    return get_sync_service().sync_paid_orders_only()
+
+
+def _sync_report_statuses():
+    from modules.reports.routers import run_cron_status_sync
+    return run_cron_status_sync()
+
+
+def _drain_baselinker_queue():
+    from modules.production.services.baselinker_queue import get_command_queue
+    return get_command_queue().drain()
+
+
+def _run_queued_repricing():
+    from modules.calculator.repricing import run_queued_repricing_jobs
+    return run_queued_repricing_jobs()
+
+
+def register_default_jobs(target: 'Scheduler', app):
+    """
+    Harmonogram systemu (dotychczas wywołania curl z crona)
+
+    SCHEDULER_DISABLED_JOBS w konfiguracji - lista identyfikatorów do pominięcia
+    """
+    disabled = set(app.config.get('SCHEDULER_DISABLED_JOBS', []) or [])
+
+    jobs = [
+        (PAID_ORDERS_SYNC_JOB, _sync_paid_orders, IntervalTrigger(hours=1),
+         'Synchronizacja opłaconych zamówień (produkcja)', 120, 15 * 60),
+        (REPORTS_STATUS_SYNC_JOB, _sync_report_statuses, CronTrigger('0 2,8,14,20 * * *'),
+         'Synchronizacja statusów zamówień (raporty)', 300, 60 * 60),
+        (BASELINKER_QUEUE_DRAIN_JOB, _drain_baselinker_queue, IntervalTrigger(minutes=1),
+         'Wysyłka kolejki komend Baselinker', 10, 60),
+        (REPRICING_QUEUE_JOB, _run_queued_repricing, IntervalTrigger(minutes=1),
+         'Przeliczenia wycen zlecone z API (pula procesów)', 10, 60),
+    ]
+    for job_id, func, trigger, title, jitter, grace in jobs:
+        if job_id in disabled:
+            target.remove_job(job_id)
+            continue
+        target.add_job(job_id, func, trigger, title=title, jitter=jitter, misfire_grace_time=grace)
+
+
+# Instancja procesu daemona
+scheduler = Scheduler()
+
+
+def init_scheduler(app):
+    """Rejestruje zadania domyślne i uruchamia scheduler (idempotentne)"""
+    register_default_jobs(scheduler, app)
+    scheduler.start(app)
+    return scheduler
+
+
+def shutdown_scheduler(wait: bool = False):
+    scheduler.shutdown(wait=wait)
+
+
+def register_scheduler_cli(app):
+    """Rejestruje komendę flask scheduler-status"""
+    import click
+    from flask.cli import with_appcontext
+
+    @app.cli.command('scheduler-status')
+    @click.option('--runs', default=0, help='Liczba ostatnich uruchomień do wyświetlenia na zadanie')
+    @with_appcontext
+    def scheduler_status_command(runs):
+        """Stan, metryki i historia zadań schedulera"""
+        for state in get_job_states():
+            print(f"{state['job_id']}: {state['trigger']} next={state['next_run_at']} "
+                  f"last={state['last_status']} ({state['last_duration_ms']} ms) "
+                  f"runs={state['runs_count']} failures={state['failures_count']} "
+                  f"misfires={state['misfires_count']} avg={state['avg_duration_ms']} ms "
+                  f"max={state['max_duration_ms']} ms daemon_alive={state['daemon_alive']} "
+                  f"lease={state['lease_owner']}")
+            for run in get_job_runs(state['job_id'], limit=runs) if runs else []:
+                print(f"    {run['started_at']} {run['status']} {run['duration_ms']} ms"
+                      + (f" - {run['error'].splitlines()[0]}" if run['error'] else ''))
@@ -0,0 +1,127 @@
+# app/modules/scheduler/triggers.py
+"""
+Wyzwalacze zadań okresowych
+
+- IntervalTrigger(minutes=15) - terminy na stałej siatce (co odstęp od
+  INTERVAL_ANCHOR), więc jitter schedulera nie przesuwa kolejnych terminów
+- CronTrigger('0 2,8,14,20 * * *') - składnia crona (minuta, godzina,
+  dzień miesiąca, miesiąc, dzień tygodnia; '*', listy, zakresy, kroki)
+
+Czas lokalny (Europe/Warsaw, naive) - jak get_local_now() w module production.
+"""
+
+from datetime import datetime, timedelta
+from typing import List, Optional, Set
+
+# Zakresy pól crona: (min, max)
+_CRON_FIELDS = (
+    ('minute', 0, 59),
+    ('hour', 0, 23),
+    ('day', 1, 31),
+    ('month', 1, 12),
+    ('day_of_week', 0, 7),
+)
+
+# Horyzont szukania następnego terminu (np. '0 0 29 2 *' - raz na 4 lata)
+MAX_SEARCH_DAYS = 366 * 5
+
+# Początek siatki terminów IntervalTrigger (odstęp 1 h -> pełne godziny)
+INTERVAL_ANCHOR = datetime(2000, 1, 1)
+
+
+class IntervalTrigger:
+    """Uruchomienie co stały odstęp czasu"""
+
+    def __init__(self, seconds: int = 0, minutes: int = 0, hours: int = 0, days: int = 0):
+        self.interval = timedelta(seconds=seconds, minutes=minutes, hours=hours, days=days)
+        if self.interval.total_seconds() <= 0:
+            raise ValueError("Odstęp IntervalTrigger musi być dodatni")
+
+    def next_fire(self, after: datetime, previous: Optional[datetime] = None) -> datetime:
+        """
+        Pierwszy termin siatki INTERVAL_ANCHOR + k × odstęp późniejszy niż `after`
+
+        Termin nie zależy od `previous` (przesuniętego o jitter) - opóźnienia
+        się nie kumulują, a zaległe terminy są łączone w jeden.
+        """
+        elapsed = after - INTERVAL_ANCHOR
+        return INTERVAL_ANCHOR + self.interval * (elapsed // self.interval + 1)
+
+    def describe(self) -> str:
+        return f"interval[{int(self.interval.total_seconds())}s]"
+
+
+def _parse_cron_field(expression: str, low: int, high: int, name: str) -> Set[int]:
+    values = set()
+    for part in expression.split(','):
+        step = 1
+        if '/' in part:
+            part, step_text = part.split('/', 1)
+            step = int(step_text)
+            if step <= 0:
+                raise ValueError(f"Nieprawidłowy krok w polu {name}: {expression}")
+
+        if part == '*':
+            start, end = low, high
+        elif '-' in part:
+            start_text, end_text = part.split('-', 1)
+            start, end = int(start_text), int(end_text)
+        else:
+            start = int(part)
+            end = high if step > 1 else start
+
+        if start < low or end > high or start > end:
+            raise ValueError(f"Wartość poza zakresem w polu {name}: {expression}")
+        values.update(range(start, end + 1, step))
+
+    if name == 'day_of_week':
+        # 7 = niedziela (jak 0)
+        values = {value % 7 for value in values}
+    return values
+
+
+class CronTrigger:
+    """Uruchomienie wg wyrażenia crona (5 pól)"""
+
+    def __init__(self, expression: str):
+        parts = expression.split()
+        if len(parts) != 5:
+            raise ValueError(f"Wyrażenie crona musi mieć 5 pól: '{expression}'")
+        self.expression = expression
+        parsed = [_parse_cron_field(part, low, high, name)
+                  for part, (name, low, high) in zip(parts, _CRON_FIELDS)]
+        self.minutes, self.hours, self.days, self.months, self.days_of_week = parsed
+        self._minutes_sorted: List[int] = sorted(self.minutes)
+        self._hours_sorted: List[int] = sorted(self.hours)
+        # Reguła crona: gdy oba pola dnia są ograniczone - wystarczy zgodność jednego
+        self._day_restricted = parts[2] != '*'
+        self._dow_restricted = parts[4] != '*'
+
+    def _day_matches(self, day: datetime) -> bool:
+        if day.month not in self.months:
+            return False
+        dom_ok = day.day in self.days
+        dow_ok = (day.weekday() + 1) % 7 in self.days_of_week
+        if self._day_restricted and self._dow_restricted:
+            return dom_ok or dow_ok
+        return dom_ok and dow_ok
+
+    def next_fire(self, after: datetime, previous: Optional[datetime] = None) -> datetime:
+        """Pierwszy termin zgodny z wyrażeniem, późniejszy niż `after`"""
+        start = after.replace(second=0, microsecond=0) + timedelta(minutes=1)
+        day = start.replace(hour=0, minute=0)
+        for _ in range(MAX_SEARCH_DAYS):
+            if self._day_matches(day):
+                same_day = day.date() == start.date()
+                for hour in self._hours_sorted:
+                    if same_day and hour < start.hour:
+                        continue
+                    for minute in self._minutes_sorted:
+                        if same_day and hour == start.hour and minute < start.minute:
+                            continue
+                        return day.replace(hour=hour, minute=minute)
+            day += timedelta(days=1)
+        raise ValueError(f"Brak terminu dla wyrażenia crona '{self.expression}'")
+
+    def describe(self) -> str:
+        return f"cron[{self.expression}]"
@@ -0,0 +1,364 @@
+# query_profiler.py
+"""
+Profiler zapytań SQL per request
+================================
+
+Instrumentacja SQLAlchemy (zdarzenia before/after_cursor_execute) zliczająca
+dla każdego żądania:
+- liczbę zapytań i łączny czas bazy danych,
+- "odciski" zapytań (SQL z literałami zastąpionymi '?', listy IN zwinięte),
+  dzięki czemu wzorce N+1 widać jako ten sam odcisk powtórzony N razy.
+
+Wyniki:
+- nagłówki odpowiedzi X-DB-Query-Count / X-DB-Time-Ms / X-DB-Repeated
+  oraz Server-Timing (widoczne w DevTools) - domyślnie tylko w trybie debug
+  i dla zalogowanych adminów,
+- agregaty per endpoint (w pamięci procesu) pod /api/admin/query-profile
+  (tylko admin; DELETE resetuje statystyki),
+- budżet zapytań per endpoint: config QUERY_BUDGETS = {"endpoint": limit}
+  lub dekorator @query_budget(limit) (endpointy list i wyszukiwarek, w których
+  usunięto N+1). Przekroczenie jest logowane, a przy QUERY_BUDGET_STRICT =
+  true (testy) zgłasza QueryBudgetExceeded.
+
+Poza requestem (testy, skrypty) działa context manager profile_queries()
+oraz assert_max_queries(n).
+"""
+
+import contextvars
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+
+from flask import g, jsonify, request, session
+from flask_login import current_user
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# Powtórzenia tego samego odcisku w jednym żądaniu uznawane za N+1
+DEFAULT_NPLUS1_THRESHOLD = 5
+
+# Ile odcisków (najczęstszych) przechowywać per endpoint w raporcie
+TOP_FINGERPRINTS = 10
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER_LIST = re.compile(r"\((?:\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*,)+\s*(?:\?|%s|%\(\w+\)s|:\w+)\s*\)")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|:\w+\b")
+_WHITESPACE = re.compile(r"\s+")
+
+_active_profile = contextvars.ContextVar('query_profile', default=None)
+_listeners_installed = False
+_listeners_lock = threading.Lock()
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Przekroczony budżet zapytań (tryb strict / assert_max_queries)"""
+
+
+def fingerprint_statement(statement):
+    """Normalizuje SQL: literały i parametry -> '?', listy IN -> (?), białe znaki"""
+    fingerprint = _STRING_LITERAL.sub('?', statement)
+    fingerprint = _NUMBER_LITERAL.sub('?', fingerprint)
+    fingerprint = _PLACEHOLDER.sub('?', fingerprint)
+    fingerprint = _PLACEHOLDER_LIST.sub('(?)', fingerprint)
+    return _WHITESPACE.sub(' ', fingerprint).strip()
+
+
+class QueryProfile:
+    """Statystyki zapytań jednego żądania (lub bloku profile_queries)"""
+
+    __slots__ = ('count', 'total_time', 'fingerprints', 'fingerprint_time')
+
+    def __init__(self):
+        self.count = 0
+        self.total_time = 0.0
+        self.fingerprints = Counter()
+        self.fingerprint_time = defaultdict(float)
+
+    def record(self, statement, duration):
+        fingerprint = fingerprint_statement(statement)
+        self.count += 1
+        self.total_time += duration
+        self.fingerprints[fingerprint] += 1
+        self.fingerprint_time[fingerprint] += duration
+
+    def repeated(self, threshold=DEFAULT_NPLUS1_THRESHOLD):
+        """Odciski powtórzone co najmniej threshold razy (kandydaci N+1)"""
+        return [
+            (fingerprint, count)
+            for fingerprint, count in self.fingerprints.most_common()
+            if count >= threshold
+        ]
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if _active_profile.get() is not None:
+        conn.info.setdefault('query_profiler_start', []).append(time.perf_counter())
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    profile = _active_profile.get()
+    if profile is None:
+        return
+    starts = conn.info.get('query_profiler_start')
+    if not starts:
+        return
+    profile.record(statement, time.perf_counter() - starts.pop())
+
+
+def install_listeners():
+    """Podpina zdarzenia na klasie Engine (raz na proces, wszystkie silniki)"""
+    global _listeners_installed
+
+    if _listeners_installed:
+        return
+    with _listeners_lock:
+        if not _listeners_installed:
+            event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+            event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+            _listeners_installed = True
+
+
+@contextmanager
+def profile_queries():
+    """Profiluje zapytania w bloku - zwraca QueryProfile"""
+    install_listeners()
+    profile = QueryProfile()
+    token = _active_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _active_profile.reset(token)
+
+
+@contextmanager
+def assert_max_queries(limit):
+    """Dla testów: zgłasza QueryBudgetExceeded, gdy blok wykona więcej niż limit zapytań"""
+    with profile_queries() as profile:
+        yield profile
+    if profile.count > limit:
+        raise QueryBudgetExceeded(_budget_message('block', profile, limit))
+
+
+def query_budget(limit):
+    """Dekorator widoku ustawiający budżet zapytań endpointu"""
+    def decorator(func):
+        # Atrybut na funkcji widoku - dekorator musi być pod @route
+        func._query_budget = limit
+        return func
+    return decorator
+
+
+def _budget_message(endpoint, profile, limit):
+    repeated = ', '.join(f"{count}x {fingerprint[:120]}" for fingerprint, count in profile.repeated()[:3])
+    message = f"{endpoint}: {profile.count} zapytań SQL (budżet {limit})"
+    if repeated:
+        message += f"; powtórzone: {repeated}"
+    return message
+
+
+class EndpointQueryStats:
+    """Agregaty per endpoint (w pamięci procesu, thread-safe)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stats = {}
+        self.started_at = time.time()
+
+    def add(self, endpoint, profile, budget, nplus1_threshold):
+        repeated = profile.repeated(nplus1_threshold)
+
+        with self._lock:
+            stats = self._stats.get(endpoint)
+            if stats is None:
+                stats = self._stats[endpoint] = {
+                    'requests': 0,
+                    'queries_total': 0,
+                    'queries_max': 0,
+                    'db_time_total': 0.0,
+                    'db_time_max': 0.0,
+                    'budget': budget,
+                    'budget_violations': 0,
+                    'nplus1_requests': 0,
+                    'fingerprints': Counter()
+                }
+
+            stats['requests'] += 1
+            stats['queries_total'] += profile.count
+            stats['queries_max'] = max(stats['queries_max'], profile.count)
+            stats['db_time_total'] += profile.total_time
+            stats['db_time_max'] = max(stats['db_time_max'], profile.total_time)
+            stats['budget'] = budget
+            if budget is not None and profile.count > budget:
+                stats['budget_violations'] += 1
+            if repeated:
+                stats['nplus1_requests'] += 1
+                for fingerprint, count in repeated:
+                    stats['fingerprints'][fingerprint] += count
+
+            # Nie pozwól, żeby licznik odcisków rósł bez końca
+            if len(stats['fingerprints']) > TOP_FINGERPRINTS * 5:
+                stats['fingerprints'] = Counter(dict(stats['fingerprints'].most_common(TOP_FINGERPRINTS)))
+
+    def report(self):
+        with self._lock:
+            endpoints = []
+            for endpoint, stats in self._stats.items():
+                requests_count = stats['requests'] or 1
+                endpoints.append({
+                    'endpoint': endpoint,
+                    'requests': stats['requests'],
+                    'queries_avg': round(stats['queries_total'] / requests_count, 2),
+                    'queries_max': stats['queries_max'],
+                    'db_time_avg_ms': round(stats['db_time_total'] * 1000 / requests_count, 2),
+                    'db_time_max_ms': round(stats['db_time_max'] * 1000, 2),
+                    'budget': stats['budget'],
+                    'budget_violations': stats['budget_violations'],
+                    'nplus1_requests': stats['nplus1_requests'],
+                    'repeated_fingerprints': [
+                        {'fingerprint': fingerprint, 'count': count}
+                        for fingerprint, count in stats['fingerprints'].most_common(TOP_FINGERPRINTS)
+                    ]
+                })
+
+        endpoints.sort(key=lambda item: (item['budget_violations'], item['queries_avg']), reverse=True)
+        return {
+            'since': time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(self.started_at)),
+            'endpoints': endpoints
+        }
+
+    def reset(self):
+        with self._lock:
+            self._stats.clear()
+            self.started_at = time.time()
+
+
+def _is_admin():
+    from modules.users.models import User
+
+    user_email = session.get('user_email')
+    if not user_email:
+        return False
+    user = User.query.filter_by(email=user_email).first()
+    return bool(user and user.role == 'admin')
+
+
+def _admin_logged_in():
+    """Admin zalogowany przez Flask-Login (użytkownik zwykle jest już wczytany przez widok)"""
+    try:
+        return bool(current_user and current_user.is_authenticated and current_user.is_admin())
+    except Exception:
+        return False
+
+
+def init_query_profiler(app):
+    """
+    Włącza profiler dla aplikacji (wyłączany przez QUERY_PROFILER_ENABLED = false)
+
+    Config:
+        QUERY_PROFILER_HEADERS (bool|None): nagłówki X-DB-* i Server-Timing dla
+            wszystkich (true) / nikogo (false); domyślnie (None) tylko w trybie
+            debug i dla adminów
+        QUERY_PROFILER_NPLUS1_THRESHOLD (int): próg powtórzeń odcisku
+        QUERY_BUDGETS (dict): {endpoint: maks. liczba zapytań}
+        QUERY_BUDGET_DEFAULT (int|None): budżet dla pozostałych endpointów
+        QUERY_BUDGET_STRICT (bool): przekroczenie budżetu zgłasza wyjątek (testy)
+    """
+    if not app.config.get('QUERY_PROFILER_ENABLED', True):
+        return None
+
+    install_listeners()
+    stats = EndpointQueryStats()
+    app.extensions['query_profiler'] = stats
+
+    # Lazy import loggera - moduł logging inicjalizuje się później w create_app
+    from modules.logging import get_structured_logger
+    profiler_logger = get_structured_logger('query_profiler')
+
+    def _endpoint_budget(endpoint):
+        budgets = app.config.get('QUERY_BUDGETS') or {}
+        if endpoint in budgets:
+            return budgets[endpoint]
+        view = app.view_functions.get(endpoint)
+        budget = getattr(view, '_query_budget', None)
+        if budget is not None:
+            return budget
+        return app.config.get('QUERY_BUDGET_DEFAULT')
+
+    def _send_headers():
+        setting = app.config.get('QUERY_PROFILER_HEADERS')
+        if setting is not None:
+            return bool(setting)
+        return app.debug or _admin_logged_in()
+
+    @app.before_request
+    def start_query_profile():
+        g._query_profile_token = _active_profile.set(QueryProfile())
+
+    @app.after_request
+    def finish_query_profile(response):
+        profile = _active_profile.get()
+        token = g.pop('_query_profile_token', None)
+        if profile is None or token is None:
+            return response
+        _active_profile.reset(token)
+
+        endpoint = request.endpoint
+        if endpoint is None or endpoint == 'static' or endpoint.endswith('.static'):
+            return response
+
+        threshold = app.config.get('QUERY_PROFILER_NPLUS1_THRESHOLD', DEFAULT_NPLUS1_THRESHOLD)
+        budget = _endpoint_budget(endpoint)
+        stats.add(endpoint, profile, budget, threshold)
+
+        if _send_headers():
+            db_time_ms = round(profile.total_time * 1000, 2)
+            response.headers['X-DB-Query-Count'] = str(profile.count)
+            response.headers['X-DB-Time-Ms'] = str(db_time_ms)
+            repeated = profile.repeated(threshold)
+            if repeated:
+                response.headers['X-DB-Repeated'] = str(sum(count for _, count in repeated))
+            response.headers.add('Server-Timing', f'db;dur={db_time_ms};desc="{profile.count} queries"')
+
+        if budget is not None and profile.count > budget:
+            message = _budget_message(endpoint, profile, budget)
+            profiler_logger.warning("Przekroczony budżet zapytań SQL",
+                                    endpoint=endpoint,
+                                    query_count=profile.count,
+                                    budget=budget,
+                                    db_time_ms=round(profile.total_time * 1000, 2))
+            if app.config.get('QUERY_BUDGET_STRICT'):
+                raise QueryBudgetExceeded(message)
+
+        return response
+
+    @app.teardown_request
+    def discard_query_profile(exception=None):
+        # after_request nie jest wołany przy nieobsłużonym wyjątku
+        token = g.pop('_query_profile_token', None)
+        if token is not None:
+            try:
+                _active_profile.reset(token)
+            except ValueError:
+                _active_profile.set(None)
+
+    @app.route('/api/admin/query-profile', methods=['GET', 'DELETE'])
+    def query_profile_report():
+        """Raport zapytań SQL per endpoint (DELETE - reset statystyk)"""
+        if not _is_admin():
+            return jsonify({'success': False, 'error': 'Brak uprawnień'}), 403
+
+        if request.method == 'DELETE':
+            stats.reset()
+            return jsonify({'success': True})
+
+        report = stats.report()
+        report['success'] = True
+        return jsonify(report)
+
+    print("[QueryProfiler] Profiler zapytań SQL włączony", file=sys.stderr)
+    return stats
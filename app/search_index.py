@@ -0,0 +1,563 @@
+# search_index.py
+"""
+Indeks trigramowy wyszukiwania (type-ahead)
+===========================================
+
+Wspólny indeks dla wyszukiwarek, które dotąd robiły ILIKE '%fraza%' po kilku
+kolumnach (produkty produkcji, klienci) - takiego warunku baza nie obsłuży
+indeksem i czas rośnie z rozmiarem tabeli.
+
+Każdy zakres (SearchScope: model + kolumny) ma w procesie indeks w pamięci:
+
+- wartości kolumn złożone do małych liter bez polskich znaków ('Dąb' -> 'dab'),
+- indeks odwrócony trigram -> zbiór id; kandydaci to przecięcie list
+  trigramów frazy (od najkrótszej), potem sprawdzenie podciągu w kolumnach -
+  wynik jak dotychczasowy ILIKE (bez rozróżniania polskich znaków),
+- frazy krótsze niż 3 znaki - przegląd wartości w pamięci,
+- ranking: cała wartość > początek wartości > początek słowa > środek słowa,
+  dalej kolejność kolumn w zakresie i krótsza wartość; dla fraz pasujących
+  do bardzo wielu wierszy - początki wartości z posortowanych kolumn
+  (bisect), potem najnowsze wiersze.
+
+Aktualizacja przy zapisie: zdarzenia sesji dopisują id zmienionych wierszy
+do search_index_changes w tej samej transakcji (rollback cofa też wpis).
+Każdy proces co INDEX_CHECK_SECONDS czyta nowe wpisy i odświeża tylko te
+wiersze; proces zapisujący sprawdza dziennik od razu po commit. Id wpisów
+nadawane są przy INSERT, a widoczne po commit - transakcja z mniejszym id
+może skończyć się po większym. Odczyt obejmuje więc wpisy z ostatnich
+CHANGE_LOG_OVERLAP (pomijając już zastosowane), a nie tylko id powyżej
+ostatnio widzianego. INSERT
+zbiorczy bez id w parametrach zapisuje id nadane przez autoincrement (wiersze
+powyżej dotychczasowego maksimum). Zmiany zbiorcze bez listy id (UPDATE /
+DELETE z warunkiem) zapisują wpis bez id - pełne przeładowanie zakresu.
+
+Przeładowanie we wszystkich procesach: flask rebuild-search-index [zakres].
+"""
+
+import bisect
+import heapq
+import sys
+import threading
+import time
+import unicodedata
+from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import event, func, insert, inspect, select
+from sqlalchemy.orm import Session
+
+from extensions import db
+from lazy_tables import LazyTables
+
+# Jak często proces sprawdza dziennik zmian innych procesów
+INDEX_CHECK_SECONDS = 2
+
+# Wpisy dziennika starsze niż tyle są usuwane; proces, który nie sprawdzał
+# dziennika dłużej niż połowę tego okresu, przeładowuje zakres w całości
+CHANGE_LOG_RETENTION = timedelta(days=1)
+
+# Wpisy z tego okresu są czytane ponownie (commit w innej kolejności niż id);
+# transakcja dłuższa niż to trafi do indeksu przy pełnym przeładowaniu
+CHANGE_LOG_OVERLAP = timedelta(minutes=2)
+
+IDS_PER_CHUNK = 1000
+
+# Do tylu kandydatów ranking obejmuje wszystkie trafienia (patrz TrigramIndex.search)
+RANK_ALL_LIMIT = 2000
+
+# Rodzaj dopasowania (mniejszy = lepszy)
+MATCH_EXACT = 0
+MATCH_PREFIX = 1
+MATCH_WORD_PREFIX = 2
+MATCH_SUBSTRING = 3
+
+_SESSION_KEY = 'search_index_changes'
+
+
+class SearchIndexChange(db.Model):
+    """Dziennik zmian wierszy indeksowanych zakresów (doc_id NULL - cały zakres)"""
+    __tablename__ = 'search_index_changes'
+
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True, autoincrement=True)
+    scope = db.Column(db.String(32), nullable=False)
+    doc_id = db.Column(db.Integer, nullable=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('idx_search_changes_scope', 'scope', 'id'),
+    )
+
+
+def fold(text) -> str:
+    """Małe litery bez polskich znaków ('Łódź' -> 'lodz')"""
+    if text is None:
+        return ''
+    text = str(text).lower().replace('ł', 'l')
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(ch for ch in text if not unicodedata.combining(ch))
+
+
+def trigrams(text: str) -> set:
+    """Trigramy złożonego tekstu"""
+    return {text[start:start + 3] for start in range(len(text) - 2)}
+
+
+def match_kind(value: str, term: str) -> Optional[int]:
+    """Rodzaj dopasowania frazy w wartości (None - brak)"""
+    position = value.find(term)
+    if position < 0:
+        return None
+    if position == 0:
+        return MATCH_EXACT if len(value) == len(term) else MATCH_PREFIX
+    while position > 0:
+        if not value[position - 1].isalnum():
+            return MATCH_WORD_PREFIX
+        position = value.find(term, position + 1)
+    return MATCH_SUBSTRING
+
+
+class TrigramIndex:
+    """
+    Indeks trigramowy wierszy jednego zakresu
+
+    Args:
+        fields: Nazwy indeksowanych kolumn (kolejność = waga w rankingu)
+    """
+
+    def __init__(self, fields: Sequence[str]):
+        self.fields = tuple(fields)
+        self.docs: Dict[int, Tuple[str, ...]] = {}
+        self.postings: Dict[str, set] = {}
+        # Per kolumna posortowane (wartość, id) - dopasowania początku wartości przez bisect
+        self.sorted_values: List[List[Tuple[str, int]]] = [[] for _ in self.fields]
+
+    def __len__(self):
+        return len(self.docs)
+
+    def _doc_trigrams(self, values: Tuple[str, ...]) -> set:
+        grams = set()
+        for value in values:
+            grams |= trigrams(value)
+        return grams
+
+    def load(self, rows: Iterable[Sequence]):
+        """Budowa z wierszy (id, *values) - kolumny sortowane raz na końcu"""
+        for row in rows:
+            doc_id, folded = row[0], tuple(fold(value) for value in row[1:])
+            self.docs[doc_id] = folded
+            for gram in self._doc_trigrams(folded):
+                self.postings.setdefault(gram, set()).add(doc_id)
+            for position, value in enumerate(folded):
+                if value:
+                    self.sorted_values[position].append((value, doc_id))
+        for column in self.sorted_values:
+            column.sort()
+
+    def put(self, doc_id: int, values: Iterable):
+        """Dodaje lub zastępuje wiersz (values w kolejności fields)"""
+        self.remove(doc_id)
+        folded = tuple(fold(value) for value in values)
+        self.docs[doc_id] = folded
+        for gram in self._doc_trigrams(folded):
+            self.postings.setdefault(gram, set()).add(doc_id)
+        for position, value in enumerate(folded):
+            if value:
+                bisect.insort(self.sorted_values[position], (value, doc_id))
+
+    def remove(self, doc_id: int):
+        folded = self.docs.pop(doc_id, None)
+        if folded is None:
+            return
+        for gram in self._doc_trigrams(folded):
+            postings = self.postings.get(gram)
+            if postings is not None:
+                postings.discard(doc_id)
+                if not postings:
+                    del self.postings[gram]
+        for position, value in enumerate(folded):
+            if value:
+                column = self.sorted_values[position]
+                at = bisect.bisect_left(column, (value, doc_id))
+                if at < len(column) and column[at] == (value, doc_id):
+                    del column[at]
+
+    def _candidates(self, term: str):
+        """Id wierszy zawierających wszystkie trigramy frazy (wszystkie wiersze dla fraz < 3 znaków)"""
+        if len(term) < 3:
+            return None
+        lists = []
+        for gram in trigrams(term):
+            postings = self.postings.get(gram)
+            if not postings:
+                return set()
+            lists.append(postings)
+        lists.sort(key=len)
+        return lists[0].intersection(*lists[1:])
+
+    def _rank(self, term: str, candidates: Iterable[int], positions) -> List[Tuple]:
+        """Klucze rankingu (rodzaj, kolumna, długość, id) wierszy zawierających frazę"""
+        ranked = []
+        for doc_id in candidates:
+            values = self.docs[doc_id]
+            best = None
+            for position in positions:
+                kind = match_kind(values[position], term)
+                if kind is not None:
+                    key = (kind, position, len(values[position]), doc_id)
+                    if best is None or key < best:
+                        best = key
+            if best is not None:
+                ranked.append(best)
+        return ranked
+
+    def _prefix_matches(self, term: str, positions, limit: int) -> List[Tuple]:
+        """Do `limit` wierszy na kolumnę, których wartość zaczyna się od frazy"""
+        ranked = []
+        for position in positions:
+            column = self.sorted_values[position]
+            at = bisect.bisect_left(column, (term,))
+            for value, doc_id in column[at:at + limit]:
+                if not value.startswith(term):
+                    break
+                kind = MATCH_EXACT if len(value) == len(term) else MATCH_PREFIX
+                ranked.append((kind, position, len(value), doc_id))
+        return ranked
+
+    def search(self, query: str, limit: Optional[int] = 20,
+               fields: Optional[Sequence[str]] = None) -> List[int]:
+        """
+        Id wierszy zawierających frazę w którejkolwiek z kolumn, od najlepszego
+
+        Przy ponad RANK_ALL_LIMIT kandydatach (fraza bardzo częsta) i podanym
+        limicie ranking obejmuje tylko dopasowania początku wartości, a resztę
+        wyników uzupełniają ostatnio dodane / zmienione wiersze - czas nie
+        rośnie z liczbą trafień.
+
+        Args:
+            limit: Maksymalna liczba wyników (None - wszystkie)
+            fields: Podzbiór kolumn do przeszukania (None - wszystkie)
+        """
+        term = fold(query).strip()
+        if not term:
+            return []
+        positions = range(len(self.fields)) if fields is None else [self.fields.index(name) for name in fields]
+        candidates = self._candidates(term)
+        candidate_count = len(self.docs) if candidates is None else len(candidates)
+
+        if limit is None or candidate_count <= RANK_ALL_LIMIT:
+            ranked = self._rank(term, self.docs if candidates is None else candidates, positions)
+            ranked = sorted(ranked) if limit is None else heapq.nsmallest(limit, ranked)
+            return [key[3] for key in ranked]
+
+        results = []
+        for key in sorted(self._prefix_matches(term, positions, limit)):
+            if key[3] not in results:
+                results.append(key[3])
+        results = results[:limit]
+
+        # Kolejność słownika = kolejność dodania / ostatniej zmiany
+        seen = set(results)
+        for doc_id in reversed(self.docs):
+            if len(results) >= limit:
+                break
+            if doc_id in seen or (candidates is not None and doc_id not in candidates):
+                continue
+            values = self.docs[doc_id]
+            if any(term in values[position] for position in positions):
+                results.append(doc_id)
+        return results
+
+
+class SearchScope:
+    """
+    Indeksowany zakres - model i kolumny przeszukiwane przez wyszukiwarkę
+
+    Args:
+        name: Nazwa zakresu (wpis w search_index_changes)
+        model: Klasa modelu (kolumna klucza głównego `id`)
+        fields: Kolumny w kolejności ważności dla rankingu
+    """
+
+    def __init__(self, name: str, model, fields: Sequence[str]):
+        self.name = name
+        self.model = model
+        self.fields = tuple(fields)
+        self._index: Optional[TrigramIndex] = None
+        # Wpisy do _low_water_id włącznie są starsze niż okno; powyżej - zastosowane id
+        self._low_water_id = 0
+        self._seen_change_ids = set()
+        self._checked_at = 0.0
+        self._lock = threading.RLock()
+        _SCOPES[name] = self
+
+    # ------------------------------------------------------------------
+    # Odczyt
+    # ------------------------------------------------------------------
+
+    def search(self, query: str, limit: Optional[int] = 20,
+               fields: Optional[Sequence[str]] = None) -> List[int]:
+        """Id pasujących wierszy od najlepszego dopasowania (patrz TrigramIndex.search)"""
+        with self._lock:
+            index = self._current_index()
+            return index.search(query, limit=limit, fields=fields)
+
+    def _current_index(self) -> TrigramIndex:
+        now = time.monotonic()
+        if self._index is None or now - self._checked_at > CHANGE_LOG_RETENTION.total_seconds() / 2:
+            self._load_all()
+        elif now - self._checked_at >= INDEX_CHECK_SECONDS:
+            self._apply_changes()
+        self._checked_at = now
+        return self._index
+
+    def invalidate(self):
+        """Sprawdź dziennik zmian przy następnym wyszukiwaniu"""
+        self._checked_at = min(self._checked_at, time.monotonic() - INDEX_CHECK_SECONDS)
+
+    # ------------------------------------------------------------------
+    # Budowa i odświeżanie
+    # ------------------------------------------------------------------
+
+    def _columns(self):
+        table = self.model.__table__
+        return [table.c.id] + [table.c[name] for name in self.fields]
+
+    def _load_all(self):
+        _TABLES.ensure()
+        changes = SearchIndexChange.__table__
+        cutoff = datetime.utcnow() - CHANGE_LOG_OVERLAP
+        with db.engine.connect() as conn:
+            # Najpierw pozycja dziennika - zmiany w trakcie ładowania zostaną powtórzone,
+            # a wpisy z okna, które pojawią się później, odczytane przy sprawdzeniu
+            low_water_id = conn.execute(
+                select(func.coalesce(func.max(changes.c.id), 0))
+                .where(changes.c.scope == self.name, changes.c.created_at < cutoff)
+            ).scalar()
+            seen = set(conn.execute(
+                select(changes.c.id).where(changes.c.scope == self.name, changes.c.id > low_water_id)
+            ).scalars())
+            index = TrigramIndex(self.fields)
+            index.load(conn.execute(select(*self._columns()).order_by(self.model.__table__.c.id)))
+        self._index = index
+        self._low_water_id = low_water_id
+        self._seen_change_ids = seen
+        prune_change_log()
+
+    def _apply_changes(self):
+        changes = SearchIndexChange.__table__
+        cutoff = datetime.utcnow() - CHANGE_LOG_OVERLAP
+        with db.engine.connect() as conn:
+            window = conn.execute(
+                select(changes.c.id, changes.c.doc_id, changes.c.created_at)
+                .where(changes.c.scope == self.name, changes.c.id > self._low_water_id)
+                .order_by(changes.c.id)
+            ).all()
+            rows = [row for row in window if row.id not in self._seen_change_ids]
+            if any(row.doc_id is None for row in rows):
+                self._load_all()
+                return
+
+            doc_ids = sorted({row.doc_id for row in rows})
+            table = self.model.__table__
+            for start in range(0, len(doc_ids), IDS_PER_CHUNK):
+                chunk = doc_ids[start:start + IDS_PER_CHUNK]
+                found = set()
+                for row in conn.execute(select(*self._columns()).where(table.c.id.in_(chunk))):
+                    self._index.put(row[0], row[1:])
+                    found.add(row[0])
+                for doc_id in chunk:
+                    if doc_id not in found:
+                        self._index.remove(doc_id)
+
+        self._seen_change_ids.update(row.id for row in rows)
+        expired = [row.id for row in window if row.created_at < cutoff]
+        if expired:
+            self._low_water_id = max(expired)
+            self._seen_change_ids = {change_id for change_id in self._seen_change_ids
+                                     if change_id > self._low_water_id}
+
+    def rebuild(self) -> int:
+        """
+        Przeładowuje indeks zakresu w tym procesie i zleca to samo pozostałym
+        (wpis dziennika bez id); zwraca liczbę wierszy
+        """
+        with self._lock:
+            _log_changes(db.session, [(self.name, None)])
+            db.session.commit()
+            self._load_all()
+            self._checked_at = time.monotonic()
+            return len(self._index)
+
+
+_SCOPES: Dict[str, SearchScope] = {}
+
+_TABLES = LazyTables(SearchIndexChange)
+_listeners_installed = False
+_listeners_lock = threading.Lock()
+
+
+def get_search_scope(name: str) -> SearchScope:
+    return _SCOPES[name]
+
+
+def _scope_for_class(cls) -> Optional[SearchScope]:
+    for scope in _SCOPES.values():
+        if issubclass(cls, scope.model):
+            return scope
+    return None
+
+
+def _scope_for_table(table) -> Optional[SearchScope]:
+    # Instrukcje ORM niosą kopię tabeli z adnotacjami - porównanie po nazwie
+    name = getattr(table, 'name', None)
+    for scope in _SCOPES.values():
+        if scope.model.__tablename__ == name:
+            return scope
+    return None
+
+
+# ============================================================================
+# ŚLEDZENIE ZMIAN (zdarzenia sesji)
+# ============================================================================
+
+def _log_changes(session, entries: Iterable[Tuple[str, Optional[int]]]):
+    """Dopisuje wpisy (zakres, id) do dziennika w transakcji sesji"""
+    entries = sorted(set(entries), key=lambda entry: (entry[0], entry[1] is not None, entry[1] or 0))
+    if not entries:
+        return
+    _TABLES.ensure()
+    now = datetime.utcnow()
+    session.connection().execute(insert(SearchIndexChange.__table__), [
+        {'scope': scope, 'doc_id': doc_id, 'created_at': now} for scope, doc_id in entries
+    ])
+    session.info.setdefault(_SESSION_KEY, set()).update(scope for scope, _doc_id in entries)
+
+
+def _after_flush(session, flush_context):
+    entries = []
+    for obj in list(session.new) + list(session.deleted):
+        scope = _scope_for_class(type(obj))
+        if scope is not None:
+            entries.append((scope.name, obj.id))
+    for obj in session.dirty:
+        scope = _scope_for_class(type(obj))
+        if scope is None:
+            continue
+        state = inspect(obj)
+        if any(state.attrs[name].history.has_changes() for name in scope.fields):
+            entries.append((scope.name, obj.id))
+    _log_changes(session, entries)
+
+
+def _do_orm_execute(orm_execute_state):
+    """Zapisy zbiorcze na indeksowanych tabelach poza obiektami ORM"""
+    if not (orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert):
+        return None
+    scope = _scope_for_table(getattr(orm_execute_state.statement, 'table', None))
+    if scope is None:
+        return None
+
+    parameters = orm_execute_state.parameters
+    by_primary_key = (isinstance(parameters, (list, tuple)) and parameters
+                      and all('id' in row for row in parameters))
+    if orm_execute_state.is_update:
+        if by_primary_key:
+            if not any(name in row for row in parameters for name in scope.fields):
+                return None
+        else:
+            values = getattr(orm_execute_state.statement, '_values', None)
+            columns = {getattr(key, 'key', key) for key in values} if values else None
+            if columns is not None and not columns & set(scope.fields):
+                return None
+
+    if orm_execute_state.is_insert and not by_primary_key:
+        return _execute_insert(orm_execute_state, scope)
+
+    result = orm_execute_state.invoke_statement()
+    if by_primary_key:
+        _log_changes(orm_execute_state.session, ((scope.name, row['id']) for row in parameters))
+    else:
+        _log_changes(orm_execute_state.session, [(scope.name, None)])
+    return result
+
+
+def _execute_insert(orm_execute_state, scope):
+    """
+    INSERT bez id w parametrach - id wierszy odczytane po wykonaniu
+
+    MySQL nie ma RETURNING, a lastrowid przy executemany daje jedno id,
+    dlatego nowe id to wiersze powyżej maksimum sprzed INSERT (autoincrement).
+    Wiersze innych transakcji z tego zakresu tylko odświeżają się dodatkowo.
+    """
+    session = orm_execute_state.session
+    table = scope.model.__table__
+    connection = session.connection()
+    last_id = connection.execute(select(func.coalesce(func.max(table.c.id), 0))).scalar()
+
+    result = orm_execute_state.invoke_statement()
+
+    # Jawne id (część wierszy albo .values(id=...)) mogą być poniżej maksimum
+    parameters = orm_execute_state.parameters
+    rows = parameters if isinstance(parameters, (list, tuple)) else [parameters or {}]
+    doc_ids = {row['id'] for row in rows if row.get('id') is not None}
+    values = getattr(orm_execute_state.statement, '_values', None) or {}
+    for key, value in values.items():
+        if getattr(key, 'key', key) == 'id' and getattr(value, 'value', None) is not None:
+            doc_ids.add(value.value)
+    doc_ids.update(connection.execute(select(table.c.id).where(table.c.id > last_id)).scalars())
+
+    _log_changes(session, ((scope.name, doc_id) for doc_id in doc_ids))
+    return result
+
+
+def _after_commit(session):
+    for name in session.info.pop(_SESSION_KEY, ()):
+        _SCOPES[name].invalidate()
+
+
+def _after_rollback(session):
+    session.info.pop(_SESSION_KEY, None)
+
+
+def install_search_tracking():
+    """Podpina zdarzenia na klasie Session (raz na proces, wszystkie sesje)"""
+    global _listeners_installed
+
+    if _listeners_installed:
+        return
+    with _listeners_lock:
+        if not _listeners_installed:
+            event.listen(Session, 'after_flush', _after_flush)
+            event.listen(Session, 'do_orm_execute', _do_orm_execute)
+            event.listen(Session, 'after_commit', _after_commit)
+            event.listen(Session, 'after_rollback', _after_rollback)
+            _listeners_installed = True
+
+
+def prune_change_log() -> int:
+    """Usuwa wpisy dziennika starsze niż CHANGE_LOG_RETENTION"""
+    _TABLES.ensure()
+    changes = SearchIndexChange.__table__
+    with db.engine.begin() as conn:
+        result = conn.execute(
+            changes.delete().where(changes.c.created_at < datetime.utcnow() - CHANGE_LOG_RETENTION)
+        )
+    return result.rowcount or 0
+
+
+def register_search_index_cli(app):
+    """Rejestruje komendę flask rebuild-search-index"""
+    import click
+    from flask.cli import with_appcontext
+
+    @app.cli.command('rebuild-search-index')
+    @click.argument('scope', required=False)
+    @with_appcontext
+    def rebuild_search_index_command(scope):
+        """Przeładowuje indeksy wyszukiwania (wszystkie lub podany) we wszystkich procesach"""
+        scopes = [get_search_scope(scope)] if scope else list(_SCOPES.values())
+        for search_scope in scopes:
+            started = time.perf_counter()
+            count = search_scope.rebuild()
+            print(f"[rebuild-search-index] {search_scope.name}: {count} wierszy, "
+                  f"{(time.perf_counter() - started) * 1000:.0f} ms", file=sys.stderr)
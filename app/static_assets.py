@@ -0,0 +1,354 @@
+# static_assets.py
+"""
+Pipeline zasobów statycznych
+============================
+
+Fingerprinting i prekompresja plików statycznych aplikacji i wszystkich
+blueprintów (static/ + modules/*/static).
+
+- Każdy plik JS/CSS/obraz/font dostaje URL z hashem treści
+  (np. /static/css/style.3f9a1c2b7d.css) w tym samym katalogu co oryginał,
+  więc względne odwołania w CSS nadal działają.
+- Pliki tekstowe (JS/CSS/SVG/JSON) są kompresowane do .gz oraz .br
+  (brotli - opcjonalnie, jeśli pakiet jest zainstalowany).
+- Manifest (static_build/manifest.json) budowany jest raz, krokiem wdrożenia
+  (flask build-assets); zapamiętuje mtime/rozmiar źródeł, więc kolejne
+  budowanie przelicza tylko zmienione pliki. Procesy aplikacji (workery
+  Passengera) tylko wczytują gotowy manifest.
+- Jinja: url_for dla endpointów *.static zwraca URL z hashem, pozostałe
+  wywołania trafiają do standardowego url_for (asset_url jest aliasem).
+- Żądania hashowanych URL-i są obsługiwane w before_request: prekompresowany
+  wariant zgodny z Accept-Encoding + Cache-Control: immutable.
+
+CLI: flask build-assets [--force] (--force - pełna przebudowa manifestu).
+"""
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import sys
+import threading
+
+import click
+from flask import has_request_context, request, send_file, url_for
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:  # brotli jest opcjonalny - wtedy tylko gzip
+    brotli = None
+
+
+# Rozszerzenia objęte fingerprintingiem
+FINGERPRINT_EXTENSIONS = {
+    '.js', '.css', '.svg', '.png', '.jpg', '.jpeg', '.gif', '.webp', '.ico',
+    '.woff', '.woff2', '.ttf', '.eot', '.json'
+}
+
+# Rozszerzenia kompresowane (obrazy rastrowe i fonty woff są już skompresowane)
+COMPRESS_EXTENSIONS = {'.js', '.css', '.svg', '.json', '.ttf', '.eot', '.ico'}
+
+# Katalogi generowane w runtime (modele AR, uploady) - pomijane
+EXCLUDED_DIRS = {'ar-models', 'uploads'}
+
+# Pliki mniejsze niż próg nie są kompresowane (narzut nagłówków > zysk)
+MIN_COMPRESS_SIZE = 512
+
+HASH_LENGTH = 10
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+
+
+class StaticAssetManifest:
+    """Manifest zasobów statycznych z fingerprintami i wariantami skompresowanymi"""
+
+    def __init__(self, build_dir):
+        self.build_dir = build_dir
+        self.manifest_path = os.path.join(build_dir, 'manifest.json')
+        # {endpoint: {filename: {hash, hashed_filename, url, source, mtime, size, gzip, br}}}
+        self.assets = {}
+        # {url_path: entry} - szybkie wyszukiwanie w before_request
+        self._by_url = {}
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Budowanie
+    # ------------------------------------------------------------------
+
+    def load(self):
+        """Wczytuje manifest z dysku (jeśli istnieje)"""
+        if not os.path.exists(self.manifest_path):
+            return False
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                self.assets = json.load(f).get('assets', {})
+            self._reindex()
+            return True
+        except (OSError, ValueError) as e:
+            print(f"[StaticAssets] Nie można wczytać manifestu: {e}", file=sys.stderr)
+            self.assets = {}
+            return False
+
+    def build(self, app, force=False):
+        """
+        Przelicza fingerprinty i warianty skompresowane dla wszystkich folderów static
+
+        Args:
+            app: Instancja aplikacji Flask
+            force (bool): Ignoruj manifest i przelicz wszystko
+
+        Returns:
+            dict: Statystyki budowania
+        """
+        with self._lock:
+            previous = {} if force else self.assets
+            assets = {}
+            stats = {'files': 0, 'rehashed': 0, 'compressed': 0, 'folders': 0}
+
+            for endpoint, static_folder in self._iter_static_folders(app):
+                stats['folders'] += 1
+                endpoint_assets = {}
+                previous_endpoint = previous.get(endpoint, {})
+
+                for filename, source in self._iter_files(static_folder):
+                    stat = os.stat(source)
+                    old_entry = previous_endpoint.get(filename)
+
+                    if (old_entry and old_entry.get('mtime') == stat.st_mtime
+                            and old_entry.get('size') == stat.st_size
+                            and self._variants_exist(old_entry)):
+                        entry = old_entry
+                    else:
+                        entry = self._build_entry(endpoint, filename, source, stat)
+                        stats['rehashed'] += 1
+                        if entry.get('gzip'):
+                            stats['compressed'] += 1
+
+                    endpoint_assets[filename] = entry
+                    stats['files'] += 1
+
+                assets[endpoint] = endpoint_assets
+
+            # URL-e liczone w kontekście aplikacji (uwzględnia url_prefix blueprintów)
+            with app.test_request_context('/'):
+                for endpoint, endpoint_assets in assets.items():
+                    for entry in endpoint_assets.values():
+                        entry['url'] = url_for(endpoint, filename=entry['hashed_filename'])
+
+            self.assets = assets
+            self._reindex()
+            self._save()
+
+            return stats
+
+    def _build_entry(self, endpoint, filename, source, stat):
+        """Liczy hash treści i zapisuje warianty .gz/.br do katalogu build"""
+        with open(source, 'rb') as f:
+            content = f.read()
+
+        digest = hashlib.md5(content).hexdigest()[:HASH_LENGTH]
+        root, ext = os.path.splitext(filename)
+        hashed_filename = f"{root}.{digest}{ext}"
+
+        entry = {
+            'hash': digest,
+            'hashed_filename': hashed_filename,
+            'source': source,
+            'mtime': stat.st_mtime,
+            'size': stat.st_size,
+            'mimetype': mimetypes.guess_type(filename)[0] or 'application/octet-stream',
+            'gzip': None,
+            'br': None
+        }
+
+        if ext.lower() in COMPRESS_EXTENSIONS and len(content) >= MIN_COMPRESS_SIZE:
+            base_path = os.path.join(self.build_dir, endpoint, hashed_filename)
+
+            gz_content = gzip.compress(content, compresslevel=9, mtime=0)
+            if len(gz_content) < len(content):
+                entry['gzip'] = self._write_atomic(base_path + '.gz', gz_content)
+
+            if brotli is not None:
+                br_content = brotli.compress(content, quality=11)
+                if len(br_content) < len(content):
+                    entry['br'] = self._write_atomic(base_path + '.br', br_content)
+
+        return entry
+
+    @staticmethod
+    def _variants_exist(entry):
+        return all(
+            not entry.get(key) or os.path.exists(entry[key])
+            for key in ('gzip', 'br')
+        )
+
+    @staticmethod
+    def _write_atomic(path, content):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        with open(temp_path, 'wb') as f:
+            f.write(content)
+        os.replace(temp_path, path)
+        return path
+
+    def _save(self):
+        os.makedirs(self.build_dir, exist_ok=True)
+        temp_path = f"{self.manifest_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump({'assets': self.assets}, f)
+        os.replace(temp_path, self.manifest_path)
+
+    def _reindex(self):
+        self._by_url = {
+            entry['url']: entry
+            for endpoint_assets in self.assets.values()
+            for entry in endpoint_assets.values()
+            if entry.get('url')
+        }
+
+    @staticmethod
+    def _iter_static_folders(app):
+        """Zwraca (endpoint, folder) dla aplikacji i blueprintów z folderem static"""
+        if app.static_folder and os.path.isdir(app.static_folder):
+            yield 'static', app.static_folder
+
+        for name, blueprint in app.blueprints.items():
+            if blueprint.has_static_folder and os.path.isdir(blueprint.static_folder):
+                yield f"{name}.static", blueprint.static_folder
+
+    @staticmethod
+    def _iter_files(static_folder):
+        """Zwraca (filename, ścieżka) dla plików objętych fingerprintingiem"""
+        for dirpath, dirnames, filenames in os.walk(static_folder):
+            dirnames[:] = [d for d in dirnames if d not in EXCLUDED_DIRS and not d.startswith('.')]
+            for name in filenames:
+                if os.path.splitext(name)[1].lower() not in FINGERPRINT_EXTENSIONS:
+                    continue
+                source = os.path.join(dirpath, name)
+                filename = os.path.relpath(source, static_folder).replace(os.sep, '/')
+                yield filename, source
+
+    # ------------------------------------------------------------------
+    # Odczyt
+    # ------------------------------------------------------------------
+
+    def get_hashed_filename(self, endpoint, filename):
+        entry = self.assets.get(endpoint, {}).get(filename)
+        return entry['hashed_filename'] if entry else None
+
+    def lookup_url(self, path):
+        return self._by_url.get(path)
+
+
+def _select_encoding(entry):
+    """Wybiera najlepszy dostępny wariant wg Accept-Encoding"""
+    accepted = request.accept_encodings
+    if entry.get('br') and accepted['br']:
+        return 'br', entry['br']
+    if entry.get('gzip') and accepted['gzip']:
+        return 'gzip', entry['gzip']
+    return None, entry['source']
+
+
+def send_hashed_asset(entry):
+    """Odpowiedź dla hashowanego URL: prekompresowany plik + immutable cache"""
+    encoding, path = _select_encoding(entry)
+
+    response = send_file(
+        path,
+        mimetype=entry['mimetype'],
+        conditional=True,
+        etag=f"{entry['hash']}-{encoding or 'identity'}",
+        max_age=31536000
+    )
+
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if entry.get('gzip') or entry.get('br'):
+        response.headers['Vary'] = 'Accept-Encoding'
+    response.headers['Cache-Control'] = IMMUTABLE_CACHE_CONTROL
+    return response
+
+
+def _build_dir(app):
+    return app.config.get(
+        'STATIC_ASSETS_BUILD_DIR',
+        os.path.join(app.root_path, 'static_build')
+    )
+
+
+def init_static_assets(app):
+    """
+    Wczytuje manifest i podpina helper Jinja oraz serwowanie hashowanych URL-i.
+
+    Manifest buduje krok wdrożenia (flask build-assets) - worker go nie
+    hashuje ani nie kompresuje. Bez manifestu aplikacja działa na zwykłych
+    URL-ach static. STATIC_ASSETS_BUILD_ON_START = true (środowisko lokalne)
+    buduje manifest przy starcie.
+
+    Wywoływane po rejestracji blueprintów (potrzebne są ich foldery static).
+    Wyłączane przez STATIC_ASSETS_FINGERPRINT = false w config/core.json.
+    """
+    if not app.config.get('STATIC_ASSETS_FINGERPRINT', True):
+        return None
+
+    manifest = StaticAssetManifest(_build_dir(app))
+    loaded = manifest.load()
+
+    if app.config.get('STATIC_ASSETS_BUILD_ON_START', False):
+        try:
+            stats = manifest.build(app)
+            print(f"[StaticAssets] Manifest gotowy: {stats}", file=sys.stderr)
+        except Exception as e:
+            print(f"[StaticAssets] Błąd budowania manifestu: {e}", file=sys.stderr)
+    elif not loaded:
+        print("[StaticAssets] Brak manifestu - uruchom 'flask build-assets' przy wdrożeniu; "
+              "zasoby serwowane bez fingerprintów", file=sys.stderr)
+
+    app.extensions['static_assets'] = manifest
+    flask_url_for = app.jinja_env.globals.get('url_for', url_for)
+
+    def asset_url(endpoint, **values):
+        """url_for z podmianą nazwy pliku na wersję z hashem dla endpointów static"""
+        filename = values.get('filename')
+        if filename and (endpoint == 'static' or endpoint.endswith('.static')):
+            # '.static' w szablonie blueprintu oznacza static bieżącego blueprintu
+            full_endpoint = endpoint
+            if endpoint.startswith('.') and has_request_context() and request.blueprint:
+                full_endpoint = f"{request.blueprint}{endpoint}"
+            hashed = manifest.get_hashed_filename(full_endpoint, filename.lstrip('/'))
+            if hashed:
+                values['filename'] = hashed
+        return flask_url_for(endpoint, **values)
+
+    app.jinja_env.globals['url_for'] = asset_url
+    app.jinja_env.globals['asset_url'] = asset_url
+
+    @app.before_request
+    def serve_hashed_static_asset():
+        if request.method not in ('GET', 'HEAD'):
+            return None
+        entry = manifest.lookup_url(request.path)
+        if entry is None:
+            return None
+        return send_hashed_asset(entry)
+
+    return manifest
+
+
+def register_static_assets_cli(app):
+    """Rejestruje komendę CLI flask build-assets"""
+
+    @app.cli.command('build-assets')
+    @click.option('--force', is_flag=True, help='Przelicz wszystkie pliki, ignorując manifest')
+    @with_appcontext
+    def build_assets_command(force):
+        """Fingerprinting i prekompresja plików statycznych (krok wdrożenia, potem restart aplikacji)."""
+        manifest = StaticAssetManifest(_build_dir(app))
+        if not force:
+            manifest.load()
+        stats = manifest.build(app, force=force)
+        click.echo(f"[build-assets] {stats}")
+        if brotli is None:
+            click.echo("[build-assets] Pakiet brotli niedostępny - wygenerowano tylko .gz")
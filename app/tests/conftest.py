@@ -0,0 +1,117 @@
+# tests/conftest.py
+"""
+Wspólne fixtures testów
+=======================
+
+create_app() jest skonfigurowane pod MySQL (pool, connect_args), dlatego
+testy budują minimalną aplikację Flask z plikiem SQLite w katalogu
+tymczasowym i zakładają tabele wszystkich modeli (relacje między modułami
+wymagają kompletu modeli).
+
+Moduły, których import wymaga niedostępnych bibliotek (np. weasyprint
+bez systemowego pango), są pomijane przez require_modules().
+"""
+
+import os
+import sys
+
+import pytest
+from flask import Flask, g
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if APP_DIR not in sys.path:
+    sys.path.insert(0, APP_DIR)
+
+from extensions import db  # noqa: E402
+
+# Modele potrzebne do konfiguracji relacji (users -> multipliers, quotes -> statusy...)
+MODEL_MODULES = (
+    'modules.users.models',
+    'modules.calculator.models',
+    'modules.clients.models',
+    'modules.quotes.models',
+    'modules.production.models',
+    'modules.reports.models',
+    'modules.jobs.models',
+)
+
+
+def require_modules(*names):
+    """Importuje moduły aplikacji albo pomija test, gdy brakuje ich zależności"""
+    import importlib
+
+    modules = []
+    for name in names:
+        try:
+            modules.append(importlib.import_module(name))
+        except (ImportError, OSError) as e:
+            pytest.skip(f"{name}: brak zależności ({e})")
+    return modules[0] if len(modules) == 1 else modules
+
+
+def _reset_process_state():
+    """Stan procesu trzymany między żądaniami (indeksy, flagi bootstrapu)"""
+    import lazy_tables
+    import search_index
+
+    # Każdy test ma nową bazę - tabele i znaczniki budowy sprawdzane od nowa
+    lazy_tables.reset_all()
+
+    for scope in search_index._SCOPES.values():
+        scope._index = None
+        scope._low_water_id = 0
+        scope._seen_change_ids = set()
+        scope._checked_at = 0.0
+
+    help_index = sys.modules.get('modules.help.services.search_index')
+    if help_index is not None:
+        help_index._index = None
+        help_index._index_signature = None
+        help_index._index_checked_at = 0.0
+
+
+@pytest.fixture
+def app(tmp_path):
+    require_modules(*MODEL_MODULES)
+
+    flask_app = Flask('tests')
+    flask_app.config.update(
+        TESTING=True,
+        SECRET_KEY='tests',
+        SQLALCHEMY_DATABASE_URI=f"sqlite:///{tmp_path / 'tests.db'}",
+        SQLALCHEMY_TRACK_MODIFICATIONS=False,
+    )
+    db.init_app(flask_app)
+
+    with flask_app.app_context():
+        db.create_all()
+        _reset_process_state()
+        yield flask_app
+        db.session.remove()
+        db.engine.dispose()
+
+
+@pytest.fixture
+def session(app):
+    return db.session
+
+
+@pytest.fixture
+def login():
+    """
+    Logowanie klienta testowego: login(client, user_id, email=None)
+
+    email ustawia też sesję aplikacji (user_email / user_id) dla
+    require_module_access i access_control; bez niego - tylko Flask-Login.
+    """
+    def _login(client, user_id, email=None):
+        # Kontekst aplikacji fixture jest współdzielony przez żądania - Flask-Login trzyma użytkownika w g
+        g.pop('_login_user', None)
+        with client.session_transaction() as session:
+            session['_user_id'] = str(user_id)
+            session['_fresh'] = True
+            if email is not None:
+                session['user_email'] = email
+                session['user_id'] = user_id
+
+    return _login
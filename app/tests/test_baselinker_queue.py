@@ -0,0 +1,65 @@
+# tests/test_baselinker_queue.py
+"""Kolejka komend Baselinker: starsza komenda nie nadpisuje nowszej"""
+
+import pytest
+
+from conftest import require_modules
+from extensions import db
+
+
+@pytest.fixture
+def queue_module(app):
+    baselinker_queue = require_modules('modules.production.services.baselinker_queue')
+    return baselinker_queue
+
+
+class FakeApi:
+    def __init__(self, fail_methods=()):
+        self.calls = []
+        self.fail_methods = set(fail_methods)
+
+    def __call__(self, method, parameters):
+        self.calls.append((method, parameters))
+        if method in self.fail_methods:
+            return {'status': 'ERROR', 'error_code': 'ERROR_TIMEOUT', 'error_message': 'timeout'}
+        return {'status': 'SUCCESS'}
+
+
+def test_retry_of_older_status_is_superseded_by_newer(queue_module):
+    api = FakeApi(fail_methods={queue_module.METHOD_SET_STATUS})
+    queue = queue_module.BaselinkerCommandQueue(api_request=api, rate_limit_per_minute=100000)
+    older = queue_module.enqueue_order_status(500, 1, commit=False)
+    db.session.commit()
+
+    claimed = queue.claim_batch()
+    # W trakcie wysyłki użytkownik zmienia status jeszcze raz - nowy wiersz (starszy jest in_progress)
+    newer = queue_module.enqueue_order_status(500, 2, commit=False)
+    db.session.commit()
+    assert newer.id != older.id
+
+    queue.process_batch(claimed)
+    db.session.refresh(older)
+    assert older.status == 'done' and older.last_error == 'superseded'
+
+
+def test_claimed_older_commands_are_not_sent(queue_module):
+    api = FakeApi()
+    queue = queue_module.BaselinkerCommandQueue(api_request=api, rate_limit_per_minute=100000)
+    queue_module.enqueue_order_fields(600, {'admin_comments': 'a', 'extra_field_1': 'x'}, commit=False)
+    db.session.commit()
+    claimed = queue.claim_batch()
+    queue_module.enqueue_order_fields(600, {'admin_comments': 'b'}, commit=False)
+    queue_module.enqueue_order_status(700, 3, commit=False)
+    db.session.commit()
+    status_command = queue_module.BaselinkerOutboundCommand.query.filter_by(baselinker_order_id=700).one()
+    status_command.status = 'in_progress'
+    queue_module.enqueue_order_status(700, 4, commit=False)
+    db.session.commit()
+
+    stats = queue.process_batch(claimed)
+    # Pole nadpisane przez nowszą komendę nie jest wysyłane, pozostałe tak
+    assert api.calls == [(queue_module.METHOD_SET_FIELDS, {'extra_field_1': 'x', 'order_id': 600})]
+    assert stats['superseded'] == 0
+
+    stats = queue.process_batch([status_command])
+    assert stats['superseded'] == 1 and len(api.calls) == 1
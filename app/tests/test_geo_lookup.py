@@ -0,0 +1,52 @@
+# tests/test_geo_lookup.py
+"""Mapowanie kodów pocztowych i nazw na województwa"""
+
+import pytest
+
+import geo_lookup
+
+
+@pytest.mark.parametrize('postcode,region', [
+    ('00-950', 'mazowieckie'),
+    ('50-001', 'dolnośląskie'),
+    ('65-001', 'lubuskie'),
+    ('69-100', 'lubuskie'),        # Słubice
+    ('85-001', 'kujawsko-pomorskie'),
+    ('88-100', 'kujawsko-pomorskie'),  # Inowrocław
+    ('89-100', 'kujawsko-pomorskie'),  # Nakło nad Notecią
+    ('89-600', 'pomorskie'),       # Chojnice
+    ('89600', 'pomorskie'),
+    ('26-200', 'świętokrzyskie'),
+    ('26-300', 'łódzkie'),
+    ('96-300', 'mazowieckie'),
+    ('96-100', 'łódzkie'),
+])
+def test_region_from_postcode(postcode, region):
+    assert geo_lookup.region_from_postcode(postcode) == region
+
+
+def test_every_two_digit_prefix_is_mapped():
+    assert [prefix for prefix in range(100) if geo_lookup._PREFIX2[prefix] is None] == []
+
+
+@pytest.mark.parametrize('value', ['', None, '1', 'abc'])
+def test_invalid_postcode(value):
+    assert geo_lookup.region_from_postcode(value) is None
+
+
+def test_bulk_lookup_matches_single():
+    postcodes = ['69-100', '89-600', '89-100', '69-100', None]
+    assert geo_lookup.regions_from_postcodes(postcodes) == [
+        geo_lookup.region_from_postcode(postcode) for postcode in postcodes
+    ]
+
+
+@pytest.mark.parametrize('name,region', [
+    ('Dolnoslaskie', 'dolnośląskie'),
+    (' woj. ŚLĄSKIE', 'śląskie'),
+    ('kujawsko pomorskie', 'kujawsko-pomorskie'),
+    ('kujawskopomorskie', 'kujawsko-pomorskie'),
+    ('nieznane', None),
+])
+def test_normalize_region(name, region):
+    assert geo_lookup.normalize_region(name) == region
@@ -0,0 +1,111 @@
+# tests/test_help_search.py
+"""Wyszukiwarka Help: type-ahead ostatniego słowa i zapis dokumentu w transakcji artykułu"""
+
+import pytest
+
+from conftest import require_modules
+from extensions import db
+
+ARTICLES = (
+    ('Kalkulator wycen', '<p>Jak przygotować wycenę w kalkulatorze krok po kroku.</p>'),
+    ('Kalkulacja kosztów wysyłki', '<p>Koszty kuriera liczone są automatycznie przy zamówieniu.</p>'),
+    ('Produkcja - stanowiska', '<p>Lista stanowisk produkcyjnych: cięcie, klejenie, pakowanie.</p>'),
+    ('Klienci', '<p>Dodawanie klientów i wyszukiwanie po <b>NIP</b>.</p>'),
+)
+
+
+@pytest.fixture
+def help_module(app):
+    models, help_service, search_service, search_index = require_modules(
+        'modules.help.models', 'modules.help.services.help_service',
+        'modules.help.services.search_service', 'modules.help.services.search_index'
+    )
+    from modules.users.models import User
+
+    db.create_all()
+    db.session.add(User(id=1, email='admin@example.com', password='x', role='admin'))
+    category = models.HelpCategory(name='Ogólne')
+    db.session.add(category)
+    db.session.commit()
+
+    for title, content in ARTICLES:
+        result = help_service.create_article(title, content, category.id, author_id=1)
+        assert result['success'], result
+    return models, help_service, search_service, search_index
+
+
+def _titles(search_service, query):
+    return [hit['article'].title for hit in search_service.search_articles(query)]
+
+
+def test_full_words_still_match(help_module):
+    _, _, search_service, _ = help_module
+    assert _titles(search_service, 'klientów NIP') == ['Klienci']
+
+
+def test_last_word_is_matched_as_prefix(help_module):
+    _, _, search_service, _ = help_module
+    assert set(_titles(search_service, 'kalk')) == {'Kalkulator wycen', 'Kalkulacja kosztów wysyłki'}
+    assert _titles(search_service, 'kalkulat') == ['Kalkulator wycen']
+    assert _titles(search_service, 'stanow') == ['Produkcja - stanowiska']
+    # Wcześniejsze słowa - bez rozwinięcia
+    assert _titles(search_service, 'kalk wysył') == ['Kalkulacja kosztów wysyłki']
+
+
+def test_short_prefix_is_not_expanded(help_module):
+    _, _, search_service, _ = help_module
+    assert _titles(search_service, 'ka') == []
+
+
+def test_prefix_match_is_highlighted(help_module):
+    _, _, search_service, _ = help_module
+    hit = search_service.search_articles('kuri')[0]
+    assert '<strong class="highlight">kuriera</strong>' in hit['excerpt']
+
+
+def test_document_is_written_in_article_transaction(help_module):
+    models, help_service, search_service, search_index = help_module
+    article = models.HelpArticle.query.filter_by(title='Klienci').one()
+
+    commits = []
+
+    def count_commit(connection):
+        commits.append(connection)
+
+    # COMMIT na połączeniu - savepoint dokumentu nie jest osobną transakcją
+    db.event.listen(db.engine, 'commit', count_commit)
+    try:
+        result = help_service.update_article(article.id, content='<p>Eksport listy klientów do pliku CSV.</p>')
+    finally:
+        db.event.remove(db.engine, 'commit', count_commit)
+    assert result['success']
+    assert len(commits) == 1
+
+    document = db.session.get(models.HelpSearchDocument, article.id)
+    assert 'CSV' in document.plain_text
+    assert _titles(search_service, 'eksport') == ['Klienci']
+
+
+def test_indexing_error_does_not_block_article_save(help_module, monkeypatch):
+    models, help_service, search_service, _ = help_module
+    category_id = models.HelpCategory.query.one().id
+
+    def broken_strip(html_content):
+        raise RuntimeError('parser')
+
+    monkeypatch.setattr(search_service, 'strip_html_tags', broken_strip)
+    result = help_service.create_article('Reklamacje', '<p>Zgłaszanie reklamacji klienta.</p>', category_id, 1)
+
+    assert result['success']
+    article_id = result['article'].id
+    assert db.session.get(models.HelpArticle, article_id) is not None
+    assert db.session.get(models.HelpSearchDocument, article_id) is None
+
+
+def test_delete_removes_document(help_module):
+    models, help_service, search_service, _ = help_module
+    article = models.HelpArticle.query.filter_by(title='Klienci').one()
+
+    assert help_service.delete_article(article.id)['success']
+    assert db.session.get(models.HelpSearchDocument, article.id) is None
+    assert _titles(search_service, 'klien') == []
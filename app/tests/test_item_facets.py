@@ -0,0 +1,112 @@
+# tests/test_item_facets.py
+"""Liczniki filtrów listy produktów: zgodność z pełnym przeliczeniem po zmianach"""
+
+import pytest
+from sqlalchemy import delete, event, insert, update
+
+from conftest import require_modules
+from extensions import db
+
+STATUSES = ('czeka_na_wyciecie', 'czeka_na_skladanie', 'spakowane')
+SPECIES = ('dąb', 'buk', 'jesion')
+
+
+@pytest.fixture
+def facets(app):
+    models, item_facets = require_modules(
+        'modules.production.models', 'modules.production.services.item_facets'
+    )
+    item_facets.install_facet_tracking()
+    for index in range(1, 31):
+        db.session.add(models.ProductionItem(
+            short_product_id=f'25_{index:05d}_1', internal_order_number=f'25_{index:05d}',
+            product_sequence_in_order=1, baselinker_order_id=1000 + index,
+            original_product_name=f'Klejonka {index}',
+            current_status=STATUSES[index % 3], parsed_wood_species=SPECIES[index % 3 - 1],
+            parsed_technology='lity' if index % 2 else 'mikrowczep', parsed_wood_class='A/B',
+            parsed_thickness_cm=(4, 2.5, None)[index % 3],
+        ))
+    db.session.commit()
+    return models, item_facets
+
+
+def _assert_matches_rebuild(item_facets):
+    db.session.commit()
+    incremental = item_facets.get_facet_counts()
+    item_facets.rebuild_all()
+    assert incremental == item_facets.get_facet_counts()
+
+
+def test_orm_changes_keep_facets_consistent(facets):
+    models, item_facets = facets
+    Item = models.ProductionItem
+
+    Item.query.filter_by(current_status='czeka_na_wyciecie').first().current_status = 'spakowane'
+    Item.query.filter_by(parsed_wood_species='buk').first().parsed_thickness_cm = 6
+    db.session.delete(Item.query.filter_by(parsed_wood_species='jesion').first())
+    db.session.commit()
+
+    summary = item_facets.summarize(item_facets.get_facet_counts())
+    assert summary['status']['spakowane'] == Item.query.filter_by(current_status='spakowane').count()
+    _assert_matches_rebuild(item_facets)
+
+
+def test_conditional_update_applies_deltas(facets):
+    models, item_facets = facets
+    Item = models.ProductionItem
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(' '.join(statement.split()))
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        db.session.execute(
+            update(Item).where(Item.parsed_wood_species == 'buk').values(current_status='wstrzymane')
+        )
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+    # Bez przeliczenia całej tabeli
+    assert 'DELETE FROM prod_item_facets' not in statements
+    assert not any('GROUP BY' in statement for statement in statements)
+
+    counts = item_facets.get_facet_counts()
+    assert counts['wood_species']['buk'] == {'wstrzymane': Item.query.filter_by(parsed_wood_species='buk').count()}
+    _assert_matches_rebuild(item_facets)
+
+
+def test_conditional_delete_and_bulk_update(facets):
+    models, item_facets = facets
+    Item = models.ProductionItem
+
+    db.session.execute(delete(Item).where(Item.parsed_technology == 'mikrowczep', Item.parsed_wood_species == 'dąb'))
+    db.session.execute(update(Item), [{'id': 1, 'parsed_wood_species': 'orzech'}, {'id': 3, 'current_status': 'spakowane'}])
+    db.session.execute(update(Item).where(Item.id > 25).values(parsed_wood_class='B/B'))
+
+    assert item_facets.get_facet_counts()['wood_class']['B/B']
+    _assert_matches_rebuild(item_facets)
+
+
+def test_items_existing_before_tracking_are_counted(app):
+    models, item_facets = require_modules(
+        'modules.production.models', 'modules.production.services.item_facets'
+    )
+    # Core insert - śledzenie go nie widzi, jak produkty sprzed wdrożenia liczników
+    db.session.execute(insert(models.ProductionItem.__table__), [
+        {'short_product_id': f'25_{index:05d}_1', 'internal_order_number': f'25_{index:05d}',
+         'product_sequence_in_order': 1, 'baselinker_order_id': 1000 + index,
+         'original_product_name': f'Klejonka {index}', 'current_status': 'czeka_na_wyciecie',
+         'parsed_wood_species': 'dąb'}
+        for index in range(1, 11)
+    ])
+    db.session.commit()
+    item_facets.install_facet_tracking()
+
+    models.ProductionItem.query.first().current_status = 'spakowane'
+    db.session.commit()
+
+    summary = item_facets.summarize(item_facets.get_facet_counts())
+    assert summary['status'] == {'czeka_na_wyciecie': 9, 'spakowane': 1}
+    assert summary['wood_species'] == {'dąb': 10}
+    _assert_matches_rebuild(item_facets)
@@ -0,0 +1,61 @@
+# tests/test_jobs_access.py
+"""API zadań w tle: dostęp tylko dla autora zadania i adminów"""
+
+from datetime import datetime
+
+import pytest
+
+from conftest import require_modules
+from extensions import db, login_manager
+
+
+@pytest.fixture
+def client(app):
+    jobs, users = require_modules('modules.jobs', 'modules.users.models')
+    app.register_blueprint(jobs.jobs_bp)
+    app.add_url_rule('/login', 'login', lambda: 'login')
+    login_manager.init_app(app)
+
+    for user_id, role in ((1, 'admin'), (2, 'user'), (3, 'user')):
+        db.session.add(users.User(id=user_id, email=f'user{user_id}@example.com', password='x', role=role))
+    for job_id, owner in (('job-of-2', 2), ('job-of-3', 3), ('system-job', None)):
+        db.session.add(jobs.BackgroundJob(
+            id=job_id, job_type='sync', status=jobs.BackgroundJob.STATUS_SUCCEEDED,
+            created_by=owner, created_at=datetime(2025, 3, 1)
+        ))
+    db.session.commit()
+    return app.test_client()
+
+
+@pytest.mark.parametrize('path', ['/jobs/api/{}', '/jobs/api/{}/events'])
+def test_owner_sees_own_job_but_not_others(client, path, login):
+    login(client, 2)
+    assert client.get(path.format('job-of-2')).status_code == 200
+    assert client.get(path.format('job-of-3')).status_code == 404
+    assert client.get(path.format('system-job')).status_code == 404
+
+
+def test_admin_sees_every_job(client, login):
+    login(client, 1)
+    for job_id in ('job-of-2', 'job-of-3', 'system-job'):
+        assert client.get(f'/jobs/api/{job_id}').status_code == 200
+
+
+def test_cannot_stream_or_cancel_foreign_job(client, login):
+    login(client, 3)
+    assert client.get('/jobs/api/job-of-2/stream').status_code == 404
+    assert client.post('/jobs/api/job-of-2/cancel').status_code == 404
+
+
+def test_list_is_filtered_by_owner(client, login):
+    login(client, 2)
+    jobs = client.get('/jobs/api/list').get_json()['jobs']
+    assert [job['id'] for job in jobs] == ['job-of-2']
+
+    login(client, 1)
+    jobs = client.get('/jobs/api/list').get_json()['jobs']
+    assert {job['id'] for job in jobs} == {'job-of-2', 'job-of-3', 'system-job'}
+
+
+def test_anonymous_request_is_rejected(client, login):
+    assert client.get('/jobs/api/job-of-2').status_code in (302, 401)
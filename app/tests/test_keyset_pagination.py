@@ -0,0 +1,117 @@
+# tests/test_keyset_pagination.py
+"""Paginacja keyset: zamówienia CRON z Baselinkera i lista ticketów"""
+
+import json
+import time
+from datetime import datetime, timedelta
+
+import pytest
+
+from conftest import require_modules
+from extensions import db
+
+
+class FakeBaselinker:
+    """getOrders: date_confirmed >= date_confirmed_from, order_id >= id_from, strony po 100"""
+
+    def __init__(self, orders):
+        self.orders = sorted(orders, key=lambda order: (order['date_confirmed'], order['order_id']))
+        self.requests = []
+
+    def __call__(self, request_data):
+        params = json.loads(request_data['parameters'])
+        self.requests.append(params)
+        matching = [order for order in self.orders
+                    if order['date_confirmed'] >= params['date_confirmed_from']
+                    and order['order_id'] >= params.get('id_from', 0)]
+        return {'status': 'SUCCESS', 'orders': matching[:100]}
+
+
+@pytest.fixture
+def sync_service(app):
+    sync = require_modules('modules.production.services.sync_service')
+    service = sync.BaselinkerSyncService()
+    service.api_key = 'test'
+    return service
+
+
+def _fetch_all(service, orders):
+    api = FakeBaselinker(orders)
+    service._make_api_request = api
+    fetched = [order['order_id'] for page in service._iter_paid_orders_for_cron() for order in page]
+    return fetched, api
+
+
+def test_cron_pages_through_orders_sharing_one_second(sync_service):
+    second = int(time.time()) - 3600
+    orders = [{'order_id': 1000 + index, 'date_confirmed': second} for index in range(250)]
+    orders += [{'order_id': 5000 + index, 'date_confirmed': second + 1 + index} for index in range(30)]
+    # Potwierdzone później, ale z mniejszym order_id niż zamówienia zatłoczonej sekundy
+    orders += [{'order_id': 10 + index, 'date_confirmed': second + 2 + index} for index in range(5)]
+
+    fetched, api = _fetch_all(sync_service, orders)
+
+    assert sorted(fetched) == sorted(order['order_id'] for order in orders)
+    assert len(fetched) == len(set(fetched))
+    assert any('id_from' in params for params in api.requests)
+
+
+def test_cron_keeps_orders_split_across_page_boundary(sync_service):
+    start = int(time.time()) - 7200
+    # Po 3 zamówienia na sekundę - granice stron wypadają w środku sekundy
+    orders = [{'order_id': index, 'date_confirmed': start + index // 3} for index in range(1, 320)]
+
+    fetched, api = _fetch_all(sync_service, orders)
+
+    assert sorted(fetched) == list(range(1, 320))
+    assert len(fetched) == len(set(fetched))
+    assert all('id_from' not in params for params in api.requests)
+
+
+@pytest.fixture
+def tickets(app):
+    issues = require_modules('modules.issues.services')
+    require_modules('modules.issues.models')
+    from modules.issues.models import Ticket
+
+    db.create_all()
+    updated_at = datetime(2025, 3, 1, 12, 0)
+    for index in range(23):
+        # Grupy ticketów z identycznym updated_at
+        db.session.add(Ticket(
+            ticket_number=f'T{index:05d}', title=f'Zgłoszenie {index}', category='bug',
+            created_by_user_id=1 + index % 2, updated_at=updated_at - timedelta(minutes=index // 5),
+        ))
+    db.session.commit()
+    return issues.TicketService, Ticket
+
+
+def test_ticket_cursor_walks_all_tickets_once(tickets):
+    service, Ticket = tickets
+    expected = [ticket.id for ticket in Ticket.query.order_by(Ticket.updated_at.desc(), Ticket.id.desc())]
+
+    seen, cursor, pages = [], None, 0
+    while True:
+        page = service.get_user_tickets(user_id=1, is_admin=True, limit=4, cursor=cursor)
+        assert (page['total'] is not None) == (cursor is None)
+        seen += [ticket.id for ticket in page['tickets']]
+        pages += 1
+        cursor = page['next_cursor']
+        if cursor is None:
+            break
+
+    assert seen == expected
+    assert pages == 6
+
+
+def test_ticket_cursor_respects_owner_filter(tickets):
+    service, Ticket = tickets
+    page = service.get_user_tickets(user_id=2, limit=100)
+    assert page['total'] == Ticket.query.filter_by(created_by_user_id=2).count()
+    assert {ticket.created_by_user_id for ticket in page['tickets']} == {2}
+
+
+def test_ticket_invalid_cursor(tickets):
+    service, _ = tickets
+    with pytest.raises(ValueError):
+        service.get_user_tickets(user_id=1, is_admin=True, cursor='zepsuty')
@@ -0,0 +1,50 @@
+# tests/test_lazy_tables.py
+"""Tabele pochodne: budowa raz (znacznik), lease chroni przed równoległą budową"""
+
+from datetime import datetime, timedelta
+
+import pytest
+
+import lazy_tables
+from extensions import db
+
+
+@pytest.fixture
+def derived(app):
+    builds = []
+    tables = lazy_tables.DerivedTables('test_derived', build=lambda conn: builds.append(conn) or len(builds))
+    yield tables, builds
+    lazy_tables._REGISTRY.remove(tables)
+
+
+def test_build_runs_once_and_sets_marker(derived):
+    tables, builds = derived
+    tables.ensure_built()
+    tables.reset()
+    tables.ensure_built()
+
+    assert len(builds) == 1
+    marker = db.session.get(lazy_tables.DerivedTableBuild, 'test_derived')
+    assert marker.built_at is not None and marker.lease_owner is None
+    assert tables.rebuild() == 2
+
+
+def test_lease_of_other_process_blocks_build(derived, monkeypatch):
+    tables, builds = derived
+    lazy_tables._BUILDS.ensure()
+    db.session.add(lazy_tables.DerivedTableBuild(
+        name='test_derived', lease_owner='other:1', lease_expires_at=datetime.utcnow() + timedelta(minutes=5)
+    ))
+    db.session.commit()
+    monkeypatch.setattr(lazy_tables, 'WAIT_SECONDS', 0)
+
+    with pytest.raises(RuntimeError):
+        tables.rebuild()
+    tables.ensure_built()
+    assert builds == []
+
+    # Lease wygasł (proces zginął) - budowę przejmuje ten proces
+    db.session.get(lazy_tables.DerivedTableBuild, 'test_derived').lease_expires_at = datetime.utcnow() - timedelta(seconds=1)
+    db.session.commit()
+    tables.ensure_built()
+    assert len(builds) == 1
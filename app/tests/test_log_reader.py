@@ -0,0 +1,29 @@
+# tests/test_log_reader.py
+"""Live tail logów: przejście na nowy plik po rotacji dziennej"""
+
+from conftest import require_modules
+
+
+def test_follow_switches_to_new_file_after_rollover(tmp_path):
+    reader = require_modules('modules.logging.reader')
+    yesterday = tmp_path / 'app_2025-03-01.log'
+    today = tmp_path / 'app_2025-03-02.log'
+    yesterday.write_text('wczoraj 1\nwczoraj 2\n')
+    current = {'path': str(yesterday)}
+
+    stream = reader.LogReader.follow(str(yesterday), offset=None, poll_interval=0,
+                                     resolve_path=lambda: current['path'])
+    assert next(stream)['content'] == 'wczoraj 1\nwczoraj 2\n'
+
+    # Północ - nowy plik jest krótszy niż kursor poprzedniego, ale czytany od początku
+    current['path'] = str(today)
+    today.write_text('dziś 1\n')
+    result = next(stream)
+    assert result['reset'] is True
+    assert result['content'] == 'dziś 1\n'
+
+    with open(today, 'a') as log_file:
+        log_file.write('dziś 2\n')
+    result = next(stream)
+    assert result['reset'] is False
+    assert result['content'] == 'dziś 2\n'
@@ -0,0 +1,41 @@
+# tests/test_logging_queue.py
+"""Kolejka logów: rekord przekazany do listenera nie zależy od obiektów wywołującego"""
+
+import logging
+import queue
+from datetime import date
+
+from conftest import require_modules
+
+
+def _record(fields):
+    record = logging.LogRecord('app.tests', logging.INFO, __file__, 1, 'Zapis %s', ('zamówienia',), None)
+    record.structured_fields = fields
+    return record
+
+
+def test_prepare_copies_structured_fields():
+    logger_module = require_modules('modules.logging.logger')
+    handler = logger_module.ContextQueueHandler(queue.Queue())
+    items = [1, 2]
+    details = {'order': {'id': 7, 'items': items}}
+
+    prepared = handler.prepare(_record({'count': 2, 'details': details, 'items': items}))
+    items.append(3)
+    details['order']['id'] = 8
+
+    assert prepared.msg == 'Zapis zamówienia'
+    assert prepared.structured_fields == {'count': 2, 'details': {'order': {'id': 7, 'items': [1, 2]}}, 'items': [1, 2]}
+
+
+def test_snapshot_fields_converts_objects_to_json_types():
+    logger_module = require_modules('modules.logging.logger')
+
+    class Unserializable:
+        def __repr__(self):
+            return '<obiekt>'
+
+    snapshot = logger_module.snapshot_fields({
+        'day': date(2025, 3, 1), 'ids': (1, 2), 'nested': {'obj': Unserializable()}, 'flag': True
+    })
+    assert snapshot == {'day': '2025-03-01', 'ids': [1, 2], 'nested': {'obj': '<obiekt>'}, 'flag': True}
@@ -0,0 +1,66 @@
+# tests/test_map_stats.py
+"""Agregaty mapy województw: budowa historii i odświeżanie dni po zmianach"""
+
+from datetime import date, timedelta
+from decimal import Decimal
+
+import pytest
+from sqlalchemy import insert
+
+from conftest import require_modules
+from extensions import db
+
+POSTCODES = ('00-950', '50-001', '80-001')
+
+
+@pytest.fixture
+def reports(app):
+    models, map_stats = require_modules('modules.reports.models', 'modules.reports.map_stats')
+    # Core insert - śledzenie go nie widzi, jak raporty sprzed wdrożenia agregatów
+    db.session.execute(insert(models.BaselinkerReportOrder.__table__), [
+        {'date_created': date(2025, 3, 1) + timedelta(days=index % 5), 'baselinker_order_id': 100 + index,
+         'delivery_postcode': POSTCODES[index % 3], 'baselinker_status_id': 138620 if index % 2 else 1,
+         'price_type': 'netto', 'value_net': Decimal('100.00'), 'total_volume': Decimal('0.1000'),
+         'raw_product_name': f'Klejonka {index}'}
+        for index in range(30)
+    ])
+    db.session.commit()
+    map_stats.install_change_tracking()
+    return models, map_stats
+
+
+def _assert_matches_rebuild(map_stats):
+    incremental = map_stats.get_map_statistics()
+    map_stats.rebuild_all()
+    assert incremental == map_stats.get_map_statistics()
+
+
+def test_history_is_built_before_first_refresh(reports):
+    models, map_stats = reports
+
+    order = models.BaselinkerReportOrder.query.filter_by(date_created=date(2025, 3, 1)).first()
+    order.delivery_postcode = '80-001'
+    db.session.commit()
+
+    stats = map_stats.get_map_statistics()
+    assert stats['processed_rows'] == 30
+    assert stats['regions']['mazowieckie']['orders_count'] == 9
+    assert stats['regions']['pomorskie']['orders_count'] == 11
+    _assert_matches_rebuild(map_stats)
+
+
+def test_refresh_of_existing_days_updates_in_place(reports):
+    models, map_stats = reports
+    map_stats.get_map_statistics()
+    stats_table = models.VoivodeshipDailyStats
+    ids_before = {row.id for row in stats_table.query.filter_by(stat_date=date(2025, 3, 2))}
+
+    # Ponowne odświeżenie tych samych dni (np. dwa procesy po sobie) - bez konfliktu klucza dnia
+    assert map_stats.refresh_days([date(2025, 3, 2)]) == map_stats.refresh_days([date(2025, 3, 2)])
+    assert {row.id for row in stats_table.query.filter_by(stat_date=date(2025, 3, 2))} == ids_before
+
+    db.session.query(models.BaselinkerReportOrder).filter_by(date_created=date(2025, 3, 2)).delete()
+    db.session.commit()
+    map_stats.refresh_days([date(2025, 3, 2)])
+    assert stats_table.query.filter_by(stat_date=date(2025, 3, 2)).count() == 0
+    _assert_matches_rebuild(map_stats)
@@ -0,0 +1,32 @@
+# tests/test_order_mirror.py
+"""Kopia zamówień Baselinker: zapis z getOrders bez pól dodatkowych"""
+
+import pytest
+
+from conftest import require_modules
+from extensions import db
+
+
+@pytest.fixture
+def order_mirror(app):
+    return require_modules('modules.baselinker.order_mirror')
+
+
+def _order(order_id, **extra):
+    return dict({'order_id': order_id, 'order_status_id': 105112, 'date_add': 1740830400}, **extra)
+
+
+def test_orders_without_custom_fields_keep_stored_ones(order_mirror):
+    order_mirror.mirror_orders([_order(1, custom_extra_fields={'78400': 'FV/1/2025'}), _order(2)])
+    # Cron: getOrders bez include_custom_extra_fields
+    assert order_mirror.mirror_orders([_order(1, order_status_id=138620), _order(2)]) == 2
+
+    first = order_mirror._load_order(1)
+    assert first.order_status_id == 138620
+    assert first.custom_extra_fields == {'78400': 'FV/1/2025'}
+    # Pola nigdy nie pobrane - snapshot nie uzna kopii za aktualną
+    assert order_mirror._load_order(2).custom_extra_fields is None
+
+    order_mirror.mirror_orders([_order(2, custom_extra_fields=[])])
+    db.session.expire_all()
+    assert order_mirror._load_order(2).custom_extra_fields == {}
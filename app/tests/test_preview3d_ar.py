@@ -0,0 +1,92 @@
+# tests/test_preview3d_ar.py
+"""Single-flight buildów modeli AR i endpoint pre-generacji"""
+
+import os
+import threading
+import time
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import require_modules
+from extensions import db, login_manager
+
+
+@pytest.fixture
+def ar_models():
+    return require_modules('modules.preview3d_ar.models')
+
+
+def test_single_flight_serializes_and_cleans_up(ar_models, tmp_path):
+    events = []
+
+    def build(index):
+        with ar_models.single_flight(str(tmp_path), 'wariant_200x80x4'):
+            events.append(('start', index))
+            time.sleep(0.02)
+            events.append(('end', index))
+
+    threads = [threading.Thread(target=build, args=(index,)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    # Buildy nie zachodzą na siebie
+    assert all(events[i][0] == 'start' and events[i + 1] == ('end', events[i][1]) for i in range(0, 8, 2))
+    assert ar_models._build_locks == {}
+    assert os.listdir(tmp_path) == []
+
+
+def test_single_flight_releases_on_error(ar_models, tmp_path):
+    with pytest.raises(RuntimeError):
+        with ar_models.single_flight(str(tmp_path), 'klucz'):
+            raise RuntimeError('build failed')
+
+    assert ar_models._build_locks == {}
+    with ar_models.single_flight(str(tmp_path), 'klucz'):
+        assert os.path.exists(tmp_path / 'klucz.lock')
+
+
+@pytest.fixture
+def prewarm(app, monkeypatch):
+    preview, routers, users = require_modules(
+        'modules.preview3d_ar', 'modules.preview3d_ar.routers', 'modules.users.models'
+    )
+    app.register_blueprint(preview.preview3d_ar_bp)
+    app.add_url_rule('/login', 'login', lambda: 'login')
+    login_manager.init_app(app)
+    db.session.add(users.User(id=1, email='admin@example.com', password='x', role='admin'))
+    db.session.add(users.User(id=2, email='user@example.com', password='x', role='user'))
+    db.session.commit()
+
+    calls = []
+
+    def start_background_prewarm(app, **kwargs):
+        calls.append(kwargs)
+        return SimpleNamespace(id=f'job-{len(calls)}')
+
+    monkeypatch.setattr(routers, 'start_background_prewarm', start_background_prewarm)
+    return app.test_client(), calls
+
+
+def test_prewarm_requires_admin(prewarm, login):
+    client, calls = prewarm
+    url = '/preview3d-ar/api/ar-prewarm'
+
+    assert client.post(url, json={}).status_code in (302, 401)
+    login(client, 2)
+    assert client.post(url, json={}).status_code == 403
+    assert calls == []
+
+
+def test_prewarm_clamps_range(prewarm, login):
+    client, calls = prewarm
+    login(client, 1)
+
+    response = client.post('/preview3d-ar/api/ar-prewarm', json={'days': 3650, 'limit': 10 ** 6})
+    assert response.status_code == 202
+    assert response.get_json()['job_id'] == 'job-1'
+    assert calls == [{'days': 30, 'limit': 500, 'quote_id': None, 'user_id': 1}]
+
+    assert client.post('/preview3d-ar/api/ar-prewarm', json={'days': 'abc'}).status_code == 400
@@ -0,0 +1,107 @@
+# tests/test_pricing.py
+"""Zgodność serwerowego silnika wyceny z formułami calculator.js"""
+
+import math
+from types import SimpleNamespace
+
+import pytest
+
+from conftest import require_modules
+from extensions import db
+
+PRICE_ROWS = [
+    # (gatunek, technologia, klasa, grubość od-do, długość od-do, cena za m³)
+    ('Dąb', 'Lity', 'A/B', 0, 3, 0, 200, 9000.0),
+    ('Dąb', 'Lity', 'A/B', 4, 6, 0, 200, 8000.0),
+    ('Dąb', 'Lity', 'A/B', 0, 6, 0, 400, 7000.0),
+    ('Buk', 'Lity', 'A/B', 0, 6, 0, 400, 5000.0),
+]
+
+
+@pytest.fixture
+def pricing():
+    return require_modules('modules.calculator.pricing')
+
+
+@pytest.fixture
+def engine(pricing):
+    rows = [
+        SimpleNamespace(species=s, technology=t, wood_class=c, thickness_min=tmin, thickness_max=tmax,
+                        length_min=lmin, length_max=lmax, price_per_m3=price)
+        for s, t, c, tmin, tmax, lmin, lmax, price in PRICE_ROWS
+    ]
+    finishing = [SimpleNamespace(name='Lakierowane bezbarwne', price_netto=180.0)]
+    return pricing.PricingEngine.from_snapshot(pricing.PricingSnapshot(rows, [], finishing))
+
+
+def _js_variant(length, width, thickness, quantity, multiplier, species, technology, wood_class):
+    """Odpowiednik updatePrices() + getPrice() z calculator.js"""
+    rounded = math.ceil(thickness)
+    match = next((row for row in PRICE_ROWS
+                  if row[:3] == (species, technology, wood_class)
+                  and row[3] <= rounded <= row[4] and row[5] <= length <= row[6]), None)
+    single_volume = (length / 100) * (width / 100) * (rounded / 100)
+    if match is None:
+        return single_volume, None
+    unit_netto = single_volume * match[7] * multiplier
+    return single_volume, {
+        'unit_netto': unit_netto,
+        'unit_brutto': unit_netto * 1.23,
+        'total_netto': unit_netto * quantity,
+        'total_brutto': unit_netto * 1.23 * quantity,
+    }
+
+
+@pytest.mark.parametrize('length,width,thickness,quantity', [
+    (150, 60, 2.5, 3),
+    (150, 60, 3.2, 1),
+    (250, 80, 4, 2),
+    (120.5, 40, 5.01, 7),
+])
+def test_price_quote_matches_calculator_js(engine, pricing, length, width, thickness, quantity):
+    products = [{'length': length, 'width': width, 'thickness': thickness, 'quantity': quantity,
+                 'variants': [{'variant_code': 'dab-lity-ab', 'is_selected': True}, 'buk-lity-ab']}]
+    result = engine.price_quote(products, multiplier=1.2)
+
+    product = result['products'][0]
+    volume, dab = _js_variant(length, width, thickness, quantity, 1.2, 'Dąb', 'Lity', 'A/B')
+    _, buk = _js_variant(length, width, thickness, quantity, 1.2, 'Buk', 'Lity', 'A/B')
+
+    assert product['volume_m3'] == pytest.approx(volume)
+    for variant, expected in zip(product['variants'], (dab, buk)):
+        for field, value in expected.items():
+            assert variant[field] == pytest.approx(value)
+    assert result['summary']['products_netto'] == pytest.approx(dab['total_netto'])
+
+
+def test_volume_rounds_thickness_up(engine):
+    product = engine.price_quote([{'length': 100, 'width': 100, 'thickness': 2.1}], multiplier=1.0)['products'][0]
+    assert product['volume_m3'] == pytest.approx(0.03)
+
+
+def test_finishing_cost_matches_calculator_js(engine, pricing):
+    product = {'length': 200, 'width': 60, 'thickness': 4, 'quantity': 2,
+               'finishing_type': 'Lakierowanie', 'finishing_variant': 'Bezbarwne'}
+    netto, brutto = engine.finishing_cost(product)
+
+    surface = 2 * (2.0 * 0.6 + 2.0 * 0.04 + 0.6 * 0.04) * 2
+    expected_netto = math.floor(surface * 180.0 * 100 + 0.5) / 100
+    assert netto == pytest.approx(expected_netto)
+    assert brutto == pytest.approx(math.floor(expected_netto * 1.23 * 100 + 0.5) / 100)
+
+
+def test_invalidation_reaches_engines_of_other_processes(app, pricing):
+    models = require_modules('modules.calculator.models')
+    db.session.add(models.Price(species='Dąb', technology='Lity', wood_class='A/B', thickness_min=0,
+                                thickness_max=6, length_min=0, length_max=400, price_per_m3=7000))
+    db.session.commit()
+    # Silnik innego workera - sprawdza wersję przy każdej wycenie
+    other_worker = pricing.PricingEngine(version_check_seconds=0)
+    assert other_worker.snapshot().lookup_price('dab-lity-ab', 4, 200) == 7000.0
+
+    models.Price.query.update({'price_per_m3': 7500})
+    db.session.commit()
+    assert other_worker.snapshot().lookup_price('dab-lity-ab', 4, 200) == 7000.0
+
+    pricing.invalidate_pricing_cache()
+    assert other_worker.snapshot().lookup_price('dab-lity-ab', 4, 200) == 7500.0
@@ -0,0 +1,193 @@
+# tests/test_query_budgets.py
+"""Budżety zapytań endpointów po usunięciu N+1 oraz nagłówki profilera"""
+
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Blueprint, g
+
+from conftest import require_modules
+from extensions import db, login_manager
+from query_profiler import assert_max_queries, init_query_profiler, profile_queries
+
+ADMIN_EMAIL = 'admin@example.com'
+
+
+def _setup_login(app):
+    from modules.users.models import User
+
+    app.add_url_rule('/login', 'login', lambda: 'login')
+    login_manager.init_app(app)
+    db.session.add(User(id=1, email=ADMIN_EMAIL, password='x', role='admin', first_name='Anna', last_name='Nowak'))
+    db.session.add(User(id=2, email='user@example.com', password='x', role='user'))
+    db.session.commit()
+
+
+def _queries_within_budget(app, client, url):
+    """Liczba zapytań żądania, sprawdzona względem budżetu widoku (@query_budget)"""
+    db.session.expire_all()
+    endpoint = app.url_map.bind('localhost').match(url.split('?')[0])[0]
+    budget = app.view_functions[endpoint]._query_budget
+    with assert_max_queries(budget) as profile:
+        response = client.get(url)
+    assert response.status_code == 200
+    return profile.count
+
+
+@pytest.fixture
+def crm_app(app):
+    quotes, clients, calculator, issues = require_modules(
+        'modules.quotes', 'modules.clients', 'modules.calculator', 'modules.issues'
+    )
+    require_modules('modules.issues.models')
+    db.create_all()
+    app.register_blueprint(quotes.quotes_bp, url_prefix='/quotes')
+    app.register_blueprint(clients.clients_bp, url_prefix='/clients')
+    app.register_blueprint(calculator.calculator_bp, url_prefix='/calculator')
+    app.register_blueprint(issues.issues_bp)
+    _setup_login(app)
+    return app
+
+
+def _add_crm_rows(count):
+    from modules.calculator.models import Quote
+    from modules.clients.models import Client
+    from modules.issues.models import Ticket
+    from modules.quotes.models import QuoteStatus
+
+    if not db.session.get(QuoteStatus, 1):
+        db.session.add(QuoteStatus(id=1, name='Nowa'))
+    start = Client.query.count()
+    for index in range(start, count):
+        db.session.add(Client(id=index + 1, client_number=f'Kowalski {index}',
+                              client_name=f'Firma Kowalski {index}', created_by_user_id=1 + index % 2))
+        db.session.add(Quote(id=index + 1, quote_number=f'W/{index}', user_id=1 + index % 2,
+                             client_id=index + 1, status_id=1, public_token=f'token{index}',
+                             created_at=datetime(2025, 1, 1) + timedelta(hours=index)))
+        db.session.add(Ticket(ticket_number=f'T{index:05d}', title='Zgłoszenie', category='bug',
+                              created_by_user_id=1 + index % 2))
+    db.session.commit()
+
+
+CRM_URLS = (
+    '/quotes/api/quotes?limit=50',
+    '/quotes/api/quotes?include_counts=1',
+    '/clients/search_in_database?q=kowalski',
+    '/calculator/search_clients?q=kowalski',
+    '/issues/api/tickets',
+)
+
+
+@pytest.mark.parametrize('url', CRM_URLS)
+def test_crm_lists_fit_budget_and_do_not_grow_with_rows(crm_app, url, login):
+    client = crm_app.test_client()
+    login(client, 1, email=ADMIN_EMAIL)
+
+    _add_crm_rows(5)
+    _queries_within_budget(crm_app, client, url)  # pierwsze żądanie ładuje indeksy wyszukiwania
+    small = _queries_within_budget(crm_app, client, url)
+    _add_crm_rows(40)
+    large = _queries_within_budget(crm_app, client, url)
+    assert large == small
+
+
+@pytest.fixture
+def production_app(app):
+    api_routers, item_facets, queue_projection = require_modules(
+        'modules.production.routers.api_routers', 'modules.production.services.item_facets',
+        'modules.production.services.queue_projection'
+    )
+    item_facets.install_facet_tracking()
+    queue_projection.install_queue_tracking()
+    blueprint = Blueprint('production', __name__, url_prefix='/production')
+    blueprint.register_blueprint(api_routers.api_bp, url_prefix='/api')
+    app.register_blueprint(blueprint)
+    _setup_login(app)
+    return app
+
+
+def _add_production_rows(count):
+    from modules.production.models import ProductionItem
+
+    for index in range(ProductionItem.query.count(), count):
+        db.session.add(ProductionItem(
+            short_product_id=f'25_{index:05d}_1', internal_order_number=f'25_{index:05d}',
+            product_sequence_in_order=1, baselinker_order_id=1000 + index,
+            original_product_name=f'Klejonka dąb {index}', parsed_wood_species='dąb',
+            current_status=('czeka_na_wyciecie', 'spakowane')[index % 2],
+            parsed_thickness_cm=4, priority_rank=index,
+        ))
+    db.session.commit()
+
+
+PRODUCTION_URLS = (
+    '/production/api/products-filtered',
+    '/production/api/products-filtered?status=czeka_na_wyciecie',
+    '/production/api/products-filtered?search=klejonka&sort_by=relevance',
+    '/production/api/products/filters-data',
+)
+
+
+@pytest.mark.parametrize('url', PRODUCTION_URLS)
+def test_production_lists_fit_budget_and_do_not_grow_with_rows(production_app, url, login):
+    client = production_app.test_client()
+    login(client, 1, email=ADMIN_EMAIL)
+
+    _add_production_rows(5)
+    _queries_within_budget(production_app, client, url)
+    small = _queries_within_budget(production_app, client, url)
+    _add_production_rows(60)
+    large = _queries_within_budget(production_app, client, url)
+    assert large == small
+
+
+@pytest.fixture
+def profiled_app(app):
+    require_modules('modules.users.models')
+    _setup_login(app)
+    app.config['QUERY_BUDGETS'] = {'items': 1}
+    app.config['QUERY_BUDGET_STRICT'] = True
+    init_query_profiler(app)
+
+    @app.route('/items/<int:count>')
+    def items(count):
+        for _ in range(count):
+            db.session.execute(db.text('SELECT 1'))
+        return 'ok'
+
+    return app
+
+
+def test_headers_are_off_for_regular_users(profiled_app, login):
+    client = profiled_app.test_client()
+    assert 'X-DB-Query-Count' not in client.get('/items/1').headers
+
+    login(client, 2, email='user@example.com')
+    response = client.get('/items/1')
+    assert 'X-DB-Query-Count' not in response.headers
+    assert 'Server-Timing' not in response.headers
+
+
+def test_headers_are_sent_to_admins_and_in_debug(profiled_app, login):
+    client = profiled_app.test_client()
+    login(client, 1, email=ADMIN_EMAIL)
+    assert client.get('/items/1').headers['X-DB-Query-Count'] == '1'
+
+    g.pop('_login_user', None)
+    profiled_app.debug = True
+    assert 'X-DB-Time-Ms' in profiled_app.test_client().get('/items/1').headers
+
+
+def test_strict_budget_raises(profiled_app):
+    from query_profiler import QueryBudgetExceeded
+
+    client = profiled_app.test_client()
+    with pytest.raises(QueryBudgetExceeded):
+        client.get('/items/3')
+
+
+def test_profile_queries_counts_block(app):
+    with profile_queries() as profile:
+        db.session.execute(db.text('SELECT 1'))
+        db.session.execute(db.text('SELECT 1'))
+    assert profile.count == 2
@@ -0,0 +1,137 @@
+# tests/test_queue_projection.py
+"""Projekcja kolejki produkcyjnej: zgodność z pełną przebudową po zmianach"""
+
+from datetime import date, datetime, timedelta
+
+import pytest
+from sqlalchemy import delete, event, insert, update
+
+from conftest import require_modules
+from extensions import db
+
+STATUSES = ('czeka_na_wyciecie', 'czeka_na_skladanie', 'czeka_na_pakowanie', 'spakowane')
+
+
+@pytest.fixture
+def projection(app):
+    models, queue_projection = require_modules(
+        'modules.production.models', 'modules.production.services.queue_projection'
+    )
+    queue_projection.install_queue_tracking()
+    for index in range(1, 31):
+        db.session.add(models.ProductionItem(
+            short_product_id=f'25_{index:05d}_1', internal_order_number=f'25_{index:05d}',
+            product_sequence_in_order=1, baselinker_order_id=1000 + index,
+            original_product_name=f'Klejonka {index}', current_status=STATUSES[index % 4],
+            parsed_wood_species='dąb' if index % 3 else 'buk', parsed_technology='lity',
+            parsed_wood_class='A/B', parsed_length_cm=200, parsed_width_cm=50, parsed_thickness_cm=4,
+            volume_m3=0.04, total_value_net=100 + index, priority_rank=index if index % 2 else None,
+            deadline_date=date(2025, 3, 1) + timedelta(days=index % 7),
+            payment_date=datetime(2025, 1, 1) + timedelta(days=index),
+        ))
+    db.session.commit()
+    return models, queue_projection
+
+
+def _snapshot(models, queue_projection):
+    items = sorted(
+        (row.id, row.current_status, row.priority_rank, row.display_name)
+        for row in models.ProductionQueueItem.query.all()
+    )
+    return items, queue_projection.get_status_counters()
+
+
+def _assert_matches_rebuild(models, queue_projection):
+    db.session.commit()
+    incremental = _snapshot(models, queue_projection)
+    queue_projection.rebuild_all()
+    db.session.expire_all()
+    assert incremental == _snapshot(models, queue_projection)
+
+
+def test_orm_changes_keep_projection_consistent(projection):
+    models, queue_projection = projection
+    Item = models.ProductionItem
+
+    Item.query.filter_by(current_status='czeka_na_wyciecie').first().current_status = 'czeka_na_skladanie'
+    Item.query.filter_by(current_status='czeka_na_pakowanie').first().current_status = 'spakowane'
+    ranked = Item.query.filter(Item.priority_rank.isnot(None)).order_by(Item.priority_rank).first()
+    ranked.priority_rank = None
+    db.session.delete(Item.query.filter_by(current_status='czeka_na_skladanie').first())
+    db.session.commit()
+
+    counters = queue_projection.get_status_counters()
+    assert counters['czeka_na_pakowanie']['count'] == models.ProductionItem.query.filter_by(
+        current_status='czeka_na_pakowanie').count()
+    _assert_matches_rebuild(models, queue_projection)
+
+
+def test_conditional_update_refreshes_only_matching_items(projection):
+    models, queue_projection = projection
+    Item = models.ProductionItem
+    moved = Item.query.filter_by(current_status='czeka_na_wyciecie').count()
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append(' '.join(statement.split()))
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        db.session.execute(
+            update(Item).where(Item.current_status == 'czeka_na_wyciecie').values(current_status='wstrzymane')
+        )
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+
+    # Bez pełnej przebudowy: projekcja kasowana tylko po id, liczniki bez GROUP BY
+    assert 'DELETE FROM prod_queue_items' not in statements
+    assert not any('GROUP BY' in statement for statement in statements)
+    counters = queue_projection.get_status_counters()
+    assert counters['wstrzymane']['count'] == moved
+    assert counters['czeka_na_wyciecie']['count'] == 0
+    _assert_matches_rebuild(models, queue_projection)
+
+
+def test_conditional_delete_and_rank_changes(projection):
+    models, queue_projection = projection
+    Item = models.ProductionItem
+
+    db.session.execute(update(Item).where(Item.baselinker_order_id > 1020).values(priority_rank=Item.baselinker_order_id))
+    db.session.execute(delete(Item).where(Item.parsed_wood_species == 'buk'))
+    db.session.execute(update(Item), [{'id': 1, 'current_status': 'czeka_na_pakowanie', 'priority_rank': 5000}])
+
+    counters = queue_projection.get_status_counters()
+    assert counters['czeka_na_pakowanie']['max_priority_rank'] == 5000
+    _assert_matches_rebuild(models, queue_projection)
+
+
+def test_update_of_untracked_column_is_ignored(projection):
+    models, queue_projection = projection
+    Item = models.ProductionItem
+    before = _snapshot(models, queue_projection)
+
+    db.session.execute(update(Item).where(Item.id < 5).values(product_sequence_in_order=2))
+    assert _snapshot(models, queue_projection) == before
+
+
+def test_items_existing_before_tracking_are_built_first(app):
+    models, queue_projection = require_modules(
+        'modules.production.models', 'modules.production.services.queue_projection'
+    )
+    # Core insert - śledzenie go nie widzi, jak produkty sprzed wdrożenia projekcji
+    db.session.execute(insert(models.ProductionItem.__table__), [
+        {'short_product_id': f'25_{index:05d}_1', 'internal_order_number': f'25_{index:05d}',
+         'product_sequence_in_order': 1, 'baselinker_order_id': 1000 + index,
+         'original_product_name': f'Klejonka {index}',
+         'current_status': 'czeka_na_wyciecie'}
+        for index in range(1, 11)
+    ])
+    db.session.commit()
+    queue_projection.install_queue_tracking()
+
+    models.ProductionItem.query.first().current_status = 'czeka_na_skladanie'
+    db.session.commit()
+
+    assert len(queue_projection.station_items('cutting')) == 9
+    assert queue_projection.get_status_counters()['czeka_na_skladanie']['count'] == 1
+    _assert_matches_rebuild(models, queue_projection)
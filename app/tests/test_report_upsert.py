@@ -0,0 +1,170 @@
+# tests/test_report_upsert.py
+"""Zbiorczy zapis raportów: liczniki ReportStatusUpsert i ReportImportStage"""
+
+from datetime import date
+from decimal import Decimal
+
+import pytest
+
+from conftest import require_modules
+from extensions import db
+
+
+@pytest.fixture
+def reports(app):
+    models, status_upsert, import_stage = require_modules(
+        'modules.reports.models', 'modules.reports.status_upsert', 'modules.reports.import_stage'
+    )
+    return models, status_upsert, import_stage
+
+
+def _add_order(models, order_id, records=2, status='Nowe'):
+    for index in range(records):
+        db.session.add(models.BaselinkerReportOrder(
+            date_created=date(2025, 3, 1), baselinker_order_id=order_id,
+            current_status=status, baselinker_status_id=1, price_type='netto',
+            order_amount_net=Decimal('200.00'), value_net=Decimal('100.00'),
+            total_volume=Decimal('0.1000'), paid_amount_net=Decimal('0.00'),
+            raw_product_name=f'Klejonka {order_id}/{index}',
+        ))
+
+
+class FakeReportsService:
+    """Minimalny odpowiednik BaselinkerReportsService używany przez ReportImportStage"""
+
+    status_map = {2: 'W produkcji'}
+
+    def __init__(self, models):
+        self.models = models
+
+    def generate_product_key(self, order_id, product, product_index=None):
+        return f"{order_id}_idx_{product_index}"
+
+    def _calculate_paid_amount_net(self, payment_done, price_type):
+        return float(payment_done or 0)
+
+    def _get_existing_order_ids(self, order_ids):
+        rows = db.session.query(self.models.BaselinkerReportOrder.baselinker_order_id)\
+            .filter(self.models.BaselinkerReportOrder.baselinker_order_id.in_(order_ids)).distinct()
+        return {row[0] for row in rows}
+
+    def _convert_order_to_records(self, order, product_fixes=None):
+        return [
+            self.models.BaselinkerReportOrder(
+                date_created=date(2025, 3, 2), baselinker_order_id=order['order_id'],
+                current_status='Nowe', value_net=Decimal('50.00'), total_volume=Decimal('0.0500'),
+                raw_product_name=product['name'],
+            )
+            for product in order['products']
+        ]
+
+
+def _api_order(order_id, status_id=2, payment=0):
+    return {
+        'order_id': order_id, 'order_status_id': status_id, 'payment_done': payment,
+        'custom_extra_fields': {'106169': 'netto'},
+        'products': [{'name': f'Blat {order_id}', 'product_id': 1}],
+    }
+
+
+def test_upsert_counts_changed_records_across_auto_flushes(reports):
+    models, status_upsert, _ = reports
+    for order_id in range(1, 6):
+        _add_order(models, order_id)
+    db.session.commit()
+
+    upsert = status_upsert.ReportStatusUpsert(batch_size=2)
+    for order_id in range(1, 6):
+        # Zamówienie 5 bez zmian - nie może być liczone
+        upsert.add(order_id, current_status='Nowe' if order_id == 5 else 'W produkcji', baselinker_status_id=1)
+    stats = upsert.finish()
+
+    assert stats['orders_checked'] == 5
+    assert stats['orders_updated'] == 4
+    assert stats['records_updated'] == 8
+    changed = models.BaselinkerReportOrder.query.filter_by(current_status='W produkcji').count()
+    assert changed == 8
+
+
+def test_upsert_without_auto_flush_leaves_batching_to_caller(reports):
+    models, status_upsert, _ = reports
+    for order_id in range(1, 4):
+        _add_order(models, order_id)
+    db.session.commit()
+
+    upsert = status_upsert.ReportStatusUpsert(batch_size=1, commit=False, auto_flush=False)
+    for order_id in range(1, 4):
+        upsert.add(order_id, current_status='W produkcji')
+    assert len(upsert) == 3
+    assert upsert.flush() == 6
+
+
+def test_upsert_recomputes_balance_due(reports):
+    models, status_upsert, _ = reports
+    _add_order(models, 1, records=1)
+    db.session.commit()
+
+    upsert = status_upsert.ReportStatusUpsert()
+    upsert.add(1, paid_amount_net=150.0, delivery_cost=20.0)
+    upsert.finish()
+
+    record = models.BaselinkerReportOrder.query.one()
+    # Zamówienie netto: 200 netto + 20 kurier - 150 zapłacone
+    assert float(record.balance_due) == pytest.approx(70.0)
+
+
+def test_import_reports_updates_from_full_batches_of_existing_orders(reports):
+    models, _, import_stage = reports
+    for order_id in range(1, 5):
+        _add_order(models, order_id)
+    db.session.commit()
+
+    stage = import_stage.ReportImportStage(FakeReportsService(models), batch_size=2)
+    result = stage.run([_api_order(order_id) for order_id in range(1, 5)])
+
+    assert result['errors'] == []
+    assert result['batches'] == 2
+    assert result['orders_updated'] == 4
+    assert result['records_updated'] == 8
+
+
+def test_import_inserts_new_orders_and_updates_existing(reports):
+    models, _, import_stage = reports
+    _add_order(models, 1)
+    db.session.commit()
+
+    stage = import_stage.ReportImportStage(FakeReportsService(models), batch_size=10)
+    result = stage.run([_api_order(1), _api_order(2), _api_order(3), _api_order(2)])
+
+    assert result['orders_added'] == 2
+    assert result['records_added'] == 2
+    assert result['orders_updated'] == 1
+    assert result['records_updated'] == 2
+    assert models.BaselinkerReportOrder.query.count() == 4
+
+
+def test_failed_status_batch_is_rolled_back_and_reported(reports, monkeypatch):
+    models, status_upsert, _ = reports
+    routers = require_modules('modules.reports.routers')
+    for order_id in range(1, 3):
+        _add_order(models, order_id)
+    db.session.commit()
+
+    upsert = status_upsert.ReportStatusUpsert(auto_flush=False)
+    upsert.add(1, current_status='W produkcji')
+
+    def failing_write(*args):
+        raise RuntimeError('deadlock')
+
+    monkeypatch.setattr(upsert, '_write', failing_write)
+    failed_batches = []
+    assert not routers._write_status_batch(upsert, [1], failed_batches)
+    assert failed_batches == [{'order_ids': [1], 'error': 'deadlock'}]
+    assert upsert.stats['records_updated'] == 0
+
+    # Kolejna porcja zapisuje się na czystej sesji
+    monkeypatch.undo()
+    upsert.add(2, current_status='W produkcji')
+    assert routers._write_status_batch(upsert, [2], failed_batches)
+    assert upsert.stats['records_updated'] == 2
+    assert len(failed_batches) == 1
@@ -0,0 +1,99 @@
+# tests/test_repricing_jobs.py
+"""Przeliczanie wycen jako zadanie w tle: stan w bazie, raport poza drzewem kodu"""
+
+import os
+import time
+from datetime import datetime
+
+import pytest
+
+from conftest import require_modules
+from extensions import db
+
+
+@pytest.fixture
+def repricing(app, tmp_path):
+    module = require_modules('modules.calculator.repricing')
+    app.config['REPRICING_REPORTS_DIR'] = str(tmp_path / 'reports')
+    return module
+
+
+def _wait_for(job_id, timeout=10.0):
+    from modules.jobs import get_job
+
+    deadline = time.monotonic() + timeout
+    while True:
+        db.session.expire_all()
+        job = get_job(job_id)
+        if not job.is_active or time.monotonic() > deadline:
+            return job
+        time.sleep(0.05)
+
+
+def test_reports_dir_defaults_to_instance_path(app, repricing):
+    app.config.pop('REPRICING_REPORTS_DIR')
+    assert repricing.get_reports_dir() == os.path.join(app.instance_path, 'repricing_reports')
+    assert not repricing.get_reports_dir().startswith(os.path.dirname(repricing.__file__))
+
+
+def test_repricing_job_state_is_persisted(app, repricing, tmp_path):
+    job = repricing.start_repricing_job(app, user_id=1, reason='tests')
+    job_id = job.id
+    db.session.remove()
+
+    job = _wait_for(job_id)
+    assert job.status == job.STATUS_SUCCEEDED
+    assert job.created_by == 1
+    assert job.result['quotes_total'] == 0
+    assert repricing.get_repricing_job(job_id).id == job_id
+
+    report_path = repricing.get_report_path(job)
+    assert report_path == str(tmp_path / 'reports' / job.result['report_file'])
+    with open(report_path, encoding='utf-8') as report_file:
+        assert report_file.readline().strip() == ';'.join(repricing.REPORT_COLUMNS)
+
+
+def test_only_one_applying_run_at_a_time(app, repricing):
+    from modules.jobs import BackgroundJob, JobAlreadyRunning
+
+    db.session.add(BackgroundJob(
+        id='running-apply', job_type=repricing.REPRICING_APPLY_JOB, status=BackgroundJob.STATUS_RUNNING,
+        active_key=repricing.REPRICING_APPLY_JOB, created_at=datetime.utcnow(), heartbeat_at=datetime.utcnow()
+    ))
+    db.session.commit()
+
+    with pytest.raises(JobAlreadyRunning):
+        repricing.start_repricing_job(app, apply=True, user_id=1)
+
+
+def test_unrelated_job_is_not_a_repricing_run(app, repricing):
+    from modules.jobs import BackgroundJob
+
+    db.session.add(BackgroundJob(id='other', job_type='reports.sync', created_at=datetime.utcnow()))
+    db.session.commit()
+    assert repricing.get_repricing_job('other') is None
+
+
+def test_process_pool_run_waits_for_scheduler_daemon(app, repricing, monkeypatch):
+    from modules.jobs import BackgroundJob
+
+    monkeypatch.setattr(repricing, 'request_job_run', lambda job_id: True)
+    job = repricing.start_repricing_job(app, workers=4, user_id=1)
+    assert job.status == BackgroundJob.STATUS_QUEUED
+
+    # Tick daemona wykonuje zadanie w swoim procesie
+    assert repricing.run_queued_repricing_jobs() == {'jobs': 1}
+    db.session.expire_all()
+    job = repricing.get_repricing_job(job.id)
+    assert job.status == BackgroundJob.STATUS_SUCCEEDED
+    assert job.params['workers'] == 4
+
+
+def test_process_pool_run_without_daemon_stays_in_worker_thread(app, repricing, monkeypatch):
+    monkeypatch.setattr(repricing, 'request_job_run', lambda job_id: False)
+    job_id = repricing.start_repricing_job(app, workers=4, user_id=1).id
+    db.session.remove()
+
+    job = _wait_for(job_id)
+    assert job.status == job.STATUS_SUCCEEDED
+    assert job.params['workers'] == 0
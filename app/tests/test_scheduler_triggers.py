@@ -0,0 +1,30 @@
+# tests/test_scheduler_triggers.py
+"""Wyzwalacze schedulera: terminy interwałowe bez dryfu mimo jittera"""
+
+from datetime import datetime, timedelta
+
+from conftest import require_modules
+
+
+def test_interval_trigger_fires_on_fixed_grid():
+    triggers = require_modules('modules.scheduler.triggers')
+    trigger = triggers.IntervalTrigger(hours=1)
+
+    assert trigger.next_fire(datetime(2025, 3, 1, 10, 0)) == datetime(2025, 3, 1, 11, 0)
+    assert trigger.next_fire(datetime(2025, 3, 1, 10, 59, 59)) == datetime(2025, 3, 1, 11, 0)
+    # Zaległe terminy łączone w jeden
+    assert trigger.next_fire(datetime(2025, 3, 1, 13, 30), previous=datetime(2025, 3, 1, 10, 0)) \
+        == datetime(2025, 3, 1, 14, 0)
+
+
+def test_jitter_does_not_accumulate():
+    service = require_modules('modules.scheduler.scheduler_service')
+    job = service.ScheduledJob('test', lambda: None, service.IntervalTrigger(minutes=1), jitter=10)
+
+    # Każde uruchomienie startuje w jitterowanym terminie, kolejny termin liczony od niego
+    scheduled = job.next_run_after(datetime(2025, 3, 1, 10, 0))
+    for _ in range(200):
+        scheduled = job.next_run_after(scheduled, previous=scheduled)
+    base = scheduled.replace(second=0)
+    assert base == datetime(2025, 3, 1, 10, 0) + timedelta(minutes=201)
+    assert scheduled - base <= timedelta(seconds=11)  # jitter + zaokrąglenie do sekundy
@@ -0,0 +1,198 @@
+# tests/test_search_index.py
+"""Indeks trigramowy: zgodność z ILIKE, dziennik zmian i sortowanie po trafności"""
+
+import pytest
+from flask import Blueprint
+from sqlalchemy import insert, or_, select
+
+from conftest import require_modules
+from extensions import db, login_manager
+
+import search_index
+
+PRODUCT_NAMES = (
+    'Klejonka dębowa lita A/B 200x80x4', 'Klejonka bukowa mikrowczep 150x60x3',
+    'Blat DĄB lity 300x90x4', 'Parapet jesion 120x30x2', 'Schody dąb/buk',
+    'klejonka Jesionowa', 'Trep 100x30x4 buk', 'Deska sosnowa',
+)
+CLIENTS = ('Jan Kowalski', 'KOWALSKA Anna', 'Stolarnia Buk-Pol', 'Firma ABC', None)
+
+
+@pytest.fixture
+def products(app):
+    models = require_modules('modules.production.models')
+    search_index.install_search_tracking()
+    for index in range(40):
+        db.session.add(_product(models.ProductionItem, index))
+    db.session.commit()
+    return models
+
+
+def _product(model, index, **overrides):
+    values = dict(
+        short_product_id=f'25_{index:05d}_1', internal_order_number=f'25_{index:05d}',
+        product_sequence_in_order=1, baselinker_order_id=1000 + index,
+        original_product_name=PRODUCT_NAMES[index % len(PRODUCT_NAMES)],
+        client_name=CLIENTS[index % len(CLIENTS)], current_status='czeka_na_wyciecie',
+        priority_rank=index,
+    )
+    values.update(overrides)
+    return model(**values)
+
+
+def _ilike_ids(model, phrase):
+    pattern = f'%{phrase}%'
+    query = db.session.query(model.id).filter(or_(
+        model.original_product_name.ilike(pattern), model.short_product_id.ilike(pattern),
+        model.internal_order_number.ilike(pattern), model.client_name.ilike(pattern),
+    ))
+    return {row[0] for row in query}
+
+
+@pytest.mark.parametrize('phrase', [
+    'klejonka', 'KLEJONKA', 'jesion', 'x30x', 'kowals', 'buk', 'Buk-Pol', '25_0001', '00012',
+    '4', 'a/', 'brak-takiego', ' lita ',
+])
+def test_search_matches_ilike(products, phrase):
+    model = products.ProductionItem
+    assert set(products.PRODUCT_SEARCH.search(phrase, limit=None)) == _ilike_ids(model, phrase.strip())
+
+
+def test_search_folds_polish_characters(products):
+    model = products.ProductionItem
+    # ILIKE nie rozróżnia tylko wielkości liter ASCII - indeks dodatkowo ignoruje polskie znaki
+    found = set(products.PRODUCT_SEARCH.search('dab', limit=None))
+    assert found == _ilike_ids(model, 'dąb') | _ilike_ids(model, 'DĄB')
+    assert _ilike_ids(model, 'dębow') <= set(products.PRODUCT_SEARCH.search('debow', limit=None))
+
+
+def _log_entries():
+    changes = search_index.SearchIndexChange.__table__
+    return db.session.execute(select(changes.c.scope, changes.c.doc_id).order_by(changes.c.id)).all()
+
+
+def test_bulk_insert_without_ids_logs_inserted_ids(products):
+    model = products.ProductionItem
+    products.PRODUCT_SEARCH.search('klejonka')
+    before = len(_log_entries())
+
+    db.session.execute(insert(model), [
+        dict(short_product_id=f'26_{index:05d}_1', internal_order_number=f'26_{index:05d}',
+             product_sequence_in_order=1, baselinker_order_id=9000 + index,
+             original_product_name=f'Zupełnie nowy blat orzech {index}', current_status='czeka_na_wyciecie')
+        for index in range(3)
+    ])
+    db.session.commit()
+
+    new_entries = _log_entries()[before:]
+    inserted = {row[0] for row in db.session.query(model.id).filter(model.baselinker_order_id >= 9000)}
+    assert new_entries and all(doc_id is not None for _scope, doc_id in new_entries)
+    assert {doc_id for _scope, doc_id in new_entries} == inserted
+    assert set(products.PRODUCT_SEARCH.search('orzech', limit=None)) == inserted
+
+
+def test_insert_with_explicit_low_id_is_logged(products):
+    model = products.ProductionItem
+    db.session.execute(insert(model).values(
+        id=0, short_product_id='24_00001_1', internal_order_number='24_00001', product_sequence_in_order=1,
+        baselinker_order_id=1, original_product_name='Orzech włoski', current_status='czeka_na_wyciecie'
+    ))
+    db.session.commit()
+    assert products.PRODUCT_SEARCH.search('orzech', limit=None) == [0]
+
+
+def test_change_committed_after_higher_id_is_applied(products):
+    model = products.ProductionItem
+    changes = search_index.SearchIndexChange.__table__
+    products.PRODUCT_SEARCH.search('klejonka')
+    last_id = db.session.execute(select(changes.c.id).order_by(changes.c.id.desc())).scalars().first()
+
+    # Wiersze i wpisy dziennika z pominięciem sesji - kolejność commit jak w dwóch procesach
+    with db.engine.begin() as conn:
+        first_id, second_id = (conn.execute(insert(model.__table__).values(
+            short_product_id=f'27_0000{index}_1', internal_order_number=f'27_0000{index}',
+            product_sequence_in_order=1, baselinker_order_id=7000 + index,
+            original_product_name=f'Orzech {name}', current_status='czeka_na_wyciecie'
+        )).inserted_primary_key[0] for index, name in ((1, 'amerykański'), (2, 'włoski')))
+    with db.engine.begin() as conn:
+        conn.execute(insert(changes).values(id=last_id + 2, scope='production_items', doc_id=second_id))
+    products.PRODUCT_SEARCH.invalidate()
+    assert products.PRODUCT_SEARCH.search('orzech', limit=None) == [second_id]
+
+    # Transakcja z niższym id kończy się później
+    with db.engine.begin() as conn:
+        conn.execute(insert(changes).values(id=last_id + 1, scope='production_items', doc_id=first_id))
+    products.PRODUCT_SEARCH.invalidate()
+    assert set(products.PRODUCT_SEARCH.search('orzech', limit=None)) == {first_id, second_id}
+
+
+def test_conditional_update_still_reloads_scope(products):
+    model = products.ProductionItem
+    db.session.query(model).filter(model.priority_rank < 3).update(
+        {'client_name': 'Tartak Wiśniewski'}, synchronize_session=False
+    )
+    db.session.commit()
+    assert _log_entries()[-1] == ('production_items', None)
+    assert len(products.PRODUCT_SEARCH.search('wisniewski', limit=None)) == 3
+
+
+@pytest.fixture
+def products_client(products, app, monkeypatch, login):
+    api_routers = require_modules('modules.production.routers.api_routers')
+    users = require_modules('modules.users.models')
+    blueprint = Blueprint('production', __name__, url_prefix='/production')
+    blueprint.register_blueprint(api_routers.api_bp, url_prefix='/api')
+    app.register_blueprint(blueprint)
+    app.add_url_rule('/login', 'login', lambda: 'login')
+    login_manager.init_app(app)
+    db.session.add(users.User(id=1, email='admin@example.com', password='x', role='admin'))
+    db.session.commit()
+
+    client = app.test_client()
+    login(client, 1)
+    return client, api_routers
+
+
+def _relevance_page(client, page, **params):
+    query = dict(search='klejonka', sort_by='relevance', per_page=4, page=page)
+    query.update(params)
+    response = client.get('/production/api/products-filtered', query_string=query)
+    assert response.status_code == 200
+    return response.get_json()
+
+
+def test_relevance_sort_pages_follow_index_ranking(products_client, products):
+    client, _ = products_client
+    expected = products.PRODUCT_SEARCH.search('klejonka', limit=None)
+
+    first = _relevance_page(client, 1)
+    assert first['filters_applied']['relevance_applied'] is True
+    assert first['pagination']['total'] == len(expected)
+
+    ids = []
+    for page in range(1, first['pagination']['pages'] + 1):
+        ids += [product['id'] for product in _relevance_page(client, page)['products']]
+    assert ids == expected
+
+
+def test_relevance_respects_status_filter_and_desc(products_client, products):
+    client, _ = products_client
+    model = products.ProductionItem
+    db.session.query(model).filter(model.priority_rank % 2 == 1).update(
+        {'current_status': 'spakowane'}, synchronize_session=False
+    )
+    db.session.commit()
+    expected = [product_id for product_id in products.PRODUCT_SEARCH.search('klejonka', limit=None)
+                if db.session.get(model, product_id).current_status == 'spakowane']
+
+    data = _relevance_page(client, 1, status='spakowane', sort_order='desc', per_page=100)
+    assert [product['id'] for product in data['products']] == expected[::-1]
+
+
+def test_relevance_flagged_when_too_many_matches(products_client, monkeypatch):
+    client, api_routers = products_client
+    monkeypatch.setattr(api_routers, 'SEARCH_MATCH_LIMIT', 3)
+
+    data = _relevance_page(client, 1)
+    assert data['filters_applied']['relevance_applied'] is False
+    assert data['pagination']['total'] > 3